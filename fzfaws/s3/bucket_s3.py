@@ -1,13 +1,13 @@
 """Contains bucket_s3 function to handle operation between buckets."""
 import re
-from typing import Dict, List, Optional, Tuple
+from typing import Any, Dict, List, Optional, Tuple
 
 from botocore.exceptions import ClientError
 
-from fzfaws.s3.helper.get_copy_args import get_copy_args
+from fzfaws.s3.helper.copy_engine import S3CopyEngine
+from fzfaws.s3.helper.get_copy_args import get_copy_args, get_copy_args_batch
+from fzfaws.s3.helper.journal import Journal
 from fzfaws.s3.helper.s3args import S3Args
-from fzfaws.s3.helper.s3progress import S3Progress
-from fzfaws.s3.helper.s3transferwrapper import S3TransferWrapper
 from fzfaws.s3.helper.sync_s3 import sync_s3
 from fzfaws.s3.helper.walk_s3_folder import walk_s3_folder
 from fzfaws.s3.s3 import S3
@@ -24,6 +24,11 @@ def bucket_s3(
     include: Optional[List[str]] = None,
     version: bool = False,
     preserve: bool = False,
+    inventory: str = None,
+    delete: bool = False,
+    checksum: bool = False,
+    resume: bool = False,
+    verify: Optional[str] = None,
 ) -> None:
     """Transfer file between buckets.
 
@@ -48,6 +53,16 @@ def bucket_s3(
     :type version: bool, optional
     :param perserve: save all object's config instead of using the new bucket's settings
     :type perserve: bool, optional
+    :param inventory: local path or s3 uri of a s3 inventory manifest.json, list objects from the inventory
+    :type inventory: str, optional
+    :param delete: during sync, delete files in the destination that don't exist in the source
+    :type delete: bool, optional
+    :param checksum: during sync, compare ETag instead of last modified time
+    :type checksum: bool, optional
+    :param resume: during recursive copy, skip objects completed by a previous failed copy
+    :type resume: bool, optional
+    :param verify: verify the copied data, md5 for the ETag only or a checksum algorithm
+    :type verify: str, optional
     """
     if exclude is None:
         exclude = []
@@ -66,14 +81,18 @@ def bucket_s3(
 
     search_folder: bool = True if recursive or sync else False
 
+    if inventory:
+        # inventory is only used to select the source objects
+        s3.set_inventory(inventory)
     if from_bucket:
         target_bucket, target_path, target_path_list = process_path_param(
             from_bucket, s3, search_folder, version=version
         )
     else:
-        s3.set_s3_bucket(
-            header="set the source bucket which contains the file to transfer"
-        )
+        if not s3.bucket_name:
+            s3.set_s3_bucket(
+                header="set the source bucket which contains the file to transfer"
+            )
         target_bucket = s3.bucket_name
         if search_folder:
             s3.set_s3_path()
@@ -103,6 +122,10 @@ def bucket_s3(
             include,
             "s3://%s/%s" % (target_bucket, target_path),
             "s3://%s/%s" % (dest_bucket, dest_path),
+            s3,
+            delete,
+            checksum,
+            verify,
         )
     elif recursive:
         recursive_copy(
@@ -114,6 +137,8 @@ def bucket_s3(
             exclude,
             include,
             preserve,
+            resume,
+            verify,
         )
 
     elif version:
@@ -125,6 +150,7 @@ def bucket_s3(
             target_bucket,
             target_path,
             preserve,
+            verify,
         )
 
     else:
@@ -139,26 +165,37 @@ def bucket_s3(
                 % (target_bucket, target_path, dest_bucket, s3_key)
             )
         if get_confirmation("Confirm?"):
-            for target_path in target_path_list:
-                s3_key = s3.get_s3_destination_key(target_path)
-                print(
-                    "copy: s3://%s/%s to s3://%s/%s"
-                    % (target_bucket, target_path, dest_bucket, s3_key)
+            if not preserve:
+                S3CopyEngine(
+                    s3.get_client(dest_bucket),
+                    s3.get_client(target_bucket),
+                    verify=verify,
+                ).copy(
+                    [
+                        {
+                            "bucket": target_bucket,
+                            "key": target_path,
+                            "dest_bucket": dest_bucket,
+                            "dest_key": s3.get_s3_destination_key(target_path),
+                            "size": s3.get_object_size(
+                                target_path, bucket=target_bucket
+                            ),
+                        }
+                        for target_path in target_path_list
+                    ]
                 )
-                copy_source = {"Bucket": target_bucket, "Key": target_path}
-                if not preserve:
-                    s3transferwrapper = S3TransferWrapper()
-                    s3.client.copy(
-                        copy_source,
-                        dest_bucket,
-                        s3_key,
-                        Callback=S3Progress(target_path, target_bucket, s3.client),
-                        Config=s3transferwrapper.transfer_config,
-                    )
-                else:
+            else:
+                for target_path in target_path_list:
+                    s3_key = s3.get_s3_destination_key(target_path)
                     s3.bucket_name = target_bucket
                     copy_and_preserve(
-                        s3, target_bucket, target_path, dest_bucket, s3_key
+                        s3,
+                        target_bucket,
+                        target_path,
+                        dest_bucket,
+                        s3_key,
+                        size=s3.get_object_size(target_path, bucket=target_bucket),
+                        verify=verify,
                     )
 
 
@@ -170,6 +207,7 @@ def copy_version(
     target_bucket: str,
     target_path: str,
     preserve: bool,
+    verify: Optional[str] = None,
 ) -> None:
     """Copy versions of object to other bucket.
 
@@ -187,6 +225,8 @@ def copy_version(
     :type target_path: str
     :param preserve: preserve previous object details after transfer
     :type preserve: bool
+    :param verify: verify the copied data, md5 for the ETag only or a checksum algorithm
+    :type verify: str, optional
     """
     # set s3 attributes for getting destination key
     s3.bucket_name = dest_bucket
@@ -205,46 +245,49 @@ def copy_version(
         )
 
     if get_confirmation("Confirm?"):
-        for obj_version in obj_versions:
-            s3_key = s3.get_s3_destination_key(obj_version.get("Key", ""))
-            print(
-                "copy: s3://%s/%s to s3://%s/%s with version %s"
-                % (
-                    target_bucket,
-                    obj_version.get("Key"),
-                    dest_bucket,
-                    s3_key,
-                    obj_version.get("VersionId"),
-                )
+        if not preserve:
+            S3CopyEngine(
+                s3.get_client(dest_bucket), s3.get_client(target_bucket), verify=verify
+            ).copy(
+                [
+                    {
+                        "bucket": target_bucket,
+                        "key": obj_version.get("Key", ""),
+                        "version_id": obj_version.get("VersionId"),
+                        "dest_bucket": dest_bucket,
+                        "dest_key": s3.get_s3_destination_key(
+                            obj_version.get("Key", "")
+                        ),
+                        "size": s3.get_object_size(
+                            obj_version.get("Key", ""),
+                            obj_version.get("VersionId", ""),
+                            target_bucket,
+                        ),
+                    }
+                    for obj_version in obj_versions
+                ]
             )
-            copy_source = {
-                "Bucket": target_bucket,
-                "Key": obj_version.get("Key"),
-                "VersionId": obj_version.get("VersionId"),
-            }
-            if not preserve:
-                s3transferwrapper = S3TransferWrapper()
-                s3.client.copy(
-                    copy_source,
-                    dest_bucket,
-                    s3_key,
-                    Callback=S3Progress(
-                        obj_version.get("Key", ""),
-                        target_bucket,
-                        s3.client,
-                        version_id=obj_version.get("VersionId"),
-                    ),
-                    Config=s3transferwrapper.transfer_config,
-                )
-            else:
-                s3.bucket_name = target_bucket
+        else:
+            s3.bucket_name = target_bucket
+            for s3_key, version_id, copy_object_args in get_copy_args_batch(
+                s3,
+                [
+                    (obj_version.get("Key", ""), obj_version.get("VersionId"))
+                    for obj_version in obj_versions
+                ],
+                S3Args(s3),
+                extra_args=True,
+            ):
                 copy_and_preserve(
                     s3,
                     target_bucket,
-                    obj_version.get("Key", ""),
-                    dest_bucket,
                     s3_key,
-                    version=obj_version.get("VersionId"),
+                    dest_bucket,
+                    s3.get_s3_destination_key(s3_key),
+                    version=version_id,
+                    size=s3.get_object_size(s3_key, version_id or "", target_bucket),
+                    copy_object_args=copy_object_args,
+                    verify=verify,
                 )
 
 
@@ -257,9 +300,14 @@ def recursive_copy(
     exclude: List[str],
     include: List[str],
     preserve: bool,
+    resume: bool = False,
+    verify: Optional[str] = None,
 ) -> None:
     """Recursive copy object to other bucket.
 
+    Every copied object is recorded in a Journal, with resume the objects
+    recorded by a previous failed copy of the same path are skipped.
+
     :param s3: S3 instance
     :type s3: S3
     :param target_bucket: source bucket
@@ -276,9 +324,28 @@ def recursive_copy(
     :type include: List[str]
     :param preserve: preserve previous object config
     :type preserve: bool
+    :param resume: skip the objects completed by a previous failed copy
+    :type resume: bool, optional
+    :param verify: verify the copied data, md5 for the ETag only or a checksum algorithm
+    :type verify: str, optional
     """
+    journal = Journal(
+        "copy",
+        {
+            "bucket": target_bucket,
+            "prefix": target_path,
+            "dest_bucket": dest_bucket,
+            "dest_prefix": dest_path,
+            "exclude": exclude,
+            "include": include,
+            "preserve": preserve,
+        },
+        resume=resume,
+    )
+    sizes: Dict[str, int] = {}
+    inventory = s3.get_inventory(target_bucket)
     file_list = walk_s3_folder(
-        s3.client,
+        s3.get_client(target_bucket),
         target_bucket,
         target_path,
         target_path,
@@ -288,27 +355,55 @@ def recursive_copy(
         "bucket",
         dest_path,
         dest_bucket,
+        inventory=inventory,
+        sizes=sizes,
+        completed=journal,
     )
+    if inventory is not None:
+        # the inventory is a snapshot, make sure the objects still exist
+        file_list = s3.confirm_file_list(file_list, target_bucket, sizes=sizes)
 
-    if get_confirmation("Confirm?"):
-        for s3_key, dest_pathname in file_list:
-            print(
-                "copy: s3://%s/%s to s3://%s/%s"
-                % (target_bucket, s3_key, dest_bucket, dest_pathname)
+    if not get_confirmation("Confirm?"):
+        return
+    with journal:
+        if not preserve:
+            S3CopyEngine(
+                s3.get_client(dest_bucket),
+                s3.get_client(target_bucket),
+                journal=journal,
+                verify=verify,
+            ).copy(
+                [
+                    {
+                        "bucket": target_bucket,
+                        "key": s3_key,
+                        "dest_bucket": dest_bucket,
+                        "dest_key": dest_pathname,
+                        "size": sizes.get(s3_key),
+                    }
+                    for s3_key, dest_pathname in file_list
+                ]
             )
-            copy_source = {"Bucket": target_bucket, "Key": s3_key}
-            if not preserve:
-                s3transferwrapper = S3TransferWrapper()
-                s3.client.copy(
-                    copy_source,
+        else:
+            s3.bucket_name = target_bucket
+            dest_pathnames = dict(file_list)
+            for s3_key, _, copy_object_args in get_copy_args_batch(
+                s3,
+                ((s3_key, None) for s3_key, _ in file_list),
+                S3Args(s3),
+                extra_args=True,
+            ):
+                copy_and_preserve(
+                    s3,
+                    target_bucket,
+                    s3_key,
                     dest_bucket,
-                    dest_pathname,
-                    Callback=S3Progress(s3_key, target_bucket, s3.client),
-                    Config=s3transferwrapper.transfer_config,
+                    dest_pathnames[s3_key],
+                    size=sizes.get(s3_key),
+                    copy_object_args=copy_object_args,
+                    verify=verify,
                 )
-            else:
-                s3.bucket_name = target_bucket
-                copy_and_preserve(s3, target_bucket, s3_key, dest_bucket, dest_pathname)
+                journal.record(s3_key)
 
 
 def copy_and_preserve(
@@ -318,6 +413,9 @@ def copy_and_preserve(
     dest_bucket: str,
     dest_path: str,
     version: str = None,
+    size: Optional[int] = None,
+    copy_object_args: Optional[Dict[str, Any]] = None,
+    verify: Optional[str] = None,
 ) -> None:
     """Copy object to other buckets and preserve previous details.
 
@@ -331,29 +429,40 @@ def copy_and_preserve(
     :type dest_path: str
     :param version: versionID of the object
     :type version: str
+    :param size: size of the object if known, avoid a head_object call for the progress bar
+    :type size: int, optional
+    :param copy_object_args: copy argument from get_copy_args if already known
+    :type copy_object_args: Dict[str, Any], optional
+    :param verify: verify the copied data, md5 for the ETag only or a checksum algorithm
+    :type verify: str, optional
     :raises ClientError: clienterror will raise when coping KMS encrypted file, handled internally
     """
-    copy_source: Dict[str, str] = {"Bucket": target_bucket, "Key": target_path}
-    if version:
-        copy_source["VersionId"] = version
-    s3_args = S3Args(s3)
-    copy_object_args = get_copy_args(
-        s3, target_path, s3_args, extra_args=True, version=version
-    )
+    if copy_object_args is None:
+        copy_object_args = get_copy_args(
+            s3, target_path, S3Args(s3), extra_args=True, version=version
+        )
+    else:
+        copy_object_args = dict(copy_object_args)
 
     # limit to one retry
     attempt_count: int = 0
     while attempt_count < 2:
         try:
             attempt_count += 1
-            s3transferwrapper = S3TransferWrapper()
-            s3.client.copy(
-                copy_source,
-                dest_bucket,
-                dest_path,
-                Callback=S3Progress(target_path, s3.bucket_name, s3.client),
-                ExtraArgs=copy_object_args,
-                Config=s3transferwrapper.transfer_config,
+            S3CopyEngine(
+                s3.get_client(dest_bucket), s3.get_client(target_bucket), verify=verify
+            ).copy(
+                [
+                    {
+                        "bucket": target_bucket,
+                        "key": target_path,
+                        "version_id": version,
+                        "dest_bucket": dest_bucket,
+                        "dest_key": dest_path,
+                        "size": size,
+                    }
+                ],
+                extra_args=copy_object_args,
             )
             break
         except ClientError as e:
@@ -1,7 +1,12 @@
 """Contains function for handling delete operation on s3."""
-from typing import Dict, List, Optional, Union
+import json
+import tempfile
+from typing import IO, Dict, Generator, List, Optional, Tuple, Union
 
+from fzfaws.s3.helper.batch_delete import BatchDeleter
 from fzfaws.s3.helper.exclude_file import exclude_file
+from fzfaws.s3.helper.journal import Journal, journal_id
+from fzfaws.s3.helper.version_index import group_versions
 from fzfaws.s3.helper.walk_s3_folder import walk_s3_folder
 from fzfaws.s3.s3 import S3
 from fzfaws.utils.util import get_confirmation
@@ -18,6 +23,8 @@ def delete_s3(
     allversion: bool = False,
     deletemark: bool = False,
     clean: bool = False,
+    inventory: str = None,
+    resume: bool = False,
 ) -> None:
     """Delete file/directory on the selected s3 bucket.
 
@@ -41,6 +48,10 @@ def delete_s3(
     :type deletemark: bool, optional
     :param clean: recusive delete all olderversions but leave the current version
     :type clean: bool, optional
+    :param inventory: local path or s3 uri of a s3 inventory manifest.json, list objects from the inventory
+    :type inventory: str, optional
+    :param resume: during recursive delete, skip objects completed by a previous failed delete
+    :type resume: bool, optional
     """
     if exclude is None:
         exclude = []
@@ -65,6 +76,8 @@ def delete_s3(
         clean = False
 
     s3.set_bucket_and_path(bucket)
+    if inventory:
+        s3.set_inventory(inventory)
     if not s3.bucket_name:
         s3.set_s3_bucket()
     if recursive:
@@ -79,7 +92,9 @@ def delete_s3(
             )
 
     if recursive:
-        delete_object_recursive(s3, exclude, include, deletemark, clean, allversion)
+        delete_object_recursive(
+            s3, exclude, include, deletemark, clean, allversion, resume
+        )
 
     elif version:
         delete_object_version(s3, allversion, mfa)
@@ -90,16 +105,17 @@ def delete_s3(
         for s3_path in s3.path_list:
             print("(dryrun) delete: s3://%s/%s" % (s3.bucket_name, s3_path))
         if get_confirmation("Confirm?"):
-            for s3_path in s3.path_list:
-                print("delete: s3://%s/%s" % (s3.bucket_name, s3_path))
-                s3.client.delete_object(
-                    Bucket=s3.bucket_name, Key=s3_path,
-                )
+            BatchDeleter(s3.client, s3.bucket_name).delete(
+                {"Key": s3_path} for s3_path in s3.path_list
+            )
 
 
 def delete_object_version(s3: S3, allversion: bool = False, mfa: str = "") -> None:
     """Delete versions of a object.
 
+    Versions are deleted in batches through BatchDeleter, except MFA delete
+    which requires delete_object for every version.
+
     :param s3: S3 instance
     :type s3: S3
     :param allversion: skip verison selection and select all verions
@@ -116,7 +132,11 @@ def delete_object_version(s3: S3, allversion: bool = False, mfa: str = "") -> No
             "(dryrun) delete: s3://%s/%s with version %s"
             % (s3.bucket_name, obj_version.get("Key"), obj_version.get("VersionId"))
         )
-    if get_confirmation("Confirm?"):
+    if not get_confirmation("Confirm?"):
+        return
+    if not mfa:
+        BatchDeleter(s3.client, s3.bucket_name).delete(obj_versions)
+    else:
         for obj_version in obj_versions:
             print(
                 "delete: s3://%s/%s with version %s"
@@ -141,9 +161,18 @@ def delete_object_recursive(
     deletemark: bool = False,
     clean: bool = False,
     allversion: bool = False,
+    resume: bool = False,
 ) -> None:
     """Recursive delete object and their versions if specified.
 
+    Every deleted object is recorded in a Journal, with resume the objects
+    recorded by a previous failed delete of the same path are skipped. This
+    matters for an inventory, which still lists the deleted objects.
+
+    With allversion, the versions are listed once for the dryrun and spooled
+    into a temporary file, exactly the spooled versions are deleted after the
+    confirmation, versions created in the meantime are left untouched.
+
     :param s3: S3 instance
     :type s3: S3
     :param exclude: glob pattern to exclude
@@ -156,60 +185,65 @@ def delete_object_recursive(
     :type clean: bool, optional
     :param allversion: delete allversions, use to nuke the entire bucket or folder
     :type allversion: bool, optional
+    :param resume: skip the objects completed by a previous failed delete
+    :type resume: bool, optional
     """
+    journal = Journal(
+        "delete",
+        {
+            "bucket": s3.bucket_name,
+            "prefix": s3.path_list[0],
+            "exclude": exclude,
+            "include": include,
+            "deletemark": deletemark,
+            "clean": clean,
+            "allversion": allversion,
+        },
+        resume=resume,
+    )
     if allversion:
-        # use a different method other than the walk s3 folder
-        # since walk_s3_folder doesn't provide access to deleted version object
-        # delete_all_versions method will list all files including deleted versions or even delete marker
-        file_list = find_all_version_files(
+        # walk_s3_folder doesn't provide access to deleted objects or delete markers
+        # list all versions under the prefix instead
+        spool = tempfile.TemporaryFile(mode="w+", encoding="utf-8")
+        for key, versions in find_all_versions(
             s3.client,
             s3.bucket_name,
             s3.path_list[0],
-            [],
             exclude,
             include,
             deletemark,
-        )
-        obj_versions: List[Dict[str, str]] = []
-
-        # loop through all files and get their versions
-        for file in file_list:
-            obj_versions.extend(
-                s3.get_object_version(
-                    key=file, delete=True, select_all=True, non_current=clean
-                )
-            )
+            clean,
+        ):
             print(
                 "(dryrun) delete: s3://%s/%s %s"
                 % (
                     s3.bucket_name,
-                    file,
+                    key,
                     "with all versions" if not clean else "all non-current versions",
                 )
             )
+            for version in versions:
+                spool.write(json.dumps(version) + "\n")
 
         if get_confirmation(
             "Delete %s?"
             % ("all of their versions" if not clean else "all non-current versions")
         ):
-            for obj_version in obj_versions:
-                print(
-                    "delete: s3://%s/%s with version %s"
-                    % (
-                        s3.bucket_name,
-                        obj_version.get("Key"),
-                        obj_version.get("VersionId"),
+            with journal:
+                BatchDeleter(s3.client, s3.bucket_name, journal=journal).delete(
+                    journal.pending(
+                        _read_spool(spool),
+                        lambda version: journal_id(
+                            version["Key"], version.get("VersionId")
+                        ),
                     )
                 )
-                s3.client.delete_object(
-                    Bucket=s3.bucket_name,
-                    Key=obj_version.get("Key"),
-                    VersionId=obj_version.get("VersionId"),
-                )
+        spool.close()
 
     else:
+        inventory = s3.get_inventory()
         file_list = walk_s3_folder(
-            s3.client,
+            s3.get_client(),
             s3.bucket_name,
             s3.path_list[0],
             s3.path_list[0],
@@ -217,73 +251,79 @@ def delete_object_recursive(
             exclude,
             include,
             "delete",
+            inventory=inventory,
+            completed=journal,
         )
+        if inventory is not None:
+            # the inventory is a snapshot, make sure the objects still exist
+            file_list = s3.confirm_file_list(file_list)
         if get_confirmation("Confirm?"):
-            for s3_key, _ in file_list:
-                print("delete: s3://%s/%s" % (s3.bucket_name, s3_key))
-                s3.client.delete_object(
-                    Bucket=s3.bucket_name, Key=s3_key,
+            with journal:
+                BatchDeleter(s3.client, s3.bucket_name, journal=journal).delete(
+                    {"Key": s3_key} for s3_key, _ in file_list
                 )
 
 
-def find_all_version_files(
+def _read_spool(spool: IO[str]) -> Generator[Dict[str, str], None, None]:
+    """Read back the versions spooled during the dryrun."""
+    spool.seek(0)
+    for line in spool:
+        yield json.loads(line)
+
+
+def find_all_versions(
     client,
     bucket: str,
     path: str,
-    file_list: Optional[List[str]] = None,
     exclude: Optional[List[str]] = None,
     include: Optional[List[str]] = None,
     deletemark: bool = False,
-) -> List[str]:
-    """Find all files based on versions.
+    non_current: bool = False,
+) -> Generator[Tuple[str, List[Dict[str, str]]], None, None]:
+    """Find all versions of all files under the path.
 
     This method is able to find all files even deleted files or just delete marker left overs.
     Use this method when needing to cleanly delete all files including their versions.
 
+    The path is listed through one list_object_versions pass without delimiter,
+    versions are grouped by key as a stream, so the versions could be passed
+    to BatchDeleter while still listing.
+
     :param client: boto3 client
     :type client: boto3.client
     :param bucket: bucket to walk
     :type bucket: str
     :param path: the folder path to walk, empty to walk from root
     :type path: str
-    :param file_list: list of files that was walked, for recursive purpose, pass empty list in
-    :type file_list: List[str], optional
     :param exclude: glob pattern to exclude
     :type exclude: List[str], optional
     :param include: glob pattern to include
-    :type include: glob pattern to include
-    :param deletemark: set to true if only want to find deletemark
+    :type include: List[str], optional
+    :param deletemark: only find files with delete marker
     :type deletemark: bool, optional
-    :return: return a list of file names including deleted file names with delete mark remained
-    :rtype: List[str]
+    :param non_current: skip the current version of each file
+    :type non_current: bool, optional
+    :return: tuple of key and its versions, keys without any matching version are skipped
+    :rtype: Generator[Tuple[str, List[Dict[str, str]]], None, None]
+
+    Example return value:
+        ("folder/a.txt", [{"Key": "folder/a.txt", "VersionId": "111111"}])
     """
-    if file_list is None:
-        file_list = []
     if exclude is None:
         exclude = []
     if include is None:
         include = []
 
     paginator = client.get_paginator("list_object_versions")
-    for result in paginator.paginate(Bucket=bucket, Delimiter="/", Prefix=path):
-        if result.get("CommonPrefixes") is not None:
-            for subdir in result.get("CommonPrefixes"):
-                file_list = find_all_version_files(
-                    client, bucket, subdir.get("Prefix"), file_list, exclude, include
-                )
-        if not deletemark:
-            for file in result.get("Versions", []):
-                if exclude_file(exclude, include, file.get("Key")):
-                    continue
-                if file.get("Key") in file_list:
-                    continue
-                else:
-                    file_list.append(file.get("Key"))
-        for file in result.get("DeleteMarkers", []):
-            if exclude_file(exclude, include, file.get("Key")):
-                continue
-            if file.get("Key") in file_list:
-                continue
-            else:
-                file_list.append(file.get("Key"))
-    return file_list
+    for key, versions in group_versions(paginator.paginate(Bucket=bucket, Prefix=path)):
+        if exclude_file(exclude, include, key):
+            continue
+        if deletemark and not any(version["DeleteMarker"] for version in versions):
+            continue
+        selected_versions = [
+            {"Key": key, "VersionId": version.get("VersionId")}
+            for version in versions
+            if not (non_current and version.get("IsLatest"))
+        ]
+        if selected_versions:
+            yield key, selected_versions
@@ -2,8 +2,9 @@
 import os
 from typing import Dict, List, Optional, Union
 
-from fzfaws.s3.helper.s3progress import S3Progress
-from fzfaws.s3.helper.s3transferwrapper import S3TransferWrapper
+from fzfaws.s3.helper.journal import Journal
+from fzfaws.s3.helper.object_cache import get_object_cache
+from fzfaws.s3.helper.s3transferscheduler import S3TransferScheduler
 from fzfaws.s3.helper.sync_s3 import sync_s3
 from fzfaws.s3.helper.walk_s3_folder import walk_s3_folder
 from fzfaws.s3.s3 import S3
@@ -22,6 +23,11 @@ def download_s3(
     include: Optional[List[str]] = None,
     hidden: bool = False,
     version: bool = False,
+    inventory: str = None,
+    delete: bool = False,
+    checksum: bool = False,
+    resume: bool = False,
+    verify: Optional[str] = None,
 ) -> None:
     """Download files/'directory' from s3.
 
@@ -38,7 +44,7 @@ def download_s3(
     :type recursive: bool, optional
     :param search_root: search from root
     :type search_root: bool, optional
-    :param sync: use aws cli s3 sync
+    :param sync: sync the s3 path to the local directory
     :type sync: bool, optional
     :param exclude: glob patterns to exclude
     :type exclude: List[str], optional
@@ -48,6 +54,16 @@ def download_s3(
     :type hidden: bool, optional
     :param version: download version object
     :type version: bool, optional
+    :param inventory: local path or s3 uri of a s3 inventory manifest.json, list objects from the inventory
+    :type inventory: str, optional
+    :param delete: during sync, delete files in the destination that don't exist in the source
+    :type delete: bool, optional
+    :param checksum: during sync, compare ETag instead of last modified time
+    :type checksum: bool, optional
+    :param resume: during recursive download, skip objects completed by a previous failed download
+    :type resume: bool, optional
+    :param verify: verify the downloaded data, md5 for the ETag only or a checksum algorithm
+    :type verify: str, optional
     """
     if not exclude:
         exclude = []
@@ -56,6 +72,8 @@ def download_s3(
 
     s3 = S3(profile)
     s3.set_bucket_and_path(bucket)
+    if inventory:
+        s3.set_inventory(inventory)
     if not s3.bucket_name:
         s3.set_s3_bucket()
     if recursive or sync:
@@ -81,12 +99,16 @@ def download_s3(
             include=include,
             from_path="s3://%s/%s" % (s3.bucket_name, s3.path_list[0]),
             to_path=local_path,
+            s3=s3,
+            delete=delete,
+            checksum=checksum,
+            verify=verify,
         )
     elif recursive:
-        download_recusive(s3, exclude, include, local_path)
+        download_recusive(s3, exclude, include, local_path, resume, verify)
 
     elif version:
-        download_version(s3, obj_versions, local_path)
+        download_version(s3, obj_versions, local_path, verify)
 
     else:
         for s3_path in s3.path_list:
@@ -98,26 +120,36 @@ def download_s3(
                 % (s3.bucket_name, s3_path, destination_path)
             )
         if get_confirmation("Confirm?"):
-            for s3_path in s3.path_list:
-                destination_path = os.path.join(local_path, os.path.basename(s3_path))
-                print(
-                    "download: s3://%s/%s to %s"
-                    % (s3.bucket_name, s3_path, destination_path)
-                )
-                transfer = S3TransferWrapper(s3.client)
-                transfer.s3transfer.download_file(
-                    s3.bucket_name,
-                    s3_path,
-                    destination_path,
-                    callback=S3Progress(s3_path, s3.bucket_name, s3.client),
-                )
+            S3TransferScheduler(
+                s3.get_client(), verify=verify, object_cache=get_object_cache()
+            ).download(
+                [
+                    {
+                        "bucket": s3.bucket_name,
+                        "key": s3_path,
+                        "local_path": os.path.join(
+                            local_path, os.path.basename(s3_path)
+                        ),
+                        "size": s3.get_object_size(s3_path),
+                    }
+                    for s3_path in s3.path_list
+                ]
+            )
 
 
 def download_recusive(
-    s3: S3, exclude: List[str], include: List[str], local_path: str
+    s3: S3,
+    exclude: List[str],
+    include: List[str],
+    local_path: str,
+    resume: bool = False,
+    verify: Optional[str] = None,
 ) -> None:
     """Download s3 recursive.
 
+    Every downloaded object is recorded in a Journal, with resume the objects
+    recorded by a previous failed download of the same path are skipped.
+
     :param s3: S3 instance
     :type s3: S3
     :param exclude: glob pattern to exclude
@@ -126,9 +158,27 @@ def download_recusive(
     :type include: List[str]
     :param local_path: local directory to download
     :type local_path: str
+    :param resume: skip the objects completed by a previous failed download
+    :type resume: bool, optional
+    :param verify: verify the downloaded data, md5 for the ETag only or a checksum algorithm
+    :type verify: str, optional
     """
+    journal = Journal(
+        "download",
+        {
+            "bucket": s3.bucket_name,
+            "prefix": s3.path_list[0],
+            "path": os.path.abspath(local_path),
+            "exclude": exclude,
+            "include": include,
+        },
+        resume=resume,
+    )
+    sizes: Dict[str, int] = {}
+    etags: Dict[str, str] = {}
+    inventory = s3.get_inventory()
     download_list = walk_s3_folder(
-        s3.client,
+        s3.get_client(),
         s3.bucket_name,
         s3.path_list[0],
         s3.path_list[0],
@@ -137,26 +187,41 @@ def download_recusive(
         include,
         "download",
         local_path,
+        inventory=inventory,
+        sizes=sizes,
+        completed=journal,
+        etags=etags,
     )
+    if inventory is not None:
+        # the inventory is a snapshot, make sure the objects still exist
+        download_list = s3.confirm_file_list(download_list, sizes=sizes, etags=etags)
 
     if get_confirmation("Confirm?"):
-        for s3_key, dest_pathname in download_list:
-            if not os.path.exists(os.path.dirname(dest_pathname)):
-                os.makedirs(os.path.dirname(dest_pathname))
-            print(
-                "download: s3://%s/%s to %s" % (s3.bucket_name, s3_key, dest_pathname)
-            )
-            transfer = S3TransferWrapper(s3.client)
-            transfer.s3transfer.download_file(
-                s3.bucket_name,
-                s3_key,
-                dest_pathname,
-                callback=S3Progress(s3_key, s3.bucket_name, s3.client),
+        with journal:
+            S3TransferScheduler(
+                s3.get_client(),
+                journal=journal,
+                verify=verify,
+                object_cache=get_object_cache(),
+            ).download(
+                [
+                    {
+                        "bucket": s3.bucket_name,
+                        "key": s3_key,
+                        "local_path": dest_pathname,
+                        "size": sizes.get(s3_key),
+                        "etag": etags.get(s3_key),
+                    }
+                    for s3_key, dest_pathname in download_list
+                ]
             )
 
 
 def download_version(
-    s3: S3, obj_versions: List[Dict[str, str]], local_path: str
+    s3: S3,
+    obj_versions: List[Dict[str, str]],
+    local_path: str,
+    verify: Optional[str] = None,
 ) -> None:
     """Download versions of a object.
 
@@ -166,6 +231,8 @@ def download_version(
     :type obj_versions: List[Dict[str, str]]
     :param local_path: local directory to download
     :type local_path: str
+    :param verify: verify the downloaded data, md5 for the ETag only or a checksum algorithm
+    :type verify: str, optional
     """
     for obj_version in obj_versions:
         destination_path = os.path.join(
@@ -182,29 +249,21 @@ def download_version(
         )
 
     if get_confirmation("Confirm"):
-        for obj_version in obj_versions:
-            destination_path = os.path.join(
-                local_path, os.path.basename(obj_version.get("Key", ""))
-            )
-            print(
-                "download: s3://%s/%s to %s with version %s"
-                % (
-                    s3.bucket_name,
-                    obj_version.get("Key"),
-                    destination_path,
-                    obj_version.get("VersionId"),
-                )
-            )
-            transfer = S3TransferWrapper(s3.client)
-            transfer.s3transfer.download_file(
-                s3.bucket_name,
-                obj_version.get("Key"),
-                destination_path,
-                extra_args={"VersionId": obj_version.get("VersionId")},
-                callback=S3Progress(
-                    obj_version.get("Key", ""),
-                    s3.bucket_name,
-                    s3.client,
-                    obj_version.get("VersionId"),
-                ),
-            )
+        S3TransferScheduler(
+            s3.get_client(), verify=verify, object_cache=get_object_cache()
+        ).download(
+            [
+                {
+                    "bucket": s3.bucket_name,
+                    "key": obj_version.get("Key", ""),
+                    "local_path": os.path.join(
+                        local_path, os.path.basename(obj_version.get("Key", ""))
+                    ),
+                    "version_id": obj_version.get("VersionId"),
+                    "size": s3.get_object_size(
+                        obj_version.get("Key", ""), obj_version.get("VersionId", "")
+                    ),
+                }
+                for obj_version in obj_versions
+            ]
+        )
@@ -0,0 +1,191 @@
+"""Module contains the batched delete pipeline."""
+from concurrent.futures import ThreadPoolExecutor
+import threading
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from fzfaws.s3.helper.concurrency import (
+    THROTTLING_ERRORS,
+    ConcurrencyController,
+    backoff,
+)
+from fzfaws.s3.helper.journal import Journal, journal_id
+from fzfaws.s3.helper.s3transferwrapper import S3TransferWrapper
+
+# delete_objects accepts at most 1000 keys per request
+BATCH_SIZE = 1000
+
+# number of attempts of a key failed with a retryable error
+MAX_ATTEMPTS = 5
+
+# per key error codes returned by delete_objects worth retrying
+RETRYABLE_ERRORS = {
+    "InternalError",
+    "OperationAborted",
+    "RequestTimeout",
+    "ServiceUnavailable",
+    "SlowDown",
+}
+
+
+class BatchDeleter:
+    """Delete many objects or versions through concurrent delete_objects.
+
+    Objects are grouped into batches of 1000 and several batches are deleted
+    concurrently. Only the keys listed in the Errors of a response are retried,
+    the rest of the batch is not sent again. Once a request failed (e.g.
+    AccessDenied), the remaining batches are not sent. Every deleted object is
+    printed as soon as its batch completes. Batches in flight per prefix are adapted
+    through a ConcurrencyController when s3 throttles the requests.
+
+    MFA delete is not supported by this class, use delete_object instead.
+
+    Example:
+        deleter = BatchDeleter(s3.client, "bucket")
+        deleter.delete([{"Key": "a.txt"}, {"Key": "b.txt", "VersionId": "111"}])
+
+    :param client: boto3 s3 client
+    :type client: boto3.client
+    :param bucket: name of the bucket
+    :type bucket: str
+    :param concurrency: number of batches in flight, default to the concurrency in config file
+    :type concurrency: int, optional
+    :param journal: record the deleted objects by key and version
+    :type journal: Journal, optional
+    :param controller: controller of the batches in flight, could be shared with other engines
+    :type controller: ConcurrencyController, optional
+    """
+
+    def __init__(
+        self,
+        client,
+        bucket: str,
+        concurrency: int = 0,
+        journal: Optional[Journal] = None,
+        controller: Optional[ConcurrencyController] = None,
+    ) -> None:
+        """Construct the deleter instance."""
+        self.client = client
+        self.bucket = bucket
+        self.concurrency: int = (
+            concurrency if concurrency > 0 else S3TransferWrapper().concurrency
+        )
+        self.journal = journal
+        self.deleted: int = 0
+        self.failures: List[Dict[str, str]] = []
+        self._errors: List[Exception] = []
+        self._lock = threading.Lock()
+        self.controller = (
+            controller
+            if controller is not None
+            else ConcurrencyController(self.concurrency)
+        )
+
+    def delete(self, objects: Iterable[Dict[str, str]]) -> int:
+        """Delete all objects, the iterable is consumed as a stream.
+
+        :param objects: objects to delete, each item requires Key and optionally VersionId
+        :type objects: Iterable[Dict[str, str]]
+        :return: number of deleted objects
+        :rtype: int
+        :raises Exception: the first failed request is re-raised after all batches finished
+        """
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            for batch in _get_batches(objects):
+                self.controller.acquire(batch[0]["Key"])
+                if self._errors:
+                    self.controller.release(batch[0]["Key"], False)
+                    break
+                executor.submit(self._delete_batch, batch)
+        for failure in self.failures:
+            print(
+                "delete failed: %s %s"
+                % (self._get_uri(failure), failure.get("Message", ""))
+            )
+        if self._errors:
+            raise self._errors[0]
+        return self.deleted
+
+    def _delete_batch(self, batch: List[Dict[str, str]]) -> None:
+        """Delete the batch, retry the keys failed with retryable errors."""
+        # the prefix of the batch is the prefix of its first key
+        key = batch[0]["Key"]
+        succeeded = False
+        try:
+            for attempt in range(MAX_ATTEMPTS):
+                if attempt:
+                    backoff(attempt)
+                response = self.controller.call(
+                    key,
+                    self.client.delete_objects,
+                    Bucket=self.bucket,
+                    Delete={"Objects": batch, "Quiet": True},
+                )
+                # quiet mode only returns the keys failed to delete
+                errors = {
+                    (error.get("Key"), error.get("VersionId")): error
+                    for error in response.get("Errors", [])
+                }
+                if any(
+                    error.get("Code") in THROTTLING_ERRORS for error in errors.values()
+                ):
+                    self.controller.throttled(key)
+                retry: List[Dict[str, str]] = []
+                for item in batch:
+                    error = errors.get((item["Key"], item.get("VersionId")))
+                    if error is None:
+                        self._done(item)
+                    elif (
+                        error.get("Code") in RETRYABLE_ERRORS
+                        and attempt + 1 < MAX_ATTEMPTS
+                    ):
+                        retry.append(item)
+                    else:
+                        self._failed(item, error)
+                if not retry:
+                    succeeded = True
+                    return
+                batch = retry
+        except Exception as e:
+            with self._lock:
+                self._errors.append(e)
+        finally:
+            self.controller.release(key, succeeded)
+
+    def _done(self, item: Dict[str, str]) -> None:
+        """Print the deleted object."""
+        if self.journal is not None:
+            self.journal.record(journal_id(item["Key"], item.get("VersionId")))
+        with self._lock:
+            self.deleted += 1
+            print("delete: %s" % self._get_uri(item))
+
+    def _failed(self, item: Dict[str, str], error: Dict[str, str]) -> None:
+        """Record the object failed to delete."""
+        if self.journal is not None:
+            self.journal.record_failure()
+        with self._lock:
+            self.failures.append(dict(item, **error))
+
+    def _get_uri(self, item: Dict[str, str]) -> str:
+        """Get the s3 uri of the object to display."""
+        return "s3://%s/%s%s" % (
+            self.bucket,
+            item["Key"],
+            " with version %s" % item["VersionId"] if item.get("VersionId") else "",
+        )
+
+
+def _get_batches(objects: Iterable[Dict[str, str]]) -> Iterator[List[Dict[str, str]]]:
+    """Group the objects into batches of BATCH_SIZE."""
+    batch: List[Dict[str, str]] = []
+    for item in objects:
+        batch.append(
+            {"Key": item["Key"], "VersionId": item["VersionId"]}
+            if item.get("VersionId")
+            else {"Key": item["Key"]}
+        )
+        if len(batch) >= BATCH_SIZE:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
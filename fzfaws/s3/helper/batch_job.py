@@ -0,0 +1,188 @@
+"""Module contains the local bulk operations job runner."""
+from concurrent.futures import ThreadPoolExecutor
+import csv
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+from urllib.parse import quote_plus, unquote_plus
+
+from botocore.exceptions import ClientError
+
+from fzfaws.s3.helper.concurrency import ConcurrencyController, is_throttled, spread
+from fzfaws.s3.helper.journal import Journal, journal_id
+from fzfaws.s3.helper.s3transferwrapper import S3TransferWrapper
+from fzfaws.utils.util import get_cache_dir
+
+
+class BatchJob:
+    """Run an operation on every object of a manifest, like S3 Batch Operations.
+
+    The manifest is consumed as a stream and the operation runs concurrently
+    on at most `concurrency` objects, with the objects of different prefixes
+    interleaved. When s3 throttles a request, the object is retried after a
+    backoff and the objects in flight under its prefix are narrowed through a
+    ConcurrencyController.
+
+    The result of every object is written to a csv completion report with the
+    columns bucket, key, version id, status (succeeded/failed), error code and
+    message. Keys and version ids are url encoded like in a S3 Batch Operations
+    manifest, the report can be read back with read_manifest to retry the
+    failed objects.
+
+    Example:
+        job = BatchJob(
+            lambda item: s3.client.put_object_tagging(
+                Bucket=item["Bucket"], Key=item["Key"], Tagging={"TagSet": []}
+            ),
+            "update",
+        )
+        job.run([{"Bucket": "bucket", "Key": "a.txt"}])
+
+    :param operation: called with every item of the manifest
+    :type operation: Callable[[Dict[str, Any]], None]
+    :param name: name of the operation to display, e.g. update
+    :type name: str
+    :param concurrency: max number of objects in flight, default to the concurrency in config file
+    :type concurrency: int, optional
+    :param report_path: path of the completion report, default to $XDG_CACHE_HOME/fzfaws/jobs
+    :type report_path: str, optional
+    :param journal: record the succeeded objects by key and version
+    :type journal: Journal, optional
+    :param controller: controller of the objects in flight, could be shared with other engines
+    :type controller: ConcurrencyController, optional
+    """
+
+    def __init__(
+        self,
+        operation: Callable[[Dict[str, Any]], None],
+        name: str,
+        concurrency: int = 0,
+        report_path: Optional[str] = None,
+        journal: Optional[Journal] = None,
+        controller: Optional[ConcurrencyController] = None,
+    ) -> None:
+        """Construct the job instance."""
+        self.operation = operation
+        self.name = name
+        self.concurrency: int = (
+            concurrency if concurrency > 0 else S3TransferWrapper().concurrency
+        )
+        if report_path is None:
+            report_dir = os.path.join(get_cache_dir(), "jobs")
+            os.makedirs(report_dir, exist_ok=True)
+            report_path = os.path.join(
+                report_dir, "%s-%s.csv" % (name, time.strftime("%Y%m%dT%H%M%S"))
+            )
+        self.report_path = report_path
+        self.journal = journal
+        self.controller = (
+            controller
+            if controller is not None
+            else ConcurrencyController(self.concurrency)
+        )
+        self.succeeded: int = 0
+        self.failures: List[Dict[str, Any]] = []
+        self._report: Any = None
+        self._lock = threading.Lock()
+
+    def run(self, manifest: Iterable[Dict[str, Any]]) -> int:
+        """Run the operation on all objects of the manifest.
+
+        :param manifest: objects to process, each item requires Bucket, Key and optionally
+            VersionId, other fields are passed to the operation as is
+        :type manifest: Iterable[Dict[str, Any]]
+        :return: number of failed objects
+        :rtype: int
+        """
+        with open(self.report_path, "w", newline="") as report_file:
+            self._report = csv.writer(report_file)
+            with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+                for item in spread(manifest, lambda item: item["Key"]):
+                    self.controller.acquire(item["Key"])
+                    executor.submit(self._process, item)
+        for failure in self.failures:
+            print(
+                "%s failed: %s %s"
+                % (self.name, _get_uri(failure), failure.get("Message", ""))
+            )
+        print(
+            "report: %s (%s succeeded, %s failed)"
+            % (self.report_path, self.succeeded, len(self.failures))
+        )
+        return len(self.failures)
+
+    def _process(self, item: Dict[str, Any]) -> None:
+        """Run the operation on the item, retry when throttled."""
+        succeeded = False
+        try:
+            self.controller.call(item["Key"], self.operation, item)
+            self._done(item)
+            succeeded = True
+        except ClientError as e:
+            if is_throttled(e):
+                self.controller.throttled(item["Key"])
+            self._failed(item, e.response.get("Error", {}).get("Code", ""), str(e))
+        except Exception as e:
+            self._failed(item, type(e).__name__, str(e))
+        finally:
+            self.controller.release(item["Key"], succeeded)
+
+    def _done(self, item: Dict[str, Any]) -> None:
+        """Record the succeeded item."""
+        if self.journal is not None:
+            self.journal.record(journal_id(item["Key"], item.get("VersionId")))
+        with self._lock:
+            self.succeeded += 1
+            self._report.writerow(_get_row(item) + ["succeeded"])
+            print("%s: %s" % (self.name, _get_uri(item)))
+
+    def _failed(self, item: Dict[str, Any], code: str, message: str) -> None:
+        """Record the failed item."""
+        if self.journal is not None:
+            self.journal.record_failure()
+        with self._lock:
+            self.failures.append(dict(item, Code=code, Message=message))
+            self._report.writerow(_get_row(item) + ["failed", code, message])
+
+
+def read_manifest(path: str) -> Iterator[Dict[str, str]]:
+    """Read a csv manifest of bucket, key and optionally version id.
+
+    The format is the same as a S3 Batch Operations csv manifest, with url
+    encoded keys and version ids. A completion report of BatchJob could also
+    be used, only the failed objects are read.
+
+    :param path: path of the csv file
+    :type path: str
+    :return: generator of objects with Bucket, Key and VersionId if present
+    :rtype: Iterator[Dict[str, str]]
+    """
+    with open(path, "r", newline="") as manifest_file:
+        for row in csv.reader(manifest_file):
+            if len(row) < 2:
+                continue
+            if len(row) > 3 and row[3] == "succeeded":
+                continue
+            item = {"Bucket": row[0], "Key": unquote_plus(row[1])}
+            if len(row) > 2 and row[2]:
+                item["VersionId"] = unquote_plus(row[2])
+            yield item
+
+
+def _get_row(item: Dict[str, Any]) -> List[str]:
+    """Get the bucket, url encoded key and version id columns of the report."""
+    return [
+        item["Bucket"],
+        quote_plus(item["Key"], safe="/"),
+        quote_plus(item.get("VersionId") or "", safe="/"),
+    ]
+
+
+def _get_uri(item: Dict[str, Any]) -> str:
+    """Get the s3 uri of the object to display."""
+    return "s3://%s/%s%s" % (
+        item["Bucket"],
+        item["Key"],
+        " with version %s" % item["VersionId"] if item.get("VersionId") else "",
+    )
@@ -0,0 +1,321 @@
+"""Module contains the adaptive concurrency controller of bulk operations."""
+from collections import OrderedDict, deque
+import random
+import threading
+import time
+from typing import Any, Callable, Deque, Dict, Iterable, Iterator, TypeVar
+
+from botocore.exceptions import ClientError
+
+from fzfaws.s3.helper.s3transferwrapper import S3TransferWrapper
+
+# number of attempts of a request failed with a retryable error
+MAX_ATTEMPTS = 5
+
+# base and cap in seconds of the exponential backoff between attempts
+BACKOFF_BASE = 0.1
+BACKOFF_CAP = 5
+
+# error codes returned when the request rate of a prefix is too high
+THROTTLING_ERRORS = {
+    "503",
+    "RequestLimitExceeded",
+    "ServiceUnavailable",
+    "SlowDown",
+    "Throttling",
+    "ThrottlingException",
+}
+
+# error codes worth retrying, throttling errors also narrow the prefix
+RETRYABLE_ERRORS = THROTTLING_ERRORS | {"InternalError", "RequestTimeout"}
+
+# weight of the newest latency in the moving average latency of a prefix
+LATENCY_WEIGHT = 0.2
+
+# a prefix is congested when its average latency is above this factor of its fastest latency
+CONGESTION_FACTOR = 4
+
+# max number of items buffered by spread() across all prefixes to interleave them
+SPREAD_WINDOW = 1000
+
+T = TypeVar("T")
+
+
+class _PrefixState:
+    """Limit and signals of a single prefix."""
+
+    def __init__(self, limit: int) -> None:
+        self.limit = limit
+        self.in_flight: int = 0
+        self.active: int = 0
+        self.successes: int = 0
+        self.throttles: int = 0
+        self.latency: float = 0.0
+        self.min_latency: float = 0.0
+        self.decreased_at: float = 0.0
+
+
+class ConcurrencyController:
+    """Adapt the number of requests in flight per key prefix, AIMD style.
+
+    S3 limits the request rate per prefix and answers 503 SlowDown above it.
+    Every prefix (the "directory" of the key) starts with the full concurrency
+    in flight. A throttled request halves the limit of its prefix, at most once
+    per average latency so a burst of throttled requests only counts once, and
+    every `limit` successful items grow it back by one, unless the average
+    latency of the prefix shows congestion (retries hidden inside botocore
+    also show up as latency). The total in flight across all prefixes never
+    exceeds `concurrency`, so a throttled prefix leaves room to the others.
+
+    The same controller can be shared by several engines so that they
+    narrow together, e.g. a S3CopyEngine followed by a BatchDeleter.
+
+    Example:
+        controller = ConcurrencyController(10)
+        controller.acquire("logs/a.txt")
+        try:
+            controller.call("logs/a.txt", client.put_object_tagging, **kwargs)
+            controller.release("logs/a.txt")
+        except Exception:
+            controller.release("logs/a.txt", succeeded=False)
+            raise
+
+    :param concurrency: max number of items in flight, default to the concurrency in config file
+    :type concurrency: int, optional
+    """
+
+    def __init__(self, concurrency: int = 0) -> None:
+        """Construct the controller instance."""
+        self.concurrency: int = (
+            concurrency if concurrency > 0 else S3TransferWrapper().concurrency
+        )
+        self._prefixes: Dict[str, _PrefixState] = {}
+        self._in_flight: int = 0
+        self._condition = threading.Condition()
+
+    def acquire(self, key: str) -> None:
+        """Wait for a place in flight for the key.
+
+        :param key: key of the object
+        :type key: str
+        """
+        with self._condition:
+            state = self._get_state(get_prefix(key))
+            while self._in_flight >= self.concurrency or state.in_flight >= state.limit:
+                self._condition.wait()
+            self._in_flight += 1
+            state.in_flight += 1
+
+    def release(self, key: str, succeeded: bool = True) -> None:
+        """Release the place of the key, widen the prefix when it succeeded.
+
+        :param key: key of the object
+        :type key: str
+        :param succeeded: the item succeeded
+        :type succeeded: bool, optional
+        """
+        with self._condition:
+            state = self._get_state(get_prefix(key))
+            self._in_flight -= 1
+            state.in_flight -= 1
+            if succeeded:
+                state.successes += 1
+                congested = (
+                    state.min_latency > 0
+                    and state.latency > CONGESTION_FACTOR * state.min_latency
+                )
+                if (
+                    not congested
+                    and state.limit < self.concurrency
+                    and state.successes >= state.limit
+                ):
+                    state.limit += 1
+                    state.successes = 0
+            self._condition.notify_all()
+
+    def throttled(self, key: str) -> None:
+        """Halve the limit of the prefix of the throttled key.
+
+        :param key: key of the object
+        :type key: str
+        """
+        with self._condition:
+            state = self._get_state(get_prefix(key))
+            state.throttles += 1
+            now = time.time()
+            if now - state.decreased_at < state.latency:
+                # requests sent before the last decrease are still coming back
+                return
+            state.limit = max(1, state.limit // 2)
+            state.successes = 0
+            state.decreased_at = now
+
+    def observe(self, key: str, latency: float) -> None:
+        """Record the latency of a successful request of the key.
+
+        :param key: key of the object
+        :type key: str
+        :param latency: seconds the request took
+        :type latency: float
+        """
+        with self._condition:
+            state = self._get_state(get_prefix(key))
+            if not state.min_latency or latency < state.min_latency:
+                state.min_latency = latency
+            if not state.latency:
+                state.latency = latency
+            else:
+                state.latency += LATENCY_WEIGHT * (latency - state.latency)
+
+    def call(self, key: str, request: Callable[..., T], *args, **kwargs) -> T:
+        """Send the request, retry retryable errors with an exponential backoff.
+
+        The requests sent at the same time under a prefix are also kept within
+        its limit, so the items already in flight of a narrowed prefix retry
+        one after another instead of all together. The latency of a successful
+        request and every throttled attempt are recorded for the prefix.
+
+        :param key: key of the object the request is about
+        :type key: str
+        :param request: function sending the request, e.g. client.copy_object
+        :type request: Callable[..., T]
+        :return: response of the request
+        :rtype: T
+        :raises ClientError: not retryable or still failing after MAX_ATTEMPTS
+        """
+        prefix = get_prefix(key)
+        attempt = 1
+        while True:
+            with self._condition:
+                state = self._get_state(prefix)
+                while state.active >= state.limit:
+                    self._condition.wait()
+                state.active += 1
+            start = time.time()
+            try:
+                response = request(*args, **kwargs)
+                self.observe(key, time.time() - start)
+                return response
+            except ClientError as e:
+                code = e.response.get("Error", {}).get("Code")
+                if code not in RETRYABLE_ERRORS or attempt >= MAX_ATTEMPTS:
+                    raise
+                if code in THROTTLING_ERRORS:
+                    self.throttled(key)
+                attempt += 1
+            finally:
+                with self._condition:
+                    state.active -= 1
+                    self._condition.notify_all()
+            backoff(attempt - 1)
+
+    def get_limit(self, key: str) -> int:
+        """Get the current limit of the prefix of the key.
+
+        :param key: key of the object
+        :type key: str
+        :return: max number of items in flight under the prefix
+        :rtype: int
+        """
+        with self._condition:
+            return self._get_state(get_prefix(key)).limit
+
+    def get_stats(self) -> Dict[str, Dict[str, Any]]:
+        """Get the limit, throttles and average latency of every prefix.
+
+        :return: dict of prefix to its stats
+        :rtype: Dict[str, Dict[str, Any]]
+        """
+        with self._condition:
+            return {
+                prefix: {
+                    "limit": state.limit,
+                    "throttles": state.throttles,
+                    "latency": state.latency,
+                }
+                for prefix, state in self._prefixes.items()
+            }
+
+    def _get_state(self, prefix: str) -> _PrefixState:
+        """Get the state of the prefix, create it with the full concurrency."""
+        state = self._prefixes.get(prefix)
+        if state is None:
+            state = self._prefixes[prefix] = _PrefixState(self.concurrency)
+        return state
+
+
+def get_prefix(key: str) -> str:
+    """Get the prefix the request rate of the key is counted against.
+
+    :param key: key of the object
+    :type key: str
+    :return: the key up to the last "/"
+    :rtype: str
+    """
+    return key.rpartition("/")[0]
+
+
+def is_throttled(error: BaseException) -> bool:
+    """Check if the error is s3 throttling the request rate.
+
+    :param error: error raised by a request
+    :type error: BaseException
+    :return: True if the request was throttled
+    :rtype: bool
+    """
+    return (
+        isinstance(error, ClientError)
+        and error.response.get("Error", {}).get("Code") in THROTTLING_ERRORS
+    )
+
+
+def backoff(attempt: int) -> None:
+    """Sleep before the next attempt, full jitter so that workers don't retry together.
+
+    :param attempt: number of the failed attempt, starting from 1
+    :type attempt: int
+    """
+    time.sleep(random.uniform(0, min(BACKOFF_BASE * 2**attempt, BACKOFF_CAP)))
+
+
+def spread(
+    items: Iterable[T], get_key: Callable[[T], str], window: int = SPREAD_WINDOW
+) -> Iterator[T]:
+    """Interleave the items of different prefixes.
+
+    Listings return the keys of a prefix together, so a throttled prefix would
+    block the items of all other prefixes behind it. Items are buffered until
+    `window` items are buffered in total across all prefixes, then one item of
+    every buffered prefix is yielded round robin, the order within a prefix is
+    kept. The memory stays bounded by `window` regardless of the number of
+    prefixes.
+
+    :param items: items to interleave, consumed as a stream
+    :type items: Iterable[T]
+    :param get_key: get the key of the item
+    :type get_key: Callable[[T], str]
+    :param window: max number of items buffered in total across all prefixes
+    :type window: int, optional
+    :return: generator of the interleaved items
+    :rtype: Iterator[T]
+    """
+    queues: Dict[str, Deque[T]] = OrderedDict()
+    buffered = 0
+    for item in items:
+        queues.setdefault(get_prefix(get_key(item)), deque()).append(item)
+        buffered += 1
+        if buffered >= window:
+            for item in _round(queues):
+                buffered -= 1
+                yield item
+    while queues:
+        yield from _round(queues)
+
+
+def _round(queues: Dict[str, Deque[T]]) -> Iterator[T]:
+    """Yield one item of every prefix and drop the empty prefixes."""
+    for prefix in list(queues):
+        queue = queues[prefix]
+        yield queue.popleft()
+        if not queue:
+            del queues[prefix]
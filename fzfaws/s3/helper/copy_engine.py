@@ -0,0 +1,483 @@
+"""Module contains the concurrent server side copy engine."""
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from fzfaws.s3.helper.concurrency import ConcurrencyController, is_throttled, spread
+from fzfaws.s3.helper.integrity import (
+    ObjectIntegrity,
+    get_checksum_args,
+    get_object_integrity,
+)
+from fzfaws.s3.helper.journal import Journal, journal_id
+from fzfaws.s3.helper.s3progress import S3TransferProgress
+from fzfaws.s3.helper.s3transferwrapper import S3TransferWrapper
+from fzfaws.utils.exceptions import ChecksumMismatch
+
+# copy_object accepts objects up to 5GiB, bigger objects are copied in parts
+MULTIPART_COPY_THRESHOLD = 5 * 1024 * 1024 * 1024
+
+# extra arguments not accepted by create_multipart_upload
+CREATE_MULTIPART_EXCLUDE_ARGS = [
+    "CopySourceIfMatch",
+    "CopySourceIfModifiedSince",
+    "CopySourceIfNoneMatch",
+    "CopySourceIfUnmodifiedSince",
+    "CopySourceSSECustomerAlgorithm",
+    "CopySourceSSECustomerKey",
+    "CopySourceSSECustomerKeyMD5",
+    "MetadataDirective",
+    "TaggingDirective",
+]
+
+# extra arguments accepted by upload_part_copy and complete_multipart_upload
+UPLOAD_PART_COPY_ARGS = [
+    "CopySourceIfMatch",
+    "CopySourceIfModifiedSince",
+    "CopySourceIfNoneMatch",
+    "CopySourceIfUnmodifiedSince",
+    "CopySourceSSECustomerAlgorithm",
+    "CopySourceSSECustomerKey",
+    "CopySourceSSECustomerKeyMD5",
+    "SSECustomerAlgorithm",
+    "SSECustomerKey",
+    "SSECustomerKeyMD5",
+    "RequestPayer",
+]
+COMPLETE_ARGS = ["RequestPayer"]
+
+# object details copy_object copies by default, multipart copy needs to set them
+COPIED_DETAILS = [
+    "CacheControl",
+    "ContentDisposition",
+    "ContentEncoding",
+    "ContentLanguage",
+    "ContentType",
+    "Expires",
+    "Metadata",
+    "WebsiteRedirectLocation",
+]
+
+
+class S3CopyEngine:
+    """Copy many objects between buckets with concurrent server side copies.
+
+    Objects under MULTIPART_COPY_THRESHOLD are copied with a single copy_object
+    request while keeping at most `concurrency` objects in flight. Bigger objects
+    are copied after that, one at a time, with concurrent upload_part_copy.
+    Requests failed with a throttling error are retried with an exponential
+    backoff, and the objects in flight per prefix are adapted through a
+    ConcurrencyController, with the objects of different prefixes interleaved.
+
+    The size of every object should be provided from the listing, otherwise a
+    head_object call is made through source_client to get it. The parts of all
+    multipart copies share a single pool of max_request_concurrency threads.
+
+    With verify, the ETag and checksum of every source object are read first,
+    and compared with the ones s3 returns for the copy. Multipart source objects
+    are copied with their own part size, so the ETag of the copy matches.
+
+    Example:
+        engine = S3CopyEngine(s3.get_client("dest"))
+        engine.copy(
+            [
+                {
+                    "bucket": "source",
+                    "key": "a.txt",
+                    "dest_bucket": "dest",
+                    "dest_key": "a.txt",
+                    "size": 1024,
+                }
+            ]
+        )
+
+    :param client: boto3 s3 client of the destination bucket
+    :type client: boto3.client
+    :param source_client: boto3 s3 client of the source bucket, default to client
+    :type source_client: boto3.client, optional
+    :param concurrency: number of objects in flight, default to the concurrency in config file
+    :type concurrency: int, optional
+    :param journal: record the copied objects by source key and version
+    :type journal: Journal, optional
+    :param controller: controller of the objects in flight, could be shared with other engines
+    :type controller: ConcurrencyController, optional
+    :param verify: verify the copies, md5 for the ETag only or a checksum algorithm
+    :type verify: str, optional
+    """
+
+    def __init__(
+        self,
+        client,
+        source_client=None,
+        concurrency: int = 0,
+        journal: Optional[Journal] = None,
+        controller: Optional[ConcurrencyController] = None,
+        verify: Optional[str] = None,
+    ) -> None:
+        """Construct the copy engine instance."""
+        self.s3transferwrapper = S3TransferWrapper()
+        self.concurrency: int = (
+            concurrency if concurrency > 0 else self.s3transferwrapper.concurrency
+        )
+        self.transfer_config = self.s3transferwrapper.transfer_config
+        self.client = client
+        self.source_client = source_client if source_client is not None else client
+        self.progress = S3TransferProgress()
+        self.journal = journal
+        self.failures: List[Tuple[Dict[str, Any], Exception]] = []
+        self.controller = (
+            controller
+            if controller is not None
+            else ConcurrencyController(self.concurrency)
+        )
+        self.verify = verify
+        self.unverified: List[Dict[str, Any]] = []
+        self._part_executor: Optional[ThreadPoolExecutor] = None
+
+    def copy(
+        self,
+        copy_list: Iterable[Dict[str, Any]],
+        extra_args: Optional[Dict[str, Any]] = None,
+    ) -> None:
+        """Copy all objects in the list.
+
+        A list is sorted so that bigger objects are copied first. Other iterables
+        are consumed as a stream in their own order.
+
+        :param copy_list: objects to copy, each item requires bucket, key, dest_bucket,
+            dest_key, and optionally version_id, size and extra_args (override extra_args)
+        :type copy_list: Iterable[Dict[str, Any]]
+        :param extra_args: extra arguments for all copies
+        :type extra_args: Dict[str, Any], optional
+        :raises Exception: the first failed copy is re-raised after all copies finished
+        """
+        if isinstance(copy_list, list):
+            for item in copy_list:
+                if item.get("size") is None:
+                    item["size"] = self._get_size(
+                        item, self._get_copy_args(item, extra_args)
+                    )
+                self.progress.add(item["size"])
+            copy_list = sorted(copy_list, key=lambda item: item["size"], reverse=True)
+
+        multipart_list: List[Dict[str, Any]] = []
+        with self.progress, ThreadPoolExecutor(
+            max_workers=self.transfer_config.max_request_concurrency
+        ) as part_executor:
+            self._part_executor = part_executor
+            with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+                for item in spread(copy_list, lambda item: item["dest_key"]):
+                    if item.get("size") is None:
+                        item["size"] = self._get_size(
+                            item, self._get_copy_args(item, extra_args)
+                        )
+                    if item["size"] >= MULTIPART_COPY_THRESHOLD:
+                        multipart_list.append(item)
+                        continue
+                    self.controller.acquire(item["dest_key"])
+                    executor.submit(
+                        self._copy_small, item, self._get_copy_args(item, extra_args)
+                    )
+            for item in multipart_list:
+                self._copy_item(
+                    self._copy_multipart, item, self._get_copy_args(item, extra_args)
+                )
+        self._part_executor = None
+        print(self.progress.summary("copy"))
+        if self.unverified:
+            print(
+                "verify: skipped %s objects without a md5 ETag or %s checksum, "
+                "e.g. encrypted with SSE-KMS or SSE-C"
+                % (len(self.unverified), self.verify)
+            )
+        if not self.failures:
+            return
+        for item, error in self.failures:
+            print("copy failed: %s %s" % (self._get_source_uri(item), error))
+        raise self.failures[0][1]
+
+    def _copy_item(
+        self,
+        copy: Callable[[Dict[str, Any], Dict[str, Any]], None],
+        item: Dict[str, Any],
+        copy_args: Dict[str, Any],
+    ) -> bool:
+        """Copy the item and record the result."""
+        try:
+            copy(item, copy_args)
+            if self.journal is not None:
+                self.journal.record(journal_id(item["key"], item.get("version_id")))
+            self.progress.done(
+                "copy: %s to s3://%s/%s"
+                % (self._get_source_uri(item), item["dest_bucket"], item["dest_key"])
+            )
+            return True
+        except Exception as e:
+            if is_throttled(e):
+                self.controller.throttled(item["dest_key"])
+            self.failures.append((item, e))
+            self.progress.done()
+            return False
+
+    def _copy_small(self, item: Dict[str, Any], copy_args: Dict[str, Any]) -> None:
+        """Copy the item with copy_object and release its place in flight."""
+        succeeded = False
+        try:
+            succeeded = self._copy_item(self._copy_object, item, copy_args)
+        finally:
+            self.controller.release(item["dest_key"], succeeded)
+
+    def _copy_object(self, item: Dict[str, Any], copy_args: Dict[str, Any]) -> None:
+        """Copy the object with a single copy_object request."""
+        integrity = self._get_integrity(item, copy_args)
+        if integrity is not None and integrity.part_size:
+            # a single copy_object would change the ETag of a multipart object
+            self._copy_multipart(item, copy_args, integrity)
+            return
+        response = self.controller.call(
+            item["dest_key"],
+            self.client.copy_object,
+            Bucket=item["dest_bucket"],
+            Key=item["dest_key"],
+            CopySource=self._get_copy_source(item),
+            **copy_args,
+            **get_checksum_args(self.verify)
+        )
+        self.progress.update(item["size"])
+        if integrity is not None:
+            self._verify_copy(
+                item,
+                copy_args,
+                integrity,
+                dict(response, **response.get("CopyObjectResult", {})),
+            )
+
+    def _copy_multipart(
+        self,
+        item: Dict[str, Any],
+        copy_args: Dict[str, Any],
+        integrity: Optional[ObjectIntegrity] = None,
+    ) -> None:
+        """Copy the object with concurrent upload_part_copy requests.
+
+        The parts are submitted to the part pool of the engine, shared by the
+        multipart copies started from copy_object workers.
+        """
+        if integrity is None:
+            integrity = self._get_integrity(item, copy_args)
+        create_args = {
+            arg: value
+            for arg, value in copy_args.items()
+            if arg not in CREATE_MULTIPART_EXCLUDE_ARGS
+        }
+        create_args.update(get_checksum_args(self.verify))
+        if copy_args.get("MetadataDirective") != "REPLACE":
+            # copy_object copies these details, create_multipart_upload doesn't
+            response = self.source_client.head_object(
+                Bucket=item["bucket"],
+                Key=item["key"],
+                **self._get_head_args(item, copy_args)
+            )
+            for detail in COPIED_DETAILS:
+                if detail in response:
+                    create_args[detail] = response[detail]
+        upload_id = self.controller.call(
+            item["dest_key"],
+            self.client.create_multipart_upload,
+            Bucket=item["dest_bucket"],
+            Key=item["dest_key"],
+            **create_args
+        )["UploadId"]
+
+        part_args = {
+            arg: value
+            for arg, value in copy_args.items()
+            if arg in UPLOAD_PART_COPY_ARGS
+        }
+        if integrity is not None and integrity.part_size:
+            part_ranges = [
+                (offset, min(integrity.part_size, item["size"] - offset))
+                for offset in range(0, item["size"], integrity.part_size)
+            ]
+        else:
+            part_ranges = self.s3transferwrapper.get_part_ranges(item["size"])
+        parts: Dict[int, Dict[str, Any]] = {}
+        try:
+            futures = {
+                self._part_executor.submit(
+                    self._copy_part,
+                    item,
+                    upload_id,
+                    number,
+                    part_ranges[number - 1],
+                    part_args,
+                ): number
+                for number in range(1, len(part_ranges) + 1)
+            }
+            try:
+                for future in as_completed(futures):
+                    parts[futures[future]] = future.result()
+            except BaseException:
+                for future in futures:
+                    future.cancel()
+                wait(futures)
+                raise
+            response = self.controller.call(
+                item["dest_key"],
+                self.client.complete_multipart_upload,
+                Bucket=item["dest_bucket"],
+                Key=item["dest_key"],
+                UploadId=upload_id,
+                MultipartUpload={
+                    "Parts": [
+                        parts[number] for number in range(1, len(part_ranges) + 1)
+                    ]
+                },
+                **{
+                    arg: value
+                    for arg, value in copy_args.items()
+                    if arg in COMPLETE_ARGS
+                }
+            )
+        except BaseException:
+            self.client.abort_multipart_upload(
+                Bucket=item["dest_bucket"], Key=item["dest_key"], UploadId=upload_id
+            )
+            raise
+        if integrity is not None:
+            self._verify_copy(item, copy_args, integrity, response)
+
+    def _copy_part(
+        self,
+        item: Dict[str, Any],
+        upload_id: str,
+        number: int,
+        part_range: Tuple[int, int],
+        part_args: Dict[str, Any],
+    ) -> Dict[str, Any]:
+        """Copy a single part and return the part to complete the upload with."""
+        offset, length = part_range
+        response = self.controller.call(
+            item["dest_key"],
+            self.client.upload_part_copy,
+            Bucket=item["dest_bucket"],
+            Key=item["dest_key"],
+            UploadId=upload_id,
+            PartNumber=number,
+            CopySource=self._get_copy_source(item),
+            CopySourceRange="bytes=%s-%s" % (offset, offset + length - 1),
+            **part_args
+        )
+        self.progress.update(length)
+        part = {"ETag": response["CopyPartResult"]["ETag"], "PartNumber": number}
+        checksum_key = "Checksum%s" % self.verify.upper() if self.verify else ""
+        if checksum_key in response["CopyPartResult"]:
+            part[checksum_key] = response["CopyPartResult"][checksum_key]
+        return part
+
+    def _get_integrity(
+        self, item: Dict[str, Any], copy_args: Dict[str, Any]
+    ) -> Optional[ObjectIntegrity]:
+        """Get the integrity of the source object to verify the copy against."""
+        if not self.verify:
+            return None
+        return get_object_integrity(
+            self.source_client,
+            item["bucket"],
+            item["key"],
+            self.verify,
+            **self._get_head_args(item, copy_args)
+        )
+
+    def _get_head_args(
+        self, item: Dict[str, Any], copy_args: Dict[str, Any]
+    ) -> Dict[str, str]:
+        """Get the arguments to head the source object with.
+
+        The SSE-C key of the source is passed as CopySourceSSECustomer* for
+        the copy, head_object requires it as SSECustomer*.
+        """
+        head_args = {
+            arg[len("CopySource") :]: value
+            for arg, value in copy_args.items()
+            if arg.startswith("CopySourceSSECustomer")
+        }
+        if "RequestPayer" in copy_args:
+            head_args["RequestPayer"] = copy_args["RequestPayer"]
+        if item.get("version_id"):
+            head_args["VersionId"] = item["version_id"]
+        return head_args
+
+    def _verify_copy(
+        self,
+        item: Dict[str, Any],
+        copy_args: Dict[str, Any],
+        source: ObjectIntegrity,
+        response: Dict[str, Any],
+    ) -> None:
+        """Compare the ETag and checksum of the copy with the source object."""
+        copied = get_object_integrity(
+            self.client,
+            item["dest_bucket"],
+            item["dest_key"],
+            self.verify,
+            response=dict(response, ContentLength=source.size),
+            find_part_size=False,
+        )
+        uri = "%s copied to s3://%s/%s" % (
+            self._get_source_uri(item),
+            item["dest_bucket"],
+            item["dest_key"],
+        )
+        verified = False
+        if (
+            source.etag is not None
+            and copied.etag is not None
+            and not copy_args.get("SSECustomerAlgorithm")
+        ):
+            if source.etag != copied.etag:
+                raise ChecksumMismatch(
+                    "%s doesn't match ETag %s, got %s" % (uri, source.etag, copied.etag)
+                )
+            verified = True
+        if (
+            source.checksum is not None
+            and copied.checksum is not None
+            and source.composite == copied.composite
+        ):
+            if source.checksum != copied.checksum:
+                raise ChecksumMismatch(
+                    "%s doesn't match %s checksum %s, got %s"
+                    % (uri, self.verify, source.checksum, copied.checksum)
+                )
+            verified = True
+        if not verified:
+            self.unverified.append(item)
+
+    def _get_size(self, item: Dict[str, Any], copy_args: Dict[str, Any]) -> int:
+        """Get the size of the object when not provided by the listing."""
+        return self.source_client.head_object(
+            Bucket=item["bucket"],
+            Key=item["key"],
+            **self._get_head_args(item, copy_args)
+        )["ContentLength"]
+
+    def _get_copy_args(
+        self, item: Dict[str, Any], extra_args: Optional[Dict[str, Any]]
+    ) -> Dict[str, Any]:
+        """Get the extra arguments of the item."""
+        return dict(extra_args or {}, **item.get("extra_args", {}))
+
+    def _get_copy_source(self, item: Dict[str, Any]) -> Dict[str, str]:
+        """Get the CopySource of the item."""
+        copy_source = {"Bucket": item["bucket"], "Key": item["key"]}
+        if item.get("version_id"):
+            copy_source["VersionId"] = item["version_id"]
+        return copy_source
+
+    def _get_source_uri(self, item: Dict[str, Any]) -> str:
+        """Get the s3 uri of the source object to display."""
+        return "s3://%s/%s%s" % (
+            item["bucket"],
+            item["key"],
+            " with version %s" % item["version_id"] if item.get("version_id") else "",
+        )
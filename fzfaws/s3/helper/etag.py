@@ -0,0 +1,113 @@
+"""Module contains the helper function to calculate s3 ETag of local files."""
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import mmap
+import os
+import re
+from typing import Optional
+
+from boto3.s3.transfer import TransferConfig
+
+from fzfaws.s3.helper.s3transferwrapper import S3TransferWrapper
+
+
+def calculate_etag(
+    path: str,
+    transfer_config: Optional[TransferConfig] = None,
+    max_workers: Optional[int] = None,
+) -> str:
+    """Calculate the ETag the file would have after uploaded through fzfaws.
+
+    Files below the multipart threshold have the md5 of the file as ETag,
+    otherwise the ETag is the md5 of all the part md5 followed by the number
+    of parts, e.g. 9b2cf535f27731c974343645a3985328-2.
+
+    The parts come from S3TransferWrapper.get_part_ranges. The file is memory
+    mapped and the parts are hashed in a thread pool, hashlib releases the GIL
+    while hashing large buffers so the parts are hashed on multiple cores.
+
+    The ETag only matches when the object was uploaded with the same chunk size
+    and without SSE-KMS encryption.
+
+    :param path: path of the local file
+    :type path: str
+    :param transfer_config: the transfer config used to upload, default to the config file
+    :type transfer_config: TransferConfig, optional
+    :param max_workers: number of threads hashing the parts, default to number of cpu
+    :type max_workers: int, optional
+    :return: ETag of the file without the surrounding quotes
+    :rtype: str
+    """
+    part_ranges = S3TransferWrapper(transfer_config=transfer_config).get_part_ranges(
+        os.path.getsize(path)
+    )
+    if part_ranges[0][1] == 0:
+        # empty file cannot be memory mapped
+        return hashlib.md5().hexdigest()
+
+    with open(path, "rb") as file, mmap.mmap(
+        file.fileno(), 0, access=mmap.ACCESS_READ
+    ) as mapped_file, memoryview(mapped_file) as view:
+        if len(part_ranges) == 1:
+            return hashlib.md5(view).hexdigest()
+
+        with ThreadPoolExecutor(
+            max_workers=min(max_workers or os.cpu_count() or 1, len(part_ranges))
+        ) as executor:
+            digests = list(
+                executor.map(
+                    lambda part: hashlib.md5(
+                        view[part[0] : part[0] + part[1]]
+                    ).digest(),
+                    part_ranges,
+                )
+            )
+    return "%s-%s" % (hashlib.md5(b"".join(digests)).hexdigest(), len(digests))
+
+
+def verify_etag(
+    path: str, etag: str, transfer_config: Optional[TransferConfig] = None
+) -> Optional[bool]:
+    """Verify the local file against the ETag of a s3 object.
+
+    A multipart ETag depends on the chunk size used to upload the object, the
+    file is hashed with the configured chunk size first, then with the chunk
+    size guessed from the number of parts (e.g. uploaded by other tools).
+    ETags which are not a md5 or a multipart md5 are not compared.
+
+    :param path: path of the local file
+    :type path: str
+    :param etag: ETag of the object, with or without the surrounding quotes
+    :type etag: str
+    :param transfer_config: the transfer config used to upload, default to the config file
+    :type transfer_config: TransferConfig, optional
+    :return: True if matched, False if not matched, None if the chunk size is unknown
+        or the ETag is not a md5
+    :rtype: Optional[bool]
+    """
+    etag = etag.strip('"')
+    if not re.match(r"^[0-9a-f]{32}(-[0-9]+)?$", etag):
+        return None
+    size = os.path.getsize(path)
+    if "-" not in etag:
+        return (
+            calculate_etag(path, TransferConfig(multipart_threshold=size + 1)) == etag
+        )
+
+    transfer_config = S3TransferWrapper(
+        transfer_config=transfer_config
+    ).get_transfer_config(size)
+    parts = int(etag.split("-")[1])
+    mib = 1024 * 1024
+    for chunksize in [
+        transfer_config.multipart_chunksize,
+        # smallest whole MiB chunk size resulting in the same number of parts
+        max(-(-size // max(parts, 1) // mib), 1) * mib,
+    ]:
+        config = TransferConfig(multipart_threshold=1, multipart_chunksize=chunksize)
+        part_ranges = S3TransferWrapper(transfer_config=config).get_part_ranges(size)
+        if len(part_ranges) != parts:
+            continue
+        if calculate_etag(path, config) == etag:
+            return True
+    return None
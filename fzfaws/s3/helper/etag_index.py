@@ -0,0 +1,105 @@
+"""Module contains the persistent index of local file ETags."""
+import os
+import sqlite3
+import threading
+from typing import Optional
+
+from boto3.s3.transfer import TransferConfig
+
+from fzfaws.s3.helper.etag import calculate_etag
+from fzfaws.s3.helper.s3transferwrapper import S3TransferWrapper
+from fzfaws.utils.util import get_cache_dir
+
+# number of updates before committing to the database
+COMMIT_INTERVAL = 500
+
+
+class ETagIndex:
+    """Persistent index of local file to the s3 ETag it would have after upload.
+
+    The ETag of a file is stored together with its inode, size, mtime and the
+    multipart settings used to calculate it. As long as those are not changed,
+    the stored ETag is returned without reading the file again.
+
+    Example:
+        with ETagIndex() as index:
+            index.get_etag("/tmp/hello.txt")
+
+    :param db_path: path of the sqlite database, default to $XDG_CACHE_HOME/fzfaws/etag_index.sqlite3
+    :type db_path: str, optional
+    :param transfer_config: transfer config of the upload, default to the config file
+    :type transfer_config: TransferConfig, optional
+    """
+
+    def __init__(
+        self,
+        db_path: Optional[str] = None,
+        transfer_config: Optional[TransferConfig] = None,
+    ) -> None:
+        """Construct the index and create the table if not exists."""
+        if db_path is None:
+            db_path = os.path.join(get_cache_dir(), "etag_index.sqlite3")
+        self.s3transferwrapper = S3TransferWrapper(transfer_config=transfer_config)
+        self._lock = threading.Lock()
+        self._pending: int = 0
+        self._connection = sqlite3.connect(db_path, check_same_thread=False)
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS etag ("
+            "path TEXT PRIMARY KEY, inode INTEGER, size INTEGER, mtime_ns INTEGER, "
+            "threshold INTEGER, chunksize INTEGER, etag TEXT)"
+        )
+        self._connection.commit()
+
+    def __enter__(self) -> "ETagIndex":
+        """Use the index as a context manager."""
+        return self
+
+    def __exit__(self, *args) -> None:
+        """Commit and close the index."""
+        self.close()
+
+    def get_etag(self, path: str) -> str:
+        """Get the ETag of the file, only calculate it when the file has changed.
+
+        :param path: path of the local file
+        :type path: str
+        :return: ETag of the file without the surrounding quotes
+        :rtype: str
+        """
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        # the auto tuned chunk size depends on the size of the file
+        transfer_config = self.s3transferwrapper.get_transfer_config(stat.st_size)
+        state = (
+            stat.st_ino,
+            stat.st_size,
+            stat.st_mtime_ns,
+            transfer_config.multipart_threshold,
+            transfer_config.multipart_chunksize,
+        )
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT inode, size, mtime_ns, threshold, chunksize, etag "
+                "FROM etag WHERE path = ?",
+                (path,),
+            ).fetchone()
+        if row is not None and tuple(row[:5]) == state:
+            return row[5]
+
+        etag = calculate_etag(path, transfer_config)
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO etag VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (path,) + state + (etag,),
+            )
+            self._pending += 1
+            if self._pending >= COMMIT_INTERVAL:
+                self._connection.commit()
+                self._pending = 0
+        return etag
+
+    def close(self) -> None:
+        """Commit pending updates and close the database."""
+        with self._lock:
+            self._connection.commit()
+            self._connection.close()
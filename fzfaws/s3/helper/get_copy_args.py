@@ -1,11 +1,32 @@
 """Contains the function to get s3 copy argument for preserving all object information."""
-from typing import Any, Dict
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from itertools import islice
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+from botocore.exceptions import ClientError
 from fzfaws.s3 import S3
 from fzfaws.s3.helper.s3args import S3Args
+from fzfaws.s3.helper.s3transferwrapper import S3TransferWrapper
+
+# number of objects to get the copy arguments concurrently at a time
+BATCH_SIZE = 1000
+
+# acl permission to the copy argument of the grant
+GRANT_ARGS = {
+    "FULL_CONTROL": "GrantFullControl",
+    "READ": "GrantRead",
+    "READ_ACP": "GrantReadACP",
+    "WRITE_ACP": "GrantWriteACP",
+}
 
 
 def get_copy_args(
-    s3: S3, s3_key: str, s3_args: S3Args, extra_args: bool = False, version: str = None
+    s3: S3,
+    s3_key: str,
+    s3_args: S3Args,
+    extra_args: bool = False,
+    version: str = None,
+    bucket: str = "",
 ) -> Dict[str, Any]:
     """Get copy argument for s3 operations.
 
@@ -30,52 +51,31 @@ def get_copy_args(
     :type extra_args: bool, optional
     :param version: specify object version id
     :type version: str, optional
+    :param bucket: bucket of the object, if not set, s3 instance's bucket_name will be used
+    :type bucket: str, optional
     :return: copy object argument
     :rtype: dict
     """
-    if version:
-        s3_obj = s3.client.get_object(
-            Bucket=s3.bucket_name, Key=s3_key, VersionId=version
-        )
-        s3_acl = s3.client.get_object_acl(
-            Bucket=s3.bucket_name, Key=s3_key, VersionId=version
-        )
-    else:
-        s3_obj = s3.client.get_object(Bucket=s3.bucket_name, Key=s3_key)
-        s3_acl = s3.client.get_object_acl(Bucket=s3.bucket_name, Key=s3_key)
-
-    permission_read = []
-    permission_acp_read = []
-    permission_acp_write = []
-    permission_full = []
-    if check_acl_update(s3_args):
-        for grantee in s3_acl.get("Grants"):
-            if grantee.get("Permission") == "READ":
-                if grantee["Grantee"].get("ID"):
-                    permission_read.append("id=" + grantee["Grantee"]["ID"])
-                elif grantee["Grantee"].get("URI"):
-                    permission_read.append("uri=" + grantee["Grantee"]["URI"])
-            elif grantee["Grantee"].get("Permission") == "FULL_CONTROL":
-                if grantee["Grantee"].get("ID"):
-                    permission_full.append("id=" + grantee["Grantee"]["ID"])
-                elif grantee["Grantee"].get("URI"):
-                    permission_full.append("uri=" + grantee["Grantee"]["URI"])
-            elif grantee.get("Permission") == "WRITE_ACP":
-                if grantee["Grantee"].get("ID"):
-                    permission_acp_write.append("id=" + grantee["Grantee"]["ID"])
-                elif grantee["Grantee"].get("URI"):
-                    permission_acp_write.append("uri=" + grantee["Grantee"]["URI"])
-            elif grantee.get("Permission") == "READ_ACP":
-                if grantee["Grantee"].get("ID"):
-                    permission_acp_read.append("id=" + grantee["Grantee"]["ID"])
-                elif grantee["Grantee"].get("URI"):
-                    permission_acp_read.append("uri=" + grantee["Grantee"]["URI"])
+    bucket = bucket if bucket else s3.bucket_name
+    client = s3.get_client(bucket)
+    version_args = {"VersionId": version} if version else {}
+    s3_obj = client.head_object(Bucket=bucket, Key=s3_key, **version_args)
+
+    grant_args: Dict[str, str] = {}
+    # the acl isn't needed when it's replaced, skip the extra request
+    if check_acl_update(s3_args) and not s3_args.acl:
+        if _is_acl_disabled(client, bucket):
+            # every object has the same acl as the bucket, full control of the owner
+            grant_args = _get_bucket_grant_args(client, bucket)
+        else:
+            s3_acl = client.get_object_acl(Bucket=bucket, Key=s3_key, **version_args)
+            grant_args = _get_grant_args(s3_acl.get("Grants", []))
 
     if not extra_args:
         copy_object_args = {
-            "Bucket": s3.bucket_name,
+            "Bucket": bucket,
             "Key": s3_key,
-            "CopySource": {"Bucket": s3.bucket_name, "Key": s3_key},
+            "CopySource": {"Bucket": bucket, "Key": s3_key},
         }
     else:
         copy_object_args = {}
@@ -111,23 +111,13 @@ def get_copy_args(
     else:
         if s3_args.acl_full:
             copy_object_args["GrantFullControl"] = s3_args.acl_full
-        elif permission_full:
-            copy_object_args["GrantFullControl"] = ",".join(permission_full)
-
         if s3_args.acl_read:
             copy_object_args["GrantRead"] = s3_args.acl_read
-        elif permission_read:
-            copy_object_args["GrantRead"] = ",".join(permission_read)
-
         if s3_args.acl_acp_read:
             copy_object_args["GrantReadACP"] = s3_args.acl_acp_read
-        elif permission_acp_read:
-            copy_object_args["GrantReadACP"] = ",".join(permission_acp_read)
-
         if s3_args.acl_acp_write:
             copy_object_args["GrantWriteACP"] = s3_args.acl_acp_write
-        elif permission_acp_write:
-            copy_object_args["GrantWriteACP"] = ",".join(permission_acp_write)
+        copy_object_args.update(grant_args)
     return copy_object_args
 
 
@@ -147,3 +137,90 @@ def check_acl_update(s3_args) -> bool:
         and not s3_args.acl_acp_write
         and not s3_args.acl_acp_read
     )
+
+
+def get_copy_args_batch(
+    s3: S3,
+    objects: Iterable[Tuple[str, Optional[str]]],
+    s3_args: S3Args,
+    extra_args: bool = False,
+    max_workers: int = 0,
+) -> Iterator[Tuple[str, Optional[str], Dict[str, Any]]]:
+    """Get copy argument of many objects concurrently.
+
+    The objects are processed in batches of BATCH_SIZE, each batch runs
+    get_copy_args concurrently, so the iterable is consumed as a stream.
+
+    :param s3: S3 class instance
+    :type s3: S3
+    :param objects: key and version id (could be None) of the objects
+    :type objects: Iterable[Tuple[str, Optional[str]]]
+    :param s3_args: S3Args instance which contains the argument for s3 client
+    :type s3_args: S3Args
+    :param extra_args: construct extra_args instead of the full copy_object argument
+    :type extra_args: bool, optional
+    :param max_workers: number of concurrent requests, default to the concurrency in config file
+    :type max_workers: int, optional
+    :return: generator of key, version id and copy argument, in the order of the objects
+    :rtype: Iterator[Tuple[str, Optional[str], Dict[str, Any]]]
+    """
+    if max_workers <= 0:
+        max_workers = S3TransferWrapper().concurrency
+    iterator = iter(objects)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        while True:
+            batch = list(islice(iterator, BATCH_SIZE))
+            if not batch:
+                return
+            for (s3_key, version), copy_args in zip(
+                batch,
+                executor.map(
+                    lambda item: get_copy_args(
+                        s3, item[0], s3_args, extra_args=extra_args, version=item[1]
+                    ),
+                    batch,
+                ),
+            ):
+                yield s3_key, version, copy_args
+
+
+@lru_cache(maxsize=128)
+def _is_acl_disabled(client, bucket: str) -> bool:
+    """Check if acls are disabled in the bucket by the BucketOwnerEnforced ownership.
+
+    The object acls can't differ then, so they don't need to be read per object.
+    The ownership controls are read once per bucket, buckets without them or
+    without the permission to read them have acls enabled.
+    """
+    try:
+        response = client.get_bucket_ownership_controls(Bucket=bucket)
+    except ClientError:
+        return False
+    return any(
+        rule.get("ObjectOwnership") == "BucketOwnerEnforced"
+        for rule in response.get("OwnershipControls", {}).get("Rules", [])
+    )
+
+
+@lru_cache(maxsize=128)
+def _get_bucket_grant_args(client, bucket: str) -> Dict[str, str]:
+    """Get the copy argument of the bucket acl, read once per bucket."""
+    return _get_grant_args(client.get_bucket_acl(Bucket=bucket).get("Grants", []))
+
+
+def _get_grant_args(grants: List[Dict[str, Any]]) -> Dict[str, str]:
+    """Get the copy argument of the acl grants."""
+    permissions: Dict[str, list] = {}
+    for grant in grants:
+        permission = grant.get("Permission")
+        if permission not in GRANT_ARGS:
+            continue
+        grantee = grant["Grantee"]
+        if grantee.get("ID"):
+            permissions.setdefault(permission, []).append("id=" + grantee["ID"])
+        elif grantee.get("URI"):
+            permissions.setdefault(permission, []).append("uri=" + grantee["URI"])
+    return {
+        GRANT_ARGS[permission]: ",".join(grantees)
+        for permission, grantees in permissions.items()
+    }
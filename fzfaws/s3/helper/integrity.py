@@ -0,0 +1,505 @@
+"""Module contains the inline integrity verification of transfers."""
+import base64
+import hashlib
+import importlib.util
+import os
+import threading
+import zlib
+from functools import lru_cache
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+import botocore.session
+from boto3.s3.transfer import TransferConfig
+
+from fzfaws.s3.helper.s3transferwrapper import S3TransferWrapper
+from fzfaws.utils.exceptions import ChecksumMismatch
+
+# --verify without an algorithm only verifies the ETag
+ETAG_ONLY = "md5"
+
+# checksum algorithms verified besides the ETag
+CHECKSUM_ALGORITHMS = ["sha256", "crc32", "crc32c"]
+
+# checksums s3 can also store for the whole object of a multipart upload
+FULL_OBJECT_ALGORITHMS = ["crc32", "crc32c"]
+
+# bytes read at once when a file is hashed after the transfer
+READ_SIZE = 8 * 1024 * 1024
+
+
+class ObjectIntegrity(NamedTuple):
+    """ETag and checksum of a s3 object to verify the transferred data against."""
+
+    size: int
+    # size of the parts of a multipart upload, 0 for a single part object
+    part_size: int
+    # None when the ETag is not a md5, e.g. SSE-KMS or SSE-C encrypted
+    etag: Optional[str]
+    checksum: Optional[str]
+    # the checksum is calculated from the checksums of the parts
+    composite: bool
+
+
+class _Crc32:
+    """Crc32 checksum with the interface of hashlib."""
+
+    def __init__(self) -> None:
+        self._value = 0
+
+    def update(self, data) -> None:
+        self._value = zlib.crc32(data, self._value)
+
+    def digest(self) -> bytes:
+        return self._value.to_bytes(4, byteorder="big")
+
+
+class _Crc32c:
+    """Crc32c checksum with the interface of hashlib, calculated by awscrt."""
+
+    def __init__(self) -> None:
+        try:
+            from awscrt import checksums
+        except ImportError:
+            raise ImportError(
+                "awscrt is required to verify crc32c checksums, "
+                "install it with pip install fzfaws[crc32c]"
+            )
+        self._crc32c = checksums.crc32c
+        self._value = 0
+
+    def update(self, data) -> None:
+        self._value = self._crc32c(data, self._value)
+
+    def digest(self) -> bytes:
+        return self._value.to_bytes(4, byteorder="big")
+
+
+class _Part:
+    """Running md5 and checksum of a range of the object."""
+
+    def __init__(self, start: int, end: int, algorithm: Optional[str]) -> None:
+        self.start = start
+        self.end = end
+        self.position = start
+        self.broken: bool = False
+        self.md5 = hashlib.md5()
+        self.checksum = new_checksum(algorithm) if algorithm else None
+        self.digests: Optional[Tuple[bytes, bytes]] = None
+        self.lock = threading.Lock()
+
+    def update(self, offset: int, data: memoryview) -> None:
+        """Hash the data at the offset, data already hashed is skipped."""
+        with self.lock:
+            if offset > self.position:
+                # a gap can't be hashed any more
+                self.broken = True
+                return
+            data = data[self.position - offset :]
+            if not data:
+                return
+            self.md5.update(data)
+            if self.checksum is not None:
+                self.checksum.update(data)
+            self.position += len(data)
+
+    def get_digests(self) -> Optional[Tuple[bytes, bytes]]:
+        """Get the md5 and checksum digests, None when not completely hashed."""
+        if self.digests is not None:
+            return self.digests
+        if self.broken or self.position != self.end:
+            return None
+        return (
+            self.md5.digest(),
+            self.checksum.digest() if self.checksum is not None else b"",
+        )
+
+
+class IntegrityHasher:
+    """Hash the data of an object while it's transferred, without reading it again.
+
+    The md5 and checksum of every part are calculated from the buffers passed
+    to update together with their offset, so the ETag and the composite
+    checksum s3 calculates can be compared after the transfer. The parts can
+    be hashed concurrently, but the data within a part has to come in order,
+    data already hashed (e.g. read again by a retry) is skipped.
+
+    Example:
+        hasher = IntegrityHasher(11, algorithm="sha256")
+        hasher.update(0, b"hello world")
+        hasher.etag()
+
+    :param size: size of the object
+    :type size: int
+    :param part_size: size of the parts of a multipart upload, 0 for a single part object
+    :type part_size: int, optional
+    :param algorithm: checksum algorithm calculated besides the md5
+    :type algorithm: str, optional
+    """
+
+    def __init__(
+        self, size: int, part_size: int = 0, algorithm: Optional[str] = None
+    ) -> None:
+        """Construct the hasher instance."""
+        self.size = size
+        self.part_size = part_size
+        self.algorithm = algorithm if algorithm in CHECKSUM_ALGORITHMS else None
+        if part_size:
+            self._parts = [
+                _Part(offset, min(offset + part_size, size), self.algorithm)
+                for offset in range(0, max(size, 1), part_size)
+            ]
+        else:
+            self._parts = [_Part(0, size, self.algorithm)]
+        # the whole object checksum needs the data of all parts in order
+        self._full: Optional[_Part] = (
+            _Part(0, size, self.algorithm)
+            if part_size and self.algorithm in FULL_OBJECT_ALGORITHMS
+            else None
+        )
+
+    def update(self, offset: int, data) -> None:
+        """Hash the data written to or read from the offset of the object.
+
+        :param offset: offset of the data in the object
+        :type offset: int
+        :param data: bytes-like data
+        :type data: bytes
+        """
+        view = memoryview(data).cast("B")
+        if self._full is not None:
+            self._full.update(offset, view)
+        while view and offset < self.size:
+            part = self._parts[offset // self.part_size if self.part_size else 0]
+            length = min(len(view), part.end - offset)
+            part.update(offset, view[:length])
+            view = view[length:]
+            offset += length
+
+    def get_part_digests(self, index: int) -> Optional[List[str]]:
+        """Get the digests of a completely hashed part to save them.
+
+        :param index: index of the part
+        :type index: int
+        :return: hex md5 and hex checksum of the part, None when not completely hashed
+        :rtype: Optional[List[str]]
+        """
+        digests = self._parts[index].get_digests()
+        if digests is None:
+            return None
+        return [digests[0].hex(), digests[1].hex()]
+
+    def set_part_digests(self, index: int, digests: List[str]) -> None:
+        """Restore the digests of a part hashed by a previous transfer.
+
+        :param index: index of the part
+        :type index: int
+        :param digests: hex md5 and hex checksum from get_part_digests
+        :type digests: List[str]
+        """
+        part = self._parts[index]
+        part.digests = (bytes.fromhex(digests[0]), bytes.fromhex(digests[1]))
+        part.position = part.end
+
+    def etag(self) -> Optional[str]:
+        """Get the ETag of the object.
+
+        :return: ETag without the surrounding quotes, None when not completely hashed
+        :rtype: Optional[str]
+        """
+        digests = [part.get_digests() for part in self._parts]
+        if any(digest is None for digest in digests):
+            return None
+        if not self.part_size:
+            return digests[0][0].hex()
+        return "%s-%s" % (
+            hashlib.md5(b"".join(digest[0] for digest in digests)).hexdigest(),
+            len(digests),
+        )
+
+    def checksum(self, composite: bool = True) -> Optional[str]:
+        """Get the base64 checksum of the object in the format of s3.
+
+        :param composite: get the checksum of the part checksums followed by the
+            number of parts, otherwise the checksum of the whole object
+        :type composite: bool, optional
+        :return: checksum of the object, None when not calculated or not completely hashed
+        :rtype: Optional[str]
+        """
+        if self.algorithm is None:
+            return None
+        if not self.part_size:
+            digests = self._parts[0].get_digests()
+            return base64.b64encode(digests[1]).decode() if digests else None
+        if not composite:
+            digests = self._full.get_digests() if self._full is not None else None
+            return base64.b64encode(digests[1]).decode() if digests else None
+        part_digests = [part.get_digests() for part in self._parts]
+        if any(digest is None for digest in part_digests):
+            return None
+        checksum = new_checksum(self.algorithm)
+        checksum.update(b"".join(digest[1] for digest in part_digests))
+        return "%s-%s" % (
+            base64.b64encode(checksum.digest()).decode(),
+            len(part_digests),
+        )
+
+
+class HashingReader:
+    """File object hashing the data s3transfer reads from it.
+
+    :param fileobj: file opened in binary mode
+    :type fileobj: BinaryIO
+    :param hasher: hasher of the object
+    :type hasher: IntegrityHasher
+    """
+
+    def __init__(self, fileobj, hasher: IntegrityHasher) -> None:
+        """Construct the reader instance."""
+        self._fileobj = fileobj
+        self._hasher = hasher
+
+    def read(self, size: int = -1) -> bytes:
+        """Read and hash the data."""
+        offset = self._fileobj.tell()
+        data = self._fileobj.read(size)
+        self._hasher.update(offset, data)
+        return data
+
+    def seek(self, offset: int, whence: int = os.SEEK_SET) -> int:
+        """Seek the file."""
+        return self._fileobj.seek(offset, whence)
+
+    def tell(self) -> int:
+        """Get the position of the file."""
+        return self._fileobj.tell()
+
+    def readable(self) -> bool:
+        """Check if the file is readable."""
+        return True
+
+    def seekable(self) -> bool:
+        """Check if the file is seekable."""
+        return True
+
+    def close(self) -> None:
+        """Close the file."""
+        self._fileobj.close()
+
+
+class HashingWriter:
+    """Write only file object hashing the data s3transfer writes to it.
+
+    The writer is not seekable, so s3transfer writes the object in order and
+    buffers the ranges downloaded ahead itself.
+
+    :param fileobj: file opened in binary mode
+    :type fileobj: BinaryIO
+    :param hasher: hasher of the object
+    :type hasher: IntegrityHasher
+    """
+
+    def __init__(self, fileobj, hasher: IntegrityHasher) -> None:
+        """Construct the writer instance."""
+        self._fileobj = fileobj
+        self._hasher = hasher
+        self._offset: int = 0
+
+    def write(self, data) -> int:
+        """Hash and write the data."""
+        self._hasher.update(self._offset, data)
+        self._offset += len(data)
+        return self._fileobj.write(data)
+
+    def close(self) -> None:
+        """Close the file."""
+        self._fileobj.close()
+
+
+def new_checksum(algorithm: str):
+    """Create a checksum of the algorithm with the interface of hashlib.
+
+    :param algorithm: one of CHECKSUM_ALGORITHMS
+    :type algorithm: str
+    :return: object with update and digest
+    :raises ImportError: awscrt is not installed for crc32c
+    """
+    if algorithm == "sha256":
+        return hashlib.sha256()
+    if algorithm == "crc32":
+        return _Crc32()
+    return _Crc32c()
+
+
+@lru_cache(maxsize=1)
+def get_verify_choices() -> List[str]:
+    """Get the --verify choices supported by the installed botocore and packages.
+
+    The ETag (md5) can always be verified. The checksum algorithms need a
+    botocore whose s3 model has ChecksumAlgorithm and ChecksumMode, which the
+    pinned botocore 1.17.20 doesn't, crc32c also needs the optional awscrt.
+
+    :return: md5 followed by the supported checksum algorithms
+    :rtype: List[str]
+    """
+    choices = [ETAG_ONLY]
+    operation = (
+        botocore.session.get_session()
+        .get_service_model("s3")
+        .operation_model("PutObject")
+    )
+    if "ChecksumAlgorithm" not in operation.input_shape.members:
+        return choices
+    for algorithm in CHECKSUM_ALGORITHMS:
+        if algorithm == "crc32c" and importlib.util.find_spec("awscrt") is None:
+            continue
+        choices.append(algorithm)
+    return choices
+
+
+def get_checksum_args(algorithm: Optional[str]) -> Dict[str, str]:
+    """Get the extra arguments asking s3 to store the checksum of the algorithm.
+
+    :param algorithm: the --verify algorithm
+    :type algorithm: str, optional
+    :return: ChecksumAlgorithm argument, empty when the algorithm is not a checksum
+    :rtype: Dict[str, str]
+    """
+    if algorithm not in CHECKSUM_ALGORITHMS:
+        return {}
+    return {"ChecksumAlgorithm": algorithm.upper()}
+
+
+def get_part_size(size: int, transfer_config: TransferConfig) -> int:
+    """Get the part size s3transfer uploads a file of the size with.
+
+    :param size: size of the file
+    :type size: int
+    :param transfer_config: transfer config of the upload
+    :type transfer_config: TransferConfig
+    :return: size of the parts, 0 when uploaded in a single part
+    :rtype: int
+    """
+    if size < transfer_config.multipart_threshold:
+        return 0
+    part_ranges = S3TransferWrapper(transfer_config=transfer_config).get_part_ranges(
+        size
+    )
+    return part_ranges[0][1]
+
+
+def get_object_integrity(
+    client,
+    bucket: str,
+    key: str,
+    algorithm: Optional[str] = None,
+    response: Optional[Dict[str, Any]] = None,
+    find_part_size: bool = True,
+    **head_args
+) -> ObjectIntegrity:
+    """Get the ETag, checksum and part size of the object.
+
+    The part size of a multipart object is the size of its first part, which
+    takes another head_object request.
+
+    :param client: boto3 s3 client
+    :type client: boto3.client
+    :param bucket: name of the bucket
+    :type bucket: str
+    :param key: key of the object
+    :type key: str
+    :param algorithm: the --verify algorithm
+    :type algorithm: str, optional
+    :param response: head_object response of the object if already requested
+    :type response: Dict[str, Any], optional
+    :param find_part_size: get the part size of multipart objects
+    :type find_part_size: bool, optional
+    :return: integrity of the object
+    :rtype: ObjectIntegrity
+    """
+    if response is None:
+        checksum_args = (
+            {"ChecksumMode": "ENABLED"} if get_checksum_args(algorithm) else {}
+        )
+        response = client.head_object(
+            Bucket=bucket, Key=key, **head_args, **checksum_args
+        )
+    size: int = response["ContentLength"]
+    etag: Optional[str] = response.get("ETag", "").strip('"') or None
+    checksum: Optional[str] = (
+        response.get("Checksum%s" % algorithm.upper())
+        if get_checksum_args(algorithm)
+        else None
+    )
+
+    part_size = 0
+    parts = etag.rpartition("-")[2] if etag and "-" in etag else ""
+    if not parts and checksum and "-" in checksum:
+        parts = checksum.rpartition("-")[2]
+    if parts.isdigit():
+        part_size = size
+        if find_part_size and int(parts) > 1:
+            part_size = client.head_object(
+                Bucket=bucket, Key=key, PartNumber=1, **head_args
+            )["ContentLength"]
+
+    if str(response.get("ServerSideEncryption", "")).startswith(
+        "aws:kms"
+    ) or response.get("SSECustomerAlgorithm"):
+        etag = None
+    return ObjectIntegrity(
+        size, part_size, etag, checksum, checksum is not None and "-" in checksum
+    )
+
+
+def check_integrity(
+    hasher: IntegrityHasher, integrity: ObjectIntegrity, uri: str
+) -> bool:
+    """Compare the hashed data with the ETag and checksum of the object.
+
+    :param hasher: hasher of the transferred data
+    :type hasher: IntegrityHasher
+    :param integrity: integrity of the object
+    :type integrity: ObjectIntegrity
+    :param uri: s3 uri of the object to display
+    :type uri: str
+    :return: True if verified, False if there was nothing to verify against
+    :rtype: bool
+    :raises ChecksumMismatch: the data doesn't match the ETag or checksum
+    """
+    verified = False
+    etag = hasher.etag() if integrity.etag is not None else None
+    if etag is not None:
+        if etag != integrity.etag:
+            raise ChecksumMismatch(
+                "%s doesn't match ETag %s, got %s" % (uri, integrity.etag, etag)
+            )
+        verified = True
+    checksum = (
+        hasher.checksum(integrity.composite) if integrity.checksum is not None else None
+    )
+    if checksum is not None:
+        if checksum != integrity.checksum:
+            raise ChecksumMismatch(
+                "%s doesn't match %s checksum %s, got %s"
+                % (uri, hasher.algorithm, integrity.checksum, checksum)
+            )
+        verified = True
+    return verified
+
+
+def hash_file(path: str, hasher: IntegrityHasher) -> None:
+    """Hash a local file in order, for the transfers which couldn't be hashed inline.
+
+    :param path: path of the local file
+    :type path: str
+    :param hasher: hasher of the object
+    :type hasher: IntegrityHasher
+    """
+    offset = 0
+    with open(path, "rb") as file:
+        while True:
+            data = file.read(READ_SIZE)
+            if not data:
+                return
+            hasher.update(offset, data)
+            offset += len(data)
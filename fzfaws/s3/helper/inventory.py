@@ -0,0 +1,244 @@
+"""Module contains helper functions to load s3 inventory reports.
+
+S3 Inventory delivers a snapshot of all objects (and optionally all versions) of
+a bucket as a set of data files described by a manifest.json. Loading the snapshot
+into a VersionIndex lets huge buckets be browsed without listing them.
+
+Reference: https://docs.aws.amazon.com/AmazonS3/latest/dev/storage-inventory.html
+"""
+import csv
+from datetime import datetime, timezone
+import gzip
+import heapq
+import io
+from itertools import groupby
+import json
+import os
+import re
+from typing import Any, Dict, Generator, List, Optional, Tuple
+from urllib.parse import unquote_plus
+
+from fzfaws.s3.helper.version_index import VersionIndex
+from fzfaws.utils.exceptions import InvalidFileType, InvalidS3PathPattern
+
+# (key, version_id, is_latest, is_delete_marker, size, last_modified, etag)
+InventoryRow = Tuple[str, str, bool, bool, int, Optional[datetime], str]
+
+
+def read_manifest(manifest: str, client=None) -> Dict[str, Any]:
+    """Read the inventory manifest.json from local disk or s3.
+
+    :param manifest: local path or s3 uri (s3://bucket/path/manifest.json) of the manifest
+    :type manifest: str
+    :param client: boto3 s3 client, required when the manifest is on s3
+    :type client: boto3.client, optional
+    :return: the parsed manifest
+    :rtype: Dict[str, Any]
+    """
+    bucket, key = parse_s3_uri(manifest)
+    if bucket:
+        body = client.get_object(Bucket=bucket, Key=key)["Body"].read()
+        return json.loads(body)
+    with open(os.path.expanduser(manifest), "r") as file:
+        return json.load(file)
+
+
+def parse_s3_uri(path: str) -> Tuple[str, str]:
+    """Split a s3 uri into bucket and key.
+
+    :param path: path to split
+    :type path: str
+    :raises InvalidS3PathPattern: when the s3 uri doesn't contain a key
+    :return: bucket and key, empty bucket if the path is not a s3 uri
+    :rtype: Tuple[str, str]
+    """
+    if not path.startswith("s3://"):
+        return "", path
+    match = re.match(r"^s3://(?P<bucket>[^/]+)/(?P<key>.+)$", path)
+    if not match:
+        raise InvalidS3PathPattern(
+            "Invalid s3 uri pattern, valid pattern(s3://Bucket/path/manifest.json)"
+        )
+    return match.group("bucket"), match.group("key")
+
+
+def load_inventory(manifest: str, client=None) -> Tuple[VersionIndex, bool]:
+    """Load all data files of an inventory report into a VersionIndex.
+
+    CSV reports are read as a stream, ORC and Parquet reports require pyarrow.
+    Inventory data files are not guaranteed to be sorted across files, each data
+    file is sorted on its own into a compact VersionIndex, then the indexes are
+    merged by key so versions of a key stay contiguous. Only the rows of one
+    data file are held as python objects at a time.
+
+    :param manifest: local path or s3 uri of the manifest.json
+    :type manifest: str
+    :param client: boto3 s3 client, required when the manifest is on s3
+    :type client: boto3.client, optional
+    :raises InvalidFileType: when the report format is not supported
+    :return: the populated index and whether the report contains all versions
+    :rtype: Tuple[VersionIndex, bool]
+    """
+    manifest_data = read_manifest(manifest, client)
+    manifest_bucket, manifest_key = parse_s3_uri(manifest)
+    file_format = manifest_data.get("fileFormat", "CSV").upper()
+    if file_format not in ("CSV", "ORC", "PARQUET"):
+        raise InvalidFileType("Inventory format %s is not supported" % file_format)
+    schema = manifest_data.get("fileSchema", "")
+    versioned = "versionid" in _normalize(schema)
+
+    parts: List[VersionIndex] = []
+    for data_file in manifest_data.get("files", []):
+        if manifest_bucket:
+            destination = manifest_data.get("destinationBucket", "")
+            body = client.get_object(
+                Bucket=destination.split(":::")[-1] or manifest_bucket,
+                Key=data_file["key"],
+            )["Body"]
+            fileobj = io.BytesIO(body.read()) if file_format != "CSV" else body
+        else:
+            fileobj = open(_local_data_file(manifest_key, data_file["key"]), "rb")
+        with fileobj:
+            if file_format == "CSV":
+                rows = list(_read_csv(fileobj, schema))
+            else:
+                rows = list(_read_arrow(fileobj, file_format))
+        rows.sort(key=_row_order)
+        part = VersionIndex()
+        for row in rows:
+            part.append(*row)
+        del rows
+        parts.append(part)
+
+    index = VersionIndex(bucket=manifest_data.get("sourceBucket", ""))
+    merged = heapq.merge(*(part.rows() for part in parts), key=lambda row: row[0])
+    for _, versions in groupby(merged, key=lambda row: row[0]):
+        # versions of a key could be in different data files
+        for row in sorted(versions, key=_row_order):
+            index.append(*row)
+    return index, versioned
+
+
+def _local_data_file(manifest_path: str, key: str) -> str:
+    """Find the local copy of a data file listed in the manifest.
+
+    The data files are looked up relative to the manifest directory by their full key,
+    then under a data/ directory and lastly by their file name.
+    """
+    manifest_dir = os.path.dirname(os.path.abspath(os.path.expanduser(manifest_path)))
+    candidates = [
+        os.path.join(manifest_dir, key),
+        os.path.join(manifest_dir, "data", os.path.basename(key)),
+        os.path.join(manifest_dir, os.path.basename(key)),
+    ]
+    for candidate in candidates:
+        if os.path.isfile(candidate):
+            return candidate
+    raise FileNotFoundError("Inventory data file %s not found" % key)
+
+
+def _read_csv(fileobj, schema: str) -> Generator[InventoryRow, None, None]:
+    """Read rows from a gzipped csv data file.
+
+    Keys in csv reports are url encoded.
+    """
+    columns = _normalize(schema)
+    with io.TextIOWrapper(gzip.GzipFile(fileobj=fileobj), encoding="utf-8") as text:
+        for line in csv.reader(text):
+            record = dict(zip(columns, line))
+            yield _to_row(
+                unquote_plus(record.get("key", "")),
+                record.get("versionid", ""),
+                record.get("islatest", "true").lower() == "true",
+                record.get("isdeletemarker", "false").lower() == "true",
+                int(record.get("size") or 0),
+                _parse_time(record.get("lastmodifieddate", "")),
+                record.get("etag", ""),
+            )
+
+
+def _read_arrow(fileobj, file_format: str) -> Generator[InventoryRow, None, None]:
+    """Read rows from an orc or parquet data file through pyarrow."""
+    try:
+        if file_format == "ORC":
+            from pyarrow import orc
+
+            table = orc.ORCFile(fileobj).read()
+        else:
+            from pyarrow import parquet
+
+            table = parquet.read_table(fileobj)
+    except ImportError:
+        raise InvalidFileType(
+            "pyarrow is required to read %s inventory reports" % file_format
+        )
+    data = {_normalize(name)[0]: column for name, column in table.to_pydict().items()}
+    empty = [None] * table.num_rows
+    for key, version_id, is_latest, is_delete_marker, size, last_modified, etag in zip(
+        data.get("key", empty),
+        data.get("versionid", empty),
+        data.get("islatest", empty),
+        data.get("isdeletemarker", empty),
+        data.get("size", empty),
+        data.get("lastmodifieddate", empty),
+        data.get("etag", empty),
+    ):
+        yield _to_row(
+            key,
+            version_id or "",
+            True if is_latest is None else is_latest,
+            bool(is_delete_marker),
+            size or 0,
+            last_modified,
+            etag or "",
+        )
+
+
+def _to_row(
+    key: str,
+    version_id: str,
+    is_latest: bool,
+    is_delete_marker: bool,
+    size: int,
+    last_modified: Optional[datetime],
+    etag: str,
+) -> InventoryRow:
+    """Construct a row from the values of a data file.
+
+    ETags of inventory reports are not quoted, they are quoted as in list_objects.
+    """
+    if last_modified and last_modified.tzinfo is None:
+        # pyarrow timestamps are naive datetime in utc
+        last_modified = last_modified.replace(tzinfo=timezone.utc)
+    if etag and not etag.startswith('"'):
+        etag = '"%s"' % etag
+    return key, version_id, is_latest, is_delete_marker, size, last_modified, etag
+
+
+def _normalize(schema: str) -> List[str]:
+    """Normalize column names so that csv and orc/parquet names are the same.
+
+    E.g. VersionId in csv schema and version_id in parquet schema are both versionid.
+    """
+    return [
+        column.strip().replace("_", "").lower()
+        for column in schema.split(",")
+        if column.strip()
+    ]
+
+
+def _parse_time(value: str) -> Optional[datetime]:
+    """Parse the LastModifiedDate of csv reports, e.g. 2020-06-03T10:20:30.000Z."""
+    if not value:
+        return None
+    return datetime.strptime(
+        value.replace("Z", "+0000"), "%Y-%m-%dT%H:%M:%S.%f%z"
+    )
+
+
+def _row_order(row: InventoryRow) -> Tuple[str, bool, float]:
+    """Sort by key, latest version first, then newest to oldest as list_object_versions does.
+
+    Rows without time are sorted last.
+    """
+    return row[0], not row[2], -(row[5].timestamp() if row[5] else 0.0)
@@ -0,0 +1,195 @@
+"""Module contains the crash safe journal of bulk operations."""
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, Iterator, Optional, Set, TypeVar
+
+from fzfaws.utils.util import get_cache_dir
+
+# number of records appended before the journal is fsynced
+SYNC_COUNT = 1000
+
+# seconds between fsyncs of the journal
+SYNC_INTERVAL = 1
+
+T = TypeVar("T")
+
+
+class Journal:
+    """Append only journal of the completed items of a bulk operation.
+
+    The journal is a json lines file under $XDG_CACHE_HOME/fzfaws/journals,
+    named after the fingerprint of the operation and its plan (e.g. source,
+    destination and filters). The first line records the plan, then every
+    completed item is appended as soon as it's done and the file is fsynced
+    in batches, so a crash loses at most the last batch, which is redone.
+
+    With resume, the completed items of a previous run with the same plan are
+    loaded when constructed and skipped through pending(), so the dryrun only
+    shows the remaining items. The file is only opened for writing when used as
+    a context manager, so cancelling at the confirmation keeps the previous
+    journal. The journal is removed when the operation completes without any
+    failed item.
+
+    Example:
+        journal = Journal("upload", {"bucket": "bucket", "path": "/tmp"}, resume=True)
+        with journal:
+            scheduler = S3TransferScheduler(s3.client, journal=journal)
+            scheduler.upload(journal.pending(upload_list, lambda item: item["key"]))
+
+    :param operation: name of the operation, e.g. upload
+    :type operation: str
+    :param plan: arguments that identify the operation
+    :type plan: Dict[str, Any]
+    :param resume: load the completed items of a previous run with the same plan
+    :type resume: bool, optional
+    :param journal_dir: directory of the journals, default to $XDG_CACHE_HOME/fzfaws/journals
+    :type journal_dir: str, optional
+    """
+
+    def __init__(
+        self,
+        operation: str,
+        plan: Dict[str, Any],
+        resume: bool = False,
+        journal_dir: Optional[str] = None,
+    ) -> None:
+        """Construct the journal and load the previous run if resume."""
+        self.operation = operation
+        self.plan = plan
+        self.fingerprint: str = hashlib.sha1(
+            json.dumps([operation, plan], sort_keys=True, default=str).encode("utf-8")
+        ).hexdigest()
+        if journal_dir is None:
+            journal_dir = os.path.join(get_cache_dir(), "journals")
+        os.makedirs(journal_dir, exist_ok=True)
+        self.path = os.path.join(journal_dir, "%s.jsonl" % self.fingerprint)
+        self.completed: Set[str] = set()
+        self.incomplete: bool = False
+        self._pending: int = 0
+        self._last_synced: float = time.time()
+        self._lock = threading.Lock()
+        self._file: Any = None
+        self._resumed: bool = resume and self._load()
+        if self._resumed:
+            print(
+                "resume: %s completed items of the previous %s"
+                % (len(self.completed), operation)
+            )
+
+    def __enter__(self) -> "Journal":
+        """Open the journal, append to the previous journal if resumed."""
+        if self._resumed:
+            self._file = open(self.path, "a")
+        else:
+            self._file = open(self.path, "w")
+            self._file.write(
+                json.dumps(
+                    {"operation": self.operation, "plan": self.plan},
+                    sort_keys=True,
+                    default=str,
+                )
+                + "\n"
+            )
+            self._sync()
+        return self
+
+    def __exit__(self, exc_type, *args) -> None:
+        """Close the journal, only keep it when the operation failed."""
+        self.close(completed=exc_type is None and not self.incomplete)
+
+    def __contains__(self, item_id: str) -> bool:
+        """Check if the item is completed in a previous run."""
+        return item_id in self.completed
+
+    def pending(self, items: Iterable[T], get_id: Callable[[T], str]) -> Iterator[T]:
+        """Skip the items completed in a previous run.
+
+        :param items: items of the operation
+        :type items: Iterable[T]
+        :param get_id: get the id of the item to look up, should be the same id as record()
+        :type get_id: Callable[[T], str]
+        :return: generator of the items not completed
+        :rtype: Iterator[T]
+        """
+        for item in items:
+            if get_id(item) not in self.completed:
+                yield item
+
+    def record(self, item_id: str) -> None:
+        """Append the completed item, fsync when the batch is full.
+
+        :param item_id: id of the item, e.g. key of the object
+        :type item_id: str
+        """
+        with self._lock:
+            self._file.write(json.dumps(item_id) + "\n")
+            self._pending += 1
+            if (
+                self._pending >= SYNC_COUNT
+                or time.time() - self._last_synced >= SYNC_INTERVAL
+            ):
+                self._sync()
+
+    def record_failure(self) -> None:
+        """Keep the journal when closed, an item failed without raising an error."""
+        self.incomplete = True
+
+    def close(self, completed: bool = False) -> None:
+        """Flush and close the journal.
+
+        :param completed: the operation completed, remove the journal
+        :type completed: bool, optional
+        """
+        with self._lock:
+            if self._file is None or self._file.closed:
+                return
+            self._sync()
+            self._file.close()
+        if completed:
+            os.remove(self.path)
+        else:
+            print(
+                "journal: %s, run again with --resume to skip the completed items"
+                % self.path
+            )
+
+    def _load(self) -> bool:
+        """Load the completed items of the previous run."""
+        try:
+            with open(self.path, "r") as file:
+                lines = iter(file)
+                header = json.loads(next(lines))
+                if header.get("operation") != self.operation:
+                    return False
+                for line in lines:
+                    try:
+                        self.completed.add(json.loads(line))
+                    except ValueError:
+                        # the last line could be torn by a crash
+                        break
+        except (OSError, ValueError, StopIteration):
+            return False
+        return True
+
+    def _sync(self) -> None:
+        """Flush the appended records to the disk."""
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._pending = 0
+        self._last_synced = time.time()
+
+
+def journal_id(key: str, version_id: Optional[str] = None) -> str:
+    """Get the id of an object in the journal.
+
+    :param key: key of the object
+    :type key: str
+    :param version_id: version id of the object
+    :type version_id: str, optional
+    :return: id of the object
+    :rtype: str
+    """
+    return "%s?versionId=%s" % (key, version_id) if version_id else key
@@ -0,0 +1,453 @@
+"""Module contains the local cache of downloaded s3 objects."""
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+
+from botocore.exceptions import ClientError
+from s3transfer.utils import random_file_extension
+
+from fzfaws.utils.util import get_cache_dir
+
+# size of the cache when object_cache doesn't set max_size, 10GiB
+DEFAULT_MAX_SIZE = 10 * 1024 * 1024 * 1024
+
+# ioctl request to clone a file on linux filesystems supporting reflink (btrfs, xfs)
+FICLONE = 0x40049409
+
+_object_cache: Optional["ObjectCache"] = None
+_object_cache_lock = threading.Lock()
+
+
+class ObjectCache:
+    """Local cache of downloaded objects, addressed by their ETag and size.
+
+    The data of an object is stored once per ETag and size, and the index
+    maps the bucket, key and version of every downloaded object to them.
+    ETags of encrypted objects aren't a md5 of the data, the size keeps two
+    objects from sharing the data by a colliding ETag alone. Before
+    an object is served from the cache, a head_object with IfNoneMatch
+    checks that the object hasn't changed in s3. Objects downloaded with a
+    version id never change, so they are served without a request.
+
+    Cached objects are copied into the destination, with a reflink on
+    filesystems supporting it, otherwise with copy_file_range, otherwise with
+    a normal copy. Destinations never share the data of the cache, so a
+    change to a downloaded file doesn't change the cache or other downloads.
+    A cached file changed outside of the cache no longer matches the inode,
+    size and mtime recorded for it, and is dropped. The least recently used
+    objects are removed when the cache grows over max_size.
+
+    Example:
+        cache = ObjectCache()
+        path, etag, size = cache.lookup(s3.client, "bucket", "hello.txt")
+        if path is not None:
+            cache.link(path, "/tmp/hello.txt")
+
+    :param cache_dir: directory of the cache, default to $XDG_CACHE_HOME/fzfaws/objects
+    :type cache_dir: str, optional
+    :param max_size: maximum number of bytes in the cache
+    :type max_size: int, optional
+    """
+
+    def __init__(
+        self, cache_dir: Optional[str] = None, max_size: int = DEFAULT_MAX_SIZE
+    ) -> None:
+        """Construct the cache and create the tables if not exists."""
+        if cache_dir is None:
+            cache_dir = os.path.join(get_cache_dir(), "objects")
+        os.makedirs(cache_dir, exist_ok=True)
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(
+            os.path.join(cache_dir, "index.sqlite3"), check_same_thread=False
+        )
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS object ("
+            "bucket TEXT, key TEXT, version_id TEXT, etag TEXT, size INTEGER, "
+            "PRIMARY KEY (bucket, key, version_id))"
+        )
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS blob ("
+            "etag TEXT, size INTEGER, inode INTEGER, mtime_ns INTEGER, "
+            "last_access REAL, PRIMARY KEY (etag, size))"
+        )
+        self._connection.commit()
+
+    def lookup(
+        self,
+        client,
+        bucket: str,
+        key: str,
+        version_id: Optional[str] = None,
+        **head_args
+    ) -> Tuple[Optional[str], Optional[str], Optional[int]]:
+        """Find the cached file of the object if the object hasn't changed.
+
+        The head_object response is used to find the object by its new ETag
+        when it has changed, and returned so that the download doesn't need
+        another head_object.
+
+        :param client: boto3 s3 client
+        :type client: boto3.client
+        :param bucket: name of the bucket
+        :type bucket: str
+        :param key: key of the object
+        :type key: str
+        :param version_id: version of the object
+        :type version_id: str, optional
+        :return: path of the cached file, None when not cached, and the ETag and size
+            of the object without the surrounding quotes, None when not known
+        :rtype: Tuple[Optional[str], Optional[str], Optional[int]]
+        """
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT etag, size FROM object "
+                "WHERE bucket = ? AND key = ? AND version_id = ?",
+                (bucket, key, version_id or ""),
+            ).fetchone()
+        if row is not None and version_id:
+            return self._get_blob(row[0], row[1]), row[0], row[1]
+
+        if version_id:
+            head_args["VersionId"] = version_id
+        if row is not None:
+            head_args["IfNoneMatch"] = '"%s"' % row[0]
+        try:
+            response = client.head_object(Bucket=bucket, Key=key, **head_args)
+        except ClientError as e:
+            if row is None or not is_not_modified(e):
+                raise
+            return self._get_blob(row[0], row[1]), row[0], row[1]
+
+        etag: str = response["ETag"].strip('"')
+        size: int = response["ContentLength"]
+        path = self._get_blob(etag, size)
+        if path is not None:
+            # same data downloaded from another object
+            self._set_object(bucket, key, version_id, etag, size)
+        return path, etag, size
+
+    def lookup_etag(
+        self, bucket: str, key: str, version_id: Optional[str], etag: str, size: int
+    ) -> Optional[str]:
+        """Find the cached file of the object by its listed ETag and size, without a request.
+
+        :param bucket: name of the bucket
+        :type bucket: str
+        :param key: key of the object
+        :type key: str
+        :param version_id: version of the object
+        :type version_id: str, optional
+        :param etag: ETag of the object in the listing
+        :type etag: str
+        :param size: size of the object in the listing
+        :type size: int
+        :return: path of the cached file, None when not cached
+        :rtype: Optional[str]
+        """
+        etag = etag.strip('"')
+        path = self._get_blob(etag, size)
+        if path is not None:
+            self._set_object(bucket, key, version_id, etag, size)
+        return path
+
+    def read(
+        self, client, bucket: str, key: str, version_id: Optional[str] = None
+    ) -> bytes:
+        """Read the object, from the cache if the object hasn't changed.
+
+        A get_object with IfNoneMatch replaces the head_object of lookup, so
+        reading the object takes a single request whether it's cached or not.
+
+        :param client: boto3 s3 client
+        :type client: boto3.client
+        :param bucket: name of the bucket
+        :type bucket: str
+        :param key: key of the object
+        :type key: str
+        :param version_id: version of the object
+        :type version_id: str, optional
+        :return: data of the object
+        :rtype: bytes
+        """
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT etag, size FROM object "
+                "WHERE bucket = ? AND key = ? AND version_id = ?",
+                (bucket, key, version_id or ""),
+            ).fetchone()
+        path = self._get_blob(row[0], row[1]) if row is not None else None
+        get_args: Dict[str, Any] = {"VersionId": version_id} if version_id else {}
+        if path is not None and version_id:
+            return self._read_blob(path)
+        if path is not None:
+            get_args["IfNoneMatch"] = '"%s"' % row[0]
+        try:
+            response = client.get_object(Bucket=bucket, Key=key, **get_args)
+        except ClientError as e:
+            if path is None or not is_not_modified(e):
+                raise
+            return self._read_blob(path)
+
+        body: bytes = response["Body"].read()
+        temp_path = os.path.join(self.cache_dir, "tmp.%s" % random_file_extension())
+        try:
+            with open(temp_path, "wb") as file:
+                file.write(body)
+            self.add(bucket, key, version_id, response["ETag"], temp_path, move=True)
+        except OSError:
+            pass
+        finally:
+            _remove(temp_path)
+        return body
+
+    def add(
+        self,
+        bucket: str,
+        key: str,
+        version_id: Optional[str],
+        etag: str,
+        path: str,
+        move: bool = False,
+    ) -> None:
+        """Add a downloaded file to the cache, failing to add it is ignored.
+
+        :param bucket: name of the bucket
+        :type bucket: str
+        :param key: key of the object
+        :type key: str
+        :param version_id: version of the object
+        :type version_id: str, optional
+        :param etag: ETag of the object
+        :type etag: str
+        :param path: path of the downloaded file
+        :type path: str
+        :param move: move the file into the cache instead of linking it
+        :type move: bool, optional
+        """
+        etag = etag.strip('"')
+        try:
+            size = os.path.getsize(path)
+            if size > self.max_size:
+                return
+            blob_path = self._get_blob_path(etag, size)
+            if self._get_blob(etag, size) is None:
+                os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+                if move:
+                    os.replace(path, blob_path)
+                else:
+                    link_file(path, blob_path)
+                stat = os.stat(blob_path)
+                with self._lock:
+                    self._connection.execute(
+                        "INSERT OR REPLACE INTO blob VALUES (?, ?, ?, ?, ?)",
+                        (etag, size, stat.st_ino, stat.st_mtime_ns, time.time()),
+                    )
+            self._set_object(bucket, key, version_id, etag, size)
+            self._evict()
+        except (OSError, sqlite3.Error):
+            pass
+
+    def link(self, path: str, local_path: str) -> None:
+        """Copy the cached file to the destination.
+
+        :param path: path of the cached file from lookup
+        :type path: str
+        :param local_path: destination of the object
+        :type local_path: str
+        """
+        link_file(path, local_path)
+
+    def close(self) -> None:
+        """Commit pending updates and close the database."""
+        with self._lock:
+            self._connection.commit()
+            self._connection.close()
+
+    def _get_blob(self, etag: str, size: int) -> Optional[str]:
+        """Get the path of the cached data of the ETag, None when not cached or changed."""
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT inode, mtime_ns FROM blob WHERE etag = ? AND size = ?",
+                (etag, size),
+            ).fetchone()
+        if row is None:
+            return None
+        path = self._get_blob_path(etag, size)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            stat = None
+        state = (stat.st_ino, stat.st_mtime_ns) if stat else None
+        with self._lock:
+            if state != tuple(row) or stat.st_size != size:
+                # modified or removed outside of the cache
+                self._delete_blob(etag, size)
+                self._connection.commit()
+                return None
+            self._connection.execute(
+                "UPDATE blob SET last_access = ? WHERE etag = ? AND size = ?",
+                (time.time(), etag, size),
+            )
+            self._connection.commit()
+        return path
+
+    def _get_blob_path(self, etag: str, size: int) -> str:
+        """Get the path of the data of the ETag, hashed into a safe file name."""
+        name = hashlib.sha256(("%s-%s" % (etag, size)).encode("utf-8")).hexdigest()
+        return os.path.join(self.cache_dir, name[:2], name)
+
+    def _read_blob(self, path: str) -> bytes:
+        """Read the cached data."""
+        with open(path, "rb") as file:
+            return file.read()
+
+    def _set_object(
+        self,
+        bucket: str,
+        key: str,
+        version_id: Optional[str],
+        etag: str,
+        size: int,
+    ) -> None:
+        """Point the object to the cached data of the ETag."""
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO object VALUES (?, ?, ?, ?, ?)",
+                (bucket, key, version_id or "", etag, size),
+            )
+            self._connection.commit()
+
+    def _evict(self) -> None:
+        """Remove the least recently used data until the cache fits in max_size."""
+        with self._lock:
+            total = self._connection.execute(
+                "SELECT COALESCE(SUM(size), 0) FROM blob"
+            ).fetchone()[0]
+            if total <= self.max_size:
+                return
+            for etag, size in self._connection.execute(
+                "SELECT etag, size FROM blob ORDER BY last_access"
+            ).fetchall():
+                self._delete_blob(etag, size)
+                total -= size
+                if total <= self.max_size:
+                    break
+            self._connection.commit()
+
+    def _delete_blob(self, etag: str, size: int) -> None:
+        """Delete the cached data of the ETag and the objects pointing to it."""
+        _remove(self._get_blob_path(etag, size))
+        self._connection.execute(
+            "DELETE FROM blob WHERE etag = ? AND size = ?", (etag, size)
+        )
+        self._connection.execute(
+            "DELETE FROM object WHERE etag = ? AND size = ?", (etag, size)
+        )
+
+
+def get_object_cache() -> Optional[ObjectCache]:
+    """Get the object cache shared by the process, when enabled in the config file.
+
+    :return: the shared cache, None when object_cache is not set
+    :rtype: Optional[ObjectCache]
+    """
+    global _object_cache
+    settings = os.getenv("FZFAWS_S3_OBJECT_CACHE", "")
+    if not settings:
+        return None
+    with _object_cache_lock:
+        if _object_cache is None:
+            config = json.loads(settings)
+            max_size = DEFAULT_MAX_SIZE
+            if isinstance(config, dict):
+                max_size = int(config.get("max_size", DEFAULT_MAX_SIZE))
+            _object_cache = ObjectCache(max_size=max_size)
+        return _object_cache
+
+
+def link_file(source: str, destination: str) -> None:
+    """Copy the source file to the destination, replacing the destination.
+
+    A reflink is tried first, which shares the blocks until either file is
+    changed, then copy_file_range, which lets the filesystem copy without
+    reading the data into the process, then a normal copy. The files are
+    never hardlinked, a change to one of them never shows up in the other.
+
+    :param source: path of the source file
+    :type source: str
+    :param destination: path of the destination file
+    :type destination: str
+    """
+    if os.path.exists(destination) and os.path.samefile(source, destination):
+        return
+    temp_path = "%s.%s" % (destination, random_file_extension())
+    try:
+        if not _reflink(source, temp_path) and not _copy_file_range(source, temp_path):
+            shutil.copyfile(source, temp_path)
+        os.replace(temp_path, destination)
+    except BaseException:
+        _remove(temp_path)
+        raise
+
+
+def is_not_modified(error: ClientError) -> bool:
+    """Check if the error is the 304 response of a IfNoneMatch request.
+
+    :param error: error of the request
+    :type error: ClientError
+    :return: True if the object matches the ETag of IfNoneMatch
+    :rtype: bool
+    """
+    status = error.response.get("ResponseMetadata", {}).get("HTTPStatusCode")
+    code = error.response.get("Error", {}).get("Code")
+    return status == 304 or code in ("304", "NotModified")
+
+
+def _reflink(source: str, destination: str) -> bool:
+    """Clone the source file to the destination, False when not supported."""
+    try:
+        import fcntl
+    except ImportError:
+        return False
+    try:
+        with open(source, "rb") as source_file, open(destination, "wb") as file:
+            fcntl.ioctl(file.fileno(), FICLONE, source_file.fileno())
+        return True
+    except OSError:
+        _remove(destination)
+        return False
+
+
+def _copy_file_range(source: str, destination: str) -> bool:
+    """Copy the source file with copy_file_range, False when not supported."""
+    if not hasattr(os, "copy_file_range"):
+        return False
+    try:
+        with open(source, "rb") as source_file, open(destination, "wb") as file:
+            remaining = os.fstat(source_file.fileno()).st_size
+            while remaining > 0:
+                copied = os.copy_file_range(
+                    source_file.fileno(), file.fileno(), remaining
+                )
+                if copied == 0:
+                    break
+                remaining -= copied
+        return True
+    except OSError:
+        _remove(destination)
+        return False
+
+
+def _remove(path: str) -> None:
+    """Remove the file if exists."""
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
@@ -0,0 +1,346 @@
+"""Module contains the parallel ranged downloader for large objects."""
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import json
+import os
+import queue
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+from boto3.s3.transfer import TransferConfig
+from botocore.exceptions import IncompleteReadError
+from s3transfer.utils import S3_RETRYABLE_DOWNLOAD_ERRORS
+
+from fzfaws.s3.helper.integrity import (
+    IntegrityHasher,
+    check_integrity,
+    get_checksum_args,
+    get_object_integrity,
+    hash_file,
+)
+from fzfaws.s3.helper.s3transferwrapper import S3TransferWrapper
+from fzfaws.utils.exceptions import ChecksumMismatch
+
+# objects above this size are downloaded through RangedDownloader
+RANGED_DOWNLOAD_THRESHOLD = 256 * 1024 * 1024
+
+# seconds between saving the completed parts to the state file
+STATE_INTERVAL = 1
+
+
+class RangedDownloader:
+    """Download a single large object with concurrent ranged get_object.
+
+    The destination is preallocated and every range is read into a buffer from
+    a fixed pool and written in place with os.pwrite, so the data isn't passed
+    through a queue to a single writer thread like s3transfer does.
+
+    The object is downloaded to local_path + ".fzfaws-download" and the completed
+    parts are saved next to it in a json state file. When a download is
+    interrupted, downloading the same object again only gets the missing ranges,
+    as long as the ETag and size of the object haven't changed.
+
+    After all ranges are written the file is verified against the ETag (when
+    the ETag is a md5) and renamed to local_path. The ranges of a multipart
+    object follow its parts, so the md5 of every part is calculated from the
+    buffers as they are written and the file is not read again. Objects with a
+    single part ETag (or a whole object checksum) have to be read after the
+    download to verify them, which is only done with verify.
+
+    Example:
+        downloader = RangedDownloader(s3.client)
+        downloader.download("bucket", "large.iso", "/tmp/large.iso")
+
+    :param client: boto3 s3 client
+    :type client: boto3.client
+    :param transfer_config: transfer config to use, default to the config file
+    :type transfer_config: TransferConfig, optional
+    :param max_workers: number of concurrent ranges, default to max_request_concurrency
+    :type max_workers: int, optional
+    :param verify: also verify the checksum of the algorithm besides the ETag
+    :type verify: str, optional
+    """
+
+    def __init__(
+        self,
+        client,
+        transfer_config: Optional[TransferConfig] = None,
+        max_workers: int = 0,
+        verify: Optional[str] = None,
+    ) -> None:
+        """Construct the downloader instance."""
+        self.client = client
+        self.s3transferwrapper = S3TransferWrapper(transfer_config=transfer_config)
+        self.transfer_config = self.s3transferwrapper.transfer_config
+        self.max_workers: int = (
+            max_workers
+            if max_workers > 0
+            else self.transfer_config.max_request_concurrency
+        )
+        self.verify = verify
+        # the download was verified against a md5 ETag or a checksum
+        self.verified: bool = False
+        self._lock = threading.Lock()
+
+    def download(
+        self,
+        bucket: str,
+        key: str,
+        local_path: str,
+        extra_args: Optional[Dict[str, Any]] = None,
+        callback: Optional[Callable[[int], None]] = None,
+    ) -> None:
+        """Download the object to local_path.
+
+        :param bucket: name of the bucket
+        :type bucket: str
+        :param key: key of the object
+        :type key: str
+        :param local_path: destination path
+        :type local_path: str
+        :param extra_args: extra arguments for head_object and get_object, e.g. VersionId
+        :type extra_args: Dict[str, Any], optional
+        :param callback: called with the number of bytes written
+        :type callback: Callable[[int], None], optional
+        :raises ChecksumMismatch: the downloaded file doesn't match the ETag
+        """
+        extra_args = dict(extra_args or {})
+        head_args = dict(extra_args)
+        if get_checksum_args(self.verify):
+            head_args["ChecksumMode"] = "ENABLED"
+        response = self.client.head_object(Bucket=bucket, Key=key, **head_args)
+        size: int = response["ContentLength"]
+        integrity = get_object_integrity(
+            self.client, bucket, key, self.verify, response=response, **extra_args
+        )
+        verifiable = integrity.etag is not None or integrity.checksum is not None
+        if 0 < integrity.part_size < size:
+            part_ranges = [
+                (offset, min(integrity.part_size, size - offset))
+                for offset in range(0, size, integrity.part_size)
+            ]
+        else:
+            part_ranges = self.s3transferwrapper.get_part_ranges(size)
+        # the parts are hashed as they are written when every range is a part
+        hasher: Optional[IntegrityHasher] = None
+        if (
+            verifiable
+            and 0 < integrity.part_size < size
+            and (integrity.checksum is None or integrity.composite)
+        ):
+            hasher = IntegrityHasher(size, integrity.part_size, self.verify)
+        temp_path = "%s.fzfaws-download" % local_path
+        state_path = "%s.json" % temp_path
+        state: Dict[str, Any] = {
+            "bucket": bucket,
+            "key": key,
+            "version_id": response.get("VersionId"),
+            "etag": response["ETag"],
+            "size": size,
+            "chunksize": part_ranges[0][1],
+        }
+        completed, digests = self._load_state(state_path, temp_path, state)
+        if completed and callback:
+            callback(sum(part_ranges[index][1] for index in completed))
+
+        fd = os.open(temp_path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if not completed:
+                self._preallocate(fd, size)
+            if hasher is not None:
+                self._restore_digests(fd, hasher, part_ranges, completed, digests)
+            buffers: "queue.Queue[bytearray]" = queue.Queue()
+            for _ in range(self.max_workers):
+                buffers.put(bytearray(self.transfer_config.io_chunksize))
+            last_saved = time.time()
+            executor = ThreadPoolExecutor(max_workers=self.max_workers)
+            futures = {
+                executor.submit(
+                    self._download_part,
+                    fd,
+                    bucket,
+                    key,
+                    dict(extra_args, IfMatch=response["ETag"]),
+                    part_ranges[index],
+                    buffers,
+                    callback,
+                    hasher,
+                ): index
+                for index in range(len(part_ranges))
+                if index not in completed and part_ranges[index][1]
+            }
+            try:
+                for future in as_completed(futures):
+                    future.result()
+                    completed.add(futures[future])
+                    if time.time() - last_saved >= STATE_INTERVAL:
+                        self._save_state(fd, state_path, state, completed, hasher)
+                        last_saved = time.time()
+            except BaseException:
+                # keep the ranges still in flight, skip the ones not started
+                for future in futures:
+                    future.cancel()
+                executor.shutdown(wait=True)
+                completed.update(
+                    index
+                    for future, index in futures.items()
+                    if not future.cancelled() and future.exception() is None
+                )
+                self._save_state(fd, state_path, state, completed, hasher)
+                raise
+            executor.shutdown()
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+        # reading the file again is only worth it when asked to verify
+        if verifiable and (hasher is not None or self.verify):
+            if hasher is None:
+                hasher = IntegrityHasher(size, integrity.part_size, self.verify)
+                hash_file(temp_path, hasher)
+            try:
+                self.verified = check_integrity(
+                    hasher, integrity, "s3://%s/%s" % (bucket, key)
+                )
+            except ChecksumMismatch:
+                os.remove(temp_path)
+                _remove(state_path)
+                raise
+        os.replace(temp_path, local_path)
+        _remove(state_path)
+
+    def _download_part(
+        self,
+        fd: int,
+        bucket: str,
+        key: str,
+        extra_args: Dict[str, Any],
+        part_range: Tuple[int, int],
+        buffers: "queue.Queue[bytearray]",
+        callback: Optional[Callable[[int], None]],
+        hasher: Optional[IntegrityHasher] = None,
+    ) -> None:
+        """Download the range and write it in place, retry on network errors."""
+        offset, length = part_range
+        for attempt in range(self.transfer_config.num_download_attempts):
+            written = 0
+            buffer = buffers.get()
+            try:
+                response = self.client.get_object(
+                    Bucket=bucket,
+                    Key=key,
+                    Range="bytes=%s-%s" % (offset, offset + length - 1),
+                    **extra_args
+                )
+                body = response["Body"]
+                readinto = getattr(body, "readinto", None)
+                view = memoryview(buffer)
+                while written < length:
+                    amount = min(len(buffer), length - written)
+                    if readinto is not None:
+                        count = readinto(view[:amount])
+                        data = view[:count]
+                    else:
+                        # older botocore StreamingBody doesn't support readinto
+                        data = body.read(amount)
+                        count = len(data)
+                    if not count:
+                        raise IncompleteReadError(
+                            actual_bytes=written, expected_bytes=length
+                        )
+                    os.pwrite(fd, data, offset + written)
+                    if hasher is not None:
+                        # a retry writes the range again, hashed data is skipped
+                        hasher.update(offset + written, data)
+                    written += count
+                    if callback:
+                        callback(count)
+                return
+            except S3_RETRYABLE_DOWNLOAD_ERRORS:
+                if callback and written:
+                    callback(-written)
+                if attempt + 1 >= self.transfer_config.num_download_attempts:
+                    raise
+            finally:
+                buffers.put(buffer)
+
+    def _preallocate(self, fd: int, size: int) -> None:
+        """Reserve the space of the whole object in the temp file."""
+        os.ftruncate(fd, size)
+        if size and hasattr(os, "posix_fallocate"):
+            try:
+                os.posix_fallocate(fd, 0, size)
+            except OSError:
+                # not supported by the file system, the file is sparse instead
+                pass
+
+    def _load_state(
+        self, state_path: str, temp_path: str, state: Dict[str, Any]
+    ) -> Tuple[Set[int], Dict[str, List[str]]]:
+        """Get the completed parts and their digests of a previous download."""
+        if not os.path.exists(temp_path) or not os.path.exists(state_path):
+            return set(), {}
+        try:
+            with open(state_path, "r") as file:
+                saved_state = json.load(file)
+        except ValueError:
+            return set(), {}
+        completed = saved_state.pop("completed", [])
+        digests = saved_state.pop("digests", {})
+        if saved_state != state or os.path.getsize(temp_path) != state["size"]:
+            return set(), {}
+        return set(completed), digests
+
+    def _restore_digests(
+        self,
+        fd: int,
+        hasher: IntegrityHasher,
+        part_ranges: List[Tuple[int, int]],
+        completed: Set[int],
+        digests: Dict[str, List[str]],
+    ) -> None:
+        """Restore the digests of the completed parts, hash the parts saved without."""
+        for index in completed:
+            if str(index) in digests:
+                hasher.set_part_digests(index, digests[str(index)])
+                continue
+            offset, length = part_ranges[index]
+            end = offset + length
+            while offset < end:
+                data = os.pread(
+                    fd, min(self.transfer_config.io_chunksize, end - offset), offset
+                )
+                if not data:
+                    break
+                hasher.update(offset, data)
+                offset += len(data)
+
+    def _save_state(
+        self,
+        fd: int,
+        state_path: str,
+        state: Dict[str, Any],
+        completed: Set[int],
+        hasher: Optional[IntegrityHasher] = None,
+    ) -> None:
+        """Flush the written ranges and save the completed parts."""
+        saved_state = dict(state, completed=sorted(completed))
+        if hasher is not None:
+            saved_state["digests"] = {
+                str(index): hasher.get_part_digests(index)
+                for index in completed
+                if hasher.get_part_digests(index) is not None
+            }
+        with self._lock:
+            os.fsync(fd)
+            with open("%s.tmp" % state_path, "w") as file:
+                json.dump(saved_state, file)
+            os.replace("%s.tmp" % state_path, state_path)
+
+
+def _remove(path: str) -> None:
+    """Remove the file if exists."""
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
@@ -0,0 +1,464 @@
+"""Module contains the resumable multipart uploader for large files."""
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import base64
+import glob
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from boto3.s3.transfer import TransferConfig
+from botocore.exceptions import ClientError
+from s3transfer.utils import ReadFileChunk
+
+from fzfaws.s3.helper.integrity import READ_SIZE, get_checksum_args, new_checksum
+from fzfaws.s3.helper.s3transferwrapper import S3TransferWrapper
+from fzfaws.utils.exceptions import ChecksumMismatch
+from fzfaws.utils.util import get_cache_dir
+
+# files above this size are uploaded through ResumableUploader
+RESUMABLE_UPLOAD_THRESHOLD = 256 * 1024 * 1024
+
+# seconds between saving the completed parts to the state file
+STATE_INTERVAL = 1
+
+# extra arguments accepted by upload_part and complete_multipart_upload
+UPLOAD_PART_ARGS = [
+    "SSECustomerKey",
+    "SSECustomerAlgorithm",
+    "SSECustomerKeyMD5",
+    "RequestPayer",
+]
+COMPLETE_ARGS = ["RequestPayer"]
+
+
+class ResumableUploader:
+    """Upload a single large file with a multipart upload that can be resumed.
+
+    The UploadId and the ETag of every completed part are saved to a state
+    file under $XDG_CACHE_HOME/fzfaws/uploads. When the upload fails, uploading
+    the same file to the same key again checks the saved parts with list_parts
+    and only uploads the missing parts, as long as the file hasn't changed.
+
+    When the upload is cancelled (KeyboardInterrupt), the multipart upload is
+    aborted so the uploaded parts don't keep costing storage.
+
+    With verify, the md5 of every part is calculated from the buffer sent and
+    compared with the ETag of the part, and the ETag of the completed upload
+    is compared with the md5 of the part md5s. With a checksum algorithm, the
+    checksum of every part is calculated from the same buffer and sent along,
+    so s3 rejects a corrupted part, and the composite checksum of the completed
+    upload is compared as well.
+
+    Example:
+        uploader = ResumableUploader(s3.client)
+        uploader.upload("/tmp/large.iso", "bucket", "large.iso")
+
+    :param client: boto3 s3 client
+    :type client: boto3.client
+    :param transfer_config: transfer config to use, default to the config file
+    :type transfer_config: TransferConfig, optional
+    :param max_workers: number of concurrent parts, default to max_request_concurrency
+    :type max_workers: int, optional
+    :param verify: verify the upload, md5 for the ETag only or a checksum algorithm
+    :type verify: str, optional
+    """
+
+    def __init__(
+        self,
+        client,
+        transfer_config: Optional[TransferConfig] = None,
+        max_workers: int = 0,
+        verify: Optional[str] = None,
+    ) -> None:
+        """Construct the uploader instance."""
+        self.client = client
+        self.s3transferwrapper = S3TransferWrapper(transfer_config=transfer_config)
+        self.transfer_config = self.s3transferwrapper.transfer_config
+        self.max_workers: int = (
+            max_workers
+            if max_workers > 0
+            else self.transfer_config.max_request_concurrency
+        )
+        self.verify = verify
+        # the upload was verified against a md5 ETag or a checksum
+        self.verified: bool = False
+        self._checksum_args = get_checksum_args(verify)
+        self._checksums: Dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def upload(
+        self,
+        local_path: str,
+        bucket: str,
+        key: str,
+        extra_args: Optional[Dict[str, Any]] = None,
+        callback: Optional[Callable[[int], None]] = None,
+    ) -> None:
+        """Upload the file to s3, resume the previous upload if exists.
+
+        :param local_path: path of the local file
+        :type local_path: str
+        :param bucket: name of the bucket
+        :type bucket: str
+        :param key: destination key
+        :type key: str
+        :param extra_args: extra arguments for create_multipart_upload
+        :type extra_args: Dict[str, Any], optional
+        :param callback: called with the number of bytes uploaded
+        :type callback: Callable[[int], None], optional
+        :raises ChecksumMismatch: with verify, s3 received different data than the file
+        """
+        extra_args = dict(extra_args or {}, **self._checksum_args)
+        local_path = os.path.abspath(local_path)
+        stat = os.stat(local_path)
+        part_ranges = self.s3transferwrapper.get_part_ranges(stat.st_size)
+        state_path = get_state_path(local_path, bucket, key)
+        state: Dict[str, Any] = {
+            "local_path": local_path,
+            "bucket": bucket,
+            "key": key,
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "chunksize": part_ranges[0][1],
+        }
+        if self._checksum_args:
+            # parts uploaded without the checksum can't be completed with it
+            state["checksum_algorithm"] = self._checksum_args["ChecksumAlgorithm"]
+        upload_id, parts = self._load_state(state_path, state, extra_args)
+        if upload_id is None:
+            response = self.client.create_multipart_upload(
+                Bucket=bucket, Key=key, **extra_args
+            )
+            upload_id = response["UploadId"]
+            parts = {}
+            # the ETag of SSE-KMS and SSE-C encrypted parts is not a md5
+            state["md5_etag"] = not (
+                str(response.get("ServerSideEncryption", "")).startswith("aws:kms")
+                or response.get("SSECustomerAlgorithm")
+            )
+        state["upload_id"] = upload_id
+        self._save_state(state_path, state, parts)
+        if parts and callback:
+            callback(sum(part_ranges[int(number) - 1][1] for number in parts))
+
+        part_args = {
+            arg: value for arg, value in extra_args.items() if arg in UPLOAD_PART_ARGS
+        }
+        verify_etag = bool(self.verify and state.get("md5_etag"))
+        last_saved = time.time()
+        executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        futures = {
+            executor.submit(
+                self._upload_part,
+                local_path,
+                bucket,
+                key,
+                upload_id,
+                number,
+                part_ranges[number - 1],
+                part_args,
+                callback,
+                verify_etag,
+            ): number
+            for number in range(1, len(part_ranges) + 1)
+            if str(number) not in parts
+        }
+        try:
+            for future in as_completed(futures):
+                parts[str(futures[future])] = future.result()
+                if time.time() - last_saved >= STATE_INTERVAL:
+                    self._save_state(state_path, state, parts)
+                    last_saved = time.time()
+        except KeyboardInterrupt:
+            for future in futures:
+                future.cancel()
+            executor.shutdown(wait=True)
+            abort_upload(self.client, bucket, key, upload_id, state_path)
+            raise
+        except BaseException:
+            # keep the parts still in flight, skip the ones not started
+            for future in futures:
+                future.cancel()
+            executor.shutdown(wait=True)
+            for future, number in futures.items():
+                if not future.cancelled() and future.exception() is None:
+                    parts[str(number)] = future.result()
+            self._save_state(state_path, state, parts)
+            raise
+        executor.shutdown()
+
+        response = self.client.complete_multipart_upload(
+            Bucket=bucket,
+            Key=key,
+            UploadId=upload_id,
+            MultipartUpload={
+                "Parts": [
+                    self._get_part(number, parts[str(number)])
+                    for number in range(1, len(part_ranges) + 1)
+                ]
+            },
+            **{arg: value for arg, value in extra_args.items() if arg in COMPLETE_ARGS}
+        )
+        os.remove(state_path)
+        if self.verify:
+            self._verify_upload(
+                bucket, key, response, parts, len(part_ranges), verify_etag
+            )
+
+    def _get_part(self, number: int, etag: str) -> Dict[str, Any]:
+        """Get the part to list in complete_multipart_upload."""
+        part: Dict[str, Any] = {"ETag": etag, "PartNumber": number}
+        if self._checksum_args:
+            part[self._get_checksum_key()] = self._checksums[str(number)]
+        return part
+
+    def _verify_upload(
+        self,
+        bucket: str,
+        key: str,
+        response: Dict[str, Any],
+        parts: Dict[str, str],
+        count: int,
+        verify_etag: bool,
+    ) -> None:
+        """Compare the completed upload with the verified parts."""
+        uri = "s3://%s/%s" % (bucket, key)
+        if verify_etag:
+            etag = "%s-%s" % (
+                hashlib.md5(
+                    b"".join(
+                        bytes.fromhex(parts[str(number)].strip('"'))
+                        for number in range(1, count + 1)
+                    )
+                ).hexdigest(),
+                count,
+            )
+            if response.get("ETag", "").strip('"') != etag:
+                raise ChecksumMismatch(
+                    "%s doesn't match ETag %s, got %s"
+                    % (uri, response.get("ETag"), etag)
+                )
+            self.verified = True
+        checksum_key = self._get_checksum_key()
+        if self._checksum_args and response.get(checksum_key):
+            checksum = new_checksum(self.verify)
+            checksum.update(
+                b"".join(
+                    base64.b64decode(self._checksums[str(number)])
+                    for number in range(1, count + 1)
+                )
+            )
+            expected = "%s-%s" % (base64.b64encode(checksum.digest()).decode(), count)
+            if response[checksum_key] != expected:
+                raise ChecksumMismatch(
+                    "%s doesn't match %s checksum %s, got %s"
+                    % (uri, self.verify, response[checksum_key], expected)
+                )
+            self.verified = True
+
+    def _get_checksum_key(self) -> str:
+        """Get the key of the checksum in requests and responses, e.g. ChecksumSHA256."""
+        return "Checksum%s" % (self.verify or "").upper()
+
+    def _upload_part(
+        self,
+        local_path: str,
+        bucket: str,
+        key: str,
+        upload_id: str,
+        number: int,
+        part_range: Tuple[int, int],
+        part_args: Dict[str, Any],
+        callback: Optional[Callable[[int], None]],
+        verify_etag: bool = False,
+    ) -> str:
+        """Upload a single part and return the ETag of the part.
+
+        The part is streamed from its range of the file, so a part is never
+        held in memory. The md5 and the checksum are read ahead of the upload,
+        the checksum has to be sent with the request.
+        """
+        offset, length = part_range
+        md5 = hashlib.md5() if verify_etag else None
+        checksum = new_checksum(self.verify) if self._checksum_args else None
+        with ReadFileChunk.from_filename(
+            local_path, offset, length, enable_callbacks=False
+        ) as body:
+            if md5 is not None or checksum is not None:
+                while True:
+                    data = body.read(READ_SIZE)
+                    if not data:
+                        break
+                    if md5 is not None:
+                        md5.update(data)
+                    if checksum is not None:
+                        checksum.update(data)
+                body.seek(0)
+            if checksum is not None:
+                value = base64.b64encode(checksum.digest()).decode()
+                part_args = dict(part_args, **{self._get_checksum_key(): value})
+            response = self.client.upload_part(
+                Bucket=bucket,
+                Key=key,
+                UploadId=upload_id,
+                PartNumber=number,
+                Body=body,
+                **part_args
+            )
+        if md5 is not None and response["ETag"].strip('"') != md5.hexdigest():
+            raise ChecksumMismatch(
+                "part %s of s3://%s/%s doesn't match ETag %s"
+                % (number, bucket, key, response["ETag"])
+            )
+        if self._checksum_args:
+            with self._lock:
+                self._checksums[str(number)] = part_args[self._get_checksum_key()]
+        if callback:
+            callback(length)
+        return response["ETag"]
+
+    def _load_state(
+        self, state_path: str, state: Dict[str, Any], extra_args: Dict[str, Any]
+    ) -> Tuple[Optional[str], Dict[str, str]]:
+        """Get the UploadId and the parts of a previous upload of the same file.
+
+        The saved parts are verified with list_parts, parts missing in s3 or
+        with a different size are uploaded again.
+        """
+        try:
+            with open(state_path, "r") as file:
+                saved_state = json.load(file)
+        except (OSError, ValueError):
+            return None, {}
+        upload_id = saved_state.pop("upload_id", None)
+        saved_parts = saved_state.pop("parts", {})
+        md5_etag = saved_state.pop("md5_etag", True)
+        if upload_id is None or saved_state != state:
+            abort_upload(
+                self.client, state["bucket"], state["key"], upload_id, state_path
+            )
+            return None, {}
+        state["md5_etag"] = md5_etag
+
+        part_ranges = self.s3transferwrapper.get_part_ranges(state["size"])
+        parts: Dict[str, str] = {}
+        try:
+            paginator = self.client.get_paginator("list_parts")
+            for result in paginator.paginate(
+                Bucket=state["bucket"],
+                Key=state["key"],
+                UploadId=upload_id,
+                **{
+                    arg: value
+                    for arg, value in extra_args.items()
+                    if arg in UPLOAD_PART_ARGS
+                }
+            ):
+                for part in result.get("Parts", []):
+                    number = part["PartNumber"]
+                    if (
+                        saved_parts.get(str(number)) == part["ETag"]
+                        and number <= len(part_ranges)
+                        and part["Size"] == part_ranges[number - 1][1]
+                        and (
+                            not self._checksum_args
+                            or part.get(self._get_checksum_key())
+                        )
+                    ):
+                        parts[str(number)] = part["ETag"]
+                        if self._checksum_args:
+                            self._checksums[str(number)] = part[
+                                self._get_checksum_key()
+                            ]
+        except ClientError as e:
+            if e.response["Error"]["Code"] != "NoSuchUpload":
+                raise
+            os.remove(state_path)
+            return None, {}
+        return upload_id, parts
+
+    def _save_state(
+        self, state_path: str, state: Dict[str, Any], parts: Dict[str, str]
+    ) -> None:
+        """Save the UploadId and the completed parts."""
+        with self._lock:
+            with open("%s.tmp" % state_path, "w") as file:
+                json.dump(dict(state, parts=parts), file)
+            os.replace("%s.tmp" % state_path, state_path)
+
+
+def get_state_path(local_path: str, bucket: str, key: str) -> str:
+    """Get the path of the state file of uploading the file to the key.
+
+    :param local_path: path of the local file
+    :type local_path: str
+    :param bucket: name of the bucket
+    :type bucket: str
+    :param key: destination key
+    :type key: str
+    :return: path of the state file
+    :rtype: str
+    """
+    state_dir = os.path.join(get_cache_dir(), "uploads")
+    os.makedirs(state_dir, exist_ok=True)
+    name = hashlib.sha1(
+        ("%s\0%s\0%s" % (os.path.abspath(local_path), bucket, key)).encode("utf-8")
+    ).hexdigest()
+    return os.path.join(state_dir, "%s.json" % name)
+
+
+def abort_upload(
+    client, bucket: str, key: str, upload_id: Optional[str], state_path: str
+) -> None:
+    """Abort the multipart upload and remove the state file.
+
+    :param client: boto3 s3 client
+    :type client: boto3.client
+    :param bucket: name of the bucket
+    :type bucket: str
+    :param key: key of the upload
+    :type key: str
+    :param upload_id: UploadId of the multipart upload
+    :type upload_id: str, optional
+    :param state_path: path of the state file
+    :type state_path: str
+    """
+    if upload_id:
+        try:
+            client.abort_multipart_upload(Bucket=bucket, Key=key, UploadId=upload_id)
+        except ClientError as e:
+            if e.response["Error"]["Code"] != "NoSuchUpload":
+                raise
+    try:
+        os.remove(state_path)
+    except FileNotFoundError:
+        pass
+
+
+def list_saved_uploads(
+    bucket: str, prefix: str = ""
+) -> List[Tuple[str, Dict[str, Any]]]:
+    """List the saved multipart uploads to the bucket under the prefix.
+
+    :param bucket: name of the bucket
+    :type bucket: str
+    :param prefix: only list uploads with key under the prefix
+    :type prefix: str, optional
+    :return: list of state file path and the saved state
+    :rtype: List[Tuple[str, Dict[str, Any]]]
+    """
+    saved_uploads: List[Tuple[str, Dict[str, Any]]] = []
+    for state_path in sorted(
+        glob.glob(os.path.join(get_cache_dir(), "uploads", "*.json"))
+    ):
+        try:
+            with open(state_path, "r") as file:
+                state = json.load(file)
+        except (OSError, ValueError):
+            continue
+        if state.get("bucket") == bucket and state.get("key", "").startswith(prefix):
+            saved_uploads.append((state_path, state))
+    return saved_uploads
@@ -362,11 +362,8 @@ class S3Args:
         if result:
             self._extra_args["ServerSideEncryption"] = result
         if result == "aws:kms":
-            current_region = self.s3.client.get_bucket_location(
-                Bucket=self.s3.bucket_name
-            )
-            current_region = current_region.get("LocationConstraint")
-            kms = KMS(self.s3.profile, self.s3.region)
+            # kms key has to be in the same region as the bucket
+            kms = KMS(self.s3.profile, self.s3.get_bucket_region())
             kms.set_keyids(header="select encryption key to use")
             self._extra_args["SSEKMSKeyId"] = kms.keyids[0]
 
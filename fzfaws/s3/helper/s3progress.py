@@ -2,7 +2,12 @@
 import os
 import sys
 import threading
-from typing import Optional
+import time
+from typing import List, Optional
+
+# seconds between each repaint of S3TransferProgress
+REFRESH_INTERVAL = 0.1
+LOG_INTERVAL = 10
 
 
 class S3Progress(object):
@@ -30,17 +35,28 @@ class S3Progress(object):
     :type client: boto3.client
     :param version_id: specify version id if download/copy is a version
     :type version_id: str
+    :param size: size of the object if already known (e.g. from the listing),
+        head_object is only called for download/copy when not provided
+    :type size: float, optional
     """
 
     def __init__(
-        self, filename: str, bucket: str = None, client=None, version_id: str = None,
+        self,
+        filename: str,
+        bucket: str = None,
+        client=None,
+        version_id: str = None,
+        size: float = None,
     ) -> None:
         """Construct the progress bar instance."""
         self._filename: str = filename
         self._seen_so_far: float = 0
+        self._last_draw: float = 0
         self._lock = threading.Lock()
         self._size: float = 0
-        if bucket and client:
+        if size is not None:
+            self._size = size
+        elif bucket and client:
             if not version_id:
                 self._size = client.head_object(Bucket=bucket, Key=filename).get(
                     "ContentLength"
@@ -55,10 +71,18 @@ class S3Progress(object):
     def __call__(self, bytes_amount: float) -> None:
         """Create the bar.
 
-        Locking the thread to a single file.
+        Locking the thread to a single file, the bar is repainted at most
+        every REFRESH_INTERVAL seconds rather than on every chunk.
         """
         with self._lock:
             self._seen_so_far += bytes_amount
+            now = time.time()
+            if (
+                now - self._last_draw < REFRESH_INTERVAL
+                and self._seen_so_far < self._size
+            ):
+                return
+            self._last_draw = now
             if self._size == 0:
                 percentage = 100
             else:
@@ -83,16 +107,220 @@ class S3Progress(object):
 
         Convert an size in bytes into a human readable format.
         """
-        HUMANIZE_SUFFIXES = ("KiB", "MiB", "GiB", "TiB", "PiB", "EiB")
-        base = 1024
-        bytes_int = float(value)
-
-        if bytes_int == 1:
-            return "1 Byte"
-        elif bytes_int < base:
-            return "%d Bytes" % bytes_int
-
-        for i, suffix in enumerate(HUMANIZE_SUFFIXES):
-            unit = base ** (i + 2)
-            if round((bytes_int / unit) * base) < base:
-                return "%.1f %s" % ((base * bytes_int / unit), suffix)
+        return human_readable_size(value)
+
+
+class S3TransferProgress(object):
+    """The aggregated progress of many concurrent s3 transfers.
+
+    Transfers only add to the counters, a single renderer thread repaints
+    a compact summary of completed files, transferred bytes, throughput
+    and ETA at a fixed rate, so concurrent transfers don't contend on
+    stdout and the output doesn't interleave. When stdout is not a tty,
+    the summary is printed as a log line periodically instead.
+
+    Example:
+        progress = S3TransferProgress(total_files=2, total_bytes=2048)
+        with progress:
+            transfer(callback=progress.update)
+            progress.done("upload: a.txt to s3://bucket/a.txt")
+
+    :param total_files: number of files to transfer
+    :type total_files: int, optional
+    :param total_bytes: total bytes of all files
+    :type total_bytes: float, optional
+    :param interval: seconds between each repaint, default to 0.1 for tty and 10 for log lines
+    :type interval: float, optional
+    """
+
+    def __init__(
+        self, total_files: int = 0, total_bytes: float = 0, interval: float = None
+    ) -> None:
+        """Construct the aggregated progress instance."""
+        self.total_files: int = total_files
+        self.total_bytes: float = total_bytes
+        self.files_done: int = 0
+        self.bytes_done: float = 0
+        self.start_time: float = time.time()
+        self.interval: Optional[float] = interval
+        self._messages: List[str] = []
+        self._lines: int = 0
+        self._lock = threading.Lock()
+        self._stopevent = threading.Event()
+        self._renderer: Optional[threading.Thread] = None
+
+    def __enter__(self) -> "S3TransferProgress":
+        """Start the renderer thread."""
+        self.start()
+        return self
+
+    def __exit__(self, *args) -> None:
+        """Stop the renderer thread."""
+        self.stop()
+
+    def add(self, size: float) -> None:
+        """Add a file to the total.
+
+        :param size: size of the file in bytes
+        :type size: float
+        """
+        with self._lock:
+            self.total_files += 1
+            self.total_bytes += size
+
+    def update(self, bytes_amount: float) -> None:
+        """Add transferred bytes, the summary is repainted by the renderer."""
+        with self._lock:
+            self.bytes_done += bytes_amount
+
+    def done(self, message: str = "") -> None:
+        """Mark a file as completed.
+
+        :param message: message to print above the summary, e.g. upload: file to s3://bucket/key
+        :type message: str, optional
+        """
+        with self._lock:
+            self.files_done += 1
+            if message:
+                self._messages.append(message)
+
+    def start(self) -> None:
+        """Start repainting the summary in a background thread."""
+        if self.interval is None:
+            self.interval = REFRESH_INTERVAL if sys.stdout.isatty() else LOG_INTERVAL
+        self.start_time = time.time()
+        self._stopevent.clear()
+        self._renderer = threading.Thread(target=self._render_loop, daemon=True)
+        self._renderer.start()
+
+    def stop(self) -> None:
+        """Stop the renderer, flush pending messages and remove the summary."""
+        self._stopevent.set()
+        if self._renderer is not None:
+            self._renderer.join()
+            self._renderer = None
+        self.render(final=True)
+
+    def throughput(self) -> float:
+        """Get the aggregate transfer rate since the progress is created.
+
+        :return: bytes per second
+        :rtype: float
+        """
+        elapsed = time.time() - self.start_time
+        if elapsed <= 0:
+            return 0
+        return self.bytes_done / elapsed
+
+    def eta(self) -> Optional[float]:
+        """Get the estimated seconds until all bytes are transferred.
+
+        :return: seconds remaining, None when unknown
+        :rtype: Optional[float]
+        """
+        rate = self.throughput()
+        if not rate or not self.total_bytes:
+            return None
+        return max(self.total_bytes - self.bytes_done, 0) / rate
+
+    def summary(self, operation: str) -> str:
+        """Get the summary line of all completed transfers.
+
+        :param operation: name of the operation, e.g. upload
+        :type operation: str
+        :return: e.g. upload: 3 files (1.0 MiB) in 2.00s, 512.0 KiB/s
+        :rtype: str
+        """
+        return "%s: %s files (%s) in %.2fs, %s/s" % (
+            operation,
+            self.files_done,
+            human_readable_size(self.bytes_done),
+            time.time() - self.start_time,
+            human_readable_size(self.throughput()),
+        )
+
+    def render(self, final: bool = False) -> None:
+        """Print pending messages and repaint the summary.
+
+        On a tty, the previous summary is erased and repainted below the new
+        messages. Otherwise the summary is printed as a log line.
+
+        :param final: remove the summary instead of repainting it
+        :type final: bool, optional
+        """
+        with self._lock:
+            messages, self._messages = self._messages, []
+        lines = self._summary_lines()
+        output: List[str] = []
+        if sys.stdout.isatty():
+            if self._lines:
+                # move to the first line of the previous summary and erase it
+                output.append("\r")
+                if self._lines > 1:
+                    output.append("\033[%dA" % (self._lines - 1))
+                output.append("\033[J")
+            output.extend("%s\n" % message for message in messages)
+            if not final:
+                output.append("\n".join(lines))
+                self._lines = len(lines)
+            else:
+                self._lines = 0
+        else:
+            output.extend("%s\n" % message for message in messages)
+            if not final:
+                output.append("%s\n" % "  ".join(lines))
+        if output:
+            sys.stdout.write("".join(output))
+            sys.stdout.flush()
+
+    def _render_loop(self) -> None:
+        """Repaint the summary at a fixed rate until stopped."""
+        while not self._stopevent.wait(self.interval):
+            self.render()
+
+    def _summary_lines(self) -> List[str]:
+        """Format the summary lines."""
+        if self.total_bytes == 0:
+            percentage = 100.0
+        else:
+            percentage = (self.bytes_done / self.total_bytes) * 100
+        eta = self.eta()
+        return [
+            "Completed %s/%s files  %s / %s  (%.2f%%)"
+            % (
+                self.files_done,
+                self.total_files,
+                human_readable_size(self.bytes_done),
+                human_readable_size(self.total_bytes),
+                percentage,
+            ),
+            "%s/s  ETA %s"
+            % (
+                human_readable_size(self.throughput()),
+                "%d:%02d:%02d" % (eta // 3600, eta % 3600 // 60, eta % 60)
+                if eta is not None
+                else "--:--:--",
+            ),
+        ]
+
+
+def human_readable_size(value: float) -> Optional[str]:
+    """Convert bytes to some human readable size.
+
+    Copied from awscli, try to provide the same experience.
+
+    Convert an size in bytes into a human readable format.
+    """
+    HUMANIZE_SUFFIXES = ("KiB", "MiB", "GiB", "TiB", "PiB", "EiB")
+    base = 1024
+    bytes_int = float(value)
+
+    if bytes_int == 1:
+        return "1 Byte"
+    elif bytes_int < base:
+        return "%d Bytes" % bytes_int
+
+    for i, suffix in enumerate(HUMANIZE_SUFFIXES):
+        unit = base ** (i + 2)
+        if round((bytes_int / unit) * base) < base:
+            return "%.1f %s" % ((base * bytes_int / unit), suffix)
@@ -0,0 +1,689 @@
+"""Module contains the scheduler for transferring many files concurrently."""
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple, Union
+
+from s3transfer.manager import TransferManager
+from s3transfer.subscribers import BaseSubscriber
+from s3transfer.utils import random_file_extension
+
+from fzfaws.s3.helper.concurrency import ConcurrencyController, is_throttled, spread
+from fzfaws.s3.helper.integrity import (
+    HashingReader,
+    HashingWriter,
+    IntegrityHasher,
+    ObjectIntegrity,
+    check_integrity,
+    get_checksum_args,
+    get_object_integrity,
+    get_part_size,
+)
+from fzfaws.s3.helper.journal import Journal, journal_id
+from fzfaws.s3.helper.object_cache import ObjectCache
+from fzfaws.s3.helper.ranged_download import (
+    RANGED_DOWNLOAD_THRESHOLD,
+    RangedDownloader,
+)
+from fzfaws.s3.helper.resumable_upload import (
+    RESUMABLE_UPLOAD_THRESHOLD,
+    ResumableUploader,
+)
+from fzfaws.s3.helper.s3progress import S3TransferProgress
+from fzfaws.s3.helper.s3transferwrapper import S3TransferWrapper
+from fzfaws.s3.helper.throughput import get_estimator
+
+
+class S3TransferScheduler:
+    """Schedule many transfers on one shared TransferManager.
+
+    Instead of creating a S3Transfer and waiting for every single file, all
+    files are submitted to one TransferManager while keeping at most
+    `concurrency` files in flight, so small files don't pay the full request
+    latency one after another. Bigger files are submitted first so that a big
+    file started at the end doesn't become the tail of the whole operation.
+
+    Downloads are written to a temporary file next to the destination and
+    renamed when completed (handled by s3transfer), so a failed or interrupted
+    download never leaves a partial file at the destination. Objects above
+    RANGED_DOWNLOAD_THRESHOLD are downloaded through RangedDownloader after the
+    smaller objects, which can resume an interrupted download. Files above
+    RESUMABLE_UPLOAD_THRESHOLD are uploaded through ResumableUploader in the
+    same way.
+
+    The files in flight per prefix are adapted through a ConcurrencyController
+    when s3 throttles the requests, and the files of different prefixes are
+    interleaved so that a throttled prefix doesn't hold back the others.
+
+    The throughput of every run is recorded in the shared ThroughputEstimator,
+    which the auto tuned transfer config of the next transfers is based on.
+    Files going through ResumableUploader or RangedDownloader get a transfer
+    config tuned for their own size.
+
+    With verify, the ETag (and the checksum of the algorithm) of every file is
+    calculated from the buffers s3transfer reads or writes, through a
+    HashingReader or HashingWriter, and compared with the object after the
+    transfer, so the file is not read a second time. A mismatch fails the
+    transfer and a download is never renamed to its destination. The
+    head_object reading the ETag and checksum of a download runs in a worker
+    thread, so the objects in flight request them concurrently.
+
+    With an object_cache, objects not changed since they were cached are
+    copied from the cache instead of downloaded, and downloaded objects are
+    added to the cache by a pool of cache workers. Objects with the etag and
+    size from the listing are found in the cache without a request. Otherwise the head_object checking the
+    cache runs in a worker thread and also provides the size and etag of
+    the download, so a miss costs no extra request.
+
+    Example:
+        scheduler = S3TransferScheduler(s3.client)
+        scheduler.upload(
+            [{"local_path": "/tmp/a.txt", "bucket": "bucket", "key": "a.txt"}]
+        )
+
+    :param client: boto3 s3 client
+    :type client: boto3.client
+    :param concurrency: number of files in flight, default to the concurrency in config file
+    :type concurrency: int, optional
+    :param journal: record the transferred files by key and version
+    :type journal: Journal, optional
+    :param controller: controller of the files in flight, could be shared with other engines
+    :type controller: ConcurrencyController, optional
+    :param verify: verify the transfers, md5 for the ETag only or a checksum algorithm
+        (sha256, crc32, crc32c) verified besides the ETag
+    :type verify: str, optional
+    :param object_cache: serve and cache the downloads through the local object cache
+    :type object_cache: ObjectCache, optional
+    """
+
+    def __init__(
+        self,
+        client,
+        concurrency: int = 0,
+        journal: Optional[Journal] = None,
+        controller: Optional[ConcurrencyController] = None,
+        verify: Optional[str] = None,
+        object_cache: Optional[ObjectCache] = None,
+    ) -> None:
+        """Construct the scheduler instance."""
+        self.s3transferwrapper = S3TransferWrapper()
+        self.concurrency: int = (
+            concurrency if concurrency > 0 else self.s3transferwrapper.concurrency
+        )
+        self.transfer_config = self.s3transferwrapper.transfer_config
+        # make sure there are enough threads to keep all files in flight
+        self.transfer_config.max_request_concurrency = max(
+            self.transfer_config.max_request_concurrency, self.concurrency
+        )
+        self.client = client
+        self.progress = S3TransferProgress()
+        self.journal = journal
+        self.failures: List[Tuple[Dict[str, Any], Exception]] = []
+        self.controller = (
+            controller
+            if controller is not None
+            else ConcurrencyController(self.concurrency)
+        )
+        self.verify = verify
+        self.unverified: List[Dict[str, Any]] = []
+        self.object_cache = object_cache
+        # bytes copied from the object cache, not part of the throughput
+        self.cached_bytes: int = 0
+        self._cache_executor: Optional[ThreadPoolExecutor] = None
+        self._created_dirs: Set[str] = set()
+
+    def upload(
+        self,
+        upload_list: Iterable[Dict[str, Any]],
+        extra_args: Optional[Dict[str, Any]] = None,
+    ) -> None:
+        """Upload all files in the list.
+
+        A list is sorted so that bigger files are uploaded first. Other iterables
+        (e.g. the files recursive_upload reads back from its dryrun spool) are
+        consumed lazily in their own order, set the totals of self.progress
+        beforehand if known.
+        Files above RESUMABLE_UPLOAD_THRESHOLD are uploaded one at a time
+        through ResumableUploader.
+
+        :param upload_list: files to upload, each item requires local_path, bucket, key,
+            and optionally relative (path to display) and size
+        :type upload_list: Iterable[Dict[str, Any]]
+        :param extra_args: extra arguments for all uploads
+        :type extra_args: Dict[str, Any], optional
+        :raises Exception: the first failed transfer is re-raised after all transfers finished
+        """
+        if isinstance(upload_list, list):
+            for item in upload_list:
+                if item.get("size") is None:
+                    item["size"] = os.path.getsize(item["local_path"])
+                self.progress.add(item["size"])
+            upload_list = sorted(
+                upload_list, key=lambda item: item["size"], reverse=True
+            )
+
+        resumable_list: List[Dict[str, Any]] = []
+        with self.progress:
+            start = self._start()
+            with TransferManager(self.client, config=self.transfer_config) as manager:
+                for item in spread(upload_list, lambda item: item["key"]):
+                    size = item.get("size") or 0
+                    if size >= RESUMABLE_UPLOAD_THRESHOLD:
+                        resumable_list.append(item)
+                        continue
+                    self.controller.acquire(item["key"])
+                    self._submit_upload(manager, item, extra_args)
+            self._record_throughput(start)
+            for item in resumable_list:
+                start = self._start()
+                try:
+                    uploader = ResumableUploader(
+                        self.client,
+                        transfer_config=self.s3transferwrapper.get_transfer_config(
+                            item["size"]
+                        ),
+                        verify=self.verify,
+                    )
+                    uploader.upload(
+                        item["local_path"],
+                        item["bucket"],
+                        item["key"],
+                        extra_args=extra_args,
+                        callback=self.progress.update,
+                    )
+                    if self.verify and not uploader.verified:
+                        self.unverified.append(item)
+                    self._record(item)
+                    self._record_throughput(start)
+                    self.progress.done(self._get_upload_message(item))
+                except Exception as e:
+                    self.failures.append((item, e))
+                    self.progress.done()
+        get_estimator().save()
+        print(self.progress.summary("upload"))
+        self._print_unverified()
+        self._raise_failures("upload")
+
+    def download(
+        self,
+        download_list: Iterable[Dict[str, Any]],
+        extra_args: Optional[Dict[str, Any]] = None,
+    ) -> None:
+        """Download all objects in the list.
+
+        A list is sorted so that bigger objects are downloaded first when the
+        size is known. Other iterables (e.g. the pending objects of a Journal)
+        are consumed lazily in their own order.
+
+        When the size (and etag) of an object is provided, it's passed to the
+        TransferManager so that s3transfer doesn't need to call head_object
+        before downloading. Objects with a known size above
+        RANGED_DOWNLOAD_THRESHOLD are downloaded one at a time through
+        RangedDownloader.
+
+        :param download_list: objects to download, each item requires bucket, key, local_path,
+            and optionally version_id, size and etag
+        :type download_list: Iterable[Dict[str, Any]]
+        :param extra_args: extra arguments for all downloads
+        :type extra_args: Dict[str, Any], optional
+        :raises Exception: the first failed transfer is re-raised after all transfers finished
+        """
+        if isinstance(download_list, list):
+            for item in download_list:
+                self.progress.add(item.get("size") or 0)
+            download_list = sorted(
+                download_list, key=lambda item: item.get("size") or 0, reverse=True
+            )
+
+        ranged_list: List[Dict[str, Any]] = []
+        # downloads are copied into the object cache by a pool of their own, so
+        # the s3transfer thread completing a download isn't held up by the copy
+        with self.progress, ThreadPoolExecutor(
+            max_workers=self.concurrency
+        ) as cache_executor:
+            self._cache_executor = cache_executor
+            start = self._start()
+            # the workers are joined before the manager waits for the downloads
+            with TransferManager(
+                self.client, config=self.transfer_config
+            ) as manager, ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+                for item in spread(download_list, lambda item: item["key"]):
+                    self._makedirs(os.path.dirname(item["local_path"]))
+                    if (
+                        self.object_cache is not None
+                        and self._is_listed(item)
+                        and self._download_cached(item, extra_args)
+                    ):
+                        continue
+                    if self._is_ranged(item):
+                        ranged_list.append(item)
+                        continue
+                    self.controller.acquire(item["key"])
+                    if self.verify or (
+                        self.object_cache is not None and not self._is_listed(item)
+                    ):
+                        executor.submit(
+                            self._prepare_download,
+                            manager,
+                            item,
+                            extra_args,
+                            ranged_list,
+                        )
+                    else:
+                        self._submit_download(manager, item, extra_args)
+            self._record_throughput(start)
+            for item in ranged_list:
+                if (
+                    self.object_cache is not None
+                    and not self._is_listed(item)
+                    and self._download_cached(item, extra_args)
+                ):
+                    continue
+                start = self._start()
+                try:
+                    downloader = RangedDownloader(
+                        self.client,
+                        transfer_config=self.s3transferwrapper.get_transfer_config(
+                            item["size"]
+                        ),
+                        verify=self.verify,
+                    )
+                    downloader.download(
+                        item["bucket"],
+                        item["key"],
+                        item["local_path"],
+                        extra_args=self._get_download_args(item, extra_args),
+                        callback=self.progress.update,
+                    )
+                    if self.verify and not downloader.verified:
+                        self.unverified.append(item)
+                    self._record(item)
+                    self._cache(item)
+                    self._record_throughput(start)
+                    self.progress.done(self._get_download_message(item))
+                except Exception as e:
+                    self.failures.append((item, e))
+                    self.progress.done()
+        get_estimator().save()
+        print(self.progress.summary("download"))
+        self._print_unverified()
+        self._raise_failures("download")
+
+    def _submit_upload(
+        self,
+        manager: TransferManager,
+        item: Dict[str, Any],
+        extra_args: Optional[Dict[str, Any]],
+    ) -> None:
+        """Submit the upload, read the file through a HashingReader with verify."""
+        if not self.verify:
+            manager.upload(
+                item["local_path"],
+                item["bucket"],
+                item["key"],
+                extra_args=extra_args,
+                subscribers=[
+                    _TransferSubscriber(self, item, self._get_upload_message(item))
+                ],
+            )
+            return
+        if item.get("size") is None:
+            item["size"] = os.path.getsize(item["local_path"])
+        hasher = IntegrityHasher(
+            item["size"],
+            get_part_size(item["size"], self.transfer_config),
+            self.verify,
+        )
+        fileobj = HashingReader(open(item["local_path"], "rb"), hasher)
+        manager.upload(
+            fileobj,
+            item["bucket"],
+            item["key"],
+            extra_args=dict(extra_args or {}, **get_checksum_args(self.verify)),
+            subscribers=[
+                _TransferSubscriber(
+                    self,
+                    item,
+                    self._get_upload_message(item),
+                    fileobj=fileobj,
+                    verify=lambda: self._verify_upload(item, hasher, extra_args),
+                )
+            ],
+        )
+
+    def _verify_upload(
+        self,
+        item: Dict[str, Any],
+        hasher: IntegrityHasher,
+        extra_args: Optional[Dict[str, Any]],
+    ) -> None:
+        """Compare the hashed file with the uploaded object."""
+        integrity = get_object_integrity(
+            self.client,
+            item["bucket"],
+            item["key"],
+            self.verify,
+            find_part_size=False,
+            **{
+                arg: value
+                for arg, value in (extra_args or {}).items()
+                if arg.startswith("SSECustomer") or arg == "RequestPayer"
+            }
+        )
+        if not check_integrity(
+            hasher, integrity, "s3://%s/%s" % (item["bucket"], item["key"])
+        ):
+            self.unverified.append(item)
+
+    def _prepare_download(
+        self,
+        manager: TransferManager,
+        item: Dict[str, Any],
+        extra_args: Optional[Dict[str, Any]],
+        ranged_list: List[Dict[str, Any]],
+    ) -> None:
+        """Check the cache, read the integrity and submit the download, in a worker.
+
+        The cache lookup and get_object_integrity need a head_object (two for
+        a multipart object), the round trips of the objects in flight run
+        concurrently instead of one after another in the submit loop. An
+        object found above RANGED_DOWNLOAD_THRESHOLD by the lookup is left
+        for RangedDownloader in ranged_list.
+        """
+        try:
+            if self.object_cache is not None and not self._is_listed(item):
+                if self._download_cached(item, extra_args):
+                    self.controller.release(item["key"])
+                    return
+                if self._is_ranged(item):
+                    ranged_list.append(item)
+                    self.controller.release(item["key"], False)
+                    return
+            self._submit_download(manager, item, extra_args)
+        except Exception as e:
+            self.failures.append((item, e))
+            self.progress.done()
+            self.controller.release(item["key"], False)
+
+    def _submit_download(
+        self,
+        manager: TransferManager,
+        item: Dict[str, Any],
+        extra_args: Optional[Dict[str, Any]],
+    ) -> None:
+        """Submit the download, write the file through a HashingWriter with verify."""
+        download_args = self._get_download_args(item, extra_args)
+        integrity: Optional[ObjectIntegrity] = None
+        if self.verify:
+            integrity = get_object_integrity(
+                self.client, item["bucket"], item["key"], self.verify, **download_args
+            )
+            item["size"] = integrity.size
+            if integrity.etag is not None:
+                # s3transfer calls head_object again without the etag
+                item["etag"] = '"%s"' % integrity.etag
+            if integrity.etag is None and integrity.checksum is None:
+                self.unverified.append(item)
+                integrity = None
+        if integrity is None:
+            manager.download(
+                item["bucket"],
+                item["key"],
+                item["local_path"],
+                extra_args=download_args,
+                subscribers=[
+                    _TransferSubscriber(
+                        self, item, self._get_download_message(item), cache=True
+                    )
+                ],
+            )
+            return
+
+        hasher = IntegrityHasher(integrity.size, integrity.part_size, self.verify)
+        # s3transfer only writes to a temporary file when given a file name
+        temp_path = "%s.%s" % (item["local_path"], random_file_extension())
+        fileobj = HashingWriter(open(temp_path, "wb"), hasher)
+        manager.download(
+            item["bucket"],
+            item["key"],
+            fileobj,
+            extra_args=download_args,
+            subscribers=[
+                _TransferSubscriber(
+                    self,
+                    item,
+                    self._get_download_message(item),
+                    fileobj=fileobj,
+                    verify=lambda: self._verify_download(
+                        item, hasher, integrity, temp_path
+                    ),
+                    cleanup=lambda: _remove(temp_path),
+                    cache=True,
+                )
+            ],
+        )
+
+    def _verify_download(
+        self,
+        item: Dict[str, Any],
+        hasher: IntegrityHasher,
+        integrity: ObjectIntegrity,
+        temp_path: str,
+    ) -> None:
+        """Compare the hashed file with the object and move it to the destination."""
+        if not check_integrity(
+            hasher, integrity, "s3://%s/%s" % (item["bucket"], item["key"])
+        ):
+            self.unverified.append(item)
+        os.replace(temp_path, item["local_path"])
+
+    def _download_cached(
+        self, item: Dict[str, Any], extra_args: Optional[Dict[str, Any]]
+    ) -> bool:
+        """Copy the item from the object cache, False when it needs to be downloaded.
+
+        The etag and size from the listing are looked up without a request,
+        otherwise a head_object checks the cached object and provides its etag
+        and size.
+        """
+        try:
+            if self._is_listed(item):
+                path = self.object_cache.lookup_etag(
+                    item["bucket"],
+                    item["key"],
+                    item.get("version_id"),
+                    item["etag"],
+                    item["size"],
+                )
+            else:
+                path, etag, size = self.object_cache.lookup(
+                    self.client,
+                    item["bucket"],
+                    item["key"],
+                    item.get("version_id"),
+                    **{
+                        arg: value
+                        for arg, value in (extra_args or {}).items()
+                        if arg.startswith("SSECustomer") or arg == "RequestPayer"
+                    }
+                )
+                if etag is not None:
+                    item["etag"] = '"%s"' % etag
+                    item["size"] = size
+            if path is None:
+                return False
+            self.object_cache.link(path, item["local_path"])
+            if item.get("size") is None:
+                item["size"] = os.path.getsize(item["local_path"])
+        except Exception as e:
+            self.failures.append((item, e))
+            self.progress.done()
+            return True
+        self.cached_bytes += item["size"]
+        self.progress.update(item["size"])
+        self._record(item)
+        self.progress.done("%s (cached)" % self._get_download_message(item))
+        return True
+
+    def _is_listed(self, item: Dict[str, Any]) -> bool:
+        """Check if the etag and size of the item are known from the listing."""
+        return bool(item.get("etag")) and item.get("size") is not None
+
+    def _is_ranged(self, item: Dict[str, Any]) -> bool:
+        """Check if the item is downloaded through RangedDownloader."""
+        return (item.get("size") or 0) >= RANGED_DOWNLOAD_THRESHOLD and hasattr(
+            os, "pwrite"
+        )
+
+    def _cache(self, item: Dict[str, Any]) -> None:
+        """Add the downloaded item to the object cache, in a worker of the cache pool."""
+        if self.object_cache is not None and item.get("etag"):
+            self._cache_executor.submit(
+                self.object_cache.add,
+                item["bucket"],
+                item["key"],
+                item.get("version_id"),
+                item["etag"],
+                item["local_path"],
+            )
+
+    def _print_unverified(self) -> None:
+        """Print the number of transfers without a md5 ETag or checksum to verify."""
+        if self.unverified:
+            print(
+                "verify: skipped %s objects without a md5 ETag or %s checksum, "
+                "e.g. encrypted with SSE-KMS or SSE-C"
+                % (len(self.unverified), self.verify)
+            )
+
+    def _get_upload_message(self, item: Dict[str, Any]) -> str:
+        """Get the message to display when the item is uploaded."""
+        return "upload: %s to s3://%s/%s" % (
+            item.get("relative", item["local_path"]),
+            item["bucket"],
+            item["key"],
+        )
+
+    def _get_download_args(
+        self, item: Dict[str, Any], extra_args: Optional[Dict[str, Any]]
+    ) -> Dict[str, Any]:
+        """Add the version of the item to the extra arguments."""
+        item_args = dict(extra_args or {})
+        if item.get("version_id"):
+            item_args["VersionId"] = item["version_id"]
+        return item_args
+
+    def _get_download_message(self, item: Dict[str, Any]) -> str:
+        """Get the message to display when the item is downloaded."""
+        return "download: s3://%s/%s to %s%s" % (
+            item["bucket"],
+            item["key"],
+            item["local_path"],
+            " with version %s" % item["version_id"] if item.get("version_id") else "",
+        )
+
+    def _start(self) -> Tuple[float, float]:
+        """Get the time and bytes done at the start of a transfer."""
+        return time.time(), self.progress.bytes_done - self.cached_bytes
+
+    def _record_throughput(self, start: Tuple[float, float]) -> None:
+        """Record the bytes transferred since the start in the estimator."""
+        get_estimator().record(
+            self.progress.bytes_done - self.cached_bytes - start[1],
+            time.time() - start[0],
+        )
+
+    def _record(self, item: Dict[str, Any]) -> None:
+        """Record the transferred item in the journal."""
+        if self.journal is not None:
+            self.journal.record(journal_id(item["key"], item.get("version_id")))
+
+    def _makedirs(self, directory: str) -> None:
+        """Create the directory once for all files under it."""
+        if not directory or directory in self._created_dirs:
+            return
+        os.makedirs(directory, exist_ok=True)
+        self._created_dirs.add(directory)
+
+    def _raise_failures(self, operation: str) -> None:
+        """Print all failed transfers and raise the first error."""
+        if not self.failures:
+            return
+        for item, error in self.failures:
+            print(
+                "%s failed: s3://%s/%s %s"
+                % (operation, item["bucket"], item["key"], error)
+            )
+        raise self.failures[0][1]
+
+
+class _TransferSubscriber(BaseSubscriber):
+    """Report progress of a single transfer to the scheduler.
+
+    The fileobj of a verified transfer is closed when the transfer is done,
+    then verify is called, cleanup is called when the transfer failed. A
+    download with cache is added to the object cache of the scheduler.
+    """
+
+    def __init__(
+        self,
+        scheduler: S3TransferScheduler,
+        item: Dict[str, Any],
+        message: str,
+        fileobj: Optional[Union[HashingReader, HashingWriter]] = None,
+        verify: Optional[Callable[[], None]] = None,
+        cleanup: Optional[Callable[[], None]] = None,
+        cache: bool = False,
+    ) -> None:
+        self._scheduler = scheduler
+        self._item = item
+        self._message = message
+        self._fileobj = fileobj
+        self._verify = verify
+        self._cleanup = cleanup
+        self._cache = cache
+
+    def on_queued(self, future, **kwargs) -> None:
+        if self._item.get("size") is not None:
+            future.meta.provide_transfer_size(self._item["size"])
+        # newer s3transfer also requires the etag to skip head_object, older
+        # s3transfer only takes the size and doesn't check the etag, so the
+        # size must come from a live listing or head_object
+        if self._item.get("etag") and hasattr(future.meta, "provide_object_etag"):
+            future.meta.provide_object_etag(self._item["etag"])
+
+    def on_progress(self, future, bytes_transferred: int, **kwargs) -> None:
+        self._scheduler.progress.update(bytes_transferred)
+
+    def on_done(self, future, **kwargs) -> None:
+        succeeded = False
+        try:
+            try:
+                future.result()
+            finally:
+                if self._fileobj is not None:
+                    self._fileobj.close()
+            if self._verify is not None:
+                self._verify()
+            self._scheduler._record(self._item)
+            if self._cache:
+                self._scheduler._cache(self._item)
+            self._scheduler.progress.done(self._message)
+            succeeded = True
+        except Exception as e:
+            if is_throttled(e):
+                self._scheduler.controller.throttled(self._item["key"])
+            if self._cleanup is not None:
+                self._cleanup()
+            self._scheduler.failures.append((self._item, e))
+            self._scheduler.progress.done()
+        finally:
+            self._scheduler.controller.release(self._item["key"], succeeded)
+
+
+def _remove(path: str) -> None:
+    """Remove the file if exists."""
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
@@ -1,23 +1,154 @@
 """Module contains the s3 transfer wrapper."""
+import copy
 import json
+import math
 import os
+from typing import Any, Dict, List, Optional, Tuple
 
 from boto3.s3.transfer import S3Transfer, TransferConfig
+from s3transfer.utils import ChunksizeAdjuster
+
+from fzfaws.s3.helper.throughput import get_estimator
+
+# max part size of s3 multipart upload
+MAX_CHUNKSIZE = 5 * 1024 * 1024 * 1024
+
+# min part size of s3 multipart upload, except the last part
+MIN_CHUNKSIZE = 5 * 1024 * 1024
+
+# auto tune: smallest chunk size, also the multipart threshold
+AUTO_CHUNKSIZE = 8 * 1024 * 1024
+
+# auto tune: the chunk size doubles until an object has at most this number of parts
+AUTO_TARGET_PARTS = 1000
+
+# auto tune: seconds a part should take at the estimated throughput
+AUTO_PART_SECONDS = 2
+
+# auto tune: bounds of the number of parts in flight
+AUTO_MIN_CONCURRENCY = 4
+AUTO_MAX_CONCURRENCY = 32
+
+# auto tune: seconds of the estimated throughput in each io chunk, and its bounds
+AUTO_IO_SECONDS = 0.01
+AUTO_MIN_IO_CHUNKSIZE = 256 * 1024
+AUTO_MAX_IO_CHUNKSIZE = 4 * 1024 * 1024
 
 
 class S3TransferWrapper:
     """A s3 transfer wrapper class to handle transfer config.
 
     Used to handle create a s3transfer instance with user
-    defined transfer configuration.
+    defined transfer configuration and number of files/objects
+    to transfer concurrently.
+
+    With auto_tune enabled in the config file, the settings not defined by
+    the user are tuned per transfer through get_transfer_config. The chunk
+    size only depends on the size of the object, so the ETag of a file stays
+    the same across runs, while the number of parts in flight and the io
+    chunk size follow the throughput estimated by previous transfers.
+    Multi file transfers share one transfer manager using the untuned
+    get_transfer_config(None), only their resumable uploads and ranged
+    downloads (RESUMABLE_UPLOAD_THRESHOLD and RANGED_DOWNLOAD_THRESHOLD) get a
+    config tuned for their size.
 
     :param client: s3 client
     :type client: boto3.client
+    :param transfer_config: transfer config to use instead of the config file
+    :type transfer_config: TransferConfig, optional
     """
 
-    def __init__(self, client=None):
+    def __init__(self, client=None, transfer_config: Optional[TransferConfig] = None):
         """Construct wrapper instance."""
-        raw_transfer_config = json.loads(os.getenv("FZFAWS_S3_TRANSFER", "{}"))
-        self.transfer_config = TransferConfig(**raw_transfer_config)
+        self.auto_tune: bool = False
+        self._user_settings: Dict[str, Any] = {}
+        if transfer_config is None:
+            self._user_settings = json.loads(os.getenv("FZFAWS_S3_TRANSFER", "{}"))
+            if "multipart_chunksize" in self._user_settings:
+                # sizes are bytes, s3transfer raises a chunk size below the s3
+                # minimum (e.g. 8 in the default config file) to MIN_CHUNKSIZE
+                self._user_settings["multipart_chunksize"] = max(
+                    int(self._user_settings["multipart_chunksize"]), MIN_CHUNKSIZE
+                )
+            # an explicit transfer config is used as is
+            self.auto_tune = os.getenv("FZFAWS_S3_AUTO_TUNE") == "true"
+            transfer_config = TransferConfig(**self._user_settings)
+        self._base_config = transfer_config
+        self.transfer_config = self.get_transfer_config()
+        self.concurrency: int = int(os.getenv("FZFAWS_S3_CONCURRENCY", "10"))
         if client:
             self.s3transfer = S3Transfer(client, config=self.transfer_config)
+
+    def get_transfer_config(self, size: Optional[int] = None) -> TransferConfig:
+        """Get the transfer config to transfer an object of the size.
+
+        Without auto tune, the config from the config file is returned. With
+        auto tune, the chunk size is the smallest power of two multiple of
+        AUTO_CHUNKSIZE splitting the object into at most AUTO_TARGET_PARTS
+        parts, far below the 10,000 parts s3 accepts. The number of
+        parts in flight is the estimated throughput times AUTO_PART_SECONDS
+        divided by the chunk size (the bytes in flight to keep each part
+        within AUTO_PART_SECONDS), and never more than the number of parts.
+        The settings defined in the config file always win.
+
+        :param size: size of the object, default to a config for objects of any size
+        :type size: int, optional
+        :return: transfer config to use
+        :rtype: TransferConfig
+        """
+        if not self.auto_tune:
+            return self._base_config
+        chunksize = AUTO_CHUNKSIZE
+        if size:
+            while chunksize < MAX_CHUNKSIZE and size > chunksize * AUTO_TARGET_PARTS:
+                chunksize *= 2
+            # 5 GiB parts split the biggest object (5 TiB) into 1024 parts
+            chunksize = min(chunksize, MAX_CHUNKSIZE)
+        settings: Dict[str, Any] = {
+            "multipart_threshold": AUTO_CHUNKSIZE,
+            "multipart_chunksize": chunksize,
+        }
+        bytes_per_second = get_estimator().bytes_per_second
+        if bytes_per_second:
+            concurrency = min(
+                max(
+                    math.ceil(bytes_per_second * AUTO_PART_SECONDS / chunksize),
+                    AUTO_MIN_CONCURRENCY,
+                ),
+                AUTO_MAX_CONCURRENCY,
+            )
+            if size:
+                concurrency = min(concurrency, -(-size // chunksize))
+            settings["max_concurrency"] = concurrency
+            settings["io_chunksize"] = min(
+                max(int(bytes_per_second * AUTO_IO_SECONDS), AUTO_MIN_IO_CHUNKSIZE),
+                AUTO_MAX_IO_CHUNKSIZE,
+            )
+        transfer_config = copy.copy(self._base_config)
+        for key, value in settings.items():
+            if key not in self._user_settings:
+                setattr(transfer_config, key, value)
+        return transfer_config
+
+    def get_part_ranges(self, size: int) -> List[Tuple[int, int]]:
+        """Get the parts s3transfer would split a file of the size into.
+
+        Files below the multipart threshold are uploaded in one part. Otherwise
+        the chunk size is adjusted to the limits of multipart upload the same
+        way as s3transfer, so the parts match what fzfaws uploads.
+
+        :param size: size of the file
+        :type size: int
+        :return: list of offset and length of each part
+        :rtype: List[Tuple[int, int]]
+        """
+        transfer_config = self.get_transfer_config(size)
+        if size < transfer_config.multipart_threshold:
+            return [(0, size)]
+        chunksize = ChunksizeAdjuster().adjust_chunksize(
+            transfer_config.multipart_chunksize, size
+        )
+        return [
+            (offset, min(chunksize, size - offset))
+            for offset in range(0, size, chunksize)
+        ]
@@ -1,71 +1,442 @@
 """Module contains function to handle sync operation.
 
-Note: awscli is required for now.
+The sync merge-joins the sorted listing of the source against the sorted
+listing of the destination, so both sides are only listed once and the
+comparison is done in a single streaming pass.
 """
-import subprocess
-from typing import List, Optional
+import os
+from typing import Callable, Generator, Iterable, List, NamedTuple, Optional, Tuple
 
-from fzfaws.utils import get_confirmation
+from fzfaws.s3.helper.batch_delete import BatchDeleter
+from fzfaws.s3.helper.concurrency import ConcurrencyController
+from fzfaws.s3.helper.copy_engine import S3CopyEngine
+from fzfaws.s3.helper.etag import verify_etag
+from fzfaws.s3.helper.exclude_file import exclude_file
+from fzfaws.s3.helper.integrity import get_object_integrity
+from fzfaws.s3.helper.s3transferscheduler import S3TransferScheduler
+from fzfaws.s3.s3 import S3
+from fzfaws.utils import Spinner, get_confirmation
 from fzfaws.utils.exceptions import InvalidS3PathPattern
 
+SyncEntry = NamedTuple(
+    "SyncEntry",
+    [
+        ("relative", str),
+        ("path", str),
+        ("size", int),
+        ("mtime", float),
+        ("etag", Optional[str]),
+    ],
+)
+
+# operation is either "copy" or "delete", source is None for delete
+SyncAction = NamedTuple(
+    "SyncAction",
+    [
+        ("operation", str),
+        ("source", Optional[SyncEntry]),
+        ("destination", Optional[SyncEntry]),
+    ],
+)
+
 
 def sync_s3(
     exclude: Optional[List[str]] = None,
     include: Optional[List[str]] = None,
     from_path: str = "",
     to_path: str = "",
+    s3: Optional[S3] = None,
+    delete: bool = False,
+    checksum: bool = False,
+    verify: Optional[str] = None,
 ) -> None:
-    """Sync from_path with to_path using awscli.
-
-    Utilizing subprocess to call aws cli s3 sync, as boto3 doesn't provide
-    way to have sync operation.
-
-    May try to implement the sync myself using S3 ETag calculation to compare
-    file, require more time and benchmark to see time difference.
+    """Sync from_path with to_path.
 
-    For now, sync is the only process require aws cli to be installed.
+    Support local to s3, s3 to local and s3 to s3. Only files that don't exist
+    in the destination, have a different size or are newer than the destination
+    are transferred. The plan is computed once and used for both the dryrun
+    output and the actual transfer.
 
     :param exclude: list of files to exclude
     :type exclude: List[str], Optional
     :param include: list of files to explicit include
     :type include: List[str], Optional
-    :param from_path: orignal file location
+    :param from_path: orignal file location, local path or s3://bucket/path/
     :type from_path: str
-    :param to_path: destination file location
+    :param to_path: destination file location, local path or s3://bucket/path/
     :type to_path: str
-    :raises InvalidS3PathPattern: when the from_path and to_path is empty
+    :param s3: S3 instance to get the clients from
+    :type s3: S3, optional
+    :param delete: delete files in the destination that don't exist in the source
+    :type delete: bool, optional
+    :param checksum: compare ETag instead of last modified time when the sizes are the same
+    :type checksum: bool, optional
+    :param verify: verify the transferred data, md5 for the ETag only or a checksum algorithm
+    :type verify: str, optional
+    :raises InvalidS3PathPattern: when the from_path and to_path is empty or both are local
     """
     if not from_path or not to_path:
         raise InvalidS3PathPattern(
             "Invalid S3 path pattern for sync, example: s3://bucketname/path/"
         )
-
     if not exclude:
         exclude = []
     if not include:
         include = []
-    # add in the exclude flag and include flag into the command list
-    exclude_list: List[str] = []
-    include_list: List[str] = []
-    for pattern in exclude:
-        if not exclude_list:
-            exclude_list.append("--exclude")
-        exclude_list.append(pattern)
-    for pattern in include:
-        if not include_list:
-            include_list.append("--include")
-        include_list.append(pattern)
-
-    cmd_list: List[str] = ["aws", "s3", "sync", from_path, to_path]
-    cmd_list.extend(exclude_list)
-    cmd_list.extend(include_list)
-    cmd_list.append("--dryrun")
-
-    sync_dry = subprocess.Popen(cmd_list)
-    sync_dry.communicate()
+    if s3 is None:
+        s3 = S3()
+
+    source_bucket, source_root = parse_sync_path(from_path)
+    dest_bucket, dest_root = parse_sync_path(to_path)
+    if not source_bucket and not dest_bucket:
+        raise InvalidS3PathPattern(
+            "Invalid S3 path pattern for sync, example: s3://bucketname/path/"
+        )
+
+    with Spinner.spin(message="Comparing %s with %s ..." % (from_path, to_path)):
+        plan = plan_sync(
+            _list_path(s3, source_bucket, source_root, exclude, include),
+            _list_path(s3, dest_bucket, dest_root, exclude, include),
+            delete=delete,
+            checksum=checksum,
+            is_md5=lambda entry: _is_md5_etag(s3, source_bucket or dest_bucket, entry),
+        )
+
+    operation = "copy"
+    if not source_bucket:
+        operation = "upload"
+    elif not dest_bucket:
+        operation = "download"
+    for action in plan:
+        print("(dryrun) %s" % _format_action(action, operation, dest_bucket, dest_root))
+    if not plan:
+        print("%s is already in sync with %s" % (to_path, from_path))
+        return
+
     if get_confirmation("Confirm?"):
-        # remove the dryrun flag and actually invoke it
-        cmd_list.pop()
-        sync = subprocess.Popen(cmd_list)
-        sync.communicate()
+        _execute_plan(
+            s3, plan, operation, source_bucket, dest_bucket, dest_root, verify
+        )
         print("%s synced with %s" % (from_path, to_path))
+
+
+def parse_sync_path(path: str) -> Tuple[str, str]:
+    """Split the sync path into bucket and root.
+
+    :param path: local path or s3://bucket/path/
+    :type path: str
+    :return: bucket and prefix for s3 path, empty bucket and absolute path for local path
+    :rtype: Tuple[str, str]
+    """
+    if not path.startswith("s3://"):
+        return "", os.path.abspath(os.path.expanduser(path))
+    bucket, _, prefix = path[5:].partition("/")
+    if not bucket:
+        raise InvalidS3PathPattern(
+            "Invalid S3 path pattern for sync, example: s3://bucketname/path/"
+        )
+    if prefix and not prefix.endswith("/"):
+        # same as awscli, the path is always treated as a directory
+        prefix += "/"
+    return bucket, prefix
+
+
+def plan_sync(
+    source: Iterable[SyncEntry],
+    destination: Iterable[SyncEntry],
+    delete: bool = False,
+    checksum: bool = False,
+    is_md5: Optional[Callable[[SyncEntry], bool]] = None,
+) -> List[SyncAction]:
+    """Merge-join the sorted source and destination listings into a plan.
+
+    Both iterables must be sorted by the relative path in s3 key order.
+
+    With checksum, local files are hashed with the part size of the object's
+    ETag. When the ETag isn't a md5 of a known part size, e.g. SSE-KMS or
+    SSE-C objects which list the same as a md5, the last modified time is
+    compared instead.
+
+    :param source: entries of the source
+    :type source: Iterable[SyncEntry]
+    :param destination: entries of the destination
+    :type destination: Iterable[SyncEntry]
+    :param delete: delete entries that only exist in the destination
+    :type delete: bool, optional
+    :param checksum: compare ETag instead of last modified time
+    :type checksum: bool, optional
+    :param is_md5: check if the ETag of a s3 entry is a md5, called when a local file
+        doesn't match a single part ETag
+    :type is_md5: Callable[[SyncEntry], bool], optional
+    :return: list of actions to make destination in sync with source
+    :rtype: List[SyncAction]
+    """
+    plan: List[SyncAction] = []
+    source_iter = iter(source)
+    dest_iter = iter(destination)
+    source_entry = next(source_iter, None)
+    dest_entry = next(dest_iter, None)
+    while source_entry is not None or dest_entry is not None:
+        if dest_entry is None or (
+            source_entry is not None and source_entry.relative < dest_entry.relative
+        ):
+            plan.append(SyncAction("copy", source_entry, None))
+            source_entry = next(source_iter, None)
+        elif source_entry is None or source_entry.relative > dest_entry.relative:
+            if delete:
+                plan.append(SyncAction("delete", None, dest_entry))
+            dest_entry = next(dest_iter, None)
+        else:
+            if _should_sync(source_entry, dest_entry, checksum, is_md5):
+                plan.append(SyncAction("copy", source_entry, dest_entry))
+            source_entry = next(source_iter, None)
+            dest_entry = next(dest_iter, None)
+    return plan
+
+
+def list_local(
+    root: str, exclude: Optional[List[str]] = None, include: Optional[List[str]] = None
+) -> Generator[SyncEntry, None, None]:
+    """List all files under the local directory in s3 key order.
+
+    Entries of each directory are sorted with directories sorted as "name/",
+    so that the depth first walk yields the same order as list_objects
+    without sorting the whole tree. Same as os.walk, symlinks to directories
+    are not followed.
+
+    :param root: local directory to list
+    :type root: str
+    :param exclude: list of glob pattern to exclude
+    :type exclude: List[str], optional
+    :param include: list of glob pattern to include
+    :type include: List[str], optional
+    :return: files under the directory
+    :rtype: Generator[SyncEntry, None, None]
+    """
+    if not os.path.isdir(root):
+        return
+
+    def _walk(directory: str, relative: str) -> Generator[SyncEntry, None, None]:
+        with os.scandir(directory) as iterator:
+            entries = [
+                (
+                    entry.name + "/"
+                    if entry.is_dir(follow_symlinks=False)
+                    else entry.name,
+                    entry,
+                )
+                for entry in iterator
+            ]
+        entries.sort(key=lambda item: item[0])
+        for name, entry in entries:
+            if name.endswith("/"):
+                yield from _walk(entry.path, relative + name)
+                continue
+            if entry.is_dir():
+                # symlink to a directory
+                continue
+            relative_path = relative + name
+            if exclude_file(exclude, include, relative_path):
+                continue
+            stat = entry.stat()
+            yield SyncEntry(relative_path, entry.path, stat.st_size, stat.st_mtime, None)
+
+    yield from _walk(root, "")
+
+
+def list_s3(
+    client,
+    bucket: str,
+    prefix: str,
+    exclude: Optional[List[str]] = None,
+    include: Optional[List[str]] = None,
+) -> Generator[SyncEntry, None, None]:
+    """List all objects under the prefix in s3 key order.
+
+    :param client: boto3 s3 client
+    :type client: boto3.client
+    :param bucket: name of the bucket
+    :type bucket: str
+    :param prefix: prefix to list, should end with "/" or be empty
+    :type prefix: str
+    :param exclude: list of glob pattern to exclude
+    :type exclude: List[str], optional
+    :param include: list of glob pattern to include
+    :type include: List[str], optional
+    :return: objects under the prefix
+    :rtype: Generator[SyncEntry, None, None]
+    """
+    paginator = client.get_paginator("list_objects_v2")
+    for result in paginator.paginate(Bucket=bucket, Prefix=prefix):
+        for file in result.get("Contents", []):
+            key = file.get("Key", "")
+            if not key or key.endswith("/"):
+                # user created dir in S3 console will appear in the result
+                continue
+            relative_path = key[len(prefix) :]
+            if exclude_file(exclude, include, relative_path):
+                continue
+            yield SyncEntry(
+                relative_path,
+                key,
+                file.get("Size", 0),
+                file["LastModified"].timestamp(),
+                file.get("ETag", "").strip('"'),
+            )
+
+
+def _list_path(
+    s3: S3, bucket: str, root: str, exclude: List[str], include: List[str]
+) -> Generator[SyncEntry, None, None]:
+    """List the local path or s3 path."""
+    if bucket:
+        return list_s3(s3.get_client(bucket), bucket, root, exclude, include)
+    return list_local(root, exclude, include)
+
+
+def _should_sync(
+    source: SyncEntry,
+    destination: SyncEntry,
+    checksum: bool,
+    is_md5: Optional[Callable[[SyncEntry], bool]] = None,
+) -> bool:
+    """Check if the source should be transferred to replace the destination."""
+    if source.size != destination.size:
+        return True
+    if checksum:
+        changed = _compare_etag(source, destination, is_md5)
+        if changed is not None:
+            return changed
+    return source.mtime > destination.mtime
+
+
+def _compare_etag(
+    source: SyncEntry,
+    destination: SyncEntry,
+    is_md5: Optional[Callable[[SyncEntry], bool]] = None,
+) -> Optional[bool]:
+    """Check if the ETags differ, None when the ETags couldn't be compared."""
+    if source.etag is not None and destination.etag is not None:
+        return source.etag != destination.etag
+    local, remote = (
+        (source, destination) if source.etag is None else (destination, source)
+    )
+    matched = verify_etag(local.path, remote.etag or "")
+    if matched is None:
+        return None
+    if not matched and is_md5 is not None and not is_md5(remote):
+        return None
+    return not matched
+
+
+def _is_md5_etag(s3: S3, bucket: str, entry: SyncEntry) -> bool:
+    """Check that the ETag of the object is a md5 through head_object."""
+    return (
+        get_object_integrity(
+            s3.get_client(bucket), bucket, entry.path, find_part_size=False
+        ).etag
+        is not None
+    )
+
+
+def _format_action(
+    action: SyncAction, operation: str, dest_bucket: str, dest_root: str
+) -> str:
+    """Format the action to print."""
+    if action.source is None:
+        return "delete: %s" % _display_path(dest_bucket, action.destination.path)
+    source = action.source
+    if operation == "upload":
+        return "upload: %s to s3://%s/%s" % (
+            source.path,
+            dest_bucket,
+            dest_root + source.relative,
+        )
+    elif operation == "download":
+        return "download: s3://%s to %s" % (
+            source.path,
+            os.path.join(dest_root, source.relative),
+        )
+    return "copy: s3://%s to s3://%s/%s" % (
+        source.path,
+        dest_bucket,
+        dest_root + source.relative,
+    )
+
+
+def _display_path(bucket: str, path: str) -> str:
+    """Display s3 key with the bucket name."""
+    return "s3://%s/%s" % (bucket, path) if bucket else path
+
+
+def _execute_plan(
+    s3: S3,
+    plan: List[SyncAction],
+    operation: str,
+    source_bucket: str,
+    dest_bucket: str,
+    dest_root: str,
+    verify: Optional[str] = None,
+) -> None:
+    """Transfer and delete the files in the plan."""
+    copies = [action.source for action in plan if action.source is not None]
+    deletes = [action.destination for action in plan if action.source is None]
+    # transfers and deletes in the destination bucket narrow the same prefixes
+    controller = ConcurrencyController()
+
+    if operation == "upload":
+        S3TransferScheduler(
+            s3.get_client(dest_bucket), controller=controller, verify=verify
+        ).upload(
+            [
+                {
+                    "local_path": entry.path,
+                    "bucket": dest_bucket,
+                    "key": dest_root + entry.relative,
+                    "size": entry.size,
+                }
+                for entry in copies
+            ]
+        )
+    elif operation == "download":
+        S3TransferScheduler(
+            s3.get_client(source_bucket), controller=controller, verify=verify
+        ).download(
+            [
+                {
+                    "bucket": source_bucket,
+                    "key": entry.path,
+                    "local_path": os.path.join(dest_root, entry.relative),
+                    "size": entry.size,
+                    "etag": '"%s"' % entry.etag if entry.etag else None,
+                }
+                for entry in copies
+            ]
+        )
+    else:
+        S3CopyEngine(
+            s3.get_client(dest_bucket),
+            s3.get_client(source_bucket),
+            controller=controller,
+            verify=verify,
+        ).copy(
+            [
+                {
+                    "bucket": source_bucket,
+                    "key": entry.path,
+                    "dest_bucket": dest_bucket,
+                    "dest_key": dest_root + entry.relative,
+                    "size": entry.size,
+                }
+                for entry in copies
+            ]
+        )
+
+    if not dest_bucket:
+        for entry in deletes:
+            print("delete: %s" % entry.path)
+            os.remove(entry.path)
+    else:
+        BatchDeleter(
+            s3.get_client(dest_bucket), dest_bucket, controller=controller
+        ).delete({"Key": entry.path} for entry in deletes)
@@ -0,0 +1,94 @@
+"""Module contains the rolling estimate of the transfer throughput."""
+import json
+import os
+import threading
+from typing import Optional
+
+from fzfaws.utils.util import get_cache_dir
+
+# weight of the newest sample in the moving average throughput
+THROUGHPUT_WEIGHT = 0.3
+
+# samples below this number of bytes are dominated by the request latency and ignored
+MIN_SAMPLE_SIZE = 1024 * 1024
+
+_estimator: Optional["ThroughputEstimator"] = None
+_estimator_lock = threading.Lock()
+
+
+class ThroughputEstimator:
+    """Rolling estimate of the throughput between this machine and s3.
+
+    Every transfer run records the bytes it transferred and the seconds it
+    took, the estimate is the moving average of those samples. The estimate
+    is saved in the cache directory, so the next run starts from the
+    throughput observed by the previous runs instead of a probe.
+
+    Example:
+        estimator = ThroughputEstimator()
+        estimator.record(100 * 1024 * 1024, 2.5)
+        estimator.save()
+
+    :param path: path of the saved estimate, default to $XDG_CACHE_HOME/fzfaws/throughput.json
+    :type path: str, optional
+    """
+
+    def __init__(self, path: Optional[str] = None) -> None:
+        """Construct the estimator and load the saved estimate."""
+        if path is None:
+            path = os.path.join(get_cache_dir(), "throughput.json")
+        self.path = path
+        self.bytes_per_second: Optional[float] = None
+        self._changed: bool = False
+        self._lock = threading.Lock()
+        try:
+            with open(path, "r") as file:
+                self.bytes_per_second = float(json.load(file)["bytes_per_second"])
+        except (OSError, ValueError, KeyError, TypeError):
+            pass
+
+    def record(self, size: float, seconds: float) -> None:
+        """Add a sample to the estimate.
+
+        :param size: number of bytes transferred
+        :type size: float
+        :param seconds: seconds the transfer took
+        :type seconds: float
+        """
+        if size < MIN_SAMPLE_SIZE or seconds <= 0:
+            return
+        sample = size / seconds
+        with self._lock:
+            if not self.bytes_per_second:
+                self.bytes_per_second = sample
+            else:
+                self.bytes_per_second += THROUGHPUT_WEIGHT * (
+                    sample - self.bytes_per_second
+                )
+            self._changed = True
+
+    def save(self) -> None:
+        """Save the estimate when it has changed, failing to save is ignored."""
+        with self._lock:
+            if not self._changed:
+                return
+            self._changed = False
+            try:
+                with open("%s.tmp" % self.path, "w") as file:
+                    json.dump({"bytes_per_second": self.bytes_per_second}, file)
+                os.replace("%s.tmp" % self.path, self.path)
+            except OSError:
+                pass
+
+
+def get_estimator() -> ThroughputEstimator:
+    """Get the estimator shared by all transfers of the process.
+
+    :return: the shared estimator
+    :rtype: ThroughputEstimator
+    """
+    global _estimator
+    with _estimator_lock:
+        if _estimator is None:
+            _estimator = ThroughputEstimator()
+        return _estimator
@@ -0,0 +1,563 @@
+"""Module contains the compact object version index for s3.
+
+The index is built from a single list_object_versions pass and is able to
+answer the common version questions (latest state of a key, non-current versions
+under a prefix, bytes held by non-current versions) without further api calls.
+"""
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+import heapq
+import os
+from typing import (
+    Any,
+    Dict,
+    FrozenSet,
+    Generator,
+    Iterable,
+    List,
+    Optional,
+    Set,
+    Tuple,
+)
+
+_LATEST = 1
+_DELETE_MARKER = 2
+
+
+class VersionIndex:
+    """Memory compact index of object versions within a bucket.
+
+    Entries are stored column wise in flat arrays instead of a list of dict, so
+    buckets with hundreds of millions of versions could still be held in memory.
+    list_object_versions return keys in sorted order with all versions of a key
+    next to each other, versions of a key are therefore stored as one contiguous
+    range of rows and the key id of a row is implied by the key offsets.
+
+    Pages are merged into the index as a whole listing, keys whose versions span
+    across a page boundary are still treated as a single key and a delete marker
+    on one page is still associated with versions on the next page.
+
+    Example:
+        index = VersionIndex.from_bucket(s3.client, "bucket", prefix="folder/")
+        for version in index.non_current(prefix="folder/"):
+            print(version["Key"], version["VersionId"])
+
+    :param bucket: name of the bucket the index is built for
+    :type bucket: str, optional
+    :param prefix: prefix the index is built for, empty for the whole bucket
+    :type prefix: str, optional
+    """
+
+    def __init__(self, bucket: str = "", prefix: str = "") -> None:
+        """Construct an empty index."""
+        self.bucket: str = bucket
+        self.prefix: str = prefix
+        # when built from selected keys, only those keys are covered by the index
+        self.selected: Optional[FrozenSet[str]] = None
+        # keys are concatenated into one buffer like the version ids, key n is
+        # key_buffer[key_offset[n]:key_offset[n+1]]
+        self._key_buffer = bytearray()
+        self._key_offset = array("Q", [0])
+        self._last_key: Optional[str] = None
+        # first row of each key, row range of key n is key_start[n]:key_start[n+1]
+        self._key_start = array("Q")
+        # version ids are concatenated into one buffer to avoid a str object per row
+        self._version_buffer = bytearray()
+        self._version_offset = array("Q", [0])
+        # ETags are stored the same way, empty when the listing doesn't provide them
+        self._etag_buffer = bytearray()
+        self._etag_offset = array("Q", [0])
+        self._flags = bytearray()
+        self._size = array("Q")
+        self._mtime = array("d")
+
+    @classmethod
+    def from_bucket(cls, client, bucket: str, prefix: str = "") -> "VersionIndex":
+        """Build the index through one list_object_versions pass.
+
+        :param client: boto3 s3 client
+        :type client: boto3.client
+        :param bucket: name of the bucket
+        :type bucket: str
+        :param prefix: only index keys under the prefix
+        :type prefix: str, optional
+        :return: the populated index
+        :rtype: VersionIndex
+        """
+        index = cls(bucket=bucket, prefix=prefix)
+        paginator = client.get_paginator("list_object_versions")
+        for result in paginator.paginate(Bucket=bucket, Prefix=prefix):
+            index.add_page(result)
+        return index
+
+    @classmethod
+    def from_keys(
+        cls, client, bucket: str, keys: Iterable[str], max_workers: int = 10
+    ) -> "VersionIndex":
+        """Build the index for a selection of keys with as few listing passes as possible.
+
+        Keys are grouped by their longest common prefix within the same "folder",
+        each group is listed once with the "/" delimiter so that sub folders are not
+        walked, and the groups are listed concurrently. Only exact key matches are
+        indexed, sibling keys sharing the prefix (e.g. a.txt and a.txt.bak) are ignored.
+
+        A group listing taking more pages than the group has keys is sparse (the
+        prefix matches many unselected keys), it's abandoned and each key is listed
+        with its own prefix instead, so the listing costs at most twice as many
+        pages as listing every key on its own.
+
+        :param client: boto3 s3 client
+        :type client: boto3.client
+        :param bucket: name of the bucket
+        :type bucket: str
+        :param keys: keys to get versions for
+        :type keys: Iterable[str]
+        :param max_workers: number of groups to list concurrently
+        :type max_workers: int, optional
+        :return: the populated index
+        :rtype: VersionIndex
+        """
+        index = cls(bucket=bucket)
+        index.selected = frozenset(keys)
+        groups = group_keys(index.selected)
+
+        def _list_prefix(
+            prefix: str, members: Set[str], max_pages: Optional[int] = None
+        ) -> Optional[List[Tuple[str, bool, Dict[str, Any]]]]:
+            entries = []
+            paginator = client.get_paginator("list_object_versions")
+            for page, result in enumerate(
+                paginator.paginate(Bucket=bucket, Prefix=prefix, Delimiter="/")
+            ):
+                if max_pages is not None and page >= max_pages:
+                    return None
+                entries.extend(_merge_page(result, members))
+            return entries
+
+        def _list_group(group: Tuple[str, Set[str]]):
+            prefix, members = group
+            if len(members) > 1:
+                entries = _list_prefix(prefix, members, max_pages=len(members))
+                if entries is not None:
+                    return entries
+            entries = []
+            for key in sorted(members):
+                entries.extend(_list_prefix(key, {key}) or [])
+            return entries
+
+        versions: Dict[str, List[Tuple[str, bool, Dict[str, Any]]]] = {}
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for entries in executor.map(_list_group, groups):
+                for entry in entries:
+                    versions.setdefault(entry[0], []).append(entry)
+        # groups could interleave in the sorted order, append by key order to keep ranges contiguous
+        for key in sorted(versions):
+            for _, is_delete_marker, entry in versions[key]:
+                index._append_entry(is_delete_marker, entry)
+        return index
+
+    def add_page(self, result: Dict[str, Any]) -> None:
+        """Add one page of list_object_versions response into the index.
+
+        :param result: a page from the list_object_versions paginator
+        :type result: Dict[str, Any]
+        """
+        for _, is_delete_marker, entry in _merge_page(result):
+            self._append_entry(is_delete_marker, entry)
+
+    def append(
+        self,
+        key: str,
+        version_id: str,
+        is_latest: bool,
+        is_delete_marker: bool,
+        size: int = 0,
+        last_modified: Optional[datetime] = None,
+        etag: str = "",
+    ) -> None:
+        """Append a single version to the index.
+
+        Versions should be appended in listing order, a key different from
+        the previous appended key starts a new key range.
+
+        :param key: object key
+        :type key: str
+        :param version_id: version id of the object
+        :type version_id: str
+        :param is_latest: if this version is the current version
+        :type is_latest: bool
+        :param is_delete_marker: if this version is a delete marker
+        :type is_delete_marker: bool
+        :param size: size of the version in bytes
+        :type size: int, optional
+        :param last_modified: last modified time of the version
+        :type last_modified: datetime, optional
+        :param etag: ETag of the version
+        :type etag: str, optional
+        """
+        if self._last_key != key:
+            self._key_buffer.extend(key.encode("utf-8"))
+            self._key_offset.append(len(self._key_buffer))
+            self._key_start.append(len(self._flags))
+            self._last_key = key
+        self._version_buffer.extend((version_id or "").encode("utf-8"))
+        self._version_offset.append(len(self._version_buffer))
+        self._etag_buffer.extend((etag or "").encode("utf-8"))
+        self._etag_offset.append(len(self._etag_buffer))
+        self._flags.append(
+            (_LATEST if is_latest else 0) | (_DELETE_MARKER if is_delete_marker else 0)
+        )
+        self._size.append(size or 0)
+        self._mtime.append(last_modified.timestamp() if last_modified else 0.0)
+
+    def _append_entry(self, is_delete_marker: bool, entry: Dict[str, Any]) -> None:
+        """Append a version entry from list_object_versions response."""
+        self.append(
+            entry.get("Key", ""),
+            entry.get("VersionId", ""),
+            entry.get("IsLatest", False),
+            is_delete_marker,
+            entry.get("Size", 0),
+            entry.get("LastModified"),
+            entry.get("ETag", ""),
+        )
+
+    def __len__(self) -> int:
+        """Return number of versions in the index."""
+        return len(self._flags)
+
+    @property
+    def keys(self) -> List[str]:
+        """Return all keys in the index, decoded into a new list."""
+        return [self._key(key_id) for key_id in range(self.key_count)]
+
+    @property
+    def key_count(self) -> int:
+        """Return number of keys in the index."""
+        return len(self._key_start)
+
+    def covers(self, bucket: str, key: str) -> bool:
+        """Check if the index contains all versions of the key.
+
+        :param bucket: bucket of the key
+        :type bucket: str
+        :param key: object key
+        :type key: str
+        :return: whether the key could be answered without listing again
+        :rtype: bool
+        """
+        if bucket != self.bucket:
+            return False
+        if self.selected is not None:
+            return key in self.selected
+        return key.startswith(self.prefix)
+
+    def versions(self, key: str) -> Generator[Dict[str, Any], None, None]:
+        """Get all versions and delete markers of a key.
+
+        :param key: object key
+        :type key: str
+        :return: version information in the same format as S3._version_generator
+        :rtype: Generator[Dict[str, Any], None, None]
+        """
+        key_id = self._key_id(key)
+        if key_id is None:
+            return
+        for row in self._rows(key_id):
+            yield self._row(key_id, row)
+
+    def latest(self, prefix: str = "") -> Generator[Dict[str, Any], None, None]:
+        """Get the latest state of each key under the prefix.
+
+        Keys whose current version is a delete marker are yield with DeleteMarker set to True.
+        Keys without a current version (e.g. only non-current versions left) are skipped.
+
+        :param prefix: only get keys under the prefix
+        :type prefix: str, optional
+        :return: the current version of each key
+        :rtype: Generator[Dict[str, Any], None, None]
+        """
+        for key_id in self._key_range(prefix):
+            for row in self._rows(key_id):
+                if self._flags[row] & _LATEST:
+                    yield self._row(key_id, row)
+                    break
+
+    def list_folder(self, prefix: str = "") -> Dict[str, Any]:
+        """List the current objects and sub folders directly under the prefix.
+
+        Same as a list_objects call with the "/" delimiter, sub folders are
+        skipped through binary search instead of walking all of their keys.
+
+        :param prefix: the folder to list
+        :type prefix: str, optional
+        :return: response in the same format as a list_objects page
+        :rtype: Dict[str, Any]
+        """
+        result: Dict[str, Any] = {"CommonPrefixes": [], "Contents": []}
+        key_id = self._bisect(prefix)
+        while key_id < self.key_count:
+            key = self._key(key_id)
+            if not key.startswith(prefix):
+                break
+            delimiter = key.find("/", len(prefix))
+            if delimiter >= 0:
+                folder = key[: delimiter + 1]
+                result["CommonPrefixes"].append({"Prefix": folder})
+                # "0" is the character sorted right after "/"
+                key_id = self._bisect(folder[:-1] + "0", key_id)
+                continue
+            for row in self._rows(key_id):
+                if self._flags[row] == _LATEST:
+                    version = self._row(key_id, row)
+                    content = {
+                        "Key": key,
+                        "Size": version["Size"],
+                        "LastModified": version["LastModified"],
+                    }
+                    if version["ETag"]:
+                        content["ETag"] = version["ETag"]
+                    result["Contents"].append(content)
+                    break
+            key_id += 1
+        return result
+
+    def non_current(self, prefix: str = "") -> Generator[Dict[str, Any], None, None]:
+        """Get all non-current versions under the prefix, including delete markers.
+
+        :param prefix: only get versions under the prefix
+        :type prefix: str, optional
+        :return: non-current versions
+        :rtype: Generator[Dict[str, Any], None, None]
+        """
+        for key_id in self._key_range(prefix):
+            for row in self._rows(key_id):
+                if not self._flags[row] & _LATEST:
+                    yield self._row(key_id, row)
+
+    def non_current_bytes(self, prefix: str = "") -> int:
+        """Get the total bytes held by non-current versions under the prefix.
+
+        :param prefix: only count versions under the prefix
+        :type prefix: str, optional
+        :return: total size in bytes
+        :rtype: int
+        """
+        total = 0
+        for key_id in self._key_range(prefix):
+            for row in self._rows(key_id):
+                if not self._flags[row] & _LATEST:
+                    total += self._size[row]
+        return total
+
+    def has_delete_marker(self, key: str) -> bool:
+        """Check if any version of the key is a delete marker.
+
+        :param key: object key
+        :type key: str
+        :return: whether the key has delete marker
+        :rtype: bool
+        """
+        key_id = self._key_id(key)
+        if key_id is None:
+            return False
+        return any(self._flags[row] & _DELETE_MARKER for row in self._rows(key_id))
+
+    def uniq_keys(
+        self, onlydelete: bool = False, start: int = 0, end: Optional[int] = None
+    ) -> Generator[Tuple[str, bool], None, None]:
+        """Get each key once with an indicator of delete marker.
+
+        :param onlydelete: only include keys that has delete marker
+        :type onlydelete: bool, optional
+        :param start: key id to start from
+        :type start: int, optional
+        :param end: key id to stop before, default to all keys
+        :type end: int, optional
+        :return: tuple of key and whether the key has delete marker
+        :rtype: Generator[Tuple[str, bool], None, None]
+        """
+        end = self.key_count if end is None else end
+        for key_id in range(start, end):
+            key = self._key(key_id)
+            deleted = any(
+                self._flags[row] & _DELETE_MARKER for row in self._rows(key_id)
+            )
+            if deleted or not onlydelete:
+                yield key, deleted
+
+    def rows(
+        self,
+    ) -> Generator[
+        Tuple[str, str, bool, bool, int, Optional[datetime], str], None, None
+    ]:
+        """Get all rows in index order with the same values as the arguments of append.
+
+        :return: tuple of key, version id, is latest, is delete marker, size, last modified
+            and ETag
+        :rtype: Generator[Tuple[str, str, bool, bool, int, Optional[datetime], str], None, None]
+        """
+        for key_id in range(self.key_count):
+            for row in self._rows(key_id):
+                version = self._row(key_id, row)
+                yield (
+                    version["Key"],
+                    version["VersionId"],
+                    version["IsLatest"],
+                    version["DeleteMarker"],
+                    version["Size"],
+                    version["LastModified"],
+                    version["ETag"],
+                )
+
+    def _key_id(self, key: str) -> Optional[int]:
+        """Find the key id through binary search on the sorted keys."""
+        key_id = self._bisect(key)
+        if key_id < self.key_count and self._key(key_id) == key:
+            return key_id
+        return None
+
+    def _key(self, key_id: int) -> str:
+        """Decode the key from the key buffer."""
+        return self._key_buffer[
+            self._key_offset[key_id] : self._key_offset[key_id + 1]
+        ].decode("utf-8")
+
+    def _bisect(self, key: str, start: int = 0) -> int:
+        """Find the first key id not sorted before the key, same as bisect_left."""
+        end = self.key_count
+        while start < end:
+            middle = (start + end) // 2
+            if self._key(middle) < key:
+                start = middle + 1
+            else:
+                end = middle
+        return start
+
+    def _key_range(self, prefix: str) -> range:
+        """Get the range of key ids under the prefix."""
+        if not prefix:
+            return range(self.key_count)
+        start = self._bisect(prefix)
+        end = start
+        while end < self.key_count and self._key(end).startswith(prefix):
+            end += 1
+        return range(start, end)
+
+    def _rows(self, key_id: int) -> range:
+        """Get the row range of a key."""
+        end = (
+            self._key_start[key_id + 1]
+            if key_id + 1 < len(self._key_start)
+            else len(self._flags)
+        )
+        return range(self._key_start[key_id], end)
+
+    def _row(self, key_id: int, row: int) -> Dict[str, Any]:
+        """Format a row into dict."""
+        mtime = self._mtime[row]
+        last_modified = datetime.fromtimestamp(mtime, tz=timezone.utc) if mtime else None
+        return {
+            "VersionId": self._version_buffer[
+                self._version_offset[row] : self._version_offset[row + 1]
+            ].decode("utf-8"),
+            "Key": self._key(key_id),
+            "IsLatest": bool(self._flags[row] & _LATEST),
+            "DeleteMarker": bool(self._flags[row] & _DELETE_MARKER),
+            "Size": self._size[row],
+            "LastModified": last_modified,
+            "ETag": self._etag_buffer[
+                self._etag_offset[row] : self._etag_offset[row + 1]
+            ].decode("utf-8"),
+        }
+
+
+def group_keys(keys: Iterable[str]) -> List[Tuple[str, Set[str]]]:
+    """Group keys by their longest common prefix within the same folder.
+
+    Sorted keys in the same folder are put into one group as long as they share
+    at least one character after the folder path, so that each group could be
+    listed with a narrow prefix instead of listing the whole folder.
+
+    :param keys: s3 keys to group
+    :type keys: Iterable[str]
+    :return: list of tuple of the group prefix and the keys in the group
+    :rtype: List[Tuple[str, Set[str]]]
+
+    Example return value:
+        [("folder/file", {"folder/file1", "folder/file2"}), ("a.txt", {"a.txt"})]
+    """
+    groups: List[Tuple[str, Set[str]]] = []
+    folder: str = ""
+    prefix: str = ""
+    members: Set[str] = set()
+    for key in sorted(set(keys)):
+        key_folder = key[: key.rfind("/") + 1]
+        if members and key_folder == folder:
+            common = os.path.commonprefix([prefix, key])
+            if len(common) > len(folder):
+                prefix = common
+                members.add(key)
+                continue
+        if members:
+            groups.append((prefix, members))
+        folder, prefix, members = key_folder, key, {key}
+    if members:
+        groups.append((prefix, members))
+    return groups
+
+
+def group_versions(
+    pages: Iterable[Dict[str, Any]]
+) -> Generator[Tuple[str, List[Dict[str, Any]]], None, None]:
+    """Group the versions of list_object_versions pages by key as a stream.
+
+    Versions of a key could span across a page boundary, the key is only yield
+    after the first version of the next key is seen, so at most the versions of
+    one key are held in memory.
+
+    :param pages: pages from the list_object_versions paginator
+    :type pages: Iterable[Dict[str, Any]]
+    :return: tuple of key and its versions with the DeleteMarker flag set
+    :rtype: Generator[Tuple[str, List[Dict[str, Any]]], None, None]
+    """
+    key: str = ""
+    versions: List[Dict[str, Any]] = []
+    for result in pages:
+        for entry_key, is_delete_marker, entry in _merge_page(result):
+            if versions and entry_key != key:
+                yield key, versions
+                versions = []
+            key = entry_key
+            versions.append(dict(entry, DeleteMarker=is_delete_marker))
+    if versions:
+        yield key, versions
+
+
+def _merge_page(
+    result: Dict[str, Any], keys: Optional[Set[str]] = None
+) -> Generator[Tuple[str, bool, Dict[str, Any]], None, None]:
+    """Merge Versions and DeleteMarkers of a list_object_versions page.
+
+    Versions and DeleteMarkers are listed separately in the response but both
+    are sorted by key, merge them back so versions of a key stay together.
+
+    :param result: a page from the list_object_versions paginator
+    :type result: Dict[str, Any]
+    :param keys: only include exact matches of the keys
+    :type keys: Set[str], optional
+    :return: tuple of key, is delete marker and the raw entry
+    :rtype: Generator[Tuple[str, bool, Dict[str, Any]], None, None]
+    """
+    versions = (
+        (version.get("Key", ""), False, version)
+        for version in result.get("Versions", [])
+    )
+    markers = (
+        (marker.get("Key", ""), True, marker)
+        for marker in result.get("DeleteMarkers", [])
+    )
+    for entry in heapq.merge(versions, markers, key=lambda item: item[0]):
+        if keys is None or entry[0] in keys:
+            yield entry
@@ -0,0 +1,116 @@
+"""Module contains a helper function to walk local directory concurrently."""
+from concurrent.futures import ThreadPoolExecutor
+import os
+import queue
+import threading
+from typing import Generator, List, NamedTuple, Optional
+
+from fzfaws.s3.helper.exclude_file import exclude_file
+
+LocalFile = NamedTuple(
+    "LocalFile", [("path", str), ("relative", str), ("size", int), ("mtime", float)]
+)
+
+# signals the end of a walker thread in the queue
+_DONE = object()
+
+
+def walk_local_folder(
+    local_path: str,
+    exclude: Optional[List[str]] = None,
+    include: Optional[List[str]] = None,
+    max_workers: int = 8,
+    max_queue: int = 10000,
+) -> Generator[LocalFile, None, None]:
+    """Walk local directory and stream all files under it.
+
+    Top level directories are walked concurrently through os.scandir and the
+    entries are put into a bounded queue, so the consumer could start processing
+    files (e.g. upload) before the walk finishes and the full file list is never
+    held in memory. Same as os.walk, symlinks to directories are not followed.
+
+    :param local_path: directory to walk
+    :type local_path: str
+    :param exclude: list of glob pattern to exclude
+    :type exclude: List[str], optional
+    :param include: list of glob pattern to include
+    :type include: List[str], optional
+    :param max_workers: number of top level directories to walk concurrently
+    :type max_workers: int, optional
+    :param max_queue: maximum number of entries waiting to be consumed
+    :type max_queue: int, optional
+    :return: files under the directory, order is not guaranteed
+    :rtype: Generator[LocalFile, None, None]
+    """
+    if exclude is None:
+        exclude = []
+    if include is None:
+        include = []
+
+    def _file(entry: os.DirEntry) -> Optional[LocalFile]:
+        relative_path = os.path.relpath(entry.path, local_path)
+        if exclude_file(exclude, include, relative_path):
+            return None
+        stat = entry.stat()
+        return LocalFile(entry.path, relative_path, stat.st_size, stat.st_mtime)
+
+    stop = threading.Event()
+
+    def _put(entries: "queue.Queue", item) -> bool:
+        # give up when the consumer stopped early instead of blocking forever
+        while not stop.is_set():
+            try:
+                entries.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _walk(directory: str, entries: "queue.Queue") -> None:
+        try:
+            stack = [directory]
+            while stack:
+                with os.scandir(stack.pop()) as iterator:
+                    for entry in iterator:
+                        if entry.is_dir():
+                            if not entry.is_symlink():
+                                stack.append(entry.path)
+                            continue
+                        local_file = _file(entry)
+                        if local_file and not _put(entries, local_file):
+                            return
+        except Exception as e:
+            _put(entries, e)
+        finally:
+            _put(entries, _DONE)
+
+    directories: List[str] = []
+    with os.scandir(local_path) as iterator:
+        for entry in iterator:
+            if entry.is_dir():
+                if not entry.is_symlink():
+                    directories.append(entry.path)
+                continue
+            local_file = _file(entry)
+            if local_file:
+                yield local_file
+
+    if not directories:
+        return
+    entries: "queue.Queue" = queue.Queue(maxsize=max_queue)
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    try:
+        for directory in directories:
+            executor.submit(_walk, directory, entries)
+        remaining = len(directories)
+        while remaining:
+            item = entries.get()
+            if item is _DONE:
+                remaining -= 1
+            elif isinstance(item, Exception):
+                raise item
+            else:
+                yield item
+    finally:
+        stop.set()
+        executor.shutdown(wait=False)
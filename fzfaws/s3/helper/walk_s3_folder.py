@@ -1,9 +1,10 @@
 """Module contains a helper function to recursivly walk and get all s3 object's within given path."""
 import os
 import re
-from typing import List, Optional, Tuple
+from typing import Container, Dict, List, Optional, Tuple
 
 from fzfaws.s3.helper.exclude_file import exclude_file
+from fzfaws.s3.helper.version_index import VersionIndex
 from fzfaws.utils.exceptions import InvalidS3PathPattern
 
 
@@ -18,6 +19,10 @@ def walk_s3_folder(
     operation: str = "download",
     destination_path: str = "/",
     destination_bucket: str = "",
+    inventory: Optional[VersionIndex] = None,
+    sizes: Optional[Dict[str, int]] = None,
+    completed: Optional[Container[str]] = None,
+    etags: Optional[Dict[str, str]] = None,
 ) -> List[Tuple[str, str]]:
     """Walk s3 folder recursivly in the given path to obtail all objects.
 
@@ -52,6 +57,18 @@ def walk_s3_folder(
     :type destination_path: str, optional
     :param destination_bucket: the destination bucket name for operation='bucket'
     :type destination_bucket: str, optional
+    :param inventory: walk the inventory snapshot of the bucket instead of listing it
+    :type inventory: VersionIndex, optional
+    :param sizes: dict to store the size of each walked object, keyed by the original key,
+        pass it to S3Progress or the transfer to avoid a head_object call per object,
+        sizes are only stored from a live listing, never from the inventory snapshot
+    :type sizes: Dict[str, int], optional
+    :param completed: keys to skip, e.g. a Journal of a previous failed operation
+    :type completed: Container[str], optional
+    :param etags: dict to store the ETag of each walked object, keyed by the original key,
+        s3transfer only skips its head_object when both size and ETag are provided,
+        like sizes, only stored from a live listing
+    :type etags: Dict[str, str], optional
     :return: return the list of tuple of file path to download
     :rtype: List[Tuple[str,str]]
 
@@ -65,8 +82,12 @@ def walk_s3_folder(
     if include is None:
         include = []
 
-    paginator = client.get_paginator("list_objects")
-    for result in paginator.paginate(Bucket=bucket, Delimiter="/", Prefix=bucket_path):
+    if inventory is not None:
+        results = [inventory.list_folder(bucket_path)]
+    else:
+        paginator = client.get_paginator("list_objects")
+        results = paginator.paginate(Bucket=bucket, Delimiter="/", Prefix=bucket_path)
+    for result in results:
         if result.get("CommonPrefixes") is not None:
             for subdir in result.get("CommonPrefixes"):
                 file_list = walk_s3_folder(
@@ -80,6 +101,10 @@ def walk_s3_folder(
                     operation,
                     destination_path,
                     destination_bucket,
+                    inventory,
+                    sizes,
+                    completed,
+                    etags,
                 )
         for file in result.get("Contents", []):
             if file.get("Key").endswith("/") or not file.get("Key"):
@@ -87,6 +112,8 @@ def walk_s3_folder(
                 continue
             if exclude_file(exclude, include, file.get("Key")):
                 continue
+            if completed is not None and file.get("Key") in completed:
+                continue
             if not root:
                 dest_pathname = os.path.join(destination_path, file.get("Key"))
             else:
@@ -124,5 +151,11 @@ def walk_s3_folder(
                 print("(dryrun) delete: s3://%s/%s" % (bucket, file.get("Key")))
             elif operation == "object":
                 print("(dryrun) update: s3://%s/%s" % (bucket, file.get("Key")))
+            # the inventory could be a day old, a changed object would be
+            # truncated or fail with InvalidRange when its old size is trusted
+            if inventory is None and sizes is not None and file.get("Size") is not None:
+                sizes[file.get("Key")] = file.get("Size")
+            if inventory is None and etags is not None and file.get("ETag"):
+                etags[file.get("Key")] = file.get("ETag")
             file_list.append((file.get("Key"), dest_pathname))
     return file_list
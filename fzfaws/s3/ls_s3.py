@@ -1,9 +1,15 @@
 """Contains function to list information of s3."""
 import json
-from typing import Dict, List, Union
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+
+from botocore.exceptions import ClientError
 
 from fzfaws.s3.s3 import S3
 
+# maximum number of concurrent requests when fetching details
+MAX_WORKERS = 10
+
 
 def ls_s3(
     profile: Union[str, bool] = False,
@@ -16,6 +22,7 @@ def ls_s3(
     arn: bool = False,
     versionid: bool = False,
     bucketpath: str = None,
+    inventory: str = None,
 ) -> None:
     """Display information on the selected s3 file or bucket.
 
@@ -39,15 +46,18 @@ def ls_s3(
     :type versionid: bool, optional
     :param bucketpath: specify a bucket to operate
     :type bucketpath: str, optional
+    :param inventory: local path or s3 uri of a s3 inventory manifest.json, list objects from the inventory
+    :type inventory: str, optional
     """
     s3 = S3(profile)
     s3.set_bucket_and_path(bucketpath)
+    if inventory:
+        s3.set_inventory(inventory, no_progress=True)
     if not s3.bucket_name:
         s3.set_s3_bucket(no_progress=True)
 
     if bucket and url:
-        response = s3.client.get_bucket_location(Bucket=s3.bucket_name)
-        bucket_location = response["LocationConstraint"]
+        bucket_location = s3.get_bucket_region()
         print("https://s3-%s.amazonaws.com/%s/" % (bucket_location, s3.bucket_name,))
         return
     if bucket and uri:
@@ -117,6 +127,9 @@ def get_detailed_info(
 ) -> None:
     """Print detailed information about bucket, object or version.
 
+    All of the api calls are fanned out on a bounded thread pool, object
+    details are printed in selection order as soon as each object completes.
+
     :param s3: S3 instance
     :type s3: S3
     :param bucket: print detailed information about the bucket
@@ -126,74 +139,143 @@ def get_detailed_info(
     :param obj_version: list of object versions to print details
     :type obj_version: List[Dict[str, str]]
     """
-    if bucket:
-        response = {}
-        acls = s3.client.get_bucket_acl(Bucket=s3.bucket_name)
-        versions = s3.client.get_bucket_versioning(Bucket=s3.bucket_name)
-        region = s3.client.get_bucket_location(Bucket=s3.bucket_name)
-        response["Owner"] = acls.get("Owner")
-        response["Region"] = region.get("LocationConstraint")
-        try:
-            encryption = s3.client.get_bucket_encryption(Bucket=s3.bucket_name)
-            response["Encryption"] = encryption.get("ServerSideEncryptionConfiguration")
-        except:
-            response["Encryption"] = None
-        try:
-            public = s3.client.get_bucket_policy_status(Bucket=s3.bucket_name)
-            response["Public"] = public.get("PolicyStatus").get("IsPublic")
-            policy = s3.client.get_bucket_policy(Bucket=s3.bucket_name)
-            response["Policy"] = policy.get("Policy")
-        except:
-            pass
-        response["Grants"] = acls.get("Grants")
-        response["Versioning"] = versions.get("Status")
-        response["MFA"] = versions.get("MFADelete")
-        try:
-            tags = s3.client.get_bucket_tagging(Bucket=s3.bucket_name)
-            response["Tags"] = tags.get("TagSet")
-        except:
-            response["Tags"] = None
-        print(80 * "-")
-        print("s3://%s" % s3.bucket_name)
-        print(json.dumps(response, indent=4, default=str))
-
-    elif version:
-        for obj_version in obj_versions:
-            response = s3.client.head_object(
-                Bucket=s3.bucket_name,
-                Key=obj_version.get("Key"),
-                VersionId=obj_version.get("VersionId"),
-            )
-            tags = s3.client.get_object_tagging(
-                Bucket=s3.bucket_name,
-                Key=obj_version.get("Key"),
-                VersionId=obj_version.get("VersionId"),
-            )
-            acls = s3.client.get_object_acl(
-                Bucket=s3.bucket_name,
-                Key=obj_version.get("Key"),
-                VersionId=obj_version.get("VersionId"),
-            )
-            response.pop("ResponseMetadata", None)
-            response["Tags"] = tags.get("TagSet")
-            response["Owner"] = acls.get("Owner")
-            response["Grants"] = acls.get("Grants")
+    client = s3.get_client()
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        if bucket:
             print(80 * "-")
+            print("s3://%s" % s3.bucket_name)
             print(
-                "s3://%s/%s versioned %s"
-                % (s3.bucket_name, obj_version.get("Key"), obj_version.get("VersionId"))
+                json.dumps(
+                    get_bucket_detail(executor, s3, client), indent=4, default=str
+                )
             )
-            print(json.dumps(response, indent=4, default=str))
 
-    else:
-        for s3_key in s3.path_list:
-            response = s3.client.head_object(Bucket=s3.bucket_name, Key=s3_key,)
-            tags = s3.client.get_object_tagging(Bucket=s3.bucket_name, Key=s3_key)
-            acls = s3.client.get_object_acl(Bucket=s3.bucket_name, Key=s3_key)
-            response.pop("ResponseMetadata", None)
-            response["Tags"] = tags.get("TagSet")
-            response["Owner"] = acls.get("Owner")
-            response["Grants"] = acls.get("Grants")
-            print(80 * "-")
-            print("s3://%s/%s" % (s3.bucket_name, s3_key))
-            print(json.dumps(response, indent=4, default=str))
+        elif version:
+            futures = [
+                submit_object_detail(
+                    executor,
+                    client,
+                    s3.bucket_name,
+                    obj_version.get("Key", ""),
+                    obj_version.get("VersionId"),
+                )
+                for obj_version in obj_versions
+            ]
+            for obj_version, future in zip(obj_versions, futures):
+                response = get_object_detail(future)
+                print(80 * "-")
+                print(
+                    "s3://%s/%s versioned %s"
+                    % (
+                        s3.bucket_name,
+                        obj_version.get("Key"),
+                        obj_version.get("VersionId"),
+                    )
+                )
+                print(json.dumps(response, indent=4, default=str))
+
+        else:
+            futures = [
+                submit_object_detail(executor, client, s3.bucket_name, s3_key)
+                for s3_key in s3.path_list
+            ]
+            for s3_key, future in zip(s3.path_list, futures):
+                response = get_object_detail(future)
+                print(80 * "-")
+                print("s3://%s/%s" % (s3.bucket_name, s3_key))
+                print(json.dumps(response, indent=4, default=str))
+
+
+def get_bucket_detail(executor: ThreadPoolExecutor, s3: S3, client) -> Dict[str, Any]:
+    """Fetch detailed information of the bucket concurrently.
+
+    :param executor: thread pool to send the requests
+    :type executor: ThreadPoolExecutor
+    :param s3: S3 instance
+    :type s3: S3
+    :param client: s3 client for the bucket region
+    :type client: boto3.client
+    :return: detailed information about the bucket
+    :rtype: Dict[str, Any]
+    """
+
+    def optional(api: Callable[..., Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        # these apis raise ClientError when the setting doesn't exist
+        try:
+            return api(Bucket=s3.bucket_name)
+        except ClientError:
+            return None
+
+    acls = executor.submit(client.get_bucket_acl, Bucket=s3.bucket_name)
+    versions = executor.submit(client.get_bucket_versioning, Bucket=s3.bucket_name)
+    encryption = executor.submit(optional, client.get_bucket_encryption)
+    public = executor.submit(optional, client.get_bucket_policy_status)
+    policy = executor.submit(optional, client.get_bucket_policy)
+    tags = executor.submit(optional, client.get_bucket_tagging)
+
+    response: Dict[str, Any] = {}
+    response["Owner"] = acls.result().get("Owner")
+    response["Region"] = s3.get_bucket_region()
+    response["Encryption"] = (
+        encryption.result().get("ServerSideEncryptionConfiguration")
+        if encryption.result()
+        else None
+    )
+    if public.result():
+        response["Public"] = public.result().get("PolicyStatus").get("IsPublic")
+        if policy.result():
+            response["Policy"] = policy.result().get("Policy")
+    response["Grants"] = acls.result().get("Grants")
+    response["Versioning"] = versions.result().get("Status")
+    response["MFA"] = versions.result().get("MFADelete")
+    response["Tags"] = tags.result().get("TagSet") if tags.result() else None
+    return response
+
+
+def submit_object_detail(
+    executor: ThreadPoolExecutor,
+    client,
+    bucket: str,
+    key: str,
+    version_id: Optional[str] = None,
+) -> Tuple[Future, Future, Future]:
+    """Submit the requests to get detailed information of an object.
+
+    :param executor: thread pool to send the requests
+    :type executor: ThreadPoolExecutor
+    :param client: s3 client for the bucket region
+    :type client: boto3.client
+    :param bucket: name of the bucket
+    :type bucket: str
+    :param key: key of the object
+    :type key: str
+    :param version_id: version of the object
+    :type version_id: str, optional
+    :return: futures of the head_object, get_object_tagging and get_object_acl call
+    :rtype: Tuple[Future, Future, Future]
+    """
+    kwargs = {"Bucket": bucket, "Key": key}
+    if version_id:
+        kwargs["VersionId"] = version_id
+    return (
+        executor.submit(client.head_object, **kwargs),
+        executor.submit(client.get_object_tagging, **kwargs),
+        executor.submit(client.get_object_acl, **kwargs),
+    )
+
+
+def get_object_detail(futures: Tuple[Future, Future, Future]) -> Dict[str, Any]:
+    """Wait and merge the responses from submit_object_detail.
+
+    :param futures: futures returned by submit_object_detail
+    :type futures: Tuple[Future, Future, Future]
+    :return: detailed information about the object
+    :rtype: Dict[str, Any]
+    """
+    head, tags, acls = futures
+    response = head.result()
+    response.pop("ResponseMetadata", None)
+    response["Tags"] = tags.result().get("TagSet")
+    response["Owner"] = acls.result().get("Owner")
+    response["Grants"] = acls.result().get("Grants")
+    return response
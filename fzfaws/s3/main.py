@@ -6,6 +6,7 @@ from typing import Any, List
 from fzfaws.s3.bucket_s3 import bucket_s3
 from fzfaws.s3.delete_s3 import delete_s3
 from fzfaws.s3.download_s3 import download_s3
+from fzfaws.s3.helper.integrity import get_verify_choices
 from fzfaws.s3.ls_s3 import ls_s3
 from fzfaws.s3.object_s3 import object_s3
 from fzfaws.s3.presign_s3 import presign_s3
@@ -67,7 +68,28 @@ def s3(raw_args: List[Any]) -> None:
         "--sync",
         action="store_true",
         default=False,
-        help="use the aws-cli s3 sync operation",
+        help="sync the local directory to s3, only transfer new and updated files",
+    )
+    upload_cmd.add_argument(
+        "--delete",
+        action="store_true",
+        default=False,
+        help="during sync, delete files in the destination that don't exist in the source",
+    )
+    upload_cmd.add_argument(
+        "-c",
+        "--checksum",
+        action="store_true",
+        default=False,
+        help="during sync, compare ETag instead of last modified time when the sizes are the same",
+    )
+    upload_cmd.add_argument(
+        "-u",
+        "--skip-unchanged",
+        action="store_true",
+        default=False,
+        help="during recursive upload, skip files with the same size and ETag in s3, "
+        + "local ETags are cached under $XDG_CACHE_HOME/fzfaws",
     )
     upload_cmd.add_argument(
         "-e",
@@ -99,6 +121,25 @@ def s3(raw_args: List[Any]) -> None:
         default=False,
         help="configure extra settings for the upload operation (e.g. ACL, StorageClass, Encryption)",
     )
+    upload_cmd.add_argument(
+        "--resume",
+        action="store_true",
+        default=False,
+        help="during recursive upload, skip files completed by a previous failed upload of the same directory, "
+        + "completed files are journaled under $XDG_CACHE_HOME/fzfaws/journals",
+    )
+    upload_cmd.add_argument(
+        "--verify",
+        nargs="?",
+        action="store",
+        const="md5",
+        choices=get_verify_choices(),
+        default=None,
+        help="verify the uploaded data against the ETag, and against the checksum of the algorithm if specified, "
+        + "the data is hashed during the transfer without reading it again, "
+        + "checksum algorithms need a botocore with s3 checksum support (md5 only with the pinned botocore), "
+        + "crc32c also needs awscrt (pip install fzfaws[crc32c])",
+    )
     upload_cmd.add_argument(
         "-P",
         "--profile",
@@ -146,7 +187,20 @@ def s3(raw_args: List[Any]) -> None:
         "--sync",
         action="store_true",
         default=False,
-        help="use the aws-cli s3 sync operation",
+        help="sync the s3 path to the local directory, only transfer new and updated files",
+    )
+    download_cmd.add_argument(
+        "--delete",
+        action="store_true",
+        default=False,
+        help="during sync, delete files in the destination that don't exist in the source",
+    )
+    download_cmd.add_argument(
+        "-c",
+        "--checksum",
+        action="store_true",
+        default=False,
+        help="during sync, compare ETag instead of last modified time when the sizes are the same",
     )
     download_cmd.add_argument(
         "-e",
@@ -178,6 +232,33 @@ def s3(raw_args: List[Any]) -> None:
         default=False,
         help="choose versions of the object to download, does not support recursive flag",
     )
+    download_cmd.add_argument(
+        "-I",
+        "--inventory",
+        nargs=1,
+        action="store",
+        default=[],
+        help="specify a s3 inventory manifest.json (local path or s3://bucket/path/manifest.json) to list objects from instead of listing the bucket",
+    )
+    download_cmd.add_argument(
+        "--resume",
+        action="store_true",
+        default=False,
+        help="during recursive download, skip objects completed by a previous failed download of the same path, "
+        + "completed objects are journaled under $XDG_CACHE_HOME/fzfaws/journals",
+    )
+    download_cmd.add_argument(
+        "--verify",
+        nargs="?",
+        action="store",
+        const="md5",
+        choices=get_verify_choices(),
+        default=None,
+        help="verify the downloaded data against the ETag, and against the checksum of the algorithm if specified, "
+        + "the data is hashed during the transfer without reading it again, "
+        + "checksum algorithms need a botocore with s3 checksum support (md5 only with the pinned botocore), "
+        + "crc32c also needs awscrt (pip install fzfaws[crc32c])",
+    )
     download_cmd.add_argument(
         "-P",
         "--profile",
@@ -218,7 +299,20 @@ def s3(raw_args: List[Any]) -> None:
         "--sync",
         action="store_true",
         default=False,
-        help="use the aws-cli s3 sync operation",
+        help="sync the s3 path to the destination s3 path, only transfer new and updated objects",
+    )
+    bucket_cmd.add_argument(
+        "--delete",
+        action="store_true",
+        default=False,
+        help="during sync, delete files in the destination that don't exist in the source",
+    )
+    bucket_cmd.add_argument(
+        "-c",
+        "--checksum",
+        action="store_true",
+        default=False,
+        help="during sync, compare ETag instead of last modified time when the sizes are the same",
     )
     bucket_cmd.add_argument(
         "-e",
@@ -250,6 +344,33 @@ def s3(raw_args: List[Any]) -> None:
         default=False,
         help="preserve object details when moving object (e.g. StorageClass, ACL, Encryption)",
     )
+    bucket_cmd.add_argument(
+        "-I",
+        "--inventory",
+        nargs=1,
+        action="store",
+        default=[],
+        help="specify a s3 inventory manifest.json (local path or s3://bucket/path/manifest.json) to list objects from instead of listing the bucket",
+    )
+    bucket_cmd.add_argument(
+        "--resume",
+        action="store_true",
+        default=False,
+        help="during recursive copy, skip objects completed by a previous failed copy of the same path, "
+        + "completed objects are journaled under $XDG_CACHE_HOME/fzfaws/journals",
+    )
+    bucket_cmd.add_argument(
+        "--verify",
+        nargs="?",
+        action="store",
+        const="md5",
+        choices=get_verify_choices(),
+        default=None,
+        help="verify the copied data against the ETag, and against the checksum of the algorithm if specified, "
+        + "the data is hashed during the transfer without reading it again, "
+        + "checksum algorithms need a botocore with s3 checksum support (md5 only with the pinned botocore), "
+        + "crc32c also needs awscrt (pip install fzfaws[crc32c])",
+    )
     bucket_cmd.add_argument(
         "-P",
         "--profile",
@@ -330,6 +451,21 @@ def s3(raw_args: List[Any]) -> None:
         default=False,
         help="delete all versions recursivly except the current version, useful for cleaning up versioned s3 bucket",
     )
+    delete_cmd.add_argument(
+        "-I",
+        "--inventory",
+        nargs=1,
+        action="store",
+        default=[],
+        help="specify a s3 inventory manifest.json (local path or s3://bucket/path/manifest.json) to list objects from instead of listing the bucket",
+    )
+    delete_cmd.add_argument(
+        "--resume",
+        action="store_true",
+        default=False,
+        help="during recursive delete, skip objects completed by a previous failed delete of the same path, "
+        + "completed objects are journaled under $XDG_CACHE_HOME/fzfaws/journals",
+    )
     delete_cmd.add_argument(
         "-P",
         "--profile",
@@ -430,6 +566,29 @@ def s3(raw_args: List[Any]) -> None:
         default=False,
         help="update the name of the selected object",
     )
+    object_cmd.add_argument(
+        "-I",
+        "--inventory",
+        nargs=1,
+        action="store",
+        default=[],
+        help="specify a s3 inventory manifest.json (local path or s3://bucket/path/manifest.json) to list objects from instead of listing the bucket",
+    )
+    object_cmd.add_argument(
+        "-m",
+        "--manifest",
+        nargs=1,
+        action="store",
+        default=[],
+        help="specify a csv manifest (bucket,key[,versionid], url encoded like a s3 batch operations manifest) or the completion report of a previous run to update the listed objects, only failed objects in a report are updated",
+    )
+    object_cmd.add_argument(
+        "--resume",
+        action="store_true",
+        default=False,
+        help="during recursive update, skip objects completed by a previous failed update of the same path, "
+        + "completed objects are journaled under $XDG_CACHE_HOME/fzfaws/journals",
+    )
     object_cmd.add_argument(
         "-P",
         "--profile",
@@ -500,6 +659,14 @@ def s3(raw_args: List[Any]) -> None:
         default=False,
         help="display the selected object version's versionid",
     )
+    ls_cmd.add_argument(
+        "-I",
+        "--inventory",
+        nargs=1,
+        action="store",
+        default=[],
+        help="specify a s3 inventory manifest.json (local path or s3://bucket/path/manifest.json) to list objects from instead of listing the bucket",
+    )
     ls_cmd.add_argument(
         "-P",
         "--profile",
@@ -548,6 +715,8 @@ def s3(raw_args: List[Any]) -> None:
         args.profile = True
     if hasattr(args, "bucketpath") and args.subparser_name != "bucket":
         args.bucketpath = args.bucketpath[0] if args.bucketpath else None
+    if hasattr(args, "inventory"):
+        args.inventory = args.inventory[0] if args.inventory else None
 
     if args.subparser_name == "upload":
         upload_s3(
@@ -561,6 +730,11 @@ def s3(raw_args: List[Any]) -> None:
             args.exclude,
             args.include,
             args.extra,
+            args.delete,
+            args.checksum,
+            args.skip_unchanged,
+            args.resume,
+            args.verify,
         )
     elif args.subparser_name == "download":
         local_path = args.path[0] if args.path else None
@@ -575,6 +749,11 @@ def s3(raw_args: List[Any]) -> None:
             args.include,
             args.hidden,
             args.version,
+            args.inventory,
+            args.delete,
+            args.checksum,
+            args.resume,
+            args.verify,
         )
     elif args.subparser_name == "bucket":
         from_bucket = args.bucketpath[0] if args.bucketpath else None
@@ -589,6 +768,11 @@ def s3(raw_args: List[Any]) -> None:
             args.include,
             args.version,
             args.preserve,
+            args.inventory,
+            args.delete,
+            args.checksum,
+            args.resume,
+            args.verify,
         )
     elif args.subparser_name == "delete":
         mfa = " ".join(args.mfa)
@@ -603,6 +787,8 @@ def s3(raw_args: List[Any]) -> None:
             args.allversion,
             args.deletemark,
             args.clean,
+            args.inventory,
+            args.resume,
         )
     elif args.subparser_name == "presign":
         presign_s3(args.profile, args.bucketpath, args.version, int(args.expires[0]))
@@ -616,6 +802,9 @@ def s3(raw_args: List[Any]) -> None:
             args.exclude,
             args.include,
             args.name,
+            inventory=args.inventory,
+            manifest=args.manifest[0] if args.manifest else None,
+            resume=args.resume,
         )
     elif args.subparser_name == "ls":
         ls_s3(
@@ -629,4 +818,5 @@ def s3(raw_args: List[Any]) -> None:
             args.arn,
             args.versionid,
             args.bucketpath,
+            args.inventory,
         )
@@ -1,8 +1,11 @@
 """Contains function to update s3 object attribute."""
-from typing import List, Optional, Union
+from typing import Any, Callable, Dict, List, Optional, Union
 
 from fzfaws.s3 import S3
+from fzfaws.s3.helper.batch_job import BatchJob, read_manifest
+from fzfaws.s3.helper.copy_engine import MULTIPART_COPY_THRESHOLD
 from fzfaws.s3.helper.get_copy_args import get_copy_args
+from fzfaws.s3.helper.journal import Journal, journal_id
 from fzfaws.s3.helper.s3args import S3Args
 from fzfaws.s3.helper.s3progress import S3Progress
 from fzfaws.s3.helper.s3transferwrapper import S3TransferWrapper
@@ -24,6 +27,9 @@ def object_s3(
     metadata: bool = False,
     tagging: bool = False,
     acl: bool = False,
+    inventory: str = None,
+    manifest: str = None,
+    resume: bool = False,
 ) -> None:
     """Update selected object settings.
 
@@ -54,6 +60,13 @@ def object_s3(
     :type tagging: bool, optional
     :param acl: update acl
     :type acl: bool, optional
+    :param inventory: local path or s3 uri of a s3 inventory manifest.json, list objects from the inventory
+    :type inventory: str, optional
+    :param manifest: csv manifest (bucket,key[,versionid]) or completion report of a previous run,
+        update the objects in it instead of selecting objects
+    :type manifest: str, optional
+    :param resume: during recursive update, skip objects completed by a previous failed update
+    :type resume: bool, optional
     """
     if exclude is None:
         exclude = []
@@ -64,7 +77,22 @@ def object_s3(
         version = True
 
     s3 = S3(profile)
+    if manifest:
+        update_object_recursive(
+            s3,
+            storage,
+            acl,
+            metadata,
+            encryption,
+            tagging,
+            manifest=manifest,
+            resume=resume,
+        )
+        return
+
     s3.set_bucket_and_path(bucket)
+    if inventory:
+        s3.set_inventory(inventory)
     if not s3.bucket_name:
         s3.set_s3_bucket()
     if recursive and not s3.path_list[0]:
@@ -80,7 +108,15 @@ def object_s3(
 
     elif recursive:
         update_object_recursive(
-            s3, storage, acl, metadata, encryption, tagging, exclude, include
+            s3,
+            storage,
+            acl,
+            metadata,
+            encryption,
+            tagging,
+            exclude,
+            include,
+            resume=resume,
         )
 
     elif version:
@@ -118,13 +154,16 @@ def object_s3(
                     )
                     copy_source = {"Bucket": s3.bucket_name, "Key": s3_key}
                     s3transferwrapper = S3TransferWrapper()
+                    size = s3.get_object_size(s3_key)
                     s3.client.copy(
                         copy_source,
                         s3.bucket_name,
                         s3_key,
-                        Callback=S3Progress(s3_key, s3.bucket_name, s3.client),
+                        Callback=S3Progress(
+                            s3_key, s3.bucket_name, s3.client, size=size,
+                        ),
                         ExtraArgs=copy_object_args,
-                        Config=s3transferwrapper.transfer_config,
+                        Config=s3transferwrapper.get_transfer_config(size),
                     )
 
 
@@ -158,33 +197,17 @@ def update_object_version(
             % (s3.bucket_name, obj_version.get("Key"), obj_version.get("VersionId"))
         )
     if get_confirmation("Confirm?"):
-        for obj_version in obj_versions:
-            print(
-                "update: s3://%s/%s with version %s"
-                % (
-                    s3.bucket_name,
-                    obj_version.get("Key"),
-                    obj_version.get("VersionId"),
-                )
+        if check_result:
+            BatchJob(get_update_operation(s3, s3_args, check_result), "update").run(
+                {
+                    "Bucket": s3.bucket_name,
+                    "Key": obj_version.get("Key"),
+                    "VersionId": obj_version.get("VersionId"),
+                }
+                for obj_version in obj_versions
             )
-            if check_result:
-                if check_result.get("Tags"):
-                    s3.client.put_object_tagging(
-                        Bucket=s3.bucket_name,
-                        Key=obj_version.get("Key"),
-                        VersionId=obj_version.get("VersionId"),
-                        Tagging={"TagSet": check_result.get("Tags")},
-                    )
-                if check_result.get("Grants"):
-                    grant_args = {
-                        "Bucket": s3.bucket_name,
-                        "Key": obj_version.get("Key"),
-                        "VersionId": obj_version.get("VersionId"),
-                    }
-                    grant_args.update(check_result.get("Grants", {}))
-                    s3.client.put_object_acl(**grant_args)
-            else:
-                print("Nothing to update")
+        else:
+            print("Nothing to update")
 
 
 def update_object_recursive(
@@ -196,9 +219,16 @@ def update_object_recursive(
     tagging: bool = False,
     exclude: Optional[List[str]] = None,
     include: Optional[List[str]] = None,
+    manifest: str = None,
+    resume: bool = False,
 ) -> None:
     """Recursive update object attributes.
 
+    The objects are updated through a BatchJob, which writes a completion
+    report of the updated and failed objects. Every updated object is also
+    recorded in a Journal, with resume the objects recorded by a previous
+    failed update with the same settings are skipped.
+
     :param s3: S3 class instance
     :type s3: S3
     :param storage: update storage
@@ -215,6 +245,10 @@ def update_object_recursive(
     :type exclude: List[str], optional
     :param include: glob pattern to include
     :type include: List[str], optional
+    :param manifest: path of a csv manifest or a completion report, update the objects in it
+    :type manifest: str, optional
+    :param resume: skip the objects completed by a previous failed update
+    :type resume: bool, optional
     """
     if exclude is None:
         exclude = []
@@ -226,51 +260,136 @@ def update_object_recursive(
     # check if only tags or acl is being updated
     # this way it won't create extra versions on the object
     check_result = s3_args.check_tag_acl()
-
-    file_list = walk_s3_folder(
-        s3.client,
-        s3.bucket_name,
-        s3.path_list[0],
-        s3.path_list[0],
-        [],
-        exclude,
-        include,
-        "object",
-        s3.path_list[0],
-        s3.bucket_name,
+    journal = Journal(
+        "update",
+        {
+            "bucket": s3.bucket_name,
+            "prefix": s3.path_list[0],
+            "exclude": exclude,
+            "include": include,
+            "manifest": manifest,
+            "extra_args": s3_args.extra_args,
+        },
+        resume=resume,
     )
+
+    if manifest:
+        manifest_list: List[Dict[str, Any]] = list(
+            journal.pending(
+                read_manifest(manifest),
+                lambda item: journal_id(item["Key"], item.get("VersionId")),
+            )
+        )
+        for item in manifest_list:
+            print(
+                "(dryrun) update: s3://%s/%s%s"
+                % (
+                    item["Bucket"],
+                    item["Key"],
+                    " with version %s" % item["VersionId"]
+                    if item.get("VersionId")
+                    else "",
+                )
+            )
+    else:
+        sizes: Dict[str, int] = {}
+        inventory = s3.get_inventory()
+        file_list = walk_s3_folder(
+            s3.get_client(),
+            s3.bucket_name,
+            s3.path_list[0],
+            s3.path_list[0],
+            [],
+            exclude,
+            include,
+            "object",
+            s3.path_list[0],
+            s3.bucket_name,
+            inventory=inventory,
+            sizes=sizes,
+            completed=journal,
+        )
+        if inventory is not None:
+            # the inventory is a snapshot, make sure the objects still exist
+            file_list = s3.confirm_file_list(file_list, sizes=sizes)
+        manifest_list = [
+            {"Bucket": s3.bucket_name, "Key": s3_key, "Size": sizes.get(s3_key)}
+            for s3_key, _ in file_list
+        ]
     if get_confirmation("Confirm?"):
-        if check_result:
-            for original_key, _ in file_list:
-                print("update: s3://%s/%s" % (s3.bucket_name, original_key))
-                if check_result.get("Tags"):
-                    s3.client.put_object_tagging(
-                        Bucket=s3.bucket_name,
-                        Key=original_key,
-                        Tagging={"TagSet": check_result.get("Tags")},
-                    )
-                if check_result.get("Grants"):
-                    grant_args = {"Bucket": s3.bucket_name, "Key": original_key}
-                    grant_args.update(check_result.get("Grants", {}))
-                    s3.client.put_object_acl(**grant_args)
+        # Note: copy will create new version if version is enabled
+        with journal:
+            BatchJob(
+                get_update_operation(s3, s3_args, check_result),
+                "update",
+                journal=journal,
+            ).run(manifest_list)
+
+
+def get_update_operation(
+    s3: S3, s3_args: S3Args, check_result: Dict[str, Any]
+) -> Callable[[Dict[str, Any]], None]:
+    """Get the operation of BatchJob to update a single object.
+
+    Only tags and acl are updated in place, other settings are updated by
+    copying the object to itself.
+
+    :param s3: S3 class instance
+    :type s3: S3
+    :param s3_args: S3Args instance with the new settings
+    :type s3_args: S3Args
+    :param check_result: result of s3_args.check_tag_acl()
+    :type check_result: Dict[str, Any]
+    :return: the operation to pass to BatchJob
+    :rtype: Callable[[Dict[str, Any]], None]
+    """
+
+    def update_tag_acl(item: Dict[str, Any]) -> None:
+        version_args = {"VersionId": item["VersionId"]} if item.get("VersionId") else {}
+        if check_result.get("Tags"):
+            s3.client.put_object_tagging(
+                Bucket=item["Bucket"],
+                Key=item["Key"],
+                Tagging={"TagSet": check_result.get("Tags")},
+                **version_args
+            )
+        if check_result.get("Grants"):
+            s3.client.put_object_acl(
+                Bucket=item["Bucket"],
+                Key=item["Key"],
+                **version_args,
+                **check_result.get("Grants", {})
+            )
 
+    def update_copy(item: Dict[str, Any]) -> None:
+        copy_object_args = get_copy_args(
+            s3,
+            item["Key"],
+            s3_args,
+            extra_args=True,
+            version=item.get("VersionId"),
+            bucket=item["Bucket"],
+        )
+        copy_source = {"Bucket": item["Bucket"], "Key": item["Key"]}
+        if item.get("VersionId"):
+            copy_source["VersionId"] = item["VersionId"]
+        if item.get("Size") is not None and item["Size"] < MULTIPART_COPY_THRESHOLD:
+            s3.client.copy_object(
+                Bucket=item["Bucket"],
+                Key=item["Key"],
+                CopySource=copy_source,
+                **copy_object_args
+            )
         else:
-            for original_key, _ in file_list:
-                print("update: s3://%s/%s" % (s3.bucket_name, original_key))
-                # Note: this will create new version if version is enabled
-                copy_object_args = get_copy_args(
-                    s3, original_key, s3_args, extra_args=True
-                )
-                copy_source = {"Bucket": s3.bucket_name, "Key": original_key}
-                s3transferwrapper = S3TransferWrapper()
-                s3.client.copy(
-                    copy_source,
-                    s3.bucket_name,
-                    original_key,
-                    Callback=S3Progress(original_key, s3.bucket_name, s3.client),
-                    ExtraArgs=copy_object_args,
-                    Config=s3transferwrapper.transfer_config,
-                )
+            s3.client.copy(
+                copy_source,
+                item["Bucket"],
+                item["Key"],
+                ExtraArgs=copy_object_args,
+                Config=S3TransferWrapper().get_transfer_config(item.get("Size")),
+            )
+
+    return update_tag_acl if check_result else update_copy
 
 
 def update_object_name(s3: S3, version: bool = False) -> None:
@@ -304,13 +423,16 @@ def update_object_name(s3: S3, version: bool = False) -> None:
                 "Key": s3.path_list[0],
             }
             s3transferwrapper = S3TransferWrapper()
+            size = s3.get_object_size()
             s3.client.copy(
                 copy_source,
                 s3.bucket_name,
                 new_name,
-                Callback=S3Progress(s3.path_list[0], s3.bucket_name, s3.client),
+                Callback=S3Progress(
+                    s3.path_list[0], s3.bucket_name, s3.client, size=size,
+                ),
                 ExtraArgs=copy_object_args,
-                Config=s3transferwrapper.transfer_config,
+                Config=s3transferwrapper.get_transfer_config(size),
             )
             s3.client.delete_object(
                 Bucket=s3.bucket_name, Key=s3.path_list[0],
@@ -355,6 +477,9 @@ def update_object_name(s3: S3, version: bool = False) -> None:
                 "VersionId": obj_version.get("VersionId"),
             }
             s3transferwrapper = S3TransferWrapper()
+            size = s3.get_object_size(
+                obj_version.get("Key", ""), obj_version.get("VersionId", "")
+            )
             s3.client.copy(
                 copy_source,
                 s3.bucket_name,
@@ -364,7 +489,8 @@ def update_object_name(s3: S3, version: bool = False) -> None:
                     s3.bucket_name,
                     s3.client,
                     version_id=obj_version.get("VersionId"),
+                    size=size,
                 ),
                 ExtraArgs=copy_object_args,
-                Config=s3transferwrapper.transfer_config,
+                Config=s3transferwrapper.get_transfer_config(size),
             )
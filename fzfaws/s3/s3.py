@@ -1,12 +1,33 @@
 """Contains the s3 wrapper class."""
+import json
 import os
 import re
-import itertools
-from typing import Any, Dict, Generator, List, Optional, Sequence, Tuple, Union
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import (
+    Any,
+    Dict,
+    Generator,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    Union,
+)
 
 from botocore.exceptions import ClientError
 
-from fzfaws.utils import BaseSession, FileLoader, Pyfzf, Spinner, get_confirmation
+from fzfaws.s3.helper.inventory import load_inventory, parse_s3_uri
+from fzfaws.s3.helper.object_cache import get_object_cache
+from fzfaws.s3.helper.version_index import VersionIndex
+from fzfaws.utils import (
+    BaseSession,
+    FileLoader,
+    Pyfzf,
+    Spinner,
+    get_cache_dir,
+    get_confirmation,
+)
 from fzfaws.utils.exceptions import (
     InvalidFileType,
     InvalidS3PathPattern,
@@ -34,6 +55,14 @@ class S3(BaseSession):
         super().__init__(profile=profile, region=region, service_name="s3")
         self.bucket_name: str = ""
         self.path_list: List[str] = [""]
+        self._version_index: Optional[VersionIndex] = None
+        self._inventory: Optional[VersionIndex] = None
+        self._object_sizes: Dict[str, Dict[str, int]] = {}
+        self._bucket_regions: Optional[Dict[str, str]] = None
+        # session region used for buckets whose location couldn't be read, not persisted
+        self._fallback_regions: Dict[str, str] = {}
+        self._region_clients: Dict[str, Any] = {}
+        self._region_lock = threading.Lock()
 
     def set_s3_bucket(self, header: str = "", no_progress: bool = False) -> None:
         """List bucket through fzf and let user select a bucket.
@@ -111,10 +140,15 @@ class S3(BaseSession):
                 fzf.append_fzf("\033[33m./\033[0m\n")
                 with Spinner.spin(message="Fetching s3 objects ..."):
                     preview: str = ""
-                    for result in paginator.paginate(
-                        Bucket=self.bucket_name,
-                        Prefix=self.path_list[0],
-                        Delimiter="/",
+                    inventory = self.get_inventory()
+                    for result in (
+                        [inventory.list_folder(self.path_list[0])]
+                        if inventory
+                        else paginator.paginate(
+                            Bucket=self.bucket_name,
+                            Prefix=self.path_list[0],
+                            Delimiter="/",
+                        )
                     ):
                         for prefix in result.get("CommonPrefixes", []):
                             fzf.append_fzf("%s\n" % prefix.get("Prefix"))
@@ -182,32 +216,59 @@ class S3(BaseSession):
         :raises NoSelectionMade: when there is no selection made
         """
         fzf = Pyfzf()
+        inventory = self.get_inventory()
 
         if not version:
+            sizes: Dict[str, int] = {}
+            self._object_sizes[self.bucket_name] = sizes
             paginator = self.client.get_paginator("list_objects")
             with Spinner.spin(
                 message="Fetching s3 objects ...", no_progress=no_progress
             ):
-                for result in paginator.paginate(Bucket=self.bucket_name):
-                    for file in result.get("Contents", []):
-                        if file.get("Key").endswith("/") or not file.get("Key"):
-                            # user created dir in S3 console will appear in the result and is not operatable
-                            continue
-                        fzf.append_fzf("Key: %s\n" % file.get("Key"))
+                if inventory:
+                    files = (
+                        file
+                        for file in inventory.latest()
+                        if not file.get("DeleteMarker")
+                    )
+                else:
+                    files = (
+                        file
+                        for result in paginator.paginate(Bucket=self.bucket_name)
+                        for file in result.get("Contents", [])
+                    )
+                for file in files:
+                    if file.get("Key").endswith("/") or not file.get("Key"):
+                        # user created dir in S3 console will appear in the result and is not operatable
+                        continue
+                    # sizes of the inventory snapshot could be outdated
+                    if not inventory and file.get("Size") is not None:
+                        sizes[file.get("Key")] = file.get("Size")
+                    fzf.append_fzf("Key: %s\n" % file.get("Key"))
             if multi_select:
                 self.path_list = list(
                     fzf.execute_fzf(multi_select=True, delimiter=": ")
                 )
             else:
                 self.path_list[0] = str(fzf.execute_fzf(delimiter=": "))
+            if inventory:
+                # the inventory is a snapshot, make sure the selection still exists
+                self.path_list = self.confirm_objects(self.path_list)
 
         else:
             paginator = self.client.get_paginator("list_object_versions")
             with Spinner.spin(
                 message="Fetching s3 objects ...", no_progress=no_progress
             ):
-                results = paginator.paginate(Bucket=self.bucket_name)
-                version_obj_genrator = self._uniq_object_generator(results, deletemark)
+                if inventory and self._version_index is inventory:
+                    version_obj_genrator = self._uniq_key_generator(
+                        inventory, deletemark
+                    )
+                else:
+                    results = paginator.paginate(Bucket=self.bucket_name)
+                    version_obj_genrator = self._uniq_object_generator(
+                        results, deletemark
+                    )
                 generated = False
                 for item in version_obj_genrator:
                     generated = True
@@ -230,9 +291,13 @@ class S3(BaseSession):
         non_current: bool = False,
         multi_select: bool = True,
         no_progress: bool = False,
+        keys: Optional[List[str]] = None,
     ) -> List[Dict[str, str]]:
         """List object versions through fzf.
-        
+
+        Versions of all keys are fetched together through VersionIndex.from_keys,
+        instead of one list_object_versions pass per key.
+
         :param bucket: object's bucketname, if not set, class instance's bucket_name will be used
         :type bucket: str, optional
         :param key: object's key, if not set, class instance's path_list[0] will be used
@@ -247,6 +312,8 @@ class S3(BaseSession):
         :type multi_select: bool, optional
         :param no_progress: don't display progress bar, useful for ls command
         :type no_progress: bool, optional
+        :param keys: list of object keys, takes priority over key and path_list
+        :type keys: List[str], optional
         :return: list of selected versions
         :rtype: List[Dict[str, str]]
 
@@ -257,42 +324,37 @@ class S3(BaseSession):
         key_list: list = []
         fzf = Pyfzf()
 
-        if key:
+        if keys:
+            key_list.extend(keys)
+        elif key:
             key_list.append(key)
         else:
             key_list.extend(self.path_list)
-        selected_versions: list = []
-        for key in key_list:
-            response_generator: Union[list, Generator[Dict[str, str], None, None]] = []
+
+        if not self._version_index or not all(
+            self._version_index.covers(bucket, key) for key in key_list
+        ):
             with Spinner.spin(
                 message="Fetching object versions ...", no_progress=no_progress
             ):
-                paginator = self.client.get_paginator("list_object_versions")
-                for result in paginator.paginate(Bucket=bucket, Prefix=key):
-                    response_generator = self._version_generator(
-                        result.get("Versions", []),
-                        result.get("DeleteMarkers", []),
-                        non_current,
-                        delete,
-                    )
-                    if not select_all:
-                        fzf.process_list(
-                            response_generator,
-                            "VersionId",
-                            "Key",
-                            "IsLatest",
-                            "DeleteMarker",
-                            "LastModified",
-                        )
-                    else:
-                        selected_versions.extend(
-                            [
-                                {"Key": key, "VersionId": version.get("VersionId")}
-                                for version in response_generator
-                            ]
-                        )
+                self._version_index = VersionIndex.from_keys(
+                    self.client, bucket, key_list
+                )
 
+        selected_versions: list = []
+        for key in key_list:
+            response_generator = self._indexed_version_generator(
+                key, non_current, delete
+            )
             if not select_all:
+                fzf.process_list(
+                    response_generator,
+                    "VersionId",
+                    "Key",
+                    "IsLatest",
+                    "DeleteMarker",
+                    "LastModified",
+                )
                 if delete and multi_select:
                     for result in fzf.execute_fzf(multi_select=True):
                         selected_versions.append({"Key": key, "VersionId": result})
@@ -300,13 +362,185 @@ class S3(BaseSession):
                     selected_versions.append(
                         {"Key": key, "VersionId": str(fzf.execute_fzf())}
                     )
+            else:
+                selected_versions.extend(
+                    [
+                        {"Key": key, "VersionId": version.get("VersionId")}
+                        for version in response_generator
+                    ]
+                )
         return selected_versions
 
+    def set_inventory(self, manifest: str, no_progress: bool = False) -> None:
+        """Use a s3 inventory report as the listing source of its bucket.
+
+        Object selection, path selection and recursive operations on the source
+        bucket of the inventory are served from the snapshot instead of listing
+        the bucket. If the report contains all versions, it's also used to answer
+        version selections.
+
+        :param manifest: local path or s3 uri of the inventory manifest.json
+        :type manifest: str
+        :param no_progress: don't display progress bar, useful for ls command
+        :type no_progress: bool, optional
+        """
+        manifest_bucket, _ = parse_s3_uri(manifest)
+        client = self.get_client(manifest_bucket) if manifest_bucket else self.client
+        with Spinner.spin(message="Loading s3 inventory ...", no_progress=no_progress):
+            index, versioned = load_inventory(manifest, client)
+        self._inventory = index
+        if versioned:
+            self._version_index = index
+        if not self.bucket_name:
+            self.bucket_name = index.bucket
+
+    def get_inventory(self, bucket: str = "") -> Optional[VersionIndex]:
+        """Get the inventory snapshot of the bucket.
+
+        :param bucket: name of the bucket, if not set, class instance's bucket_name will be used
+        :type bucket: str, optional
+        :return: the inventory index, None if no inventory is loaded for the bucket
+        :rtype: Optional[VersionIndex]
+        """
+        bucket = bucket if bucket else self.bucket_name
+        if self._inventory is not None and self._inventory.bucket == bucket:
+            return self._inventory
+        return None
+
+    def confirm_objects(
+        self,
+        keys: List[str],
+        bucket: str = "",
+        sizes: Optional[Dict[str, int]] = None,
+        etags: Optional[Dict[str, str]] = None,
+    ) -> List[str]:
+        """Confirm the objects still exist through concurrent head_object calls.
+
+        Used to validate keys selected from an inventory snapshot. The sizes
+        from the head_object responses are recorded for get_object_size,
+        replacing the possibly outdated sizes of the snapshot.
+
+        :param keys: keys to confirm
+        :type keys: List[str]
+        :param bucket: name of the bucket, if not set, class instance's bucket_name will be used
+        :type bucket: str, optional
+        :param sizes: dict to also store the live size of each confirmed object
+        :type sizes: Dict[str, int], optional
+        :param etags: dict to store the live ETag of each confirmed object
+        :type etags: Dict[str, str], optional
+        :raises NoSelectionMade: when none of the keys exist anymore
+        :return: the keys that still exist, in the original order
+        :rtype: List[str]
+        """
+        bucket = bucket if bucket else self.bucket_name
+        client = self.get_client(bucket)
+        object_sizes = self._object_sizes.setdefault(bucket, {})
+
+        def exists(key: str) -> bool:
+            try:
+                response = client.head_object(Bucket=bucket, Key=key)
+                object_sizes[key] = response["ContentLength"]
+                if sizes is not None:
+                    sizes[key] = response["ContentLength"]
+                if etags is not None and response.get("ETag"):
+                    etags[key] = response["ETag"]
+                return True
+            except ClientError as e:
+                if e.response["Error"]["Code"] in ("404", "NoSuchKey"):
+                    return False
+                raise
+
+        with ThreadPoolExecutor(max_workers=10) as executor:
+            results = list(executor.map(exists, keys))
+        confirmed: List[str] = []
+        for key, result in zip(keys, results):
+            if result:
+                confirmed.append(key)
+            else:
+                print("s3://%s/%s no longer exists, skipped" % (bucket, key))
+        if not confirmed:
+            raise NoSelectionMade
+        return confirmed
+
+    def confirm_file_list(
+        self,
+        file_list: List[Tuple[str, str]],
+        bucket: str = "",
+        sizes: Optional[Dict[str, int]] = None,
+        etags: Optional[Dict[str, str]] = None,
+    ) -> List[Tuple[str, str]]:
+        """Confirm the objects of a walk_s3_folder over the inventory still exist.
+
+        The inventory is a snapshot, recursive operations would otherwise
+        download, copy or update objects deleted since.
+
+        :param file_list: original and destination key of the walked objects
+        :type file_list: List[Tuple[str, str]]
+        :param bucket: name of the bucket, if not set, class instance's bucket_name will be used
+        :type bucket: str, optional
+        :param sizes: dict to store the live size of each confirmed object
+        :type sizes: Dict[str, int], optional
+        :param etags: dict to store the live ETag of each confirmed object
+        :type etags: Dict[str, str], optional
+        :raises NoSelectionMade: when none of the objects exist anymore
+        :return: the walked objects that still exist, in the original order
+        :rtype: List[Tuple[str, str]]
+        """
+        if not file_list:
+            return file_list
+        confirmed = set(
+            self.confirm_objects(
+                [s3_key for s3_key, _ in file_list], bucket, sizes, etags
+            )
+        )
+        return [
+            (s3_key, destination)
+            for s3_key, destination in file_list
+            if s3_key in confirmed
+        ]
+
+    def get_object_size(
+        self, key: str = "", version_id: str = "", bucket: str = ""
+    ) -> Optional[int]:
+        """Get the size of an object from the previous listing.
+
+        Sizes are recorded by set_s3_object, confirm_objects and the version
+        index, so the size could be passed to S3Progress or the transfer
+        without a head_object call. The size of the latest version in an
+        inventory snapshot could be outdated and is never returned, the
+        size of a specific version can't change.
+
+        :param key: object's key, if not set, class instance's path_list[0] will be used
+        :type key: str, optional
+        :param version_id: get the size of a specific version
+        :type version_id: str, optional
+        :param bucket: name of the bucket, if not set, class instance's bucket_name will be used
+        :type bucket: str, optional
+        :return: size of the object in bytes, None if the object wasn't listed
+        :rtype: Optional[int]
+        """
+        bucket = bucket if bucket else self.bucket_name
+        key = key if key else self.path_list[0]
+        if not version_id and key in self._object_sizes.get(bucket, {}):
+            return self._object_sizes[bucket][key]
+        if self._version_index and self._version_index.covers(bucket, key):
+            for version in self._version_index.versions(key):
+                if version.get("DeleteMarker"):
+                    continue
+                if (version_id and version.get("VersionId") == version_id) or (
+                    not version_id
+                    and version.get("IsLatest")
+                    and self._version_index is not self._inventory
+                ):
+                    return version.get("Size")
+        return None
+
     def get_object_data(self, file_type: str = "") -> Dict[str, Any]:
         """Read the s3 object.
 
         Read the s3 object file and if is yaml/json file_type, load the file into dict
-        currently is only used for cloudformation.
+        currently is only used for cloudformation. With the object cache enabled,
+        the object is read from the cache if it hasn't changed.
 
         :param file_type: type of file to process, supported value: yaml/json
         :type file_type: str
@@ -315,8 +549,14 @@ class S3(BaseSession):
         :rtype: Dict[str, Any]
         """
         with Spinner.spin(message="Reading file from s3 ..."):
-            s3_object = self.resource.Object(self.bucket_name, self.path_list[0])
-            body = s3_object.get()["Body"].read()
+            object_cache = get_object_cache()
+            if object_cache is not None:
+                body = object_cache.read(
+                    self.client, self.bucket_name, self.path_list[0]
+                )
+            else:
+                s3_object = self.resource.Object(self.bucket_name, self.path_list[0])
+                body = s3_object.get()["Body"].read()
             body_dict: Dict[str, Any] = {}
             fileloader = FileLoader(body=body)
             if file_type == "yaml":
@@ -340,8 +580,7 @@ class S3(BaseSession):
         if not object_key:
             object_key = self.path_list[0]
 
-        response = self.client.get_bucket_location(Bucket=self.bucket_name)
-        bucket_location = response["LocationConstraint"]
+        bucket_location = self.get_bucket_region()
         if not version:
             return "https://s3-%s.amazonaws.com/%s/%s" % (
                 bucket_location,
@@ -356,6 +595,94 @@ class S3(BaseSession):
                 version,
             )
 
+    def get_bucket_region(self, bucket: str = "") -> str:
+        """Get the region of the bucket.
+
+        Bucket regions are cached in memory and persisted under the fzfaws cache
+        directory, so get_bucket_location is only called once for each bucket.
+        When the location couldn't be read, the session region is cached in
+        memory only, as the permission could be granted later.
+
+        :param bucket: name of the bucket, if not set, class instance's bucket_name will be used
+        :type bucket: str, optional
+        :return: region of the bucket
+        :rtype: str
+        """
+        bucket = bucket if bucket else self.bucket_name
+        if bucket.startswith("arn:"):
+            # access point arn contains the region, arn:aws:s3:region:account:accesspoint/name
+            return bucket.split(":")[3]
+
+        with self._region_lock:
+            if self._bucket_regions is None:
+                self._bucket_regions = self._load_bucket_regions()
+            if bucket in self._bucket_regions:
+                return self._bucket_regions[bucket]
+            if bucket in self._fallback_regions:
+                return self._fallback_regions[bucket]
+
+        try:
+            response = self.client.get_bucket_location(Bucket=bucket)
+        except ClientError:
+            # no permission to get the location, let s3 redirect the requests
+            with self._region_lock:
+                self._fallback_regions[bucket] = self.client.meta.region_name
+            return self.client.meta.region_name
+        # buckets in us-east-1 have a LocationConstraint of None
+        # and legacy buckets in eu-west-1 could have a LocationConstraint of EU
+        region = response.get("LocationConstraint") or "us-east-1"
+        if region == "EU":
+            region = "eu-west-1"
+
+        with self._region_lock:
+            self._bucket_regions[bucket] = region
+            self._save_bucket_regions()
+        return region
+
+    def get_client(self, bucket: str = ""):
+        """Get a s3 client which sends requests to the region of the bucket.
+
+        Clients are pooled per region, the default client is returned when
+        the bucket is in the same region as the session.
+
+        :param bucket: name of the bucket, if not set, class instance's bucket_name will be used
+        :type bucket: str, optional
+        :return: boto3 s3 client for the bucket region
+        :rtype: boto3.client
+        """
+        region = self.get_bucket_region(bucket)
+        if region == self.client.meta.region_name:
+            return self.client
+        with self._region_lock:
+            if region not in self._region_clients:
+                self._region_clients[region] = self.session.client(
+                    "s3", region_name=region
+                )
+            return self._region_clients[region]
+
+    def _load_bucket_regions(self) -> Dict[str, str]:
+        """Load the persisted bucket region cache.
+
+        :return: dict of bucket name to region
+        :rtype: Dict[str, str]
+        """
+        cache_path = os.path.join(get_cache_dir(), "bucket_region.json")
+        if not os.path.isfile(cache_path):
+            return {}
+        with open(cache_path, "r") as file:
+            try:
+                return json.load(file)
+            except ValueError:
+                return {}
+
+    def _save_bucket_regions(self) -> None:
+        """Persist the bucket region cache."""
+        cache_path = os.path.join(get_cache_dir(), "bucket_region.json")
+        tmp_path = "%s.%s" % (cache_path, os.getpid())
+        with open(tmp_path, "w") as file:
+            json.dump(self._bucket_regions, file)
+        os.replace(tmp_path, cache_path)
+
     def get_s3_destination_key(self, local_path: str, recursive: bool = False) -> str:
         """Set the s3 key for upload destination.
 
@@ -474,16 +801,41 @@ class S3(BaseSession):
                     "LastModified": marker.get("LastModified"),
                 }
 
+    def _indexed_version_generator(
+        self, key: str, non_current: bool, delete: bool
+    ) -> Generator[Dict[str, Any], None, None]:
+        """Create version generator from the version index.
+
+        :param key: object key to get versions
+        :type key: str
+        :param non_current: just include non_current object?
+        :type non_current: bool
+        :param delete: include delete marker
+        :type delete: bool
+        :return: formatted dict of version information in generator form
+        :rtype: Generator[Dict[str, Any], None, None]
+        """
+        if not self._version_index:
+            return
+        for version in self._version_index.versions(key):
+            if non_current and version.get("IsLatest"):
+                continue
+            if not delete and version.get("DeleteMarker"):
+                continue
+            yield version
+
     def _uniq_object_generator(
         self, results: List[Dict[str, Any]], onlydelete: bool
     ) -> Generator[str, None, None]:
         """Create uniq version generator.
 
-        Attempt to improve the performance on big data sets. Comparing with previous
-        solutions, although this handle one less edge case (if user delete a version object
-        but then created a new object with the same name), this is much faster and better
-        in memory usage.
-        
+        Pages are merged into a VersionIndex as they arrive, so that keys with versions
+        spanning multiple pages are only listed once and a delete marker on one page
+        is still associated with the versions on the other pages. Keys are yield after
+        each page except the last key of the page, which could continue on the next
+        page. The index is kept on the instance so get_object_version could answer
+        without listing again.
+
         :param results: the result from boto3 paginator
         :type results: List[Dict[str, Any]]
         :param onlydelete: boolean indicator indicates whether to only show deletemark.
@@ -492,24 +844,40 @@ class S3(BaseSession):
         :return: return the uniq object generator
         :rtype: Generator[str, None, None]
         """
-
-        def _uniq(version_obj):
-            return version_obj.get("Key")
-
+        index = VersionIndex(bucket=self.bucket_name)
+        done = 0
         for result in results:
-            deletemarks = itertools.groupby(result.get("DeleteMarkers", []), _uniq)
-            delete_sets = set()
-            for deletemark, _ in deletemarks:
-                delete_sets.add(deletemark)
-
-            for deletemark in delete_sets:
-                if deletemark.endswith("/"):
-                    continue
-                yield "\033[31m" + "Key: %s" % deletemark + "\033[0m"
+            index.add_page(result)
+            end = max(done, index.key_count - 1)
+            yield from self._uniq_key_generator(index, onlydelete, done, end)
+            done = end
+        yield from self._uniq_key_generator(index, onlydelete, done)
+        self._version_index = index
+
+    def _uniq_key_generator(
+        self,
+        index: VersionIndex,
+        onlydelete: bool,
+        start: int = 0,
+        end: Optional[int] = None,
+    ) -> Generator[str, None, None]:
+        """Create uniq key generator from the version index.
 
-            if not onlydelete:
-                for version, _ in itertools.groupby(result.get("Versions", []), _uniq):
-                    if version.endswith("/") or version in delete_sets:
-                        continue
-                    else:
-                        yield "Key: %s" % version
+        :param index: the version index to get keys from
+        :type index: VersionIndex
+        :param onlydelete: only show keys with deletemark
+        :type onlydelete: bool
+        :param start: key id to start from
+        :type start: int, optional
+        :param end: key id to stop before, default to all keys
+        :type end: int, optional
+        :return: return the uniq object generator
+        :rtype: Generator[str, None, None]
+        """
+        for key, deleted in index.uniq_keys(onlydelete, start, end):
+            if key.endswith("/"):
+                continue
+            if deleted:
+                yield "\033[31m" + "Key: %s" % key + "\033[0m"
+            else:
+                yield "Key: %s" % key
@@ -1,14 +1,22 @@
 """Contains function to upload file to s3."""
+import json
 import os
-from typing import Dict, List, Optional, Union
+import tempfile
+from typing import IO, Dict, Generator, List, Optional, Tuple, Union
 
 from fzfaws.s3 import S3
-from fzfaws.s3.helper.exclude_file import exclude_file
+from fzfaws.s3.helper.etag_index import ETagIndex
+from fzfaws.s3.helper.journal import Journal
+from fzfaws.s3.helper.resumable_upload import abort_upload, list_saved_uploads
 from fzfaws.s3.helper.s3args import S3Args
-from fzfaws.s3.helper.s3progress import S3Progress
-from fzfaws.s3.helper.s3transferwrapper import S3TransferWrapper
+from fzfaws.s3.helper.s3progress import human_readable_size
+from fzfaws.s3.helper.s3transferscheduler import S3TransferScheduler
 from fzfaws.s3.helper.sync_s3 import sync_s3
-from fzfaws.utils import Pyfzf, get_confirmation
+from fzfaws.s3.helper.walk_local_folder import LocalFile, walk_local_folder
+from fzfaws.utils import Pyfzf, Spinner, get_confirmation
+
+# print the summary instead of every file during dryrun above this number of files
+DRYRUN_LIMIT = 1000
 
 
 def upload_s3(
@@ -22,6 +30,11 @@ def upload_s3(
     exclude: Optional[List[str]] = None,
     include: Optional[List[str]] = None,
     extra_config: bool = False,
+    delete: bool = False,
+    checksum: bool = False,
+    skip_unchanged: bool = False,
+    resume: bool = False,
+    verify: Optional[str] = None,
 ) -> None:
     """Upload local files/directories to s3.
 
@@ -40,7 +53,7 @@ def upload_s3(
     :type hidden: bool, optional
     :param search_root: search from root
     :type search_root: bool, optional
-    :param sync: use aws cli s3 sync
+    :param sync: sync the local directory to s3
     :type sync: bool, optional
     :param exclude: glob patterns to exclude
     :type exclude: List[str], optional
@@ -48,6 +61,16 @@ def upload_s3(
     :type include: List[str], optional
     :param extra_config: configure extra settings during upload
     :type extra_config: bool, optional
+    :param delete: during sync, delete files in the destination that don't exist in the source
+    :type delete: bool, optional
+    :param checksum: during sync, compare ETag instead of last modified time
+    :type checksum: bool, optional
+    :param skip_unchanged: during recursive upload, skip files with the same ETag in s3
+    :type skip_unchanged: bool, optional
+    :param resume: during recursive upload, skip files completed by a previous failed upload
+    :type resume: bool, optional
+    :param verify: verify the uploaded data, md5 for the ETag only or a checksum algorithm
+    :type verify: str, optional
     """
     if not local_paths:
         local_paths = []
@@ -94,10 +117,16 @@ def upload_s3(
             include=include,
             from_path=local_path,
             to_path="s3://%s/%s" % (s3.bucket_name, s3.path_list[0]),
+            s3=s3,
+            delete=delete,
+            checksum=checksum,
+            verify=verify,
         )
 
     elif recursive:
-        recursive_upload(s3, local_path, exclude, include, extra_args)
+        recursive_upload(
+            s3, local_path, exclude, include, extra_args, skip_unchanged, resume, verify
+        )
 
     else:
         for filepath in local_paths:
@@ -109,28 +138,49 @@ def upload_s3(
             )
 
         if get_confirmation("Confirm?"):
+            scheduler = S3TransferScheduler(s3.get_client(), verify=verify)
+            scheduler.upload(
+                [
+                    {
+                        "local_path": filepath,
+                        "bucket": s3.bucket_name,
+                        "key": s3.get_s3_destination_key(filepath),
+                    }
+                    for filepath in local_paths
+                ],
+                extra_args=extra_args.extra_args,
+            )
+        else:
             for filepath in local_paths:
-                destination_key = s3.get_s3_destination_key(filepath)
-                print(
-                    "upload: %s to s3://%s/%s"
-                    % (filepath, s3.bucket_name, destination_key)
-                )
-                transfer = S3TransferWrapper(s3.client)
-                transfer.s3transfer.upload_file(
-                    filepath,
-                    s3.bucket_name,
-                    destination_key,
-                    callback=S3Progress(filepath),
-                    extra_args=extra_args.extra_args,
-                )
+                abort_saved_uploads(s3, s3.get_s3_destination_key(filepath))
 
 
 def recursive_upload(
-    s3: S3, local_path: str, exclude: List[str], include: List[str], extra_args: S3Args
+    s3: S3,
+    local_path: str,
+    exclude: List[str],
+    include: List[str],
+    extra_args: S3Args,
+    skip_unchanged: bool = False,
+    resume: bool = False,
+    verify: Optional[str] = None,
 ) -> None:
     """Recursive upload local directory to s3.
 
-    Perform a os.walk to upload everyfile under a directory.
+    The directory is scanned once through walk_local_folder for the dryrun, the
+    files to upload are spooled into a temporary file and streamed from it into
+    S3TransferScheduler after the confirmation, so exactly the files counted in
+    the dryrun are uploaded. The scan has to finish before the confirmation,
+    uploads don't overlap with it, the spool only keeps the file list out of
+    memory. The dryrun prints a summary instead of every file when the
+    directory contains many files.
+
+    With skip_unchanged, the destination is listed once and files with the same
+    size and ETag are skipped. Local ETags are stored in ETagIndex, so unchanged
+    files are only hashed again when their stat changes.
+
+    Every uploaded file is recorded in a Journal, with resume the files recorded
+    by a previous failed upload of the same directory are skipped.
 
     :param s3: S3 instance
     :type s3: S3
@@ -142,41 +192,172 @@ def recursive_upload(
     :type include: List[str]
     :param extra_args: S3Args instance to set extra argument
     :type extra_args: S3Args
+    :param skip_unchanged: skip files with the same size and ETag in s3
+    :type skip_unchanged: bool, optional
+    :param resume: skip the files completed by a previous failed upload
+    :type resume: bool, optional
+    :param verify: verify the uploaded data, md5 for the ETag only or a checksum algorithm
+    :type verify: str, optional
     """
-    upload_list: List[Dict[str, str]] = []
-    for root, _, files in os.walk(local_path):
-        for filename in files:
-            full_path = os.path.join(root, filename)
-            relative_path = os.path.relpath(full_path, local_path)
-
-            if not exclude_file(exclude, include, relative_path):
-                destination_key = s3.get_s3_destination_key(
-                    relative_path, recursive=True
-                )
-                print(
-                    "(dryrun) upload: %s to s3://%s/%s"
-                    % (relative_path, s3.bucket_name, destination_key)
+    total_files: int = 0
+    total_bytes: int = 0
+    skipped_files: int = 0
+    dryrun_list: List[str] = []
+    remote_objects: Dict[str, Tuple[int, str]] = {}
+    etag_index: Optional[ETagIndex] = None
+    if skip_unchanged:
+        with Spinner.spin(
+            message="Listing s3://%s/%s ..." % (s3.bucket_name, s3.path_list[0])
+        ):
+            remote_objects = list_remote_objects(
+                s3.get_client(), s3.bucket_name, s3.path_list[0]
+            )
+        etag_index = ETagIndex()
+    journal = Journal(
+        "upload",
+        {
+            "bucket": s3.bucket_name,
+            "prefix": s3.path_list[0],
+            "path": os.path.abspath(local_path),
+            "exclude": exclude,
+            "include": include,
+        },
+        resume=resume,
+    )
+
+    def _pending(local_file: LocalFile) -> bool:
+        return (
+            s3.get_s3_destination_key(local_file.relative, recursive=True)
+            not in journal
+        )
+
+    def _changed(local_file: LocalFile) -> bool:
+        if etag_index is None:
+            return True
+        remote = remote_objects.get(
+            s3.get_s3_destination_key(local_file.relative, recursive=True)
+        )
+        if remote is None or remote[0] != local_file.size:
+            return True
+        return etag_index.get_etag(local_file.path) != remote[1]
+
+    spool = tempfile.TemporaryFile(mode="w+", encoding="utf-8")
+    for local_file in walk_local_folder(local_path, exclude, include):
+        if not _pending(local_file):
+            continue
+        if not _changed(local_file):
+            skipped_files += 1
+            continue
+        total_files += 1
+        total_bytes += local_file.size
+        spool.write(json.dumps(local_file) + "\n")
+        if total_files <= DRYRUN_LIMIT:
+            dryrun_list.append(local_file.relative)
+
+    if total_files <= DRYRUN_LIMIT:
+        for relative_path in sorted(dryrun_list):
+            print(
+                "(dryrun) upload: %s to s3://%s/%s"
+                % (
+                    relative_path,
+                    s3.bucket_name,
+                    s3.get_s3_destination_key(relative_path, recursive=True),
                 )
-                upload_list.append(
+            )
+    else:
+        print(
+            "(dryrun) upload: %s files (%s) in %s to s3://%s/%s"
+            % (
+                total_files,
+                human_readable_size(total_bytes),
+                local_path,
+                s3.bucket_name,
+                s3.path_list[0],
+            )
+        )
+    if skipped_files:
+        print("(dryrun) skip: %s unchanged files" % skipped_files)
+
+    if not total_files:
+        pass
+    elif get_confirmation("Confirm?"):
+        with journal:
+            scheduler = S3TransferScheduler(
+                s3.get_client(), journal=journal, verify=verify
+            )
+            scheduler.progress.total_files = total_files
+            scheduler.progress.total_bytes = total_bytes
+            scheduler.upload(
+                (
                     {
-                        "local_path": full_path,
+                        "local_path": local_file.path,
                         "bucket": s3.bucket_name,
-                        "key": destination_key,
-                        "relative": relative_path,
+                        "key": s3.get_s3_destination_key(
+                            local_file.relative, recursive=True
+                        ),
+                        "relative": local_file.relative,
+                        "size": local_file.size,
                     }
-                )
-
-    if get_confirmation("Confirm?"):
-        for item in upload_list:
-            print(
-                "upload: %s to s3://%s/%s"
-                % (item["relative"], item["bucket"], item["key"])
-            )
-            transfer = S3TransferWrapper(s3.client)
-            transfer.s3transfer.upload_file(
-                item["local_path"],
-                item["bucket"],
-                item["key"],
-                callback=S3Progress(item["local_path"]),
+                    for local_file in _read_spool(spool)
+                ),
                 extra_args=extra_args.extra_args,
             )
+    else:
+        abort_saved_uploads(s3, s3.path_list[0])
+    spool.close()
+    if etag_index is not None:
+        etag_index.close()
+
+
+def _read_spool(spool: IO[str]) -> Generator[LocalFile, None, None]:
+    """Read back the files spooled during the dryrun."""
+    spool.seek(0)
+    for line in spool:
+        yield LocalFile(*json.loads(line))
+
+
+def abort_saved_uploads(s3: S3, prefix: str) -> None:
+    """Abort the incomplete multipart uploads saved by ResumableUploader.
+
+    Called when the user cancels the upload, so the orphaned parts of a
+    previous failed upload don't keep costing storage.
+
+    :param s3: S3 instance
+    :type s3: S3
+    :param prefix: abort the uploads with key under the prefix
+    :type prefix: str
+    """
+    saved_uploads = list_saved_uploads(s3.bucket_name, prefix)
+    if not saved_uploads:
+        return
+    client = s3.get_client()
+    for state_path, state in saved_uploads:
+        abort_upload(
+            client, s3.bucket_name, state["key"], state.get("upload_id"), state_path
+        )
+        print(
+            "abort: incomplete upload to s3://%s/%s" % (s3.bucket_name, state["key"])
+        )
+
+
+def list_remote_objects(client, bucket: str, prefix: str) -> Dict[str, Tuple[int, str]]:
+    """List the size and ETag of all objects under the prefix.
+
+    :param client: boto3 s3 client
+    :type client: boto3.client
+    :param bucket: name of the bucket
+    :type bucket: str
+    :param prefix: prefix to list
+    :type prefix: str
+    :return: dict of key to size and ETag without the surrounding quotes
+    :rtype: Dict[str, Tuple[int, str]]
+    """
+    remote_objects: Dict[str, Tuple[int, str]] = {}
+    paginator = client.get_paginator("list_objects_v2")
+    for result in paginator.paginate(Bucket=bucket, Prefix=prefix):
+        for file in result.get("Contents", []):
+            remote_objects[file["Key"]] = (
+                file.get("Size", 0),
+                file.get("ETag", "").strip('"'),
+            )
+    return remote_objects
@@ -35,3 +35,9 @@ class EC2Error(Exception):
     """Generic exception when the error is caused by during EC2 operation."""
 
     pass
+
+
+class ChecksumMismatch(Exception):
+    """The transferred file doesn't match the checksum of the s3 object."""
+
+    pass
@@ -163,6 +163,14 @@ class FileLoader:
             os.environ["FZFAWS_S3_TRANSFER"] = json.dumps(
                 s3_settings["transfer_config"]
             )
+        if s3_settings.get("auto_tune"):
+            os.environ["FZFAWS_S3_AUTO_TUNE"] = "true"
+        if s3_settings.get("concurrency"):
+            os.environ["FZFAWS_S3_CONCURRENCY"] = str(s3_settings["concurrency"])
+        if s3_settings.get("object_cache"):
+            os.environ["FZFAWS_S3_OBJECT_CACHE"] = json.dumps(
+                s3_settings["object_cache"]
+            )
         if s3_settings.get("profile"):
             os.environ["FZFAWS_S3_PROFILE"] = s3_settings["profile"]
         if s3_settings.get("default_args"):
@@ -120,3 +120,19 @@ def get_default_args(action_command: str, curr_args: List[Any]) -> List[Any]:
         return curr_args
     else:
         return [action_subcommand] + default_args.split() + action_options
+
+
+def get_cache_dir() -> str:
+    """Get the cache directory of fzfaws.
+
+    Respects $XDG_CACHE_HOME, default to ~/.cache/fzfaws. The
+    directory will be created if it doesn't exist.
+
+    :return: path to the cache directory
+    :rtype: str
+    """
+    home = os.path.expanduser("~")
+    base_directory = os.getenv("XDG_CACHE_HOME", "%s/.cache" % home)
+    cache_dir = "%s/fzfaws" % base_directory
+    os.makedirs(cache_dir, exist_ok=True)
+    return cache_dir
@@ -27,6 +27,7 @@ setuptools.setup(
         "Programming Language :: Python :: 3.8",
     ],
     install_requires=["boto3>=1.14.20", "PyYAML>=5.3.1"],
+    extras_require={"crc32c": ["awscrt"]},
     package_data={
         "fzfaws": [
             "libs/fzf-0.21.1-darwin_386",
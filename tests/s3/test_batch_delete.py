@@ -0,0 +1,93 @@
+import io
+import sys
+import unittest
+from unittest.mock import MagicMock, patch
+
+from botocore.exceptions import ClientError
+
+from fzfaws.s3.helper.batch_delete import BatchDeleter
+
+
+class TestBatchDeleter(unittest.TestCase):
+    def setUp(self):
+        self.capturedOutput = io.StringIO()
+        sys.stdout = self.capturedOutput
+        self.client = MagicMock()
+        self.client.delete_objects.return_value = {}
+
+    def tearDown(self):
+        sys.stdout = sys.__stdout__
+
+    def test_delete(self):
+        deleter = BatchDeleter(self.client, "kazhala-lol", concurrency=2)
+        deleted = deleter.delete(
+            (
+                {"Key": "%s.txt" % index, "VersionId": "1", "IsLatest": True}
+                for index in range(2500)
+            )
+        )
+        self.assertEqual(deleted, 2500)
+        self.assertEqual(
+            sorted(
+                len(call[1]["Delete"]["Objects"])
+                for call in self.client.delete_objects.call_args_list
+            ),
+            [500, 1000, 1000],
+        )
+        self.assertEqual(
+            self.client.delete_objects.call_args_list[0][1]["Delete"]["Objects"][0],
+            {"Key": "0.txt", "VersionId": "1"},
+        )
+        self.assertRegex(
+            self.capturedOutput.getvalue(),
+            r"delete: s3://kazhala-lol/2499.txt with version 1\n",
+        )
+
+    @patch("fzfaws.s3.helper.concurrency.time.sleep")
+    def test_retry(self, mocked_sleep):
+        self.client.delete_objects.side_effect = [
+            {
+                "Errors": [
+                    {"Key": "a.txt", "Code": "SlowDown", "Message": "slow down"},
+                    {"Key": "b.txt", "Code": "AccessDenied", "Message": "denied"},
+                ]
+            },
+            {},
+        ]
+        deleter = BatchDeleter(self.client, "kazhala-lol", concurrency=1)
+        deleted = deleter.delete([{"Key": "a.txt"}, {"Key": "b.txt"}, {"Key": "c.txt"}])
+        self.assertEqual(deleted, 2)
+        # only the key failed with a retryable error is sent again
+        self.assertEqual(
+            self.client.delete_objects.call_args[1],
+            {
+                "Bucket": "kazhala-lol",
+                "Delete": {"Objects": [{"Key": "a.txt"}], "Quiet": True},
+            },
+        )
+        mocked_sleep.assert_called_once()
+        self.assertEqual(deleter.failures[0]["Code"], "AccessDenied")
+        self.assertEqual(
+            self.capturedOutput.getvalue(),
+            "delete: s3://kazhala-lol/c.txt\n"
+            "delete: s3://kazhala-lol/a.txt\n"
+            "delete failed: s3://kazhala-lol/b.txt denied\n",
+        )
+
+    def test_request_error(self):
+        self.client.delete_objects.side_effect = ClientError(
+            {"Error": {"Code": "AccessDenied"}}, "DeleteObjects"
+        )
+        deleter = BatchDeleter(self.client, "kazhala-lol", concurrency=1)
+        self.assertRaises(ClientError, deleter.delete, [{"Key": "a.txt"}])
+
+        # remaining batches are not sent after the failure
+        self.client.delete_objects.reset_mock()
+        deleter = BatchDeleter(self.client, "kazhala-lol", concurrency=1)
+        with patch("fzfaws.s3.helper.batch_delete.BATCH_SIZE", 1):
+            self.assertRaises(
+                ClientError,
+                deleter.delete,
+                [{"Key": "a.txt"}, {"Key": "b.txt"}, {"Key": "c.txt"}],
+            )
+        self.client.delete_objects.assert_called_once()
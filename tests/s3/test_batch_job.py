@@ -0,0 +1,100 @@
+import csv
+import io
+import os
+import sys
+import tempfile
+import unittest
+from unittest.mock import MagicMock, patch
+
+from botocore.exceptions import ClientError
+
+from fzfaws.s3.helper.batch_job import BatchJob, read_manifest
+
+
+class TestBatchJob(unittest.TestCase):
+    def setUp(self):
+        self.capturedOutput = io.StringIO()
+        sys.stdout = self.capturedOutput
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.report_path = os.path.join(self.tmpdir.name, "report.csv")
+
+    def tearDown(self):
+        sys.stdout = sys.__stdout__
+        self.tmpdir.cleanup()
+
+    def test_run(self):
+        operation = MagicMock()
+        job = BatchJob(operation, "update", concurrency=4, report_path=self.report_path)
+        failed = job.run(
+            (
+                {"Bucket": "kazhala-lol", "Key": "%s.txt" % index, "Size": index}
+                for index in range(100)
+            )
+        )
+        self.assertEqual(failed, 0)
+        self.assertEqual(operation.call_count, 100)
+        operation.assert_any_call({"Bucket": "kazhala-lol", "Key": "9.txt", "Size": 9})
+        with open(self.report_path, "r", newline="") as file:
+            rows = list(csv.reader(file))
+        self.assertEqual(len(rows), 100)
+        self.assertIn(["kazhala-lol", "9.txt", "", "succeeded"], rows)
+        self.assertRegex(
+            self.capturedOutput.getvalue(), r"update: s3://kazhala-lol/9.txt\n"
+        )
+        self.assertRegex(
+            self.capturedOutput.getvalue(),
+            r"report: .*report.csv \(100 succeeded, 0 failed\)",
+        )
+
+    @patch("fzfaws.s3.helper.concurrency.time.sleep")
+    def test_throttle(self, mocked_sleep):
+        operation = MagicMock()
+        operation.side_effect = [
+            ClientError({"Error": {"Code": "SlowDown"}}, "PutObjectTagging"),
+            None,
+            ClientError({"Error": {"Code": "AccessDenied"}}, "PutObjectTagging"),
+        ]
+        job = BatchJob(operation, "update", concurrency=4, report_path=self.report_path)
+        failed = job.run(
+            [
+                {"Bucket": "kazhala-lol", "Key": "a.txt"},
+                {"Bucket": "kazhala-lol", "Key": "b c+%.txt", "VersionId": "111"},
+            ]
+        )
+        self.assertEqual(failed, 1)
+        mocked_sleep.assert_called_once()
+        # the throttled job halved the objects in flight
+        self.assertEqual(job.controller.get_limit("a.txt"), 2)
+        self.assertEqual(job.failures[0]["Code"], "AccessDenied")
+        self.assertRegex(
+            self.capturedOutput.getvalue(), r"update failed: s3://kazhala-lol/"
+        )
+
+        with open(self.report_path, "r", newline="") as file:
+            keys = [row[1] for row in csv.reader(file)]
+        self.assertIn("b+c%2B%25.txt", keys)
+        # the report is read back as a manifest of the failed objects
+        self.assertEqual(
+            [
+                (item["Key"], item.get("VersionId"))
+                for item in read_manifest(self.report_path)
+            ],
+            [(job.failures[0]["Key"], job.failures[0].get("VersionId"))],
+        )
+
+    def test_read_manifest(self):
+        with open(self.report_path, "w", newline="") as file:
+            writer = csv.writer(file)
+            writer.writerow(["kazhala-lol", "hello%2C+world%2B1.txt"])
+            writer.writerow(["kazhala-lol", "a.txt", "111"])
+            writer.writerow(["kazhala-lol", "b.txt", "", "succeeded"])
+            writer.writerow(["kazhala-lol", "c.txt", "", "failed", "SlowDown", "slow"])
+            writer.writerow([])
+        self.assertEqual(
+            list(read_manifest(self.report_path)),
+            [
+                {"Bucket": "kazhala-lol", "Key": "hello, world+1.txt"},
+                {"Bucket": "kazhala-lol", "Key": "a.txt", "VersionId": "111"},
+                {"Bucket": "kazhala-lol", "Key": "c.txt"},
+            ],
+        )
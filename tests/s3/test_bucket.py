@@ -1,7 +1,7 @@
 import io
 import sys
 import unittest
-from unittest.mock import call, patch
+from unittest.mock import ANY, call, patch
 from fzfaws.s3.bucket_s3 import bucket_s3, process_path_param
 from fzfaws.s3 import S3
 
@@ -35,7 +35,9 @@ class TestS3BucketCopy(unittest.TestCase):
                 ),
             ]
         )
-        mocked_sync.assert_called_with(["*"], ["hello*"], "s3:///", "s3:///")
+        mocked_sync.assert_called_with(
+            ["*"], ["hello*"], "s3:///", "s3:///", ANY, False, False, None
+        )
 
         bucket_s3(
             sync=True,
@@ -48,21 +50,35 @@ class TestS3BucketCopy(unittest.TestCase):
         mocked_version.assert_not_called()
         mocked_object.assert_not_called()
         mocked_sync.assert_called_with(
-            ["*"], ["hello*"], "s3://kazhala-lol/", "s3://kazhala-yes/foo/"
+            ["*"],
+            ["hello*"],
+            "s3://kazhala-lol/",
+            "s3://kazhala-yes/foo/",
+            ANY,
+            False,
+            False,
+            None,
         )
 
+    @patch.object(S3, "get_client")
     @patch.object(S3, "set_s3_path")
     @patch.object(S3, "set_s3_bucket")
     @patch.object(S3, "get_object_version")
     @patch("fzfaws.s3.bucket_s3.walk_s3_folder")
     @patch("fzfaws.s3.bucket_s3.get_confirmation")
     def test_recusive(
-        self, mocked_confirm, mocked_walk, mocked_version, mocked_bucket, mocked_path
+        self,
+        mocked_confirm,
+        mocked_walk,
+        mocked_version,
+        mocked_bucket,
+        mocked_path,
+        mocked_client,
     ):
         self.capturedOutput.truncate(0)
         self.capturedOutput.seek(0)
         mocked_confirm.return_value = False
-        mocked_walk.side_effect = lambda a, b, c, d, e, g, h, i, j, k: print(
+        mocked_walk.side_effect = lambda a, b, c, d, e, g, h, i, j, k, inventory=None, sizes=None, completed=None: print(
             b, c, d, e, g, h, i, j, k
         )
         bucket_s3(
@@ -203,28 +219,40 @@ class TestS3BucketCopy(unittest.TestCase):
         self.assertEqual(result, ("lol", "", [""]))
         mocked_object.assert_called_with(multi_select=True, version=True)
 
+    @patch.object(S3, "get_client")
     @patch("fzfaws.s3.bucket_s3.walk_s3_folder")
     @patch.object(S3, "set_s3_path")
     @patch.object(S3, "get_object_version")
     @patch("fzfaws.s3.bucket_s3.get_confirmation")
     @patch("fzfaws.s3.bucket_s3.copy_and_preserve")
+    @patch("fzfaws.s3.bucket_s3.get_copy_args_batch")
     def test_copy_and_preserve(
-        self, mocked_copy, mocked_confirm, mocked_version, mocked_path, mocked_walk
+        self,
+        mocked_args,
+        mocked_copy,
+        mocked_confirm,
+        mocked_version,
+        mocked_path,
+        mocked_walk,
+        mocked_client,
     ):
         self.capturedOutput.truncate(0)
         self.capturedOutput.seek(0)
-        mocked_copy.side_effect = lambda a, b, c, d, e: print(b, c, d, e)
+        mocked_copy.side_effect = lambda a, b, c, d, e, size=None, verify=None: print(b, c, d, e)
         mocked_confirm.return_value = True
         bucket_s3(from_bucket="foo/boo.txt", to_bucket="lol/hello/", preserve=True)
         self.assertEqual(
             self.capturedOutput.getvalue(),
-            "(dryrun) copy: s3://foo/boo.txt to s3://lol/hello/boo.txt\ncopy: s3://foo/boo.txt to s3://lol/hello/boo.txt\nfoo boo.txt lol hello/boo.txt\n",
+            "(dryrun) copy: s3://foo/boo.txt to s3://lol/hello/boo.txt\nfoo boo.txt lol hello/boo.txt\n",
         )
 
         self.capturedOutput.truncate(0)
         self.capturedOutput.seek(0)
-        mocked_copy.side_effect = lambda a, b, c, d, e, version=None: print(
-            b, c, d, e, version
+        mocked_copy.side_effect = lambda a, b, c, d, e, version=None, size=None, copy_object_args=None, verify=None: print(
+            b, c, d, e, version, copy_object_args
+        )
+        mocked_args.side_effect = lambda s3, objects, s3_args, extra_args: (
+            (key, version, {"StorageClass": "GLACIER"}) for key, version in objects
         )
         mocked_confirm.return_value = True
         mocked_version.return_value = [{"Key": "boo.txt", "VersionId": "11111111"}]
@@ -236,12 +264,14 @@ class TestS3BucketCopy(unittest.TestCase):
         )
         self.assertEqual(
             self.capturedOutput.getvalue(),
-            "(dryrun) copy: s3://foo/boo.txt to s3://lol/hello/boo.txt with version 11111111\ncopy: s3://foo/boo.txt to s3://lol/hello/boo.txt with version 11111111\nfoo boo.txt lol hello/boo.txt 11111111\n",
+            "(dryrun) copy: s3://foo/boo.txt to s3://lol/hello/boo.txt with version 11111111\nfoo boo.txt lol hello/boo.txt 11111111 {'StorageClass': 'GLACIER'}\n",
         )
 
         self.capturedOutput.truncate(0)
         self.capturedOutput.seek(0)
-        mocked_copy.side_effect = lambda a, b, c, d, e: print(b, c, d, e)
+        mocked_copy.side_effect = lambda a, b, c, d, e, size=None, copy_object_args=None, verify=None: print(
+            b, c, d, e, copy_object_args
+        )
         mocked_confirm.return_value = True
         mocked_walk.return_value = [("boo/hello.txt", "hello/hello.txt")]
         bucket_s3(
@@ -252,5 +282,32 @@ class TestS3BucketCopy(unittest.TestCase):
         )
         self.assertEqual(
             self.capturedOutput.getvalue(),
-            "copy: s3://foo/boo/hello.txt to s3://lol/hello/hello.txt\nfoo boo/hello.txt lol hello/hello.txt\n",
+            "foo boo/hello.txt lol hello/hello.txt {'StorageClass': 'GLACIER'}\n",
+        )
+
+    @patch.object(S3, "get_client")
+    @patch("fzfaws.s3.bucket_s3.S3CopyEngine")
+    @patch("fzfaws.s3.bucket_s3.walk_s3_folder")
+    @patch("fzfaws.s3.bucket_s3.get_confirmation")
+    def test_recursive_copy_engine(
+        self, mocked_confirm, mocked_walk, mocked_engine, mocked_client
+    ):
+        mocked_confirm.return_value = True
+
+        def walk(*args, sizes=None, **kwargs):
+            sizes["boo/hello.txt"] = 3
+            return [("boo/hello.txt", "hello/hello.txt")]
+
+        mocked_walk.side_effect = walk
+        bucket_s3(from_bucket="foo/boo/", to_bucket="lol/hello/", recursive=True)
+        mocked_engine.return_value.copy.assert_called_once_with(
+            [
+                {
+                    "bucket": "foo",
+                    "key": "boo/hello.txt",
+                    "dest_bucket": "lol",
+                    "dest_key": "hello/hello.txt",
+                    "size": 3,
+                }
+            ]
         )
@@ -0,0 +1,179 @@
+import io
+import os
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from unittest.mock import patch
+
+from botocore.exceptions import ClientError
+
+from fzfaws.s3.helper.batch_job import BatchJob
+from fzfaws.s3.helper.concurrency import (
+    ConcurrencyController,
+    get_prefix,
+    is_throttled,
+    spread,
+)
+
+
+class ThrottlingS3:
+    """Local stand-in of s3 throttling a prefix above its capacity of requests in flight."""
+
+    def __init__(self, capacities, latency=0.002):
+        self.capacities = capacities
+        self.latency = latency
+        self.in_flight = {}
+        self.max_in_flight = {}
+        self.throttled = {}
+        self.lock = threading.Lock()
+
+    def put_object_tagging(self, Bucket, Key, Tagging):
+        prefix = get_prefix(Key)
+        with self.lock:
+            self.in_flight[prefix] = self.in_flight.get(prefix, 0) + 1
+            self.max_in_flight[prefix] = max(
+                self.max_in_flight.get(prefix, 0), self.in_flight[prefix]
+            )
+            throttled = self.in_flight[prefix] > self.capacities.get(prefix, 100)
+        time.sleep(self.latency)
+        with self.lock:
+            self.in_flight[prefix] -= 1
+            if throttled:
+                self.throttled[prefix] = self.throttled.get(prefix, 0) + 1
+        if throttled:
+            raise ClientError(
+                {
+                    "Error": {
+                        "Code": "SlowDown",
+                        "Message": "Please reduce your request rate.",
+                    }
+                },
+                "PutObjectTagging",
+            )
+        return {}
+
+
+class TestConcurrencyController(unittest.TestCase):
+    def setUp(self):
+        self.capturedOutput = io.StringIO()
+        sys.stdout = self.capturedOutput
+        self.tmpdir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        sys.stdout = sys.__stdout__
+        self.tmpdir.cleanup()
+
+    def test_aimd(self):
+        controller = ConcurrencyController(8)
+        self.assertEqual(controller.get_limit("hot/a.txt"), 8)
+        controller.throttled("hot/a.txt")
+        self.assertEqual(controller.get_limit("hot/b.txt"), 4)
+        # other prefixes keep their limit
+        self.assertEqual(controller.get_limit("cold/a.txt"), 8)
+        self.assertEqual(controller.get_limit("hot/nested/a.txt"), 8)
+
+        # grow by one after every `limit` successful items
+        for _ in range(4):
+            controller.acquire("hot/a.txt")
+            controller.release("hot/a.txt")
+        self.assertEqual(controller.get_limit("hot/a.txt"), 5)
+        controller.acquire("hot/a.txt")
+        controller.release("hot/a.txt", succeeded=False)
+        self.assertEqual(controller.get_limit("hot/a.txt"), 5)
+
+        # no growth while the latency shows congestion
+        controller.observe("hot/a.txt", 0.01)
+        for _ in range(20):
+            controller.observe("hot/a.txt", 1)
+        for _ in range(10):
+            controller.acquire("hot/a.txt")
+            controller.release("hot/a.txt")
+        self.assertEqual(controller.get_limit("hot/a.txt"), 5)
+
+        # a burst of throttled requests within the latency only halves once
+        controller.observe("cold/a.txt", 1)
+        controller.throttled("cold/a.txt")
+        controller.throttled("cold/a.txt")
+        self.assertEqual(controller.get_limit("cold/a.txt"), 4)
+        self.assertEqual(controller.get_stats()["cold"]["throttles"], 2)
+
+    @patch("fzfaws.s3.helper.concurrency.time.sleep")
+    def test_call(self, mocked_sleep):
+        controller = ConcurrencyController(4)
+        responses = [
+            ClientError({"Error": {"Code": "SlowDown"}}, "CopyObject"),
+            ClientError({"Error": {"Code": "InternalError"}}, "CopyObject"),
+            {"CopyObjectResult": {}},
+        ]
+
+        def request(**kwargs):
+            response = responses.pop(0)
+            if isinstance(response, Exception):
+                raise response
+            return response
+
+        self.assertEqual(
+            controller.call("hot/a.txt", request, Bucket="kazhala-lol"),
+            {"CopyObjectResult": {}},
+        )
+        self.assertEqual(mocked_sleep.call_count, 2)
+        # only the throttling error narrows the prefix
+        self.assertEqual(controller.get_limit("hot/a.txt"), 2)
+
+        error = ClientError({"Error": {"Code": "AccessDenied"}}, "CopyObject")
+        responses.append(error)
+        self.assertRaises(ClientError, controller.call, "hot/a.txt", request)
+        self.assertFalse(is_throttled(error))
+        self.assertEqual(mocked_sleep.call_count, 2)
+
+    def test_spread(self):
+        keys = ["hot/%s" % index for index in range(5)] + ["cold/0", "cold/1", "a"]
+        self.assertEqual(
+            list(spread(keys, lambda key: key, window=4)),
+            ["hot/0", "hot/1", "hot/2", "cold/0", "hot/3", "cold/1", "a", "hot/4"],
+        )
+        self.assertEqual(
+            list(spread(keys, lambda key: key)),
+            ["hot/0", "cold/0", "a", "hot/1", "cold/1", "hot/2", "hot/3", "hot/4"],
+        )
+
+        # the window bounds the items buffered in total, not per prefix
+        consumed = []
+
+        def _items():
+            for index in range(20):
+                consumed.append(index)
+                yield "%s/%s" % (index % 5, index)
+
+        for count, _ in enumerate(spread(_items(), lambda key: key, window=4), 1):
+            self.assertLessEqual(len(consumed) - count, 4)
+
+    @patch("fzfaws.s3.helper.concurrency.BACKOFF_BASE", 0.001)
+    def test_throttling_stand_in(self):
+        s3 = ThrottlingS3({"hot": 2})
+        manifest = []
+        for index in range(100):
+            manifest.append({"Bucket": "kazhala-lol", "Key": "hot/%s.txt" % index})
+            manifest.append({"Bucket": "kazhala-lol", "Key": "cold/%s.txt" % index})
+        job = BatchJob(
+            lambda item: s3.put_object_tagging(
+                Bucket=item["Bucket"], Key=item["Key"], Tagging={"TagSet": []}
+            ),
+            "update",
+            concurrency=8,
+            report_path=os.path.join(self.tmpdir.name, "report.csv"),
+        )
+        self.assertEqual(job.run(manifest), 0)
+        self.assertEqual(job.succeeded, 200)
+
+        stats = job.controller.get_stats()
+        # the hot prefix settled around its capacity
+        self.assertGreater(stats["hot"]["throttles"], 0)
+        self.assertLess(stats["hot"]["limit"], 8)
+        # the cold prefix was never narrowed and kept more requests in flight
+        self.assertEqual(stats["cold"]["throttles"], 0)
+        self.assertEqual(stats["cold"]["limit"], 8)
+        self.assertGreater(s3.max_in_flight["cold"], s3.capacities["hot"])
+        self.assertNotIn("cold", s3.throttled)
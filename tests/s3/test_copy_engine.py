@@ -0,0 +1,335 @@
+import io
+import sys
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import MagicMock, patch
+
+from botocore.exceptions import ClientError
+
+from fzfaws.s3.helper.copy_engine import S3CopyEngine
+from fzfaws.utils.exceptions import ChecksumMismatch
+
+
+class TestS3CopyEngine(unittest.TestCase):
+    def setUp(self):
+        self.capturedOutput = io.StringIO()
+        sys.stdout = self.capturedOutput
+        self.client = MagicMock()
+        self.client.copy_object.return_value = {}
+        self.client.create_multipart_upload.return_value = {"UploadId": "111"}
+        self.client.upload_part_copy.side_effect = lambda **kwargs: {
+            "CopyPartResult": {"ETag": '"%s"' % kwargs["PartNumber"]}
+        }
+        self.source_client = MagicMock()
+
+    def tearDown(self):
+        sys.stdout = sys.__stdout__
+
+    def test_copy(self):
+        engine = S3CopyEngine(self.client, self.source_client, concurrency=2)
+        engine.copy(
+            [
+                {
+                    "bucket": "kazhala-lol",
+                    "key": "a.txt",
+                    "dest_bucket": "kazhala-yes",
+                    "dest_key": "hello/a.txt",
+                    "size": 3,
+                },
+                {
+                    "bucket": "kazhala-lol",
+                    "key": "b.txt",
+                    "version_id": "11111111",
+                    "dest_bucket": "kazhala-yes",
+                    "dest_key": "hello/b.txt",
+                    "size": 5,
+                    "extra_args": {"StorageClass": "GLACIER"},
+                },
+            ],
+            extra_args={"StorageClass": "STANDARD_IA"},
+        )
+        self.client.copy_object.assert_any_call(
+            Bucket="kazhala-yes",
+            Key="hello/a.txt",
+            CopySource={"Bucket": "kazhala-lol", "Key": "a.txt"},
+            StorageClass="STANDARD_IA",
+        )
+        self.client.copy_object.assert_any_call(
+            Bucket="kazhala-yes",
+            Key="hello/b.txt",
+            CopySource={
+                "Bucket": "kazhala-lol",
+                "Key": "b.txt",
+                "VersionId": "11111111",
+            },
+            StorageClass="GLACIER",
+        )
+        # sizes from the listing are used without head_object
+        self.source_client.head_object.assert_not_called()
+        self.assertEqual(engine.progress.bytes_done, 8)
+        self.assertRegex(
+            self.capturedOutput.getvalue(),
+            r"copy: s3://kazhala-lol/b.txt with version 11111111 to s3://kazhala-yes/hello/b.txt",
+        )
+
+    def test_unknown_size(self):
+        self.source_client.head_object.return_value = {"ContentLength": 10}
+        engine = S3CopyEngine(self.client, self.source_client)
+        engine.copy(
+            iter(
+                [
+                    {
+                        "bucket": "kazhala-lol",
+                        "key": "a.txt",
+                        "dest_bucket": "kazhala-yes",
+                        "dest_key": "a.txt",
+                    }
+                ]
+            )
+        )
+        self.source_client.head_object.assert_called_once_with(
+            Bucket="kazhala-lol", Key="a.txt"
+        )
+        self.client.copy_object.assert_called_once()
+
+    @patch("fzfaws.s3.helper.copy_engine.MULTIPART_COPY_THRESHOLD", 10)
+    def test_multipart(self):
+        self.source_client.head_object.return_value = {
+            "ContentType": "text/plain",
+            "Metadata": {"foo": "boo"},
+            "ContentLength": 20 * 1024 * 1024,
+        }
+        engine = S3CopyEngine(self.client, self.source_client)
+        engine.transfer_config.multipart_chunksize = 8 * 1024 * 1024
+        engine.copy(
+            [
+                {
+                    "bucket": "kazhala-lol",
+                    "key": "a.iso",
+                    "dest_bucket": "kazhala-yes",
+                    "dest_key": "a.iso",
+                    "size": 20 * 1024 * 1024,
+                }
+            ],
+            extra_args={"StorageClass": "STANDARD_IA", "RequestPayer": "requester"},
+        )
+        self.client.copy_object.assert_not_called()
+        self.client.create_multipart_upload.assert_called_once_with(
+            Bucket="kazhala-yes",
+            Key="a.iso",
+            StorageClass="STANDARD_IA",
+            RequestPayer="requester",
+            ContentType="text/plain",
+            Metadata={"foo": "boo"},
+        )
+        self.assertEqual(
+            sorted(
+                call[1]["CopySourceRange"]
+                for call in self.client.upload_part_copy.call_args_list
+            ),
+            ["bytes=0-8388607", "bytes=16777216-20971519", "bytes=8388608-16777215"],
+        )
+        self.client.complete_multipart_upload.assert_called_once_with(
+            Bucket="kazhala-yes",
+            Key="a.iso",
+            UploadId="111",
+            MultipartUpload={
+                "Parts": [
+                    {"ETag": '"1"', "PartNumber": 1},
+                    {"ETag": '"2"', "PartNumber": 2},
+                    {"ETag": '"3"', "PartNumber": 3},
+                ]
+            },
+            RequestPayer="requester",
+        )
+        self.assertEqual(engine.progress.bytes_done, 20 * 1024 * 1024)
+
+    @patch("fzfaws.s3.helper.copy_engine.MULTIPART_COPY_THRESHOLD", 10)
+    def test_multipart_sse_c(self):
+        self.source_client.head_object.return_value = {"ContentLength": 20}
+        sse_args = {
+            "CopySourceSSECustomerAlgorithm": "AES256",
+            "CopySourceSSECustomerKey": "abc",
+        }
+        engine = S3CopyEngine(self.client, self.source_client)
+        with patch(
+            "fzfaws.s3.helper.copy_engine.ThreadPoolExecutor",
+            wraps=ThreadPoolExecutor,
+        ) as mocked_executor:
+            engine.copy(
+                iter(
+                    [
+                        {
+                            "bucket": "kazhala-lol",
+                            "key": "%s.iso" % name,
+                            "dest_bucket": "kazhala-yes",
+                            "dest_key": "%s.iso" % name,
+                        }
+                        for name in ("a", "b")
+                    ]
+                ),
+                sse_args,
+            )
+        # source is headed with its SSE-C key
+        self.source_client.head_object.assert_called_with(
+            Bucket="kazhala-lol",
+            Key="b.iso",
+            SSECustomerAlgorithm="AES256",
+            SSECustomerKey="abc",
+        )
+        self.assertEqual(self.source_client.head_object.call_count, 4)
+        self.assertEqual(self.client.complete_multipart_upload.call_count, 2)
+        # parts of all multipart copies share the pool of the engine
+        self.assertEqual(mocked_executor.call_count, 2)
+
+    def test_verify(self):
+        self.source_client.head_object.return_value = {
+            "ContentLength": 3,
+            "ETag": '"1"',
+            "ChecksumSHA256": "abc",
+        }
+        self.client.copy_object.return_value = {
+            "CopyObjectResult": {"ETag": '"1"', "ChecksumSHA256": "abc"}
+        }
+        item = {
+            "bucket": "kazhala-lol",
+            "key": "a.txt",
+            "version_id": "11111111",
+            "dest_bucket": "kazhala-yes",
+            "dest_key": "a.txt",
+            "size": 3,
+        }
+        engine = S3CopyEngine(self.client, self.source_client, verify="sha256")
+        engine.copy([item], extra_args={"RequestPayer": "requester"})
+        self.source_client.head_object.assert_called_once_with(
+            Bucket="kazhala-lol",
+            Key="a.txt",
+            RequestPayer="requester",
+            VersionId="11111111",
+            ChecksumMode="ENABLED",
+        )
+        self.assertEqual(
+            self.client.copy_object.call_args[1]["ChecksumAlgorithm"], "SHA256"
+        )
+        self.assertEqual(engine.unverified, [])
+
+        self.client.copy_object.return_value = {"CopyObjectResult": {"ETag": '"2"'}}
+        engine = S3CopyEngine(self.client, self.source_client, verify="sha256")
+        self.assertRaises(ChecksumMismatch, engine.copy, [item])
+
+        # ETag of kms encrypted copy is not md5
+        self.client.copy_object.return_value = {
+            "CopyObjectResult": {"ETag": '"2"'},
+            "ServerSideEncryption": "aws:kms",
+        }
+        engine = S3CopyEngine(self.client, self.source_client, verify="md5")
+        engine.copy([item])
+        self.assertEqual(engine.unverified, [item])
+        self.assertRegex(
+            self.capturedOutput.getvalue(),
+            r"verify: skipped 1 objects without a md5 ETag or md5 checksum",
+        )
+
+    def test_verify_multipart(self):
+        self.source_client.head_object.side_effect = lambda **kwargs: {
+            "ContentLength": 6 if kwargs.get("PartNumber") else 10,
+            "ETag": '"abc-2"',
+        }
+        self.client.complete_multipart_upload.return_value = {"ETag": '"abc-2"'}
+        engine = S3CopyEngine(self.client, self.source_client, verify="md5")
+        engine.copy(
+            [
+                {
+                    "bucket": "kazhala-lol",
+                    "key": "a.iso",
+                    "dest_bucket": "kazhala-yes",
+                    "dest_key": "a.iso",
+                    "size": 10,
+                }
+            ]
+        )
+        # parts of the source are kept, so the ETag of the copy matches
+        self.client.copy_object.assert_not_called()
+        self.assertEqual(
+            sorted(
+                call[1]["CopySourceRange"]
+                for call in self.client.upload_part_copy.call_args_list
+            ),
+            ["bytes=0-5", "bytes=6-9"],
+        )
+        self.assertEqual(engine.unverified, [])
+        self.assertEqual(engine.failures, [])
+
+    @patch("fzfaws.s3.helper.copy_engine.MULTIPART_COPY_THRESHOLD", 10)
+    def test_multipart_abort(self):
+        self.client.upload_part_copy.side_effect = ClientError(
+            {"Error": {"Code": "AccessDenied", "Message": "denied"}}, "UploadPartCopy"
+        )
+        engine = S3CopyEngine(self.client, self.source_client)
+        self.assertRaises(
+            ClientError,
+            engine.copy,
+            [
+                {
+                    "bucket": "kazhala-lol",
+                    "key": "a.iso",
+                    "dest_bucket": "kazhala-yes",
+                    "dest_key": "a.iso",
+                    "size": 20,
+                }
+            ],
+            {"MetadataDirective": "REPLACE"},
+        )
+        # details are replaced, no need to get them from the source
+        self.source_client.head_object.assert_not_called()
+        self.client.abort_multipart_upload.assert_called_once_with(
+            Bucket="kazhala-yes", Key="a.iso", UploadId="111"
+        )
+        self.client.complete_multipart_upload.assert_not_called()
+        self.assertRegex(
+            self.capturedOutput.getvalue(), r"copy failed: s3://kazhala-lol/a.iso"
+        )
+
+    @patch("fzfaws.s3.helper.concurrency.time.sleep")
+    def test_retry(self, mocked_sleep):
+        self.client.copy_object.side_effect = [
+            ClientError({"Error": {"Code": "SlowDown"}}, "CopyObject"),
+            ClientError({"Error": {"Code": "SlowDown"}}, "CopyObject"),
+            {},
+        ]
+        engine = S3CopyEngine(self.client, self.source_client)
+        engine.copy(
+            [
+                {
+                    "bucket": "kazhala-lol",
+                    "key": "a.txt",
+                    "dest_bucket": "kazhala-yes",
+                    "dest_key": "a.txt",
+                    "size": 3,
+                }
+            ]
+        )
+        self.assertEqual(self.client.copy_object.call_count, 3)
+        self.assertEqual(mocked_sleep.call_count, 2)
+        self.assertEqual(engine.failures, [])
+
+        # other errors are not retried
+        self.client.copy_object.reset_mock()
+        self.client.copy_object.side_effect = ClientError(
+            {"Error": {"Code": "AccessDenied"}}, "CopyObject"
+        )
+        engine = S3CopyEngine(self.client, self.source_client)
+        self.assertRaises(
+            ClientError,
+            engine.copy,
+            [
+                {
+                    "bucket": "kazhala-lol",
+                    "key": "a.txt",
+                    "dest_bucket": "kazhala-yes",
+                    "dest_key": "a.txt",
+                    "size": 3,
+                }
+            ],
+        )
+        self.client.copy_object.assert_called_once()
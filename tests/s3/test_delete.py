@@ -9,7 +9,7 @@ import boto3
 from botocore.paginate import Paginator
 from botocore.stub import Stubber
 
-from fzfaws.s3.delete_s3 import delete_s3, find_all_version_files
+from fzfaws.s3.delete_s3 import delete_s3, find_all_versions
 from fzfaws.s3.s3 import S3
 from fzfaws.utils.session import BaseSession
 
@@ -23,7 +23,7 @@ class TestS3Delete(unittest.TestCase):
         sys.stdout = sys.__stdout__
 
     @patch.object(Paginator, "paginate")
-    def test_find_all_version_files(self, mocked_result):
+    def test_find_all_versions(self, mocked_result):
         data_path = os.path.join(
             os.path.dirname(os.path.abspath(__file__)), "../data/s3_object_ver.json"
         )
@@ -31,9 +31,10 @@ class TestS3Delete(unittest.TestCase):
             mocked_result.return_value = json.load(file)
 
         s3 = boto3.client("s3")
-        result = find_all_version_files(s3, "kazhala-lol", "")
+        result = list(find_all_versions(s3, "kazhala-lol", ""))
+        mocked_result.assert_called_with(ANY, Bucket="kazhala-lol", Prefix="")
         self.assertEqual(
-            result,
+            [key for key, _ in result],
             [
                 " elb.pem",
                 " w tf.txt",
@@ -45,12 +46,18 @@ class TestS3Delete(unittest.TestCase):
                 "wtf.pem",
             ],
         )
+        # versions and delete markers of a key are listed together
+        self.assertEqual(len(result[0][1]), 2)
+        self.assertEqual(len(result[4][1]), 5)
+        self.assertEqual(result[0][1][0]["Key"], " elb.pem")
 
-        result = find_all_version_files(
-            s3, "kazhala-lol", "", exclude=["*.pem"], include=["wtf.pem"]
+        result = list(
+            find_all_versions(
+                s3, "kazhala-lol", "", exclude=["*.pem"], include=["wtf.pem"]
+            )
         )
         self.assertEqual(
-            result,
+            [key for key, _ in result],
             [
                 " w tf.txt",
                 " wtf.txt",
@@ -62,15 +69,24 @@ class TestS3Delete(unittest.TestCase):
             ],
         )
 
-        result = find_all_version_files(s3, "kazhala-lol", "", deletemark=True)
+        result = list(find_all_versions(s3, "kazhala-lol", "", deletemark=True))
         self.assertEqual(
-            result, [" elb.pem", " w tf.txt", " wtf.txt", ".DS_Store"],
+            [key for key, _ in result],
+            [" elb.pem", " w tf.txt", " wtf.txt", ".DS_Store"],
         )
 
+        # current versions are skipped, "../" only has the current version
+        result = list(find_all_versions(s3, "kazhala-lol", "", non_current=True))
+        self.assertNotIn("../", [key for key, _ in result])
+        self.assertEqual(len(dict(result)["wtf.pem"]), 4)
+
+    @patch.object(
+        S3, "get_client", autospec=True, side_effect=lambda s3, bucket="": s3.client
+    )
     @patch.object(BaseSession, "client", new_callable=PropertyMock)
     @patch("fzfaws.s3.delete_s3.get_confirmation")
     @patch("fzfaws.s3.delete_s3.walk_s3_folder")
-    @patch("fzfaws.s3.delete_s3.find_all_version_files")
+    @patch("fzfaws.s3.delete_s3.find_all_versions")
     @patch.object(S3, "get_object_version")
     @patch.object(S3, "set_s3_path")
     @patch.object(S3, "set_s3_bucket")
@@ -83,6 +99,7 @@ class TestS3Delete(unittest.TestCase):
         mocked_walk,
         mocked_confirm,
         mocked_client,
+        mocked_get_client,
     ):
         # test params
         mocked_confirm.return_value = False
@@ -98,31 +115,30 @@ class TestS3Delete(unittest.TestCase):
         s3 = boto3.client("s3")
         stubber = Stubber(s3)
         stubber.add_response(
-            "delete_object",
-            {
-                "DeleteMarker": False,
-                "VersionId": "string",
-                "RequestCharged": "requester",
-            },
+            "delete_objects",
+            {},
             expected_params={
                 "Bucket": "kazhala-lol",
-                "Key": "wtf.pem",
-                "VersionId": "111111",
+                "Delete": {
+                    "Objects": [{"Key": "wtf.pem", "VersionId": "111111"}],
+                    "Quiet": True,
+                },
             },
         )
         stubber.activate()
         mocked_client.return_value = s3
-        mocked_find.return_value = ["wtf.pem"]
-        mocked_version.return_value = [{"Key": "wtf.pem", "VersionId": "111111"}]
+        mocked_find.side_effect = lambda *args: iter(
+            [("wtf.pem", [{"Key": "wtf.pem", "VersionId": "111111"}])]
+        )
         delete_s3(bucket="kazhala-lol/", recursive=True, allversion=True)
         self.assertEqual(
             self.capturedOutput.getvalue(),
             "(dryrun) delete: s3://kazhala-lol/wtf.pem with all versions\ndelete: s3://kazhala-lol/wtf.pem with version 111111\n",
         )
-        mocked_version.assert_called_once_with(
-            key="wtf.pem", delete=True, select_all=True, non_current=False
+        mocked_version.assert_not_called()
+        mocked_find.assert_called_once_with(
+            ANY, "kazhala-lol", "", [], [], False, False
         )
-        mocked_find.assert_called_with(ANY, "kazhala-lol", "", [], [], [], False)
 
         # test clean
         mocked_version.reset_mock()
@@ -132,31 +148,55 @@ class TestS3Delete(unittest.TestCase):
         s3 = boto3.client("s3")
         stubber = Stubber(s3)
         stubber.add_response(
-            "delete_object",
-            {
-                "DeleteMarker": False,
-                "VersionId": "string",
-                "RequestCharged": "requester",
-            },
+            "delete_objects",
+            {},
             expected_params={
                 "Bucket": "kazhala-lol",
-                "Key": "wtf.pem",
-                "VersionId": "111111",
+                "Delete": {
+                    "Objects": [{"Key": "wtf.pem", "VersionId": "111111"}],
+                    "Quiet": True,
+                },
             },
         )
         stubber.activate()
         mocked_client.return_value = s3
-        mocked_find.return_value = ["wtf.pem"]
-        mocked_version.return_value = [{"Key": "wtf.pem", "VersionId": "111111"}]
         delete_s3(bucket="kazhala-lol/", recursive=True, allversion=True, clean=True)
         self.assertEqual(
             self.capturedOutput.getvalue(),
             "(dryrun) delete: s3://kazhala-lol/wtf.pem all non-current versions\ndelete: s3://kazhala-lol/wtf.pem with version 111111\n",
         )
-        mocked_version.assert_called_once_with(
-            key="wtf.pem", delete=True, select_all=True, non_current=True
+        mocked_version.assert_not_called()
+        mocked_find.assert_called_with(ANY, "kazhala-lol", "", [], [], False, True)
+
+        # versions created after the dryrun are not deleted
+        self.capturedOutput.truncate(0)
+        self.capturedOutput.seek(0)
+        s3 = boto3.client("s3")
+        stubber = Stubber(s3)
+        stubber.add_response(
+            "delete_objects",
+            {},
+            expected_params={
+                "Bucket": "kazhala-lol",
+                "Delete": {
+                    "Objects": [{"Key": "wtf.pem", "VersionId": "111111"}],
+                    "Quiet": True,
+                },
+            },
         )
-        mocked_find.assert_called_with(ANY, "kazhala-lol", "", [], [], [], False)
+        stubber.activate()
+        mocked_client.return_value = s3
+
+        def _confirm(message):
+            mocked_find.side_effect = lambda *args: iter(
+                [("new.pem", [{"Key": "new.pem", "VersionId": "222222"}])]
+            )
+            return True
+
+        mocked_confirm.side_effect = _confirm
+        delete_s3(bucket="kazhala-lol/", recursive=True, allversion=True)
+        stubber.assert_no_pending_responses()
+        mocked_confirm.side_effect = None
 
         # test recursive non version delete
         mocked_version.reset_mock()
@@ -166,13 +206,12 @@ class TestS3Delete(unittest.TestCase):
         s3 = boto3.client("s3")
         stubber = Stubber(s3)
         stubber.add_response(
-            "delete_object",
-            {
-                "DeleteMarker": False,
-                "VersionId": "string",
-                "RequestCharged": "requester",
+            "delete_objects",
+            {},
+            expected_params={
+                "Bucket": "kazhala-lol",
+                "Delete": {"Objects": [{"Key": "wtf.pem"}], "Quiet": True},
             },
-            expected_params={"Bucket": "kazhala-lol", "Key": "wtf.pem",},
         )
         stubber.activate()
         mocked_client.return_value = s3
@@ -181,7 +220,18 @@ class TestS3Delete(unittest.TestCase):
         self.assertEqual(
             self.capturedOutput.getvalue(), "delete: s3://kazhala-lol/wtf.pem\n",
         )
-        mocked_walk.assert_called_with(ANY, "kazhala-lol", "", "", [], [], [], "delete")
+        mocked_walk.assert_called_with(
+            ANY,
+            "kazhala-lol",
+            "",
+            "",
+            [],
+            [],
+            [],
+            "delete",
+            inventory=None,
+            completed=ANY,
+        )
         mocked_version.assert_not_called()
 
     @patch.object(BaseSession, "client", new_callable=PropertyMock)
@@ -214,17 +264,14 @@ class TestS3Delete(unittest.TestCase):
         s3 = boto3.client("s3")
         stubber = Stubber(s3)
         stubber.add_response(
-            "delete_object",
-            {
-                "DeleteMarker": False,
-                "VersionId": "string",
-                "RequestCharged": "requester",
-            },
+            "delete_objects",
+            {},
             expected_params={
                 "Bucket": "kazhala-lol",
-                "Key": "wtf.pem",
-                "MFA": "",
-                "VersionId": "111111",
+                "Delete": {
+                    "Objects": [{"Key": "wtf.pem", "VersionId": "111111"}],
+                    "Quiet": True,
+                },
             },
         )
         stubber.activate()
@@ -302,13 +349,12 @@ class TestS3Delete(unittest.TestCase):
         s3 = boto3.client("s3")
         stubber = Stubber(s3)
         stubber.add_response(
-            "delete_object",
-            {
-                "DeleteMarker": False,
-                "VersionId": "string",
-                "RequestCharged": "requester",
+            "delete_objects",
+            {},
+            expected_params={
+                "Bucket": "kazhala-lol",
+                "Delete": {"Objects": [{"Key": "wtf.pem"}], "Quiet": True},
             },
-            expected_params={"Bucket": "kazhala-lol", "Key": "wtf.pem",},
         )
         stubber.activate()
         mocked_client.return_value = s3
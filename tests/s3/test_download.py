@@ -2,9 +2,15 @@ from fzfaws.utils.pyfzf import Pyfzf
 import os
 import io
 import sys
+import tempfile
 import unittest
-from unittest.mock import patch
-from fzfaws.s3.download_s3 import download_s3
+from unittest.mock import ANY, patch
+
+import boto3
+from botocore.stub import Stubber
+
+from fzfaws.s3.download_s3 import download_recusive, download_s3
+from fzfaws.s3.helper.version_index import VersionIndex
 from fzfaws.s3 import S3
 
 
@@ -27,6 +33,10 @@ class TestS3Download(unittest.TestCase):
             include=[],
             from_path="s3://kazhala-lol/hello/",
             to_path=os.path.dirname(__file__),
+            s3=ANY,
+            delete=False,
+            checksum=False,
+            verify=None,
         )
         mocked_local.assert_called_with(False, directory=True, hidden=False)
 
@@ -37,32 +47,47 @@ class TestS3Download(unittest.TestCase):
             include=[],
             from_path="s3://kazhala-lol/",
             to_path=os.path.dirname(__file__),
+            s3=ANY,
+            delete=False,
+            checksum=False,
+            verify=None,
         )
 
         mocked_local.reset_mock()
         download_s3(
-            sync=True, bucket="kazhala-lol/hello/", hidden=True, search_from_root=True
+            sync=True,
+            bucket="kazhala-lol/hello/",
+            hidden=True,
+            search_from_root=True,
+            verify="sha256",
         )
         mocked_sync.assert_called_with(
             exclude=[],
             include=[],
             from_path="s3://kazhala-lol/hello/",
             to_path=os.path.dirname(__file__),
+            s3=ANY,
+            delete=False,
+            checksum=False,
+            verify="sha256",
         )
         mocked_local.assert_called_with(True, directory=True, hidden=True)
 
+    @patch.object(S3, "get_client")
     @patch("fzfaws.s3.download_s3.get_confirmation")
     @patch("fzfaws.s3.download_s3.walk_s3_folder")
-    def test_recursive(self, mocked_walk, mocked_confirm):
+    def test_recursive(self, mocked_walk, mocked_confirm, mocked_client):
         self.capturedOutput.truncate(0)
         self.capturedOutput.seek(0)
         mocked_walk.return_value = [("hello/hello.txt", "hello.txt")]
-        mocked_walk.side_effect = lambda a, b, c, d, e, g, h, i, j: print(
+        mocked_walk.side_effect = lambda a, b, c, d, e, g, h, i, j, inventory=None, sizes=None, completed=None, etags=None: print(
             b, c, d, e, g, h, i, j
         )
         mocked_confirm.return_value = False
         download_s3(recursive=True, bucket="kazhala-lol/hello/", local_path="/tmp")
         mocked_walk.assert_called()
+        # the walk lists through the client of the bucket region
+        self.assertIs(mocked_walk.call_args[0][0], mocked_client.return_value)
         mocked_confirm.assert_called()
         self.assertEqual(
             self.capturedOutput.getvalue(),
@@ -124,3 +149,145 @@ class TestS3Download(unittest.TestCase):
             "(dryrun) download: s3://kazhala-lol/ to /tmp/\n",
         )
         mocked_object.assert_called_with(multi_select=True, version=False)
+
+    @patch.object(S3, "get_client")
+    @patch("fzfaws.s3.download_s3.get_confirmation")
+    def test_recursive_no_head_object(self, mocked_confirm, mocked_client):
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        mocked_confirm.return_value = True
+        client = boto3.client("s3")
+        mocked_client.return_value = client
+        stubber = Stubber(client)
+        stubber.add_response(
+            "list_objects",
+            {
+                "Contents": [
+                    {"Key": "hello/a.txt", "Size": 5, "ETag": '"1"'},
+                    {"Key": "hello/b.txt", "Size": 3, "ETag": '"2"'},
+                ]
+            },
+        )
+        # no head_object is stubbed, the stubber raises if s3transfer calls it
+        stubber.add_response(
+            "get_object",
+            {"Body": io.BytesIO(b"hello"), "ContentLength": 5},
+            {"Bucket": "kazhala-lol", "Key": "hello/a.txt"},
+        )
+        stubber.add_response(
+            "get_object",
+            {"Body": io.BytesIO(b"foo"), "ContentLength": 3},
+            {"Bucket": "kazhala-lol", "Key": "hello/b.txt"},
+        )
+        stubber.activate()
+
+        s3 = S3()
+        s3.bucket_name = "kazhala-lol"
+        s3.path_list = ["hello/"]
+        with patch.dict(
+            os.environ,
+            {
+                "XDG_CACHE_HOME": tmpdir.name,
+                "FZFAWS_S3_TRANSFER": "{}",
+                "FZFAWS_S3_CONCURRENCY": "1",
+            },
+        ), patch.object(S3, "client", client):
+            download_recusive(s3, [], [], os.path.join(tmpdir.name, "download"))
+        stubber.assert_no_pending_responses()
+        with open(os.path.join(tmpdir.name, "download", "a.txt"), "rb") as file:
+            self.assertEqual(file.read(), b"hello")
+
+    @patch("fzfaws.s3.download_s3.S3TransferScheduler")
+    @patch.object(S3, "get_object_size")
+    @patch.object(S3, "get_client")
+    @patch("fzfaws.s3.download_s3.walk_s3_folder")
+    @patch("fzfaws.s3.download_s3.get_confirmation")
+    def test_scheduler(
+        self, mocked_confirm, mocked_walk, mocked_client, mocked_size, mocked_scheduler
+    ):
+        mocked_confirm.return_value = True
+        mocked_size.return_value = 5
+        download_s3(bucket="kazhala-lol/hello/hello.txt", local_path="/tmp")
+        mocked_size.assert_called_with("hello/hello.txt")
+        mocked_scheduler.return_value.download.assert_called_with(
+            [
+                {
+                    "bucket": "kazhala-lol",
+                    "key": "hello/hello.txt",
+                    "local_path": "/tmp/hello.txt",
+                    "size": 5,
+                }
+            ]
+        )
+
+        def walk(*args, sizes=None, etags=None, **kwargs):
+            # sizes and etags are recorded by the walker from the listing
+            sizes["hello/a.txt"] = 1
+            etags["hello/a.txt"] = '"1"'
+            return [("hello/a.txt", "/tmp/a.txt"), ("hello/b/c.txt", "/tmp/b/c.txt")]
+
+        mocked_walk.side_effect = walk
+        download_s3(recursive=True, bucket="kazhala-lol/hello/", local_path="/tmp")
+        mocked_scheduler.return_value.download.assert_called_with(
+            [
+                {
+                    "bucket": "kazhala-lol",
+                    "key": "hello/a.txt",
+                    "local_path": "/tmp/a.txt",
+                    "size": 1,
+                    "etag": '"1"',
+                },
+                {
+                    "bucket": "kazhala-lol",
+                    "key": "hello/b/c.txt",
+                    "local_path": "/tmp/b/c.txt",
+                    "size": None,
+                    "etag": None,
+                },
+            ]
+        )
+
+        # objects walked from the inventory are confirmed with their live size
+        def confirm_objects(keys, bucket="", sizes=None, etags=None):
+            sizes["hello/a.txt"] = 2
+            etags["hello/a.txt"] = '"2"'
+            return ["hello/a.txt"]
+
+        mocked_walk.side_effect = lambda *args, **kwargs: [
+            ("hello/a.txt", "/tmp/a.txt"),
+            ("hello/deleted.txt", "/tmp/deleted.txt"),
+        ]
+        with patch.object(S3, "get_inventory") as mocked_inventory, patch.object(
+            S3, "confirm_objects", side_effect=confirm_objects
+        ):
+            mocked_inventory.return_value = VersionIndex(bucket="kazhala-lol")
+            download_s3(recursive=True, bucket="kazhala-lol/hello/", local_path="/tmp")
+        mocked_scheduler.return_value.download.assert_called_with(
+            [
+                {
+                    "bucket": "kazhala-lol",
+                    "key": "hello/a.txt",
+                    "local_path": "/tmp/a.txt",
+                    "size": 2,
+                    "etag": '"2"',
+                }
+            ]
+        )
+
+        with patch.object(S3, "get_object_version") as mocked_version:
+            mocked_version.return_value = [
+                {"Key": "hello/hello.txt", "VersionId": "11111111"}
+            ]
+            download_s3(version=True, bucket="kazhala-lol/hello/", local_path="/tmp")
+        mocked_scheduler.return_value.download.assert_called_with(
+            [
+                {
+                    "bucket": "kazhala-lol",
+                    "key": "hello/hello.txt",
+                    "local_path": "/tmp/hello.txt",
+                    "version_id": "11111111",
+                    "size": 5,
+                }
+            ]
+        )
+        mocked_size.assert_called_with("hello/hello.txt", "11111111")
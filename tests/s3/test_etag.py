@@ -0,0 +1,59 @@
+import hashlib
+import os
+import tempfile
+import unittest
+
+from boto3.s3.transfer import TransferConfig
+
+from fzfaws.s3.helper.etag import calculate_etag, verify_etag
+
+
+class TestETag(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, "hello.txt")
+        self.body = b"a" * (5 * 1024 * 1024) + b"b" * 10
+        with open(self.path, "wb") as file:
+            file.write(self.body)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_single_part(self):
+        config = TransferConfig(multipart_threshold=len(self.body) + 1)
+        self.assertEqual(
+            calculate_etag(self.path, config), hashlib.md5(self.body).hexdigest()
+        )
+
+    def test_multipart(self):
+        # chunk size is adjusted to the 5 MiB minimum same as s3transfer
+        config = TransferConfig(multipart_threshold=8, multipart_chunksize=8)
+        parts = [self.body[: 5 * 1024 * 1024], self.body[5 * 1024 * 1024 :]]
+        expected = hashlib.md5(
+            b"".join(hashlib.md5(part).digest() for part in parts)
+        ).hexdigest()
+        self.assertEqual(calculate_etag(self.path, config), "%s-2" % expected)
+
+    def test_parallel(self):
+        config = TransferConfig(multipart_threshold=8, multipart_chunksize=8)
+        self.assertEqual(
+            calculate_etag(self.path, config, max_workers=1),
+            calculate_etag(self.path, config, max_workers=4),
+        )
+
+    def test_empty(self):
+        path = os.path.join(self.tmpdir.name, "empty")
+        open(path, "w").close()
+        self.assertEqual(calculate_etag(path), hashlib.md5().hexdigest())
+
+    def test_verify_etag(self):
+        self.assertTrue(verify_etag(self.path, hashlib.md5(self.body).hexdigest()))
+        self.assertFalse(verify_etag(self.path, '"%s"' % hashlib.md5().hexdigest()))
+        # uploaded in 5 MiB parts, chunk size is guessed from the 2 parts
+        etag = calculate_etag(
+            self.path, TransferConfig(multipart_threshold=8, multipart_chunksize=8)
+        )
+        self.assertTrue(verify_etag(self.path, '"%s"' % etag, TransferConfig()))
+        self.assertIsNone(verify_etag(self.path, "abc-2", TransferConfig()))
+        # not a md5, e.g. objects uploaded with SSE-C
+        self.assertIsNone(verify_etag(self.path, '"abc"'))
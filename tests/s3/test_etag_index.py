@@ -0,0 +1,59 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from boto3.s3.transfer import TransferConfig
+
+from fzfaws.s3.helper.etag_index import ETagIndex
+
+
+class TestETagIndex(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, "hello.txt")
+        with open(self.path, "w") as file:
+            file.write("hello")
+        self.db_path = os.path.join(self.tmpdir.name, "etag_index.sqlite3")
+        self.config = TransferConfig(multipart_threshold=1024)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_get_etag(self):
+        with ETagIndex(self.db_path, self.config) as index:
+            self.assertEqual(
+                index.get_etag(self.path), "5d41402abc4b2a76b9719d911017c592"
+            )
+
+        # stored etag is used when the file is not changed
+        with patch("fzfaws.s3.helper.etag_index.calculate_etag") as mocked_etag:
+            with ETagIndex(self.db_path, self.config) as index:
+                self.assertEqual(
+                    index.get_etag(self.path), "5d41402abc4b2a76b9719d911017c592"
+                )
+            mocked_etag.assert_not_called()
+
+    def test_invalidate(self):
+        with ETagIndex(self.db_path, self.config) as index:
+            index.get_etag(self.path)
+            with open(self.path, "w") as file:
+                file.write("world")
+            os.utime(self.path, ns=(0, 0))
+            self.assertEqual(
+                index.get_etag(self.path), "7d793037a0760186574b0282f2f435e7"
+            )
+
+        # changing the multipart settings also invalidates the stored etag
+        with patch("fzfaws.s3.helper.etag_index.calculate_etag") as mocked_etag:
+            mocked_etag.return_value = "abc-1"
+            config = TransferConfig(multipart_threshold=1)
+            with ETagIndex(self.db_path, config) as index:
+                self.assertEqual(index.get_etag(self.path), "abc-1")
+            mocked_etag.assert_called_once_with(self.path, config)
+
+    @patch("fzfaws.s3.helper.etag_index.get_cache_dir")
+    def test_default_path(self, mocked_cache_dir):
+        mocked_cache_dir.return_value = self.tmpdir.name
+        ETagIndex(transfer_config=self.config).close()
+        self.assertTrue(os.path.exists(self.db_path))
@@ -1,8 +1,12 @@
 import os
 import json
 import unittest
-from unittest.mock import PropertyMock, patch
-from fzfaws.s3.helper.get_copy_args import get_copy_args, check_acl_update
+from unittest.mock import MagicMock, PropertyMock, patch
+from fzfaws.s3.helper.get_copy_args import (
+    get_copy_args,
+    get_copy_args_batch,
+    check_acl_update,
+)
 from fzfaws.s3.helper.s3args import S3Args
 from botocore.stub import Stubber
 import boto3
@@ -48,6 +52,8 @@ class TestS3GetCopyArgs(unittest.TestCase):
         )
         with open(data_path1, "r") as file:
             response1 = json.load(file)
+        # head_object has the same response without the body
+        response1.pop("Body")
         data_path2 = os.path.join(
             os.path.dirname(os.path.abspath(__file__)), "../data/s3_acl.json"
         )
@@ -57,11 +63,15 @@ class TestS3GetCopyArgs(unittest.TestCase):
         # no version, update acl true
         s3_client = boto3.client("s3")
         stubber = Stubber(s3_client)
-        stubber.add_response("get_object", response1)
+        stubber.add_response("head_object", response1)
+        stubber.add_client_error(
+            "get_bucket_ownership_controls", "OwnershipControlsNotFoundError"
+        )
         stubber.add_response("get_object_acl", response2)
         stubber.activate()
         s3 = S3()
         s3._client = s3_client
+        s3.get_client = MagicMock(return_value=s3_client)
         s3.bucket_name = "hello"
         s3_args = S3Args(s3)
         result = get_copy_args(s3, "hello.json", s3_args, False)
@@ -81,11 +91,11 @@ class TestS3GetCopyArgs(unittest.TestCase):
         # no version, update acl false
         s3_client = boto3.client("s3")
         stubber = Stubber(s3_client)
-        stubber.add_response("get_object", response1)
-        stubber.add_response("get_object_acl", response2)
+        stubber.add_response("head_object", response1)
         stubber.activate()
         s3 = S3()
         s3._client = s3_client
+        s3.get_client = MagicMock(return_value=s3_client)
         s3.bucket_name = "hello"
         s3_args = S3Args(s3)
         s3_args._extra_args["GrantFullControl"] = "email=hello@gmail.com"
@@ -106,11 +116,11 @@ class TestS3GetCopyArgs(unittest.TestCase):
         # no version, no extra_args
         s3_client = boto3.client("s3")
         stubber = Stubber(s3_client)
-        stubber.add_response("get_object", response1)
-        stubber.add_response("get_object_acl", response2)
+        stubber.add_response("head_object", response1)
         stubber.activate()
         s3 = S3()
         s3._client = s3_client
+        s3.get_client = MagicMock(return_value=s3_client)
         s3.bucket_name = "hello"
         s3_args = S3Args(s3)
         s3_args._extra_args["GrantFullControl"] = "email=hello@gmail.com"
@@ -131,6 +141,8 @@ class TestS3GetCopyArgs(unittest.TestCase):
         )
         with open(data_path1, "r") as file:
             response1 = json.load(file)
+        # head_object has the same response without the body
+        response1.pop("Body")
         data_path2 = os.path.join(
             os.path.dirname(os.path.abspath(__file__)), "../data/s3_acl.json"
         )
@@ -140,11 +152,15 @@ class TestS3GetCopyArgs(unittest.TestCase):
         # with version
         s3_client = boto3.client("s3")
         stubber = Stubber(s3_client)
-        stubber.add_response("get_object", response1)
+        stubber.add_response("head_object", response1)
+        stubber.add_client_error(
+            "get_bucket_ownership_controls", "OwnershipControlsNotFoundError"
+        )
         stubber.add_response("get_object_acl", response2)
         stubber.activate()
         s3 = S3()
         s3._client = s3_client
+        s3.get_client = MagicMock(return_value=s3_client)
         s3.bucket_name = "hello"
         s3_args = S3Args(s3)
         result = get_copy_args(s3, "hello.json", s3_args, False)
@@ -160,3 +176,104 @@ class TestS3GetCopyArgs(unittest.TestCase):
                 "GrantRead": "uri=http://acs.amazonaws.com/groups/global/AllUsers",
             },
         )
+
+    def test_get_copy_args_batch(self):
+        s3 = S3()
+        s3._client = MagicMock()
+        s3.get_client = MagicMock(return_value=s3._client)
+        s3._client.get_bucket_ownership_controls.return_value = {
+            "OwnershipControls": {"Rules": [{"ObjectOwnership": "ObjectWriter"}]}
+        }
+        s3._client.head_object.side_effect = lambda **kwargs: {
+            "StorageClass": "STANDARD_IA" if kwargs.get("VersionId") else "GLACIER"
+        }
+        s3._client.get_object_acl.return_value = {
+            "Grants": [
+                {
+                    "Grantee": {"Type": "CanonicalUser", "ID": "11111111"},
+                    "Permission": "FULL_CONTROL",
+                },
+                {
+                    "Grantee": {
+                        "Type": "Group",
+                        "URI": "http://acs.amazonaws.com/groups/global/AllUsers",
+                    },
+                    "Permission": "READ",
+                },
+            ]
+        }
+        s3.bucket_name = "hello"
+        s3_args = S3Args(s3)
+        result = list(
+            get_copy_args_batch(
+                s3,
+                (("%s.txt" % index, "1" if index == 3 else None) for index in range(5)),
+                s3_args,
+                extra_args=True,
+                max_workers=2,
+            )
+        )
+        self.assertEqual(
+            [(key, version) for key, version, _ in result],
+            [
+                ("0.txt", None),
+                ("1.txt", None),
+                ("2.txt", None),
+                ("3.txt", "1"),
+                ("4.txt", None),
+            ],
+        )
+        self.assertEqual(
+            result[3][2],
+            {
+                "StorageClass": "STANDARD_IA",
+                "GrantFullControl": "id=11111111",
+                "GrantRead": "uri=http://acs.amazonaws.com/groups/global/AllUsers",
+            },
+        )
+        self.assertEqual(result[0][2]["StorageClass"], "GLACIER")
+        s3._client.head_object.assert_any_call(
+            Bucket="hello", Key="3.txt", VersionId="1"
+        )
+        s3._client.get_object.assert_not_called()
+        s3.get_client.assert_called_with("hello")
+        s3._client.get_bucket_ownership_controls.assert_called_with(Bucket="hello")
+
+        # the acl isn't requested when a canned acl replaces it
+        s3._client.get_object_acl.reset_mock()
+        s3_args._extra_args["ACL"] = "private"
+        result = list(get_copy_args_batch(s3, [("0.txt", None)], s3_args, True))
+        s3._client.get_object_acl.assert_not_called()
+        self.assertEqual(result[0][2], {"StorageClass": "GLACIER", "ACL": "private"})
+
+        # acls disabled, the bucket acl is read once instead of every object acl
+        s3._client = MagicMock()
+        s3.get_client.return_value = s3._client
+        s3._client.head_object.return_value = {}
+        s3._client.get_bucket_ownership_controls.return_value = {
+            "OwnershipControls": {"Rules": [{"ObjectOwnership": "BucketOwnerEnforced"}]}
+        }
+        s3._client.get_bucket_acl.return_value = {
+            "Grants": [
+                {
+                    "Grantee": {"Type": "CanonicalUser", "ID": "11111111"},
+                    "Permission": "FULL_CONTROL",
+                }
+            ]
+        }
+        s3_args._extra_args.pop("ACL")
+        result = list(
+            get_copy_args_batch(
+                s3,
+                (("%s.txt" % index, None) for index in range(5)),
+                s3_args,
+                extra_args=True,
+                max_workers=1,
+            )
+        )
+        self.assertEqual(
+            [copy_args for _, _, copy_args in result],
+            [{"GrantFullControl": "id=11111111"}] * 5,
+        )
+        s3._client.get_object_acl.assert_not_called()
+        s3._client.get_bucket_acl.assert_called_once_with(Bucket="hello")
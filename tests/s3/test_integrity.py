@@ -0,0 +1,211 @@
+import base64
+import hashlib
+import io
+import os
+import tempfile
+import unittest
+import zlib
+from unittest.mock import MagicMock, patch
+
+from boto3.s3.transfer import TransferConfig
+
+from fzfaws.s3.helper.integrity import (
+    HashingReader,
+    HashingWriter,
+    IntegrityHasher,
+    ObjectIntegrity,
+    check_integrity,
+    get_checksum_args,
+    get_object_integrity,
+    get_part_size,
+    get_verify_choices,
+    hash_file,
+)
+from fzfaws.utils.exceptions import ChecksumMismatch
+
+MB = 1024 * 1024
+
+
+class TestIntegrity(unittest.TestCase):
+    def setUp(self):
+        self.body = os.urandom(11 * MB)
+        self.parts = [
+            self.body[i : i + 5 * MB] for i in range(0, len(self.body), 5 * MB)
+        ]
+        self.multipart_etag = "%s-3" % (
+            hashlib.md5(
+                b"".join(hashlib.md5(part).digest() for part in self.parts)
+            ).hexdigest()
+        )
+
+    def test_hasher(self):
+        hasher = IntegrityHasher(11, algorithm="sha256")
+        self.assertIsNone(hasher.etag())
+        hasher.update(0, b"hello")
+        hasher.update(5, b" world")
+        self.assertEqual(hasher.etag(), hashlib.md5(b"hello world").hexdigest())
+        self.assertEqual(
+            hasher.checksum(),
+            base64.b64encode(hashlib.sha256(b"hello world").digest()).decode(),
+        )
+
+        # md5 only verifies the ETag
+        hasher = IntegrityHasher(11, algorithm="md5")
+        hasher.update(0, b"hello world")
+        self.assertIsNone(hasher.checksum())
+
+    def test_hasher_multipart(self):
+        hasher = IntegrityHasher(len(self.body), 5 * MB, "sha256")
+        # parts hashed in any order, data read again by a retry is skipped
+        for offset in [10 * MB, 5 * MB, 0, 5 * MB]:
+            hasher.update(offset, self.body[offset : offset + 5 * MB])
+        self.assertEqual(hasher.etag(), self.multipart_etag)
+        self.assertEqual(
+            hasher.checksum(),
+            "%s-3"
+            % base64.b64encode(
+                hashlib.sha256(
+                    b"".join(hashlib.sha256(part).digest() for part in self.parts)
+                ).digest()
+            ).decode(),
+        )
+        self.assertIsNone(hasher.checksum(composite=False))
+
+        hasher = IntegrityHasher(len(self.body), 5 * MB, "crc32")
+        hasher.update(0, self.body)
+        self.assertEqual(
+            hasher.checksum(composite=False),
+            base64.b64encode(zlib.crc32(self.body).to_bytes(4, "big")).decode(),
+        )
+
+    def test_hasher_gap(self):
+        hasher = IntegrityHasher(len(self.body), 5 * MB)
+        hasher.update(0, self.body[: 5 * MB])
+        hasher.update(6 * MB, self.body[6 * MB :])
+        self.assertIsNone(hasher.etag())
+        self.assertIsNone(hasher.get_part_digests(1))
+
+        # digests saved by a previous transfer are restored
+        digests = hasher.get_part_digests(0)
+        hasher = IntegrityHasher(len(self.body), 5 * MB)
+        hasher.set_part_digests(0, digests)
+        hasher.update(5 * MB, self.body[5 * MB :])
+        self.assertEqual(hasher.etag(), self.multipart_etag)
+
+    def test_hashing_reader_writer(self):
+        hasher = IntegrityHasher(11)
+        reader = HashingReader(io.BytesIO(b"hello world"), hasher)
+        self.assertEqual(reader.read(5), b"hello")
+        reader.seek(0)
+        self.assertEqual(reader.read(), b"hello world")
+        self.assertEqual(hasher.etag(), hashlib.md5(b"hello world").hexdigest())
+
+        hasher = IntegrityHasher(11)
+        fileobj = io.BytesIO()
+        writer = HashingWriter(fileobj, hasher)
+        writer.write(b"hello")
+        writer.write(b" world")
+        self.assertEqual(fileobj.getvalue(), b"hello world")
+        self.assertEqual(hasher.etag(), hashlib.md5(b"hello world").hexdigest())
+        self.assertFalse(hasattr(writer, "seek"))
+
+    def test_hash_file(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "big.iso")
+            with open(path, "wb") as file:
+                file.write(self.body)
+            hasher = IntegrityHasher(len(self.body), 5 * MB)
+            hash_file(path, hasher)
+        self.assertEqual(hasher.etag(), self.multipart_etag)
+
+    def test_get_checksum_args(self):
+        self.assertEqual(get_checksum_args("sha256"), {"ChecksumAlgorithm": "SHA256"})
+        self.assertEqual(get_checksum_args("md5"), {})
+        self.assertEqual(get_checksum_args(None), {})
+
+    @patch("fzfaws.s3.helper.integrity.importlib.util.find_spec")
+    @patch("fzfaws.s3.helper.integrity.botocore.session.get_session")
+    def test_get_verify_choices(self, mocked_session, mocked_spec):
+        operation = MagicMock()
+        mocked_session.return_value.get_service_model.return_value.operation_model.return_value = (
+            operation
+        )
+        operation.input_shape.members = {"Bucket": None, "ContentMD5": None}
+        get_verify_choices.cache_clear()
+        self.assertEqual(get_verify_choices(), ["md5"])
+
+        operation.input_shape.members = {"Bucket": None, "ChecksumAlgorithm": None}
+        mocked_spec.return_value = None
+        get_verify_choices.cache_clear()
+        self.assertEqual(get_verify_choices(), ["md5", "sha256", "crc32"])
+
+        mocked_spec.return_value = MagicMock()
+        get_verify_choices.cache_clear()
+        self.assertEqual(get_verify_choices(), ["md5", "sha256", "crc32", "crc32c"])
+        get_verify_choices.cache_clear()
+
+    def test_get_part_size(self):
+        config = TransferConfig(multipart_threshold=8 * MB, multipart_chunksize=5 * MB)
+        self.assertEqual(get_part_size(MB, config), 0)
+        self.assertEqual(get_part_size(11 * MB, config), 5 * MB)
+
+    def test_get_object_integrity(self):
+        client = MagicMock()
+        client.head_object.side_effect = lambda **kwargs: (
+            {"ContentLength": 5 * MB}
+            if kwargs.get("PartNumber")
+            else {
+                "ContentLength": 11 * MB,
+                "ETag": '"%s"' % self.multipart_etag,
+                "ChecksumSHA256": "abc-3",
+            }
+        )
+        integrity = get_object_integrity(
+            client, "kazhala-lol", "big.iso", "sha256", VersionId="11111111"
+        )
+        self.assertEqual(
+            integrity,
+            ObjectIntegrity(11 * MB, 5 * MB, self.multipart_etag, "abc-3", True),
+        )
+        client.head_object.assert_any_call(
+            Bucket="kazhala-lol",
+            Key="big.iso",
+            VersionId="11111111",
+            ChecksumMode="ENABLED",
+        )
+        client.head_object.assert_called_with(
+            Bucket="kazhala-lol", Key="big.iso", PartNumber=1, VersionId="11111111"
+        )
+
+        # ETag of kms encrypted object is not md5
+        client.reset_mock()
+        integrity = get_object_integrity(
+            client,
+            "kazhala-lol",
+            "hello.txt",
+            response={
+                "ContentLength": 11,
+                "ETag": '"1"',
+                "ServerSideEncryption": "aws:kms",
+            },
+        )
+        self.assertEqual(integrity, ObjectIntegrity(11, 0, None, None, False))
+        client.head_object.assert_not_called()
+
+    def test_check_integrity(self):
+        hasher = IntegrityHasher(11)
+        hasher.update(0, b"hello world")
+        etag = hashlib.md5(b"hello world").hexdigest()
+        self.assertTrue(
+            check_integrity(hasher, ObjectIntegrity(11, 0, etag, None, False), "s3://")
+        )
+        self.assertFalse(
+            check_integrity(hasher, ObjectIntegrity(11, 0, None, None, False), "s3://")
+        )
+        self.assertRaises(
+            ChecksumMismatch,
+            check_integrity,
+            hasher,
+            ObjectIntegrity(11, 0, "1", None, False),
+            "s3://",
+        )
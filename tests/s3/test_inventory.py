@@ -0,0 +1,168 @@
+from datetime import datetime, timezone
+import gzip
+import io
+import json
+import os
+import tempfile
+import unittest
+
+import boto3
+from botocore.stub import Stubber
+
+from fzfaws.s3.helper.inventory import load_inventory, parse_s3_uri, read_manifest
+from fzfaws.utils.exceptions import InvalidFileType, InvalidS3PathPattern
+
+try:
+    import pyarrow  # noqa: F401
+
+    HAS_PYARROW = True
+except ImportError:
+    HAS_PYARROW = False
+
+SCHEMA = "Bucket, Key, VersionId, IsLatest, IsDeleteMarker, Size, LastModifiedDate, ETag"
+
+
+def _csv_gz(lines):
+    return gzip.compress(("\n".join(lines) + "\n").encode("utf-8"))
+
+
+class TestInventory(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.manifest = {
+            "sourceBucket": "kazhala-lol",
+            "destinationBucket": "arn:aws:s3:::kazhala-inventory",
+            "fileFormat": "CSV",
+            "fileSchema": SCHEMA,
+            "files": [
+                {"key": "kazhala-lol/all/data/1.csv.gz"},
+                {"key": "kazhala-lol/all/data/2.csv.gz"},
+            ],
+        }
+        # keys of the two data files interleave
+        self.data = [
+            _csv_gz(
+                [
+                    '"kazhala-lol","folder/b.txt","2","true","false","5","2020-06-03T10:20:30.000Z","x"',
+                    '"kazhala-lol","hello+world.txt","4","true","true","","2020-06-04T10:20:30.000Z",""',
+                ]
+            ),
+            _csv_gz(
+                [
+                    '"kazhala-lol","folder/a.txt","1","true","false","3","2020-06-03T10:20:30.000Z","x"',
+                    '"kazhala-lol","hello+world.txt","3","false","false","7","2020-06-01T10:20:30.000Z","x"',
+                    '"kazhala-lol","folder/sub/c%2Ejson","5","true","false","9","2020-06-03T10:20:30.000Z","x"',
+                ]
+            ),
+        ]
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_parse_s3_uri(self):
+        self.assertEqual(
+            parse_s3_uri("s3://kazhala-inventory/lol/manifest.json"),
+            ("kazhala-inventory", "lol/manifest.json"),
+        )
+        self.assertEqual(parse_s3_uri("~/manifest.json"), ("", "~/manifest.json"))
+        self.assertRaises(InvalidS3PathPattern, parse_s3_uri, "s3://kazhala-inventory")
+
+    def test_load_local(self):
+        manifest_path = os.path.join(self.tmpdir.name, "manifest.json")
+        with open(manifest_path, "w") as file:
+            json.dump(self.manifest, file)
+        os.makedirs(os.path.join(self.tmpdir.name, "data"))
+        for name, data in zip(["1.csv.gz", "2.csv.gz"], self.data):
+            with open(os.path.join(self.tmpdir.name, "data", name), "wb") as file:
+                file.write(data)
+
+        self.assertEqual(read_manifest(manifest_path), self.manifest)
+        index, versioned = load_inventory(manifest_path)
+        self.assertTrue(versioned)
+        self.assertEqual(index.bucket, "kazhala-lol")
+        self.assertEqual(
+            index.keys,
+            ["folder/a.txt", "folder/b.txt", "folder/sub/c.json", "hello world.txt"],
+        )
+        self.assertEqual(len(index), 5)
+        versions = list(index.versions("hello world.txt"))
+        self.assertEqual(
+            [(item["VersionId"], item["IsLatest"]) for item in versions],
+            [("4", True), ("3", False)],
+        )
+        self.assertTrue(versions[0]["DeleteMarker"])
+        self.assertEqual(versions[1]["Size"], 7)
+        modified = datetime(2020, 6, 3, 10, 20, 30, tzinfo=timezone.utc)
+        self.assertEqual(
+            index.list_folder("folder/"),
+            {
+                "CommonPrefixes": [{"Prefix": "folder/sub/"}],
+                "Contents": [
+                    {
+                        "Key": "folder/a.txt",
+                        "Size": 3,
+                        "LastModified": modified,
+                        "ETag": '"x"',
+                    },
+                    {
+                        "Key": "folder/b.txt",
+                        "Size": 5,
+                        "LastModified": modified,
+                        "ETag": '"x"',
+                    },
+                ],
+            },
+        )
+
+        self.manifest["fileFormat"] = "JSON"
+        with open(manifest_path, "w") as file:
+            json.dump(self.manifest, file)
+        self.assertRaises(InvalidFileType, load_inventory, manifest_path)
+
+    def test_load_s3(self):
+        client = boto3.client("s3")
+        stubber = Stubber(client)
+        stubber.add_response(
+            "get_object",
+            {"Body": io.BytesIO(json.dumps(self.manifest).encode("utf-8"))},
+            {"Bucket": "kazhala-inventory", "Key": "kazhala-lol/all/manifest.json"},
+        )
+        for file, data in zip(self.manifest["files"], self.data):
+            stubber.add_response(
+                "get_object",
+                {"Body": io.BytesIO(data)},
+                {"Bucket": "kazhala-inventory", "Key": file["key"]},
+            )
+        stubber.activate()
+        index, versioned = load_inventory(
+            "s3://kazhala-inventory/kazhala-lol/all/manifest.json", client
+        )
+        stubber.assert_no_pending_responses()
+        self.assertTrue(versioned)
+        self.assertEqual(len(index), 5)
+
+    def test_unversioned(self):
+        self.manifest["fileSchema"] = "Bucket, Key, Size"
+        self.manifest["files"] = [{"key": "1.csv.gz"}]
+        manifest_path = os.path.join(self.tmpdir.name, "manifest.json")
+        with open(manifest_path, "w") as file:
+            json.dump(self.manifest, file)
+        with open(os.path.join(self.tmpdir.name, "1.csv.gz"), "wb") as file:
+            file.write(_csv_gz(['"kazhala-lol","hello.txt","5"']))
+        index, versioned = load_inventory(manifest_path)
+        self.assertFalse(versioned)
+        self.assertEqual(
+            [(item["Key"], item["Size"]) for item in index.latest()],
+            [("hello.txt", 5)],
+        )
+
+    @unittest.skipIf(HAS_PYARROW, "pyarrow is installed")
+    def test_no_pyarrow(self):
+        self.manifest["fileFormat"] = "Parquet"
+        self.manifest["files"] = [{"key": "1.parquet"}]
+        manifest_path = os.path.join(self.tmpdir.name, "manifest.json")
+        with open(manifest_path, "w") as file:
+            json.dump(self.manifest, file)
+        with open(os.path.join(self.tmpdir.name, "1.parquet"), "wb") as file:
+            file.write(b"")
+        self.assertRaises(InvalidFileType, load_inventory, manifest_path)
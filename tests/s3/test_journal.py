@@ -0,0 +1,111 @@
+import io
+import os
+import sys
+import tempfile
+import unittest
+from unittest.mock import MagicMock
+
+from fzfaws.s3.helper.batch_delete import BatchDeleter
+from fzfaws.s3.helper.journal import Journal, journal_id
+
+
+class TestJournal(unittest.TestCase):
+    def setUp(self):
+        self.capturedOutput = io.StringIO()
+        sys.stdout = self.capturedOutput
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.plan = {"bucket": "kazhala-lol", "prefix": "hello/", "exclude": []}
+
+    def tearDown(self):
+        sys.stdout = sys.__stdout__
+        self.tmpdir.cleanup()
+
+    def test_resume(self):
+        journal = Journal("upload", self.plan, journal_dir=self.tmpdir.name)
+        self.assertFalse(os.path.exists(journal.path))
+        with self.assertRaises(ValueError):
+            with journal:
+                journal.record("a.txt")
+                journal.record(journal_id("b.txt", "111"))
+                raise ValueError
+        # the journal is kept when the operation failed
+        self.assertTrue(os.path.exists(journal.path))
+        self.assertRegex(
+            self.capturedOutput.getvalue(), r"journal: .*, run again with --resume"
+        )
+
+        # a crash could leave a torn line at the end
+        with open(journal.path, "a") as file:
+            file.write('"c.t')
+
+        journal = Journal(
+            "upload", self.plan, resume=True, journal_dir=self.tmpdir.name
+        )
+        self.assertEqual(journal.completed, {"a.txt", "b.txt?versionId=111"})
+        self.assertIn("a.txt", journal)
+        self.assertEqual(
+            list(
+                journal.pending(
+                    [
+                        {"Key": "a.txt"},
+                        {"Key": "b.txt", "VersionId": "111"},
+                        {"Key": "b.txt", "VersionId": "222"},
+                    ],
+                    lambda item: journal_id(item["Key"], item.get("VersionId")),
+                )
+            ),
+            [{"Key": "b.txt", "VersionId": "222"}],
+        )
+        self.assertRegex(
+            self.capturedOutput.getvalue(),
+            r"resume: 2 completed items of the previous upload",
+        )
+
+        # the journal is removed when the operation completed
+        with journal:
+            journal.record("c.txt")
+        self.assertFalse(os.path.exists(journal.path))
+
+    def test_plan(self):
+        with self.assertRaises(ValueError):
+            with Journal("delete", self.plan, journal_dir=self.tmpdir.name) as journal:
+                journal.record("a.txt")
+                raise ValueError
+
+        # a different plan or operation doesn't share the journal
+        journal = Journal(
+            "delete",
+            dict(self.plan, prefix="foo/"),
+            resume=True,
+            journal_dir=self.tmpdir.name,
+        )
+        self.assertEqual(journal.completed, set())
+        journal = Journal(
+            "upload", self.plan, resume=True, journal_dir=self.tmpdir.name
+        )
+        self.assertEqual(journal.completed, set())
+
+        # without resume, the previous journal is replaced
+        journal = Journal("delete", self.plan, journal_dir=self.tmpdir.name)
+        self.assertEqual(journal.completed, set())
+        with journal:
+            journal.record_failure()
+        journal = Journal(
+            "delete", self.plan, resume=True, journal_dir=self.tmpdir.name
+        )
+        self.assertEqual(journal.completed, set())
+
+    def test_batch_delete(self):
+        client = MagicMock()
+        client.delete_objects.return_value = {
+            "Errors": [{"Key": "b.txt", "Code": "AccessDenied", "Message": "denied"}]
+        }
+        with Journal("delete", self.plan, journal_dir=self.tmpdir.name) as journal:
+            BatchDeleter(client, "kazhala-lol", journal=journal).delete(
+                [{"Key": "a.txt"}, {"Key": "b.txt"}, {"Key": "c.txt", "VersionId": "1"}]
+            )
+        # the failed object is not recorded and the journal is kept
+        journal = Journal(
+            "delete", self.plan, resume=True, journal_dir=self.tmpdir.name
+        )
+        self.assertEqual(journal.completed, {"a.txt", "c.txt?versionId=1"})
@@ -1,10 +1,14 @@
 from fzfaws.s3.s3 import S3
 import io
+import json
+import os
 import sys
+import tempfile
 import unittest
-from unittest.mock import ANY, PropertyMock, patch
+from unittest.mock import ANY, MagicMock, PropertyMock, patch
 from fzfaws.s3.ls_s3 import ls_s3, get_detailed_info
 import boto3
+from botocore.exceptions import ClientError
 from fzfaws.utils import BaseSession
 from botocore.stub import Stubber
 
@@ -13,9 +17,16 @@ class TestS3LS(unittest.TestCase):
     def setUp(self):
         self.capturedOutput = io.StringIO()
         sys.stdout = self.capturedOutput
+        self.cache_dir = tempfile.TemporaryDirectory()
+        self.env_patcher = patch.dict(
+            os.environ, {"XDG_CACHE_HOME": self.cache_dir.name}
+        )
+        self.env_patcher.start()
 
     def tearDown(self):
         sys.stdout = sys.__stdout__
+        self.env_patcher.stop()
+        self.cache_dir.cleanup()
 
     @patch.object(BaseSession, "client", new_callable=PropertyMock)
     @patch("fzfaws.s3.ls_s3.get_detailed_info")
@@ -139,3 +150,67 @@ class TestS3LS(unittest.TestCase):
         self.assertEqual(
             self.capturedOutput.getvalue(), "arn:aws:s3:::kazhala-lol/hello.txt\n"
         )
+
+    @patch.object(S3, "get_bucket_region")
+    @patch.object(S3, "get_client")
+    def test_get_detailed_info(self, mocked_client, mocked_region):
+        client = MagicMock()
+        mocked_client.return_value = client
+        mocked_region.return_value = "ap-southeast-2"
+        s3 = S3()
+        s3.bucket_name = "kazhala-lol"
+
+        error = ClientError({"Error": {"Code": "NoSuchTagSet"}}, "GetBucketTagging")
+        client.get_bucket_acl.return_value = {"Owner": {"ID": "1"}, "Grants": []}
+        client.get_bucket_versioning.return_value = {"Status": "Enabled"}
+        client.get_bucket_encryption.side_effect = error
+        client.get_bucket_policy_status.side_effect = error
+        client.get_bucket_policy.side_effect = error
+        client.get_bucket_tagging.side_effect = error
+        get_detailed_info(s3, True, False, [])
+        self.assertEqual(
+            self.capturedOutput.getvalue(),
+            "%s\ns3://kazhala-lol\n%s\n"
+            % (
+                80 * "-",
+                json.dumps(
+                    {
+                        "Owner": {"ID": "1"},
+                        "Region": "ap-southeast-2",
+                        "Encryption": None,
+                        "Grants": [],
+                        "Versioning": "Enabled",
+                        "MFA": None,
+                        "Tags": None,
+                    },
+                    indent=4,
+                ),
+            ),
+        )
+
+        # objects are printed in selection order
+        self.capturedOutput.truncate(0)
+        self.capturedOutput.seek(0)
+        s3.path_list = ["file%s" % i for i in range(20)]
+        client.head_object.side_effect = lambda **kwargs: {"Key": kwargs["Key"]}
+        client.get_object_tagging.return_value = {"TagSet": []}
+        client.get_object_acl.return_value = {"Owner": {"ID": "1"}, "Grants": []}
+        get_detailed_info(s3, False, False, [])
+        self.assertEqual(client.head_object.call_count, 20)
+        output = self.capturedOutput.getvalue()
+        positions = [output.index("s3://kazhala-lol/file%s\n" % i) for i in range(20)]
+        self.assertEqual(positions, sorted(positions))
+
+        # versioned objects
+        self.capturedOutput.truncate(0)
+        self.capturedOutput.seek(0)
+        get_detailed_info(s3, False, True, [{"Key": "file1", "VersionId": "11111"}])
+        client.head_object.assert_called_with(
+            Bucket="kazhala-lol", Key="file1", VersionId="11111"
+        )
+        client.get_object_acl.assert_called_with(
+            Bucket="kazhala-lol", Key="file1", VersionId="11111"
+        )
+        self.assertRegex(
+            self.capturedOutput.getvalue(), r"s3://kazhala-lol/file1 versioned 11111"
+        )
@@ -20,7 +20,21 @@ class TestS3Main(unittest.TestCase):
     def test_upload(self, mocked_upload):
         s3(["upload"])
         mocked_upload.assert_called_with(
-            False, None, [], False, False, False, False, [], [], False
+            False,
+            None,
+            [],
+            False,
+            False,
+            False,
+            False,
+            [],
+            [],
+            False,
+            False,
+            False,
+            False,
+            False,
+            None,
         )
 
         s3(["upload", "-P", "-b", "kazhala-file-transfer/", "-p", "hello.txt", "-E"])
@@ -35,6 +49,11 @@ class TestS3Main(unittest.TestCase):
             [],
             [],
             True,
+            False,
+            False,
+            False,
+            False,
+            None,
         )
 
         s3(
@@ -46,6 +65,12 @@ class TestS3Main(unittest.TestCase):
                 "-R",
                 "-H",
                 "-s",
+                "--delete",
+                "-c",
+                "-u",
+                "--resume",
+                "--verify",
+                "sha256",
                 "-e",
                 "*.git",
                 "*.lol",
@@ -64,42 +89,143 @@ class TestS3Main(unittest.TestCase):
             ["*.git", "*.lol"],
             ["hello.txt"],
             False,
+            True,
+            True,
+            True,
+            True,
+            "sha256",
         )
 
     @patch("fzfaws.s3.main.download_s3")
     def test_download(self, mocked_download):
         s3(["download"])
         mocked_download.assert_called_with(
-            False, None, None, False, False, False, [], [], False, False
+            False,
+            None,
+            None,
+            False,
+            False,
+            False,
+            [],
+            [],
+            False,
+            False,
+            None,
+            False,
+            False,
+            False,
+            None,
         )
 
-        s3(["download", "-r", "-R", "-s", "-e", "lol", "-v", "-H"])
+        s3(
+            [
+                "download",
+                "-r",
+                "-R",
+                "-s",
+                "--delete",
+                "-e",
+                "lol",
+                "-v",
+                "-H",
+                "--resume",
+                "--verify",
+            ]
+        )
         mocked_download.assert_called_with(
-            False, None, None, True, True, True, ["lol"], [], True, True
+            False,
+            None,
+            None,
+            True,
+            True,
+            True,
+            ["lol"],
+            [],
+            True,
+            True,
+            None,
+            True,
+            False,
+            True,
+            "md5",
         )
 
         s3(["download", "-P", "root", "-b", "kazhala-file"])
         mocked_download.assert_called_with(
-            "root", "kazhala-file", None, False, False, False, [], [], False, False
+            "root",
+            "kazhala-file",
+            None,
+            False,
+            False,
+            False,
+            [],
+            [],
+            False,
+            False,
+            None,
+            False,
+            False,
+            False,
+            None,
         )
 
     @patch("fzfaws.s3.main.bucket_s3")
     def test_bucket(self, mocked_bucket):
         s3(["bucket"])
         mocked_bucket.assert_called_with(
-            False, None, None, False, False, [], [], False, False
+            False,
+            None,
+            None,
+            False,
+            False,
+            [],
+            [],
+            False,
+            False,
+            None,
+            False,
+            False,
+            False,
+            None,
         )
 
-        s3(["bucket", "-b", "kazhala", "-t", "yes", "-r", "-s"])
+        s3(
+            [
+                "bucket",
+                "-b",
+                "kazhala",
+                "-t",
+                "yes",
+                "-r",
+                "-s",
+                "-c",
+                "--resume",
+                "--verify",
+                "crc32",
+            ]
+        )
         mocked_bucket.assert_called_with(
-            False, "kazhala", "yes", True, True, [], [], False, False
+            False,
+            "kazhala",
+            "yes",
+            True,
+            True,
+            [],
+            [],
+            False,
+            False,
+            None,
+            False,
+            True,
+            True,
+            "crc32",
         )
 
     @patch("fzfaws.s3.main.delete_s3")
     def test_delete(self, mocked_delete):
         s3(["delete"])
         mocked_delete.assert_called_with(
-            False, None, False, [], [], "", False, False, False, False
+            False, None, False, [], [], "", False, False, False, False, None, False
         )
 
         s3(
@@ -117,10 +243,22 @@ class TestS3Main(unittest.TestCase):
                 "-V",
                 "--clean",
                 "--deletemark",
+                "--resume",
             ]
         )
         mocked_delete.assert_called_with(
-            "root", "kazhala", True, [], [], "111111 010010", True, True, True, True
+            "root",
+            "kazhala",
+            True,
+            [],
+            [],
+            "111111 010010",
+            True,
+            True,
+            True,
+            True,
+            None,
+            True,
         )
 
     @patch("fzfaws.s3.main.presign_s3")
@@ -135,20 +273,72 @@ class TestS3Main(unittest.TestCase):
     def test_ls(self, mocked_ls):
         s3(["ls"])
         mocked_ls.assert_called_with(
-            False, False, False, False, False, False, False, False, False, None
+            False, False, False, False, False, False, False, False, False, None, None
         )
 
         s3(["ls", "-P", "-v", "-d", "-b"])
         mocked_ls.assert_called_with(
-            True, True, True, True, False, False, False, False, False, None
+            True, True, True, True, False, False, False, False, False, None, None
         )
 
     @patch("fzfaws.s3.main.object_s3")
     def test_object(self, mocked_object):
         s3(["object"])
         mocked_object.assert_called_with(
-            False, None, False, False, False, [], [], False
+            False,
+            None,
+            False,
+            False,
+            False,
+            [],
+            [],
+            False,
+            inventory=None,
+            manifest=None,
+            resume=False,
         )
 
         s3(["object", "-b", "hello", "-r", "-v", "-V", "-n"])
-        mocked_object.assert_called_with(False, "hello", True, True, True, [], [], True)
+        mocked_object.assert_called_with(
+            False,
+            "hello",
+            True,
+            True,
+            True,
+            [],
+            [],
+            True,
+            inventory=None,
+            manifest=None,
+            resume=False,
+        )
+
+        s3(["object", "-I", "s3://inventory/manifest.json"])
+        mocked_object.assert_called_with(
+            False,
+            None,
+            False,
+            False,
+            False,
+            [],
+            [],
+            False,
+            inventory="s3://inventory/manifest.json",
+            manifest=None,
+            resume=False,
+        )
+
+        s3(["object", "-m", "report.csv", "--resume"])
+        mocked_object.assert_called_with(
+            False,
+            None,
+            False,
+            False,
+            False,
+            [],
+            [],
+            False,
+            inventory=None,
+            manifest="report.csv",
+            resume=True,
+        )
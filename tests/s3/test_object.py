@@ -2,7 +2,9 @@ from fzfaws.s3.helper.s3args import S3Args
 from botocore.stub import Stubber
 from fzfaws.utils.session import BaseSession
 import io
+import os
 import sys
+import tempfile
 import unittest
 from unittest.mock import PropertyMock, patch, ANY
 from fzfaws.s3.object_s3 import object_s3
@@ -81,13 +83,20 @@ class TestS3Object(unittest.TestCase):
             ExtraArgs={},
         )
 
+    @patch.object(S3, "get_client")
     @patch("fzfaws.s3.object_s3.get_confirmation")
     @patch("fzfaws.s3.object_s3.walk_s3_folder")
     @patch.object(S3Args, "set_extra_args")
     @patch.object(S3, "set_s3_path")
     @patch.object(S3, "set_s3_bucket")
     def test_recursive(
-        self, mocked_bucket, mocked_path, mocked_args, mocked_walk, mocked_confirm,
+        self,
+        mocked_bucket,
+        mocked_path,
+        mocked_args,
+        mocked_walk,
+        mocked_confirm,
+        mocked_client,
     ):
         mocked_confirm.return_value = False
         mocked_walk.return_value = [("hello.txt", "hello.txt")]
@@ -96,7 +105,21 @@ class TestS3Object(unittest.TestCase):
         mocked_bucket.assert_called_once()
         mocked_path.assert_called_once()
         mocked_args.assert_called_once_with(False, False, False, False, False)
-        mocked_walk.assert_called_with(ANY, "", "", "", [], [], [], "object", "", "")
+        mocked_walk.assert_called_with(
+            mocked_client.return_value,
+            "",
+            "",
+            "",
+            [],
+            [],
+            [],
+            "object",
+            "",
+            "",
+            inventory=None,
+            sizes={},
+            completed=ANY,
+        )
 
         mocked_bucket.reset_mock()
         mocked_path.reset_mock()
@@ -116,6 +139,9 @@ class TestS3Object(unittest.TestCase):
             "object",
             "hello/",
             "kazhala-lol",
+            inventory=None,
+            sizes={},
+            completed=ANY,
         )
 
     @patch("fzfaws.s3.object_s3.get_confirmation")
@@ -188,3 +214,93 @@ class TestS3Object(unittest.TestCase):
             self.capturedOutput.getvalue(),
             "(dryrun) update: s3://kazhala-lol/hello.txt\n",
         )
+
+    @patch.object(BaseSession, "client", new_callable=PropertyMock)
+    @patch("fzfaws.s3.object_s3.get_confirmation")
+    @patch.object(S3Args, "check_tag_acl")
+    @patch.object(S3Args, "set_extra_args")
+    def test_manifest(self, mocked_args, mocked_check, mocked_confirm, mocked_client):
+        mocked_confirm.return_value = True
+        mocked_check.return_value = {
+            "Tags": [{"Key": "hello", "Value": "world"}],
+            "Grants": {"ACL": "private"},
+        }
+        client = mocked_client.return_value
+        with tempfile.TemporaryDirectory() as tmpdir:
+            manifest = os.path.join(tmpdir, "manifest.csv")
+            with open(manifest, "w") as file:
+                file.write("kazhala-lol,hello.txt\nkazhala-lol,foo.txt,111\n")
+            with patch.dict(os.environ, {"XDG_CACHE_HOME": tmpdir}):
+                object_s3(tagging=True, acl=True, manifest=manifest)
+            self.assertEqual(
+                len(os.listdir(os.path.join(tmpdir, "fzfaws", "jobs"))), 1
+            )
+        mocked_args.assert_called_once_with(False, True, False, False, True)
+        client.put_object_tagging.assert_any_call(
+            Bucket="kazhala-lol",
+            Key="foo.txt",
+            VersionId="111",
+            Tagging={"TagSet": [{"Key": "hello", "Value": "world"}]},
+        )
+        client.put_object_acl.assert_any_call(
+            Bucket="kazhala-lol", Key="hello.txt", ACL="private"
+        )
+        self.assertRegex(
+            self.capturedOutput.getvalue(),
+            r"\(dryrun\) update: s3://kazhala-lol/foo.txt with version 111\n",
+        )
+        self.assertRegex(
+            self.capturedOutput.getvalue(), r"report: .* \(2 succeeded, 0 failed\)"
+        )
+
+    @patch.object(
+        S3, "get_client", autospec=True, side_effect=lambda s3, bucket="": s3.client
+    )
+    @patch.object(BaseSession, "client", new_callable=PropertyMock)
+    @patch("fzfaws.s3.object_s3.get_copy_args")
+    @patch("fzfaws.s3.object_s3.get_confirmation")
+    @patch("fzfaws.s3.object_s3.walk_s3_folder")
+    @patch.object(S3Args, "set_extra_args")
+    def test_recursive_copy(
+        self,
+        mocked_args,
+        mocked_walk,
+        mocked_confirm,
+        mocked_copy_args,
+        mocked_client,
+        mocked_get_client,
+    ):
+        mocked_confirm.return_value = True
+        mocked_copy_args.return_value = {"StorageClass": "GLACIER"}
+
+        def walk(*args, sizes=None, **kwargs):
+            sizes["hello/a.txt"] = 3
+            return [("hello/a.txt", "hello/a.txt"), ("hello/b.txt", "hello/b.txt")]
+
+        mocked_walk.side_effect = walk
+        client = mocked_client.return_value
+        with tempfile.TemporaryDirectory() as tmpdir:
+            with patch.dict(os.environ, {"XDG_CACHE_HOME": tmpdir}):
+                object_s3(bucket="kazhala-lol/hello/", recursive=True, storage=True)
+        # size from the listing is copied with a single copy_object
+        client.copy_object.assert_called_once_with(
+            Bucket="kazhala-lol",
+            Key="hello/a.txt",
+            CopySource={"Bucket": "kazhala-lol", "Key": "hello/a.txt"},
+            StorageClass="GLACIER",
+        )
+        client.copy.assert_called_once_with(
+            {"Bucket": "kazhala-lol", "Key": "hello/b.txt"},
+            "kazhala-lol",
+            "hello/b.txt",
+            ExtraArgs={"StorageClass": "GLACIER"},
+            Config=ANY,
+        )
+        mocked_copy_args.assert_any_call(
+            ANY,
+            "hello/a.txt",
+            ANY,
+            extra_args=True,
+            version=None,
+            bucket="kazhala-lol",
+        )
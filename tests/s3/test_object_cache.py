@@ -0,0 +1,254 @@
+import io
+import json
+import os
+import tempfile
+import unittest
+from unittest.mock import MagicMock, patch
+
+from botocore.exceptions import ClientError
+
+from fzfaws.s3.helper import object_cache
+from fzfaws.s3.helper.object_cache import (
+    ObjectCache,
+    get_object_cache,
+    is_not_modified,
+    link_file,
+)
+
+
+class TestObjectCache(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.cache = ObjectCache(os.path.join(self.tmpdir.name, "cache"), max_size=20)
+        self.client = MagicMock()
+        self.client.head_object.side_effect = self._head_object
+        self.etag = '"1"'
+
+    def tearDown(self):
+        self.cache.close()
+        self.tmpdir.cleanup()
+
+    def _head_object(self, Bucket, Key, IfNoneMatch=None, **kwargs):
+        if IfNoneMatch == self.etag:
+            raise ClientError(
+                {"Error": {"Code": "304"}, "ResponseMetadata": {"HTTPStatusCode": 304}},
+                "HeadObject",
+            )
+        return {"ETag": self.etag, "ContentLength": 10}
+
+    def _download(self, name, data=b"a" * 10):
+        path = os.path.join(self.tmpdir.name, name)
+        with open(path, "wb") as file:
+            file.write(data)
+        return path
+
+    def test_lookup(self):
+        self.assertEqual(
+            self.cache.lookup(self.client, "kazhala-lol", "hello.txt"),
+            (None, "1", 10),
+        )
+        self.cache.add(
+            "kazhala-lol", "hello.txt", None, self.etag, self._download("hello.txt")
+        )
+
+        path, etag, size = self.cache.lookup(
+            self.client, "kazhala-lol", "hello.txt", RequestPayer="requester"
+        )
+        self.assertEqual((etag, size), ("1", 10))
+        self.client.head_object.assert_called_with(
+            Bucket="kazhala-lol",
+            Key="hello.txt",
+            RequestPayer="requester",
+            IfNoneMatch='"1"',
+        )
+        destination = os.path.join(self.tmpdir.name, "world.txt")
+        self.cache.link(path, destination)
+        with open(destination, "rb") as file:
+            self.assertEqual(file.read(), b"a" * 10)
+
+        # same data under another key is found by its ETag
+        path, etag, size = self.cache.lookup(self.client, "kazhala-yes", "world.txt")
+        self.assertIsNotNone(path)
+
+        # changed in s3
+        self.etag = '"2"'
+        self.assertEqual(
+            self.cache.lookup(self.client, "kazhala-lol", "hello.txt"),
+            (None, "2", 10),
+        )
+
+    def test_lookup_version(self):
+        self.cache.add(
+            "kazhala-lol",
+            "hello.txt",
+            "11111111",
+            self.etag,
+            self._download("hello.txt"),
+        )
+        path, etag, size = self.cache.lookup(
+            self.client, "kazhala-lol", "hello.txt", "11111111"
+        )
+        self.assertIsNotNone(path)
+        self.client.head_object.assert_not_called()
+
+        self.cache.lookup(self.client, "kazhala-lol", "hello.txt", "22222222")
+        self.client.head_object.assert_called_with(
+            Bucket="kazhala-lol", Key="hello.txt", VersionId="22222222"
+        )
+
+    def test_modified_blob(self):
+        local_path = self._download("hello.txt")
+        self.cache.add("kazhala-lol", "hello.txt", None, self.etag, local_path)
+        # the downloaded file doesn't share the data of the cache
+        with open(local_path, "ab") as file:
+            file.write(b"b")
+        path, _, _ = self.cache.lookup(self.client, "kazhala-lol", "hello.txt")
+        self.assertIsNotNone(path)
+
+        # changed outside of the cache
+        with open(self.cache._get_blob_path("1", 10), "ab") as file:
+            file.write(b"b")
+        path, _, _ = self.cache.lookup(self.client, "kazhala-lol", "hello.txt")
+        self.assertIsNone(path)
+        self.assertFalse(os.path.exists(self.cache._get_blob_path("1", 10)))
+
+    def test_lookup_etag(self):
+        self.assertIsNone(
+            self.cache.lookup_etag("kazhala-lol", "hello.txt", None, self.etag, 10)
+        )
+        self.cache.add(
+            "kazhala-lol", "hello.txt", None, self.etag, self._download("hello.txt")
+        )
+        path = self.cache.lookup_etag("kazhala-yes", "world.txt", None, self.etag, 10)
+        self.assertEqual(path, self.cache._get_blob_path("1", 10))
+        self.client.head_object.assert_not_called()
+
+        # the same ETag with another size is different data
+        self.assertIsNone(
+            self.cache.lookup_etag("kazhala-yes", "other.txt", None, self.etag, 9)
+        )
+        self.cache.add(
+            "kazhala-yes",
+            "other.txt",
+            None,
+            self.etag,
+            self._download("other.txt", b"b" * 9),
+        )
+        path = self.cache.lookup_etag("kazhala-yes", "other.txt", None, self.etag, 9)
+        with open(path, "rb") as file:
+            self.assertEqual(file.read(), b"b" * 9)
+        self.assertIsNotNone(
+            self.cache.lookup_etag("kazhala-lol", "hello.txt", None, self.etag, 10)
+        )
+
+    def test_evict(self):
+        self.cache.add("kazhala-lol", "a.txt", None, '"1"', self._download("a.txt"))
+        self.cache.add("kazhala-lol", "b.txt", None, '"2"', self._download("b.txt"))
+        self.cache._get_blob("1", 10)
+        # least recently used is removed over max_size
+        self.cache.add("kazhala-lol", "c.txt", None, '"3"', self._download("c.txt"))
+        self.assertIsNotNone(self.cache._get_blob("1", 10))
+        self.assertIsNone(self.cache._get_blob("2", 10))
+        self.assertIsNotNone(self.cache._get_blob("3", 10))
+
+        # bigger than max_size is not cached
+        self.cache.add(
+            "kazhala-lol", "d.txt", None, '"4"', self._download("d.txt", b"a" * 21)
+        )
+        self.assertIsNone(self.cache._get_blob("4", 21))
+
+    def test_read(self):
+        self.client.get_object.return_value = {
+            "Body": io.BytesIO(b"hello"),
+            "ETag": self.etag,
+        }
+        self.assertEqual(
+            self.cache.read(self.client, "kazhala-lol", "template.yaml"), b"hello"
+        )
+        self.client.get_object.assert_called_with(
+            Bucket="kazhala-lol", Key="template.yaml"
+        )
+        # the temporary file is moved into the cache
+        self.assertIsNotNone(self.cache._get_blob("1", 5))
+        self.assertFalse(
+            [
+                name
+                for name in os.listdir(os.path.join(self.tmpdir.name, "cache"))
+                if name.startswith("tmp.")
+            ]
+        )
+
+        self.client.get_object.side_effect = ClientError(
+            {"Error": {"Code": "304"}}, "GetObject"
+        )
+        self.assertEqual(
+            self.cache.read(self.client, "kazhala-lol", "template.yaml"), b"hello"
+        )
+        self.client.get_object.assert_called_with(
+            Bucket="kazhala-lol", Key="template.yaml", IfNoneMatch='"1"'
+        )
+
+        self.client.get_object.side_effect = ClientError(
+            {"Error": {"Code": "AccessDenied"}}, "GetObject"
+        )
+        self.assertRaises(
+            ClientError, self.cache.read, self.client, "kazhala-lol", "template.yaml"
+        )
+
+    def test_link_file(self):
+        source = self._download("hello.txt", b"hello")
+        destination = self._download("world.txt", b"world")
+        link_file(source, destination)
+        with open(destination, "rb") as file:
+            self.assertEqual(file.read(), b"hello")
+        link_file(source, destination)
+        self.assertEqual(
+            sorted(os.listdir(self.tmpdir.name)), ["cache", "hello.txt", "world.txt"]
+        )
+
+        # never hardlinked
+        self.assertFalse(os.path.samefile(source, destination))
+
+        copy_path = os.path.join(self.tmpdir.name, "copy.txt")
+        with patch.object(object_cache, "_reflink", return_value=False), patch(
+            "os.copy_file_range", side_effect=OSError, create=True
+        ):
+            link_file(source, copy_path)
+        with open(copy_path, "rb") as file:
+            self.assertEqual(file.read(), b"hello")
+        self.assertFalse(os.path.samefile(source, copy_path))
+
+        if hasattr(os, "copy_file_range"):
+            with patch.object(object_cache, "_reflink", return_value=False), patch(
+                "shutil.copyfile"
+            ) as mocked_copy:
+                link_file(source, destination)
+            mocked_copy.assert_not_called()
+            with open(destination, "rb") as file:
+                self.assertEqual(file.read(), b"hello")
+
+    def test_is_not_modified(self):
+        self.assertTrue(
+            is_not_modified(
+                ClientError({"ResponseMetadata": {"HTTPStatusCode": 304}}, "HeadObject")
+            )
+        )
+        self.assertFalse(
+            is_not_modified(ClientError({"Error": {"Code": "404"}}, "HeadObject"))
+        )
+
+    @patch.object(object_cache, "_object_cache", None)
+    def test_get_object_cache(self):
+        with patch.dict(os.environ, {"FZFAWS_S3_OBJECT_CACHE": ""}):
+            self.assertIsNone(get_object_cache())
+        with patch.dict(
+            os.environ,
+            {
+                "FZFAWS_S3_OBJECT_CACHE": json.dumps({"max_size": 1024}),
+                "XDG_CACHE_HOME": self.tmpdir.name,
+            },
+        ):
+            cache = get_object_cache()
+            self.assertEqual(cache.max_size, 1024)
+            self.assertIs(get_object_cache(), cache)
+            cache.close()
@@ -0,0 +1,207 @@
+import base64
+import hashlib
+import io
+import json
+import os
+import tempfile
+import unittest
+from unittest.mock import MagicMock
+
+from boto3.s3.transfer import TransferConfig
+from botocore.exceptions import ClientError, ReadTimeoutError
+from botocore.response import StreamingBody
+
+from fzfaws.s3.helper.ranged_download import RangedDownloader
+from fzfaws.utils.exceptions import ChecksumMismatch
+
+MB = 1024 * 1024
+
+
+class TestRangedDownloader(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.local_path = os.path.join(self.tmpdir.name, "big.iso")
+        # 5 MiB minimum chunk size, 3 parts
+        self.body = os.urandom(11 * MB)
+        self.etag = '"%s"' % hashlib.md5(self.body).hexdigest()
+        self.ranges = []
+        self.client = MagicMock()
+        self.client.head_object.side_effect = lambda **kwargs: {
+            "ContentLength": len(self.body),
+            "ETag": self.etag,
+        }
+        self.client.get_object.side_effect = self._get_object
+        self.config = TransferConfig(
+            multipart_threshold=MB,
+            multipart_chunksize=5 * MB,
+            io_chunksize=MB,
+            num_download_attempts=2,
+        )
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def _get_object(self, Bucket, Key, Range, IfMatch, **kwargs):
+        self.ranges.append(Range)
+        start, end = [int(i) for i in Range[len("bytes=") :].split("-")]
+        data = self.body[start : end + 1]
+        return {"Body": StreamingBody(io.BytesIO(data), len(data))}
+
+    def test_download(self):
+        progress = []
+        downloader = RangedDownloader(self.client, self.config, max_workers=3)
+        downloader.download(
+            "kazhala-lol",
+            "big.iso",
+            self.local_path,
+            extra_args={"VersionId": "11111111"},
+            callback=progress.append,
+        )
+        with open(self.local_path, "rb") as file:
+            self.assertEqual(file.read(), self.body)
+        self.assertEqual(os.listdir(self.tmpdir.name), ["big.iso"])
+        self.assertEqual(sum(progress), len(self.body))
+        self.assertEqual(
+            sorted(self.ranges),
+            [
+                "bytes=0-5242879",
+                "bytes=10485760-11534335",
+                "bytes=5242880-10485759",
+            ],
+        )
+        self.client.head_object.assert_called_once_with(
+            Bucket="kazhala-lol", Key="big.iso", VersionId="11111111"
+        )
+        self.assertEqual(self.client.get_object.call_args[1]["IfMatch"], self.etag)
+        self.assertEqual(self.client.get_object.call_args[1]["VersionId"], "11111111")
+
+    def test_checksum_mismatch(self):
+        self.etag = '"%s"' % hashlib.md5(b"hello").hexdigest()
+        # a single part object is only read again with verify
+        downloader = RangedDownloader(self.client, self.config)
+        downloader.download("kazhala-lol", "big.iso", self.local_path)
+        self.assertFalse(downloader.verified)
+        os.remove(self.local_path)
+
+        downloader = RangedDownloader(self.client, self.config, verify="md5")
+        self.assertRaises(
+            ChecksumMismatch,
+            downloader.download,
+            "kazhala-lol",
+            "big.iso",
+            self.local_path,
+        )
+        self.assertEqual(os.listdir(self.tmpdir.name), [])
+
+        # ETag of kms encrypted object is not md5
+        self.client.head_object.side_effect = lambda **kwargs: {
+            "ContentLength": len(self.body),
+            "ETag": self.etag,
+            "ServerSideEncryption": "aws:kms",
+        }
+        downloader.download("kazhala-lol", "big.iso", self.local_path)
+        self.assertEqual(os.listdir(self.tmpdir.name), ["big.iso"])
+
+    def test_verify(self):
+        # uploaded with 4 MiB parts, different from the 5 MiB ranges
+        parts = [self.body[i : i + 4 * MB] for i in range(0, len(self.body), 4 * MB)]
+        etag = '"%s-3"' % (
+            hashlib.md5(
+                b"".join(hashlib.md5(part).digest() for part in parts)
+            ).hexdigest()
+        )
+        checksum = "%s-3" % (
+            base64.b64encode(
+                hashlib.sha256(
+                    b"".join(hashlib.sha256(part).digest() for part in parts)
+                ).digest()
+            ).decode()
+        )
+        self.client.head_object.side_effect = lambda **kwargs: (
+            {"ContentLength": 4 * MB}
+            if kwargs.get("PartNumber")
+            else {
+                "ContentLength": len(self.body),
+                "ETag": etag,
+                "ChecksumSHA256": checksum,
+            }
+        )
+        downloader = RangedDownloader(self.client, self.config, verify="sha256")
+        downloader.download("kazhala-lol", "big.iso", self.local_path)
+        self.assertTrue(downloader.verified)
+        # ranges are aligned with the parts to hash them while downloading
+        self.assertEqual(
+            sorted(self.ranges),
+            ["bytes=0-4194303", "bytes=4194304-8388607", "bytes=8388608-11534335"],
+        )
+        self.client.head_object.assert_any_call(
+            Bucket="kazhala-lol", Key="big.iso", ChecksumMode="ENABLED"
+        )
+
+        checksum = "abc-3"
+        self.assertRaises(
+            ChecksumMismatch,
+            downloader.download,
+            "kazhala-lol",
+            "big.iso",
+            self.local_path,
+        )
+        # the temporary and state files are removed
+        self.assertEqual(os.listdir(self.tmpdir.name), ["big.iso"])
+
+    def test_retry(self):
+        failed = []
+
+        def _get_object(**kwargs):
+            if not failed:
+                failed.append(kwargs["Range"])
+                raise ReadTimeoutError(endpoint_url="s3")
+            return self._get_object(**kwargs)
+
+        self.client.get_object.side_effect = _get_object
+        progress = []
+        downloader = RangedDownloader(self.client, self.config, max_workers=1)
+        downloader.download(
+            "kazhala-lol", "big.iso", self.local_path, callback=progress.append
+        )
+        self.assertEqual(self.client.get_object.call_count, 4)
+        self.assertEqual(sum(progress), len(self.body))
+
+    def test_resume(self):
+        def _get_object(**kwargs):
+            if kwargs["Range"] == "bytes=5242880-10485759":
+                raise ClientError({"Error": {"Code": "InternalError"}}, "GetObject")
+            return self._get_object(**kwargs)
+
+        self.client.get_object.side_effect = _get_object
+        downloader = RangedDownloader(self.client, self.config, max_workers=1)
+        self.assertRaises(
+            ClientError, downloader.download, "kazhala-lol", "big.iso", self.local_path
+        )
+        self.assertFalse(os.path.exists(self.local_path))
+        with open("%s.fzfaws-download.json" % self.local_path, "r") as file:
+            self.assertEqual(json.load(file)["completed"], [0, 2])
+
+        self.ranges = []
+        self.client.get_object.side_effect = self._get_object
+        progress = []
+        downloader.download(
+            "kazhala-lol", "big.iso", self.local_path, callback=progress.append
+        )
+        self.assertEqual(self.ranges, ["bytes=5242880-10485759"])
+        self.assertEqual(sum(progress), len(self.body))
+        with open(self.local_path, "rb") as file:
+            self.assertEqual(file.read(), self.body)
+        self.assertEqual(os.listdir(self.tmpdir.name), ["big.iso"])
+
+    def test_restart_changed_object(self):
+        with open("%s.fzfaws-download" % self.local_path, "wb") as file:
+            file.write(b"a" * len(self.body))
+        with open("%s.fzfaws-download.json" % self.local_path, "w") as file:
+            json.dump({"etag": '"old"', "completed": [0, 1, 2]}, file)
+        RangedDownloader(self.client, self.config).download(
+            "kazhala-lol", "big.iso", self.local_path
+        )
+        self.assertEqual(len(self.ranges), 3)
+        with open(self.local_path, "rb") as file:
+            self.assertEqual(file.read(), self.body)
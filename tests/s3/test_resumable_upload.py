@@ -0,0 +1,217 @@
+import base64
+import hashlib
+import json
+import os
+import tempfile
+import unittest
+from unittest.mock import MagicMock, patch
+
+from boto3.s3.transfer import TransferConfig
+from botocore.exceptions import ClientError
+
+from fzfaws.s3.helper.resumable_upload import (
+    ResumableUploader,
+    get_state_path,
+    list_saved_uploads,
+)
+from fzfaws.utils.exceptions import ChecksumMismatch
+
+MB = 1024 * 1024
+
+
+class TestResumableUploader(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.env_patcher = patch.dict(os.environ, {"XDG_CACHE_HOME": self.tmpdir.name})
+        self.env_patcher.start()
+        self.local_path = os.path.join(self.tmpdir.name, "big.iso")
+        # 5 MiB minimum chunk size, 3 parts
+        with open(self.local_path, "wb") as file:
+            file.write(os.urandom(11 * MB))
+        self.client = MagicMock()
+        self.client.create_multipart_upload.return_value = {"UploadId": "11111111"}
+        self.client.upload_part.side_effect = self._upload_part
+        self.config = TransferConfig(multipart_threshold=MB, multipart_chunksize=5 * MB)
+        self.state_path = get_state_path(self.local_path, "kazhala-lol", "big.iso")
+
+    def tearDown(self):
+        self.env_patcher.stop()
+        self.tmpdir.cleanup()
+
+    def _upload_part(self, PartNumber, **kwargs):
+        return {"ETag": '"%s"' % PartNumber}
+
+    def _uploaded_parts(self):
+        return sorted(
+            call[1]["PartNumber"] for call in self.client.upload_part.call_args_list
+        )
+
+    def test_upload(self):
+        progress = []
+        ResumableUploader(self.client, self.config).upload(
+            self.local_path,
+            "kazhala-lol",
+            "big.iso",
+            extra_args={"StorageClass": "GLACIER", "RequestPayer": "requester"},
+            callback=progress.append,
+        )
+        self.client.create_multipart_upload.assert_called_once_with(
+            Bucket="kazhala-lol",
+            Key="big.iso",
+            StorageClass="GLACIER",
+            RequestPayer="requester",
+        )
+        self.assertEqual(self._uploaded_parts(), [1, 2, 3])
+        self.assertNotIn("StorageClass", self.client.upload_part.call_args[1])
+        self.client.complete_multipart_upload.assert_called_once_with(
+            Bucket="kazhala-lol",
+            Key="big.iso",
+            UploadId="11111111",
+            MultipartUpload={
+                "Parts": [
+                    {"ETag": '"1"', "PartNumber": 1},
+                    {"ETag": '"2"', "PartNumber": 2},
+                    {"ETag": '"3"', "PartNumber": 3},
+                ]
+            },
+            RequestPayer="requester",
+        )
+        self.assertEqual(sum(progress), 11 * MB)
+        self.assertFalse(os.path.exists(self.state_path))
+
+    def test_verify(self):
+        with open(self.local_path, "rb") as file:
+            body = file.read()
+        parts = [body[i : i + 5 * MB] for i in range(0, len(body), 5 * MB)]
+        self.client.upload_part.side_effect = lambda Body, **kwargs: {
+            "ETag": '"%s"' % hashlib.md5(Body.read()).hexdigest()
+        }
+        self.client.complete_multipart_upload.return_value = {
+            "ETag": '"%s-3"'
+            % hashlib.md5(
+                b"".join(hashlib.md5(part).digest() for part in parts)
+            ).hexdigest(),
+            "ChecksumSHA256": "%s-3"
+            % base64.b64encode(
+                hashlib.sha256(
+                    b"".join(hashlib.sha256(part).digest() for part in parts)
+                ).digest()
+            ).decode(),
+        }
+        uploader = ResumableUploader(self.client, self.config, verify="sha256")
+        uploader.upload(self.local_path, "kazhala-lol", "big.iso")
+        self.assertTrue(uploader.verified)
+        self.assertEqual(
+            self.client.create_multipart_upload.call_args[1]["ChecksumAlgorithm"],
+            "SHA256",
+        )
+        part_args = self.client.upload_part.call_args[1]
+        self.assertEqual(
+            part_args["ChecksumSHA256"],
+            base64.b64encode(
+                hashlib.sha256(parts[part_args["PartNumber"] - 1]).digest()
+            ).decode(),
+        )
+
+        # the ETag of every part is compared with the data sent
+        self.client.upload_part.side_effect = self._upload_part
+        uploader = ResumableUploader(self.client, self.config, verify="md5")
+        self.assertRaises(
+            ChecksumMismatch, uploader.upload, self.local_path, "kazhala-lol", "big.iso"
+        )
+
+    def test_resume(self):
+        def _upload_part(PartNumber, **kwargs):
+            if PartNumber == 2:
+                raise ClientError({"Error": {"Code": "InternalError"}}, "UploadPart")
+            return self._upload_part(PartNumber)
+
+        self.client.upload_part.side_effect = _upload_part
+        uploader = ResumableUploader(self.client, self.config, max_workers=1)
+        self.assertRaises(
+            ClientError, uploader.upload, self.local_path, "kazhala-lol", "big.iso"
+        )
+        with open(self.state_path, "r") as file:
+            state = json.load(file)
+        self.assertEqual(state["upload_id"], "11111111")
+        self.assertEqual(state["parts"], {"1": '"1"', "3": '"3"'})
+        self.assertEqual(len(list_saved_uploads("kazhala-lol")), 1)
+        self.assertEqual(list_saved_uploads("kazhala-lol", "hello/"), [])
+
+        # part 3 is missing in s3
+        self.client.get_paginator.return_value.paginate.return_value = [
+            {"Parts": [{"PartNumber": 1, "ETag": '"1"', "Size": 5 * MB}]}
+        ]
+        self.client.upload_part.reset_mock()
+        self.client.upload_part.side_effect = self._upload_part
+        progress = []
+        uploader.upload(
+            self.local_path, "kazhala-lol", "big.iso", callback=progress.append
+        )
+        self.client.get_paginator.assert_called_with("list_parts")
+        self.client.get_paginator.return_value.paginate.assert_called_with(
+            Bucket="kazhala-lol", Key="big.iso", UploadId="11111111"
+        )
+        self.client.create_multipart_upload.assert_called_once()
+        self.assertEqual(self._uploaded_parts(), [2, 3])
+        self.assertEqual(sum(progress), 11 * MB)
+        self.assertFalse(os.path.exists(self.state_path))
+
+    def test_no_such_upload(self):
+        uploader = ResumableUploader(self.client, self.config)
+        with open(self.state_path, "w") as file:
+            json.dump(
+                {
+                    "local_path": self.local_path,
+                    "bucket": "kazhala-lol",
+                    "key": "big.iso",
+                    "size": 11 * MB,
+                    "mtime_ns": os.stat(self.local_path).st_mtime_ns,
+                    "chunksize": 5 * MB,
+                    "upload_id": "00000000",
+                    "parts": {"1": '"1"'},
+                },
+                file,
+            )
+        self.client.get_paginator.return_value.paginate.side_effect = ClientError(
+            {"Error": {"Code": "NoSuchUpload"}}, "ListParts"
+        )
+        uploader.upload(self.local_path, "kazhala-lol", "big.iso")
+        self.client.create_multipart_upload.assert_called_once()
+        self.assertEqual(self._uploaded_parts(), [1, 2, 3])
+
+    def test_changed_file(self):
+        with open(self.state_path, "w") as file:
+            json.dump(
+                {
+                    "bucket": "kazhala-lol",
+                    "key": "big.iso",
+                    "size": 1,
+                    "upload_id": "00000000",
+                    "parts": {},
+                },
+                file,
+            )
+        ResumableUploader(self.client, self.config).upload(
+            self.local_path, "kazhala-lol", "big.iso"
+        )
+        self.client.abort_multipart_upload.assert_called_once_with(
+            Bucket="kazhala-lol", Key="big.iso", UploadId="00000000"
+        )
+        self.client.get_paginator.assert_not_called()
+        self.assertEqual(self._uploaded_parts(), [1, 2, 3])
+
+    def test_cancel(self):
+        self.client.upload_part.side_effect = KeyboardInterrupt
+        uploader = ResumableUploader(self.client, self.config, max_workers=1)
+        self.assertRaises(
+            KeyboardInterrupt,
+            uploader.upload,
+            self.local_path,
+            "kazhala-lol",
+            "big.iso",
+        )
+        self.client.abort_multipart_upload.assert_called_once_with(
+            Bucket="kazhala-lol", Key="big.iso", UploadId="11111111"
+        )
+        self.assertFalse(os.path.exists(self.state_path))
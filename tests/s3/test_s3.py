@@ -3,16 +3,23 @@ import json
 import os
 from pathlib import Path
 import sys
+import tempfile
 import unittest
-from unittest.mock import PropertyMock, call, patch
+from unittest.mock import ANY, MagicMock, PropertyMock, call, patch
 
 import boto3
+from botocore.exceptions import ClientError
 from botocore.paginate import Paginator
 from botocore.stub import Stubber
 
 from fzfaws.s3 import S3
+from fzfaws.s3.helper.version_index import VersionIndex
 from fzfaws.utils import BaseSession, FileLoader, Pyfzf
-from fzfaws.utils.exceptions import InvalidFileType, InvalidS3PathPattern
+from fzfaws.utils.exceptions import (
+    InvalidFileType,
+    InvalidS3PathPattern,
+    NoSelectionMade,
+)
 
 
 class TestS3(unittest.TestCase):
@@ -23,9 +30,16 @@ class TestS3(unittest.TestCase):
         config_path = Path(__file__).resolve().parent.joinpath("../data/fzfaws.yml")
         fileloader.load_config_file(config_path=str(config_path))
         self.s3 = S3()
+        self.cache_dir = tempfile.TemporaryDirectory()
+        self.env_patcher = patch.dict(
+            os.environ, {"XDG_CACHE_HOME": self.cache_dir.name}
+        )
+        self.env_patcher.start()
 
     def tearDown(self):
         sys.stdout = sys.__stdout__
+        self.env_patcher.stop()
+        self.cache_dir.cleanup()
 
     def test_constructor(self):
         self.assertEqual(self.s3.profile, "default")
@@ -465,11 +479,46 @@ class TestS3(unittest.TestCase):
         self.s3.path_list = ["wtf.pem"]
         mocked_paginator.return_value = response
         result = self.s3.get_object_version(select_all=True)
+        # only exact key matches are selected, " elb.pem" etc. are ignored
         self.assertEqual(
             result[0],
-            {"Key": "wtf.pem", "VersionId": "L2e4FjTfzOFyWZ1wsZwLYZSPWdxys9hZ"},
+            {"Key": "wtf.pem", "VersionId": "uFQYVZPcPUfqhR7jVidSd8x93DOvtrh."},
+        )
+        self.assertEqual(len(result), 5)
+
+        # batched test, all keys are fetched with one listing per group
+        self.s3._version_index = None
+        mocked_paginator.reset_mock()
+        result = self.s3.get_object_version(
+            keys=[" wtf.txt", " w tf.txt"], select_all=True, delete=True
+        )
+        mocked_paginator.assert_called_once()
+        self.assertEqual(len(result), 5)
+
+        # keys are yield before the next page is listed, except the last key of a page
+        pages = iter(
+            [
+                {"Versions": [{"Key": "a.txt"}, {"Key": "b.txt"}]},
+                {"DeleteMarkers": [{"Key": "b.txt"}], "Versions": [{"Key": "c.txt"}]},
+            ]
+        )
+        generator = self.s3._uniq_object_generator(pages, False)
+        self.assertEqual(next(generator), "Key: a.txt")
+        self.assertEqual(
+            list(generator),
+            ["\033[31mKey: b.txt\033[0m", "Key: c.txt"],
         )
 
+        # indexed test, versions are answered from the set_s3_object listing
+        list(self.s3._uniq_object_generator(response, False))
+        mocked_paginator.reset_mock()
+        self.s3.path_list = ["wtf.pem"]
+        result = self.s3.get_object_version(select_all=True, non_current=True)
+        mocked_paginator.assert_not_called()
+        self.assertEqual(len(result), 4)
+        for version in result:
+            self.assertEqual(version["Key"], "wtf.pem")
+
     @patch.object(BaseSession, "resource", new_callable=PropertyMock)
     @patch.object(FileLoader, "process_json_body")
     @patch.object(FileLoader, "process_yaml_body")
@@ -512,6 +561,14 @@ class TestS3(unittest.TestCase):
             mocked_yaml.return_value = {"hello"}
             self.assertRaises(InvalidFileType, self.s3.get_object_data, file_type="txt")
 
+        with patch("fzfaws.s3.s3.get_object_cache") as mocked_cache:
+            mocked_cache.return_value.read.return_value = b"{}"
+            result = self.s3.get_object_data(file_type="json")
+            mocked_cache.return_value.read.assert_called_once_with(
+                ANY, "kazhala-version-testing", "wtf.pem"
+            )
+        self.assertEqual(result, {"hello"})
+
     @patch.object(BaseSession, "client", new_callable=PropertyMock)
     def test_get_object_url(self, mocked_client):
         self.s3.bucket_name = "kazhala-version-testing"
@@ -545,6 +602,170 @@ class TestS3(unittest.TestCase):
             % ("ap-southeast-2", self.s3.bucket_name, self.s3.path_list[0], "111111"),
         )
 
+    @patch.object(BaseSession, "client", new_callable=PropertyMock)
+    def test_get_bucket_region(self, mocked_client):
+        s3 = boto3.client("s3", region_name="ap-southeast-2")
+        stubber = Stubber(s3)
+        stubber.add_response("get_bucket_location", {}, {"Bucket": "lol"})
+        stubber.add_response(
+            "get_bucket_location", {"LocationConstraint": "EU"}, {"Bucket": "yes"}
+        )
+        stubber.add_client_error("get_bucket_location", "AccessDenied")
+        stubber.activate()
+        mocked_client.return_value = s3
+
+        self.s3.bucket_name = "lol"
+        self.assertEqual(self.s3.get_bucket_region(), "us-east-1")
+        # cached, no more api call for the same bucket
+        self.assertEqual(self.s3.get_bucket_region("lol"), "us-east-1")
+        self.assertEqual(self.s3.get_bucket_region("yes"), "eu-west-1")
+        self.assertEqual(self.s3.get_bucket_region("no"), "ap-southeast-2")
+        # the fallback is cached as well
+        self.assertEqual(self.s3.get_bucket_region("no"), "ap-southeast-2")
+        self.assertEqual(
+            self.s3.get_bucket_region(
+                "arn:aws:s3:us-west-2:111111111111:accesspoint/hello"
+            ),
+            "us-west-2",
+        )
+        stubber.assert_no_pending_responses()
+
+        # persisted across instances, failed lookup is not persisted
+        s3 = S3()
+        self.assertEqual(s3.get_bucket_region("lol"), "us-east-1")
+        self.assertEqual(s3.get_bucket_region("yes"), "eu-west-1")
+        with open(
+            os.path.join(self.cache_dir.name, "fzfaws", "bucket_region.json"), "r"
+        ) as file:
+            self.assertEqual(json.load(file), {"lol": "us-east-1", "yes": "eu-west-1"})
+
+    @patch.object(S3, "get_bucket_region")
+    def test_get_client(self, mocked_region):
+        mocked_region.return_value = self.s3.client.meta.region_name
+        self.assertIs(self.s3.get_client("lol"), self.s3.client)
+
+        mocked_region.return_value = "eu-west-1"
+        client = self.s3.get_client("yes")
+        self.assertEqual(client.meta.region_name, "eu-west-1")
+        self.assertIs(self.s3.get_client("yes"), client)
+        mocked_region.assert_called_with("yes")
+
+    @patch("fzfaws.s3.s3.load_inventory")
+    def test_set_inventory(self, mocked_load):
+        index = VersionIndex(bucket="kazhala-lol")
+        mocked_load.return_value = (index, False)
+        self.s3.set_inventory("~/manifest.json")
+        mocked_load.assert_called_once_with("~/manifest.json", self.s3.client)
+        self.assertEqual(self.s3.bucket_name, "kazhala-lol")
+        self.assertIs(self.s3.get_inventory(), index)
+        self.assertIs(self.s3.get_inventory("kazhala-lol"), index)
+        self.assertEqual(self.s3.get_inventory("kazhala-yes"), None)
+        self.assertEqual(self.s3._version_index, None)
+
+        mocked_load.return_value = (index, True)
+        self.s3.set_inventory("~/manifest.json")
+        self.assertIs(self.s3._version_index, index)
+
+    @patch.object(S3, "get_client")
+    def test_confirm_objects(self, mocked_client):
+        self.s3.bucket_name = "kazhala-lol"
+        client = MagicMock()
+        mocked_client.return_value = client
+
+        def head_object(Bucket, Key):
+            if Key == "deleted.txt":
+                raise ClientError({"Error": {"Code": "404"}}, "HeadObject")
+            return {"ContentLength": len(Key), "ETag": '"%s"' % Key}
+
+        client.head_object.side_effect = head_object
+        result = self.s3.confirm_objects(["a.txt", "deleted.txt", "b.txt"])
+        self.assertEqual(result, ["a.txt", "b.txt"])
+        self.assertEqual(
+            self.capturedOutput.getvalue(),
+            "s3://kazhala-lol/deleted.txt no longer exists, skipped\n",
+        )
+        # the live sizes are recorded
+        self.assertEqual(self.s3.get_object_size("a.txt"), 5)
+        self.assertRaises(NoSelectionMade, self.s3.confirm_objects, ["deleted.txt"])
+
+        # objects walked from the inventory
+        sizes, etags = {}, {}
+        result = self.s3.confirm_file_list(
+            [("a.txt", "tmp/a.txt"), ("deleted.txt", "tmp/deleted.txt")],
+            sizes=sizes,
+            etags=etags,
+        )
+        self.assertEqual(result, [("a.txt", "tmp/a.txt")])
+        self.assertEqual(sizes, {"a.txt": 5})
+        self.assertEqual(etags, {"a.txt": '"a.txt"'})
+        self.assertEqual(self.s3.confirm_file_list([]), [])
+
+    @patch.object(S3, "confirm_objects")
+    @patch.object(Paginator, "paginate")
+    @patch.object(Pyfzf, "append_fzf")
+    @patch.object(Pyfzf, "execute_fzf")
+    def test_set_s3_object_inventory(
+        self, mocked_execute, mocked_append, mocked_paginator, mocked_confirm
+    ):
+        index = VersionIndex(bucket="kazhala-lol")
+        index.append("folder/", "", True, False)
+        index.append("folder/hello.txt", "", True, False)
+        index.append("world.txt", "2", True, True)
+        index.append("world.txt", "1", False, False)
+        self.s3._inventory = index
+        self.s3.bucket_name = "kazhala-lol"
+        mocked_execute.return_value = ["folder/hello.txt"]
+        mocked_confirm.side_effect = lambda keys: keys
+        self.s3.set_s3_object(multi_select=True)
+        mocked_paginator.assert_not_called()
+        mocked_append.assert_called_once_with("Key: folder/hello.txt\n")
+        mocked_confirm.assert_called_once_with(["folder/hello.txt"])
+        self.assertEqual(self.s3.path_list, ["folder/hello.txt"])
+
+        # versioned inventory
+        mocked_append.reset_mock()
+        self.s3._version_index = index
+        mocked_execute.return_value = "world.txt"
+        self.s3.set_s3_object(version=True, deletemark=True)
+        mocked_paginator.assert_not_called()
+        mocked_append.assert_called_once_with("\033[31mKey: world.txt\033[0m\n")
+        self.assertEqual(self.s3.path_list, ["world.txt"])
+
+    @patch.object(S3, "confirm_objects")
+    @patch.object(Pyfzf, "append_fzf")
+    @patch.object(Pyfzf, "execute_fzf")
+    def test_get_object_size(self, mocked_execute, mocked_append, mocked_confirm):
+        index = VersionIndex(bucket="kazhala-lol")
+        index.append("hello.txt", "", True, False, 10)
+        index.append("world.txt", "3", True, True)
+        index.append("world.txt", "2", False, False, 20)
+        self.s3._inventory = index
+        self.s3.bucket_name = "kazhala-lol"
+        mocked_execute.return_value = ["hello.txt"]
+        mocked_confirm.side_effect = lambda keys: keys
+        self.s3.set_s3_object(multi_select=True)
+        # sizes of the inventory snapshot are not trusted
+        self.assertEqual(self.s3.get_object_size(), None)
+        self.assertEqual(self.s3.get_object_size("world.txt"), None)
+
+        # recorded from the listing
+        self.s3._inventory = None
+        with patch.object(Paginator, "paginate") as mocked_paginate:
+            mocked_paginate.return_value = [
+                {"Contents": [{"Key": "hello.txt", "Size": 10}]}
+            ]
+            self.s3.set_s3_object(multi_select=True)
+        self.assertEqual(self.s3.get_object_size(), 10)
+        self.assertEqual(self.s3.get_object_size("hello.txt", bucket="kazhala-lol"), 10)
+        self.assertEqual(self.s3.get_object_size("hello.txt", bucket="kazhala-yes"), None)
+        self.s3._inventory = index
+
+        # from the version index
+        self.s3._version_index = index
+        self.assertEqual(self.s3.get_object_size("world.txt", "2"), 20)
+        self.assertEqual(self.s3.get_object_size("world.txt", "3"), None)
+        self.assertEqual(self.s3.get_object_size("world.txt"), None)
+
     def test_get_s3_destination_key(self):
         # normal test
         self.s3.bucket_name = "kazhala-version-testing"
@@ -4,6 +4,7 @@ import io
 import json
 import os
 import sys
+import tempfile
 import unittest
 from unittest.mock import PropertyMock, patch
 from fzfaws.s3.helper.s3args import S3Args
@@ -21,9 +22,16 @@ class TestS3Args(unittest.TestCase):
         s3.bucket_name = "hello"
         s3.path_list = ["hello.json"]
         self.s3_args = S3Args(s3)
+        self.cache_dir = tempfile.TemporaryDirectory()
+        self.env_patcher = patch.dict(
+            os.environ, {"XDG_CACHE_HOME": self.cache_dir.name}
+        )
+        self.env_patcher.start()
 
     def tearDown(self):
         sys.stdout = sys.__stdout__
+        self.env_patcher.stop()
+        self.cache_dir.cleanup()
 
     def test_constructor(self):
         self.assertIsInstance(self.s3_args.s3, S3)
@@ -1,8 +1,9 @@
 import sys
 import io
+import time
 import unittest
 from unittest.mock import patch
-from fzfaws.s3.helper.s3progress import S3Progress
+from fzfaws.s3.helper.s3progress import S3Progress, S3TransferProgress
 import boto3
 from botocore.stub import Stubber
 
@@ -33,6 +34,15 @@ class TestS3Progress(unittest.TestCase):
         self.assertEqual(progress._filename, __file__)
         self.assertEqual(progress._seen_so_far, 0)
         self.assertEqual(progress._size, 100)
+        stubber.assert_no_pending_responses()
+
+        # known size doesn't require head_object
+        progress = S3Progress(
+            filename=__file__, client=client, bucket="hello", size=50
+        )
+        self.assertEqual(progress._size, 50)
+        progress = S3Progress(filename=__file__, client=client, bucket="hello", size=0)
+        self.assertEqual(progress._size, 0)
 
     @patch("os.path.getsize")
     def test_call(self, mocked_size):
@@ -57,3 +67,87 @@ class TestS3Progress(unittest.TestCase):
         self.assertEqual(result, "1.0 GiB")
         result = progress.human_readable_size(10737418991)
         self.assertEqual(result, "10.0 GiB")
+
+
+class TestS3TransferProgress(unittest.TestCase):
+    def setUp(self):
+        self.capturedOutput = io.StringIO()
+        sys.stdout = self.capturedOutput
+
+    def tearDown(self):
+        sys.stdout = sys.__stdout__
+
+    def test_progress(self):
+        progress = S3TransferProgress()
+        progress.add(1024)
+        progress.add(1024)
+        self.assertEqual(progress.total_files, 2)
+        self.assertEqual(progress.total_bytes, 2048)
+
+        # counters don't write to stdout, only the renderer does
+        progress.update(1024)
+        progress.done("upload: a.txt to s3://kazhala-lol/a.txt")
+        self.assertEqual(progress.files_done, 1)
+        self.assertEqual(self.capturedOutput.getvalue(), "")
+
+        progress.render()
+        self.assertRegex(
+            self.capturedOutput.getvalue(),
+            r"^upload: a.txt to s3://kazhala-lol/a.txt\nCompleted 1/2 files  1.0 KiB / 2.0 KiB  \(50.00%\)  .*/s  ETA",
+        )
+
+    def test_render_tty(self):
+        self.capturedOutput.isatty = lambda: True
+        progress = S3TransferProgress(total_files=2, total_bytes=2048)
+        progress.render()
+        self.assertRegex(
+            self.capturedOutput.getvalue(), r"^Completed 0/2 files.*\n.*ETA --:--:--$"
+        )
+        self.capturedOutput.truncate(0)
+        self.capturedOutput.seek(0)
+        progress.done("upload: a.txt to s3://kazhala-lol/a.txt")
+        progress.render()
+        # previous summary is erased before the message and the new summary
+        self.assertRegex(
+            self.capturedOutput.getvalue(),
+            r"^\r\033\[1A\033\[Jupload: a.txt to s3://kazhala-lol/a.txt\nCompleted 1/2",
+        )
+        self.capturedOutput.truncate(0)
+        self.capturedOutput.seek(0)
+        progress.render(final=True)
+        self.assertEqual(self.capturedOutput.getvalue(), "\r\033[1A\033[J")
+
+    def test_renderer(self):
+        progress = S3TransferProgress(interval=0.01)
+        with progress:
+            progress.add(10)
+            progress.update(10)
+            progress.done("download: s3://kazhala-lol/a.txt to a.txt")
+            for _ in range(100):
+                if "Completed 1/1 files" in self.capturedOutput.getvalue():
+                    break
+                time.sleep(0.01)
+        self.assertRegex(
+            self.capturedOutput.getvalue(),
+            r"^download: s3://kazhala-lol/a.txt to a.txt\nCompleted 1/1 files",
+        )
+        self.assertFalse(progress._renderer)
+
+    @patch("fzfaws.s3.helper.s3progress.time.time")
+    def test_throughput(self, mocked_time):
+        mocked_time.return_value = 100
+        progress = S3TransferProgress()
+        progress.add(4096)
+        mocked_time.return_value = 102
+        progress.update(2048)
+        self.assertEqual(progress.throughput(), 1024)
+        self.assertEqual(progress.eta(), 2)
+        progress.render()
+        self.assertRegex(
+            self.capturedOutput.getvalue(), r"\(50.00%\)  1.0 KiB/s  ETA 0:00:02"
+        )
+        progress.done()
+        self.assertEqual(
+            progress.summary("download"),
+            "download: 1 files (2.0 KiB) in 2.00s, 1.0 KiB/s",
+        )
@@ -0,0 +1,496 @@
+import hashlib
+import io
+import os
+import sys
+import tempfile
+import threading
+import unittest
+from unittest.mock import patch
+
+import boto3
+from botocore.exceptions import ClientError
+from botocore.stub import Stubber
+from s3transfer.manager import TransferManager
+
+from fzfaws.s3.helper.integrity import ObjectIntegrity
+from fzfaws.s3.helper.object_cache import ObjectCache
+from fzfaws.s3.helper.s3transferscheduler import S3TransferScheduler
+from fzfaws.utils.exceptions import ChecksumMismatch
+
+
+class TestS3TransferScheduler(unittest.TestCase):
+    def setUp(self):
+        self.capturedOutput = io.StringIO()
+        sys.stdout = self.capturedOutput
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.env_patcher = patch.dict(
+            os.environ, {"FZFAWS_S3_TRANSFER": "{}", "FZFAWS_S3_CONCURRENCY": "10"}
+        )
+        self.env_patcher.start()
+        self.upload_list = []
+        for name, size in [("small.txt", 1), ("big.txt", 100), ("medium.txt", 10)]:
+            path = os.path.join(self.tmpdir.name, name)
+            with open(path, "wb") as file:
+                file.write(b"a" * size)
+            self.upload_list.append(
+                {"local_path": path, "bucket": "kazhala-lol", "key": name}
+            )
+
+    def tearDown(self):
+        sys.stdout = sys.__stdout__
+        self.env_patcher.stop()
+        self.tmpdir.cleanup()
+
+    def test_constructor(self):
+        scheduler = S3TransferScheduler(boto3.client("s3"))
+        self.assertEqual(scheduler.concurrency, 10)
+        self.assertEqual(scheduler.failures, [])
+
+        scheduler = S3TransferScheduler(boto3.client("s3"), concurrency=50)
+        self.assertEqual(scheduler.concurrency, 50)
+        self.assertEqual(scheduler.transfer_config.max_request_concurrency, 50)
+
+    def test_upload(self):
+        client = boto3.client("s3")
+        stubber = Stubber(client)
+        for _ in self.upload_list:
+            stubber.add_response("put_object", {})
+        stubber.activate()
+
+        scheduler = S3TransferScheduler(client, concurrency=1)
+        with patch.object(
+            TransferManager, "upload", autospec=True, side_effect=TransferManager.upload
+        ) as mocked_upload:
+            scheduler.upload(self.upload_list, extra_args={"ACL": "private"})
+        stubber.assert_no_pending_responses()
+        # bigger files are submitted first
+        self.assertEqual(
+            [call[0][3] for call in mocked_upload.call_args_list],
+            ["big.txt", "medium.txt", "small.txt"],
+        )
+        self.assertEqual(mocked_upload.call_args[1]["extra_args"], {"ACL": "private"})
+        self.assertEqual(scheduler.progress.files_done, 3)
+        self.assertEqual(scheduler.progress.total_bytes, 111)
+        self.assertRegex(
+            self.capturedOutput.getvalue(),
+            r"upload: %s to s3://kazhala-lol/big.txt"
+            % os.path.join(self.tmpdir.name, "big.txt"),
+        )
+
+    def test_upload_failure(self):
+        client = boto3.client("s3")
+        stubber = Stubber(client)
+        stubber.add_client_error("put_object", "AccessDenied")
+        stubber.add_response("put_object", {})
+        stubber.add_response("put_object", {})
+        stubber.activate()
+
+        scheduler = S3TransferScheduler(client, concurrency=1)
+        self.assertRaises(ClientError, scheduler.upload, self.upload_list)
+        # other files are still uploaded
+        stubber.assert_no_pending_responses()
+        self.assertEqual(len(scheduler.failures), 1)
+        self.assertRegex(
+            self.capturedOutput.getvalue(),
+            r"upload failed: s3://kazhala-lol/big.txt",
+        )
+
+    @patch("fzfaws.s3.helper.s3transferscheduler.ResumableUploader")
+    @patch("fzfaws.s3.helper.s3transferscheduler.RESUMABLE_UPLOAD_THRESHOLD", 100)
+    def test_upload_resumable(self, mocked_uploader):
+        mocked_uploader.return_value.upload.side_effect = (
+            lambda local_path, bucket, key, extra_args, callback: callback(100)
+        )
+        client = boto3.client("s3")
+        stubber = Stubber(client)
+        stubber.add_response("put_object", {})
+        stubber.add_response("put_object", {})
+        stubber.activate()
+        scheduler = S3TransferScheduler(client, concurrency=1)
+        scheduler.upload(self.upload_list)
+        stubber.assert_no_pending_responses()
+        mocked_uploader.return_value.upload.assert_called_once_with(
+            os.path.join(self.tmpdir.name, "big.txt"),
+            "kazhala-lol",
+            "big.txt",
+            extra_args=None,
+            callback=scheduler.progress.update,
+        )
+        self.assertEqual(scheduler.progress.files_done, 3)
+        self.assertRegex(
+            self.capturedOutput.getvalue(), r"upload: .*big.txt to s3://kazhala-lol"
+        )
+
+    def test_download(self):
+        client = boto3.client("s3")
+        stubber = Stubber(client)
+        stubber.add_response(
+            "get_object",
+            {"Body": io.BytesIO(b"a" * 10), "ContentLength": 10},
+            {"Bucket": "kazhala-lol", "Key": "a/b/big.txt", "VersionId": "11111111"},
+        )
+        stubber.add_response(
+            "get_object",
+            {"Body": io.BytesIO(b"a"), "ContentLength": 1},
+            {"Bucket": "kazhala-lol", "Key": "a/small.txt"},
+        )
+        stubber.activate()
+
+        download_list = [
+            {
+                "bucket": "kazhala-lol",
+                "key": "a/small.txt",
+                "local_path": os.path.join(self.tmpdir.name, "a", "small.txt"),
+                "size": 1,
+                "etag": '"1"',
+            },
+            {
+                "bucket": "kazhala-lol",
+                "key": "a/b/big.txt",
+                "local_path": os.path.join(self.tmpdir.name, "a", "b", "big.txt"),
+                "version_id": "11111111",
+                "size": 10,
+                "etag": '"2"',
+            },
+        ]
+        scheduler = S3TransferScheduler(client, concurrency=1)
+        scheduler.download(download_list)
+        # size is provided so no head_object is called
+        stubber.assert_no_pending_responses()
+        self.assertEqual(
+            scheduler._created_dirs,
+            {
+                os.path.join(self.tmpdir.name, "a"),
+                os.path.join(self.tmpdir.name, "a", "b"),
+            },
+        )
+        with patch("os.makedirs") as mocked_makedirs:
+            scheduler._makedirs(os.path.join(self.tmpdir.name, "a"))
+            mocked_makedirs.assert_not_called()
+        with open(os.path.join(self.tmpdir.name, "a", "b", "big.txt"), "rb") as file:
+            self.assertEqual(file.read(), b"a" * 10)
+        # temp files are renamed to the destination
+        self.assertEqual(
+            sorted(os.listdir(os.path.join(self.tmpdir.name, "a"))), ["b", "small.txt"]
+        )
+        self.assertEqual(scheduler.progress.files_done, 2)
+        self.assertEqual(scheduler.progress.bytes_done, 11)
+        self.assertRegex(
+            self.capturedOutput.getvalue(),
+            r"download: s3://kazhala-lol/a/b/big.txt to .*big.txt with version 11111111",
+        )
+        self.assertRegex(
+            self.capturedOutput.getvalue(), r"download: 2 files \(11 Bytes\) in"
+        )
+
+    def test_download_cached(self):
+        client = boto3.client("s3")
+        stubber = Stubber(client)
+        stubber.add_response(
+            "head_object",
+            {"ETag": '"1"', "ContentLength": 10},
+            {"Bucket": "kazhala-lol", "Key": "big.txt"},
+        )
+        stubber.add_response(
+            "get_object",
+            {"Body": io.BytesIO(b"a" * 10), "ContentLength": 10, "ETag": '"1"'},
+            {"Bucket": "kazhala-lol", "Key": "big.txt"},
+        )
+        stubber.add_client_error(
+            "head_object",
+            "304",
+            http_status_code=304,
+            expected_params={
+                "Bucket": "kazhala-lol",
+                "Key": "big.txt",
+                "IfNoneMatch": '"1"',
+            },
+        )
+        stubber.activate()
+
+        object_cache = ObjectCache(os.path.join(self.tmpdir.name, "cache"))
+        local_path = os.path.join(self.tmpdir.name, "big.txt")
+        download_list = [
+            {"bucket": "kazhala-lol", "key": "big.txt", "local_path": local_path}
+        ]
+        scheduler = S3TransferScheduler(
+            client, concurrency=1, object_cache=object_cache
+        )
+        # the head_object of the miss provides the size and etag of the download
+        scheduler.download([dict(item) for item in download_list])
+        os.remove(local_path)
+
+        scheduler = S3TransferScheduler(
+            client, concurrency=1, object_cache=object_cache
+        )
+        scheduler.download([dict(item) for item in download_list])
+        stubber.assert_no_pending_responses()
+        with open(local_path, "rb") as file:
+            self.assertEqual(file.read(), b"a" * 10)
+        self.assertEqual(scheduler.progress.bytes_done, 10)
+        self.assertEqual(scheduler.cached_bytes, 10)
+        self.assertRegex(
+            self.capturedOutput.getvalue(),
+            r"download: s3://kazhala-lol/big.txt to .*big.txt \(cached\)",
+        )
+
+        # the etag from the listing is found in the cache without a request
+        os.remove(local_path)
+        scheduler = S3TransferScheduler(
+            client, concurrency=1, object_cache=object_cache
+        )
+        scheduler.download([dict(item, etag='"1"', size=10) for item in download_list])
+        stubber.assert_no_pending_responses()
+        self.assertEqual(scheduler.cached_bytes, 10)
+        # the destination doesn't share the data of the cache
+        self.assertFalse(
+            os.path.samefile(local_path, object_cache._get_blob_path("1", 10))
+        )
+        object_cache.close()
+
+    def test_download_cached_concurrent(self):
+        client = boto3.client("s3")
+        stubber = Stubber(client)
+        for _ in range(2):
+            stubber.add_response(
+                "get_object",
+                {"Body": io.BytesIO(b"a" * 10), "ContentLength": 10, "ETag": '"1"'},
+            )
+        stubber.activate()
+
+        # both objects in flight check the cache at the same time
+        barrier = threading.Barrier(2, timeout=5)
+
+        def _lookup(*args, **kwargs):
+            barrier.wait()
+            return None, "1", 10
+
+        object_cache = ObjectCache(os.path.join(self.tmpdir.name, "cache"))
+        scheduler = S3TransferScheduler(
+            client, concurrency=2, object_cache=object_cache
+        )
+        with patch.object(object_cache, "lookup", side_effect=_lookup):
+            scheduler.download(
+                [
+                    {
+                        "bucket": "kazhala-lol",
+                        "key": name,
+                        "local_path": os.path.join(self.tmpdir.name, name),
+                    }
+                    for name in ("a.txt", "b.txt")
+                ]
+            )
+        stubber.assert_no_pending_responses()
+        self.assertEqual(scheduler.failures, [])
+        self.assertEqual(scheduler.progress.files_done, 2)
+        object_cache.close()
+
+    def test_upload_verify(self):
+        client = boto3.client("s3")
+        # the stubbed put_object doesn't send the body
+        client.meta.events.register(
+            "before-parameter-build.s3.PutObject",
+            lambda params, **kwargs: params["Body"].read(),
+        )
+        stubber = Stubber(client)
+        stubber.add_response("put_object", {})
+        stubber.add_response(
+            "head_object",
+            {
+                "ContentLength": 100,
+                "ETag": '"%s"' % hashlib.md5(b"a" * 100).hexdigest(),
+            },
+            {"Bucket": "kazhala-lol", "Key": "big.txt"},
+        )
+        stubber.add_response("put_object", {})
+        stubber.add_response(
+            "head_object",
+            {"ContentLength": 10, "ETag": '"1"'},
+            {"Bucket": "kazhala-lol", "Key": "medium.txt"},
+        )
+        stubber.activate()
+
+        scheduler = S3TransferScheduler(client, concurrency=1, verify="md5")
+        self.assertRaises(ChecksumMismatch, scheduler.upload, self.upload_list[1:])
+        stubber.assert_no_pending_responses()
+        self.assertEqual(scheduler.progress.files_done, 2)
+        self.assertEqual(
+            [item["key"] for item, _ in scheduler.failures], ["medium.txt"]
+        )
+        self.assertRegex(
+            self.capturedOutput.getvalue(),
+            r"upload failed: s3://kazhala-lol/medium.txt",
+        )
+
+    def test_download_verify(self):
+        client = boto3.client("s3")
+        stubber = Stubber(client)
+        stubber.add_response(
+            "head_object",
+            {"ContentLength": 10, "ETag": '"%s"' % hashlib.md5(b"a" * 10).hexdigest()},
+            {"Bucket": "kazhala-lol", "Key": "big.txt"},
+        )
+        stubber.add_response(
+            "get_object",
+            {"Body": io.BytesIO(b"a" * 10), "ContentLength": 10},
+            {"Bucket": "kazhala-lol", "Key": "big.txt"},
+        )
+        stubber.activate()
+
+        local_path = os.path.join(self.tmpdir.name, "a", "big.txt")
+        scheduler = S3TransferScheduler(client, verify="md5")
+        scheduler.download(
+            [{"bucket": "kazhala-lol", "key": "big.txt", "local_path": local_path}]
+        )
+        stubber.assert_no_pending_responses()
+        with open(local_path, "rb") as file:
+            self.assertEqual(file.read(), b"a" * 10)
+        # the temporary file is renamed to the destination
+        self.assertEqual(os.listdir(os.path.dirname(local_path)), ["big.txt"])
+        self.assertEqual(scheduler.unverified, [])
+
+        # ETag of kms encrypted object is not md5
+        stubber.add_response(
+            "head_object",
+            {"ContentLength": 1, "ETag": '"1"', "ServerSideEncryption": "aws:kms"},
+            {"Bucket": "kazhala-lol", "Key": "small.txt"},
+        )
+        # s3transfer needs the etag to skip head_object
+        stubber.add_response(
+            "head_object",
+            {"ContentLength": 1, "ETag": '"1"'},
+            {"Bucket": "kazhala-lol", "Key": "small.txt"},
+        )
+        stubber.add_response(
+            "get_object",
+            {"Body": io.BytesIO(b"a"), "ContentLength": 1},
+            {"Bucket": "kazhala-lol", "Key": "small.txt"},
+        )
+        scheduler = S3TransferScheduler(client, verify="md5")
+        scheduler.download(
+            [
+                {
+                    "bucket": "kazhala-lol",
+                    "key": "small.txt",
+                    "local_path": os.path.join(self.tmpdir.name, "a", "small.txt"),
+                }
+            ]
+        )
+        self.assertEqual(len(scheduler.unverified), 1)
+        self.assertRegex(
+            self.capturedOutput.getvalue(),
+            r"verify: skipped 1 objects without a md5 ETag or md5 checksum",
+        )
+
+        # the temporary file is removed when the data doesn't match
+        stubber.add_response(
+            "head_object",
+            {"ContentLength": 10, "ETag": '"1"'},
+            {"Bucket": "kazhala-lol", "Key": "big.txt"},
+        )
+        stubber.add_response(
+            "get_object",
+            {"Body": io.BytesIO(b"b" * 10), "ContentLength": 10},
+            {"Bucket": "kazhala-lol", "Key": "big.txt"},
+        )
+        scheduler = S3TransferScheduler(client, verify="md5")
+        self.assertRaises(
+            ChecksumMismatch,
+            scheduler.download,
+            [{"bucket": "kazhala-lol", "key": "big.txt", "local_path": local_path}],
+        )
+        with open(local_path, "rb") as file:
+            self.assertEqual(file.read(), b"a" * 10)
+        self.assertEqual(
+            sorted(os.listdir(os.path.dirname(local_path))), ["big.txt", "small.txt"]
+        )
+
+    def test_download_verify_concurrent(self):
+        client = boto3.client("s3")
+        stubber = Stubber(client)
+        for _ in range(2):
+            stubber.add_response(
+                "get_object", {"Body": io.BytesIO(b"a" * 10), "ContentLength": 10}
+            )
+        stubber.activate()
+
+        # both objects in flight read their integrity at the same time
+        barrier = threading.Barrier(2, timeout=5)
+
+        def _get_object_integrity(*args, **kwargs):
+            barrier.wait()
+            return ObjectIntegrity(
+                10, 0, hashlib.md5(b"a" * 10).hexdigest(), None, False
+            )
+
+        scheduler = S3TransferScheduler(client, concurrency=2, verify="md5")
+        with patch(
+            "fzfaws.s3.helper.s3transferscheduler.get_object_integrity",
+            side_effect=_get_object_integrity,
+        ):
+            scheduler.download(
+                [
+                    {
+                        "bucket": "kazhala-lol",
+                        "key": name,
+                        "local_path": os.path.join(self.tmpdir.name, name),
+                    }
+                    for name in ("a.txt", "b.txt")
+                ]
+            )
+        stubber.assert_no_pending_responses()
+        self.assertEqual(scheduler.failures, [])
+        self.assertEqual(scheduler.progress.files_done, 2)
+
+    @patch("fzfaws.s3.helper.s3transferscheduler.RangedDownloader")
+    @patch("fzfaws.s3.helper.s3transferscheduler.RANGED_DOWNLOAD_THRESHOLD", 10)
+    def test_download_ranged(self, mocked_downloader):
+        mocked_downloader.return_value.download.side_effect = (
+            lambda bucket, key, local_path, extra_args, callback: callback(10)
+        )
+        scheduler = S3TransferScheduler(boto3.client("s3"), concurrency=1)
+        scheduler.download(
+            [
+                {
+                    "bucket": "kazhala-lol",
+                    "key": "big.txt",
+                    "local_path": os.path.join(self.tmpdir.name, "big.txt"),
+                    "version_id": "11111111",
+                    "size": 10,
+                }
+            ]
+        )
+        mocked_downloader.return_value.download.assert_called_once_with(
+            "kazhala-lol",
+            "big.txt",
+            os.path.join(self.tmpdir.name, "big.txt"),
+            extra_args={"VersionId": "11111111"},
+            callback=scheduler.progress.update,
+        )
+        self.assertEqual(scheduler.progress.files_done, 1)
+        self.assertEqual(scheduler.progress.bytes_done, 10)
+
+    def test_download_failure(self):
+        client = boto3.client("s3")
+        stubber = Stubber(client)
+        stubber.add_client_error("get_object", "NoSuchKey")
+        stubber.activate()
+
+        local_path = os.path.join(self.tmpdir.name, "hello.txt")
+        scheduler = S3TransferScheduler(client)
+        self.assertRaises(
+            ClientError,
+            scheduler.download,
+            [
+                {
+                    "bucket": "kazhala-lol",
+                    "key": "hello.txt",
+                    "local_path": local_path,
+                    "size": 1,
+                    "etag": '"1"',
+                }
+            ],
+        )
+        # no partial file is left behind
+        self.assertFalse(os.path.exists(local_path))
+        self.assertEqual(len(os.listdir(self.tmpdir.name)), 3)
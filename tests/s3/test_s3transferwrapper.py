@@ -1,7 +1,12 @@
+import os
+import tempfile
 import unittest
+from unittest.mock import patch
 from fzfaws.utils import FileLoader
 from fzfaws.s3.helper.s3transferwrapper import S3TransferWrapper
+from fzfaws.s3.helper.throughput import ThroughputEstimator
 import boto3
+from boto3.s3.transfer import TransferConfig
 from pathlib import Path
 
 
@@ -13,3 +18,129 @@ class TestS3TransferWrapper(unittest.TestCase):
         transfer = S3TransferWrapper(boto3.client("s3"))
         self.assertEqual(transfer.s3transfer._manager.config.num_download_attempts, 6)
         self.assertEqual(transfer.transfer_config.num_download_attempts, 6)
+        self.assertEqual(transfer.concurrency, 10)
+
+    def test_get_part_ranges(self):
+        transfer = S3TransferWrapper(
+            transfer_config=TransferConfig(
+                multipart_threshold=10, multipart_chunksize=5 * 1024 * 1024
+            )
+        )
+        self.assertEqual(transfer.get_part_ranges(0), [(0, 0)])
+        self.assertEqual(transfer.get_part_ranges(9), [(0, 9)])
+        # chunk size is adjusted to the 5 MiB minimum same as s3transfer
+        self.assertEqual(transfer.get_part_ranges(10), [(0, 10)])
+        self.assertEqual(
+            transfer.get_part_ranges(11 * 1024 * 1024),
+            [
+                (0, 5 * 1024 * 1024),
+                (5 * 1024 * 1024, 5 * 1024 * 1024),
+                (10 * 1024 * 1024, 1024 * 1024),
+            ],
+        )
+
+    @patch("fzfaws.s3.helper.s3transferwrapper.get_estimator")
+    def test_get_transfer_config(self, mocked_estimator):
+        mocked_estimator.return_value.bytes_per_second = None
+        mib = 1024 * 1024
+        with patch.dict(
+            os.environ,
+            {"FZFAWS_S3_TRANSFER": '{"max_io_queue": 50}', "FZFAWS_S3_AUTO_TUNE": ""},
+        ):
+            transfer = S3TransferWrapper()
+            self.assertFalse(transfer.auto_tune)
+            self.assertIs(
+                transfer.get_transfer_config(100 * 1024 * mib), transfer.transfer_config
+            )
+
+        with patch.dict(
+            os.environ,
+            {
+                "FZFAWS_S3_TRANSFER": '{"max_io_queue": 50}',
+                "FZFAWS_S3_AUTO_TUNE": "true",
+            },
+        ):
+            transfer = S3TransferWrapper()
+        self.assertTrue(transfer.auto_tune)
+        self.assertEqual(transfer.transfer_config.multipart_chunksize, 8 * mib)
+        self.assertEqual(transfer.transfer_config.max_io_queue, 50)
+        # without an estimate the concurrency is not tuned
+        self.assertEqual(transfer.transfer_config.max_request_concurrency, 10)
+
+        # chunk size only depends on the object size
+        self.assertEqual(transfer.get_transfer_config(mib).multipart_chunksize, 8 * mib)
+        config = transfer.get_transfer_config(40 * 1024 * mib)
+        self.assertEqual(config.multipart_chunksize, 64 * mib)
+        self.assertEqual(len(transfer.get_part_ranges(40 * 1024 * mib)), 640)
+        config = transfer.get_transfer_config(5 * 1024 * 1024 * mib)
+        self.assertEqual(config.multipart_chunksize, 5 * 1024 * mib)
+        self.assertLessEqual(
+            len(transfer.get_part_ranges(5 * 1024 * 1024 * mib)), 10000
+        )
+
+        # keep the parts within AUTO_PART_SECONDS at the estimated throughput
+        mocked_estimator.return_value.bytes_per_second = 100 * mib
+        config = transfer.get_transfer_config(40 * 1024 * mib)
+        self.assertEqual(config.max_request_concurrency, 4)
+        self.assertEqual(config.io_chunksize, 1024 * 1024)
+        config = transfer.get_transfer_config(1024 * mib)
+        self.assertEqual(config.max_request_concurrency, 25)
+        # never more parts in flight than parts of the object
+        self.assertEqual(
+            transfer.get_transfer_config(20 * mib).max_request_concurrency, 3
+        )
+        mocked_estimator.return_value.bytes_per_second = 1024 * mib
+        config = transfer.get_transfer_config()
+        self.assertEqual(config.max_request_concurrency, 32)
+        self.assertEqual(config.io_chunksize, 4 * mib)
+        self.assertEqual(config.multipart_threshold, 8 * mib)
+
+        # user settings always win
+        with patch.dict(
+            os.environ,
+            {
+                "FZFAWS_S3_TRANSFER": '{"multipart_chunksize": 16777216, "max_concurrency": 2}',
+                "FZFAWS_S3_AUTO_TUNE": "true",
+            },
+        ):
+            config = S3TransferWrapper().get_transfer_config(40 * 1024 * mib)
+        self.assertEqual(config.multipart_chunksize, 16 * mib)
+        self.assertEqual(config.max_request_concurrency, 2)
+        self.assertEqual(config.io_chunksize, 4 * mib)
+
+        # the 8 bytes of the default config file are the 5 MiB parts s3transfer uploads
+        with patch.dict(
+            os.environ,
+            {
+                "FZFAWS_S3_TRANSFER": '{"multipart_threshold": 8, "multipart_chunksize": 8}',
+                "FZFAWS_S3_AUTO_TUNE": "",
+            },
+        ):
+            transfer = S3TransferWrapper()
+        self.assertEqual(transfer.transfer_config.multipart_threshold, 8)
+        self.assertEqual(transfer.transfer_config.multipart_chunksize, 5 * mib)
+        self.assertEqual(transfer.get_part_ranges(8), [(0, 8)])
+        self.assertEqual(
+            transfer.get_part_ranges(11 * mib),
+            [(0, 5 * mib), (5 * mib, 5 * mib), (10 * mib, mib)],
+        )
+
+    def test_throughput_estimator(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "throughput.json")
+            estimator = ThroughputEstimator(path)
+            self.assertIsNone(estimator.bytes_per_second)
+            # small samples are dominated by latency
+            estimator.record(1024, 1)
+            self.assertIsNone(estimator.bytes_per_second)
+            estimator.record(100 * 1024 * 1024, 1)
+            estimator.record(200 * 1024 * 1024, 1)
+            self.assertEqual(estimator.bytes_per_second, 130 * 1024 * 1024)
+            estimator.save()
+            self.assertEqual(
+                ThroughputEstimator(path).bytes_per_second, 130 * 1024 * 1024
+            )
+            # a corrupted file is ignored
+            with open(path, "w") as file:
+                file.write("{")
+            self.assertIsNone(ThroughputEstimator(path).bytes_per_second)
@@ -1,56 +1,268 @@
+from datetime import datetime, timezone
 import io
+import os
 import sys
+import tempfile
 import unittest
-from unittest.mock import patch
-from fzfaws.s3.helper.sync_s3 import sync_s3
-import subprocess
+from unittest.mock import MagicMock, patch
+
+from fzfaws.s3.helper.sync_s3 import (
+    SyncAction,
+    SyncEntry,
+    list_local,
+    list_s3,
+    parse_sync_path,
+    plan_sync,
+    sync_s3,
+)
 from fzfaws.utils.exceptions import InvalidS3PathPattern
 
 
+def _entry(relative, size=1, mtime=100.0, etag=None):
+    return SyncEntry(relative, relative, size, mtime, etag)
+
+
 class TestS3Sync(unittest.TestCase):
     def setUp(self):
         self.capturedOutput = io.StringIO()
         sys.stdout = self.capturedOutput
+        self.tmpdir = tempfile.TemporaryDirectory()
+        for filename in ["a-c", "a/b", "a0", "b.txt", "a/.hidden", "c/d/e.txt"]:
+            path = os.path.join(self.tmpdir.name, filename)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "w") as file:
+                file.write(filename)
+        self.s3 = MagicMock()
+        self.client = self.s3.get_client.return_value
+        self.modified = datetime(2020, 6, 3, tzinfo=timezone.utc)
 
     def tearDown(self):
         sys.stdout = sys.__stdout__
+        self.tmpdir.cleanup()
 
-    @patch("fzfaws.s3.helper.sync_s3.get_confirmation")
-    @patch.object(subprocess, "Popen")
-    def test_no_extra(self, mocked_popen, mocked_confirmation):
-        mocked_confirmation.return_value = True
-        attrs = {"communicate.return_value": ("output", "error")}
-        mocked_popen.configure_mock(**attrs)
-        sync_s3(from_path="hello/world", to_path="s3://hello")
-        mocked_popen.assert_called_with(
-            ["aws", "s3", "sync", "hello/world", "s3://hello",]
+    def test_invalid(self):
+        self.assertRaises(InvalidS3PathPattern, sync_s3)
+        self.assertRaises(
+            InvalidS3PathPattern, sync_s3, from_path="/tmp", to_path="/usr", s3=self.s3
         )
+        self.assertRaises(InvalidS3PathPattern, parse_sync_path, "s3:///hello")
 
-        self.assertRaises(InvalidS3PathPattern, sync_s3)
+    def test_parse_sync_path(self):
+        self.assertEqual(parse_sync_path("s3://kazhala-lol/"), ("kazhala-lol", ""))
+        self.assertEqual(parse_sync_path("s3://kazhala-lol"), ("kazhala-lol", ""))
+        self.assertEqual(
+            parse_sync_path("s3://kazhala-lol/hello"), ("kazhala-lol", "hello/")
+        )
+        self.assertEqual(parse_sync_path("/tmp/hello/"), ("", "/tmp/hello"))
+
+    def test_list_local(self):
+        # same order as list_objects, "a-c" < "a/b" < "a0"
+        self.assertEqual(
+            [entry.relative for entry in list_local(self.tmpdir.name)],
+            ["a-c", "a/.hidden", "a/b", "a0", "b.txt", "c/d/e.txt"],
+        )
+        entry = next(list_local(self.tmpdir.name, exclude=["a*"]))
+        self.assertEqual(entry.relative, "b.txt")
+        self.assertEqual(entry.path, os.path.join(self.tmpdir.name, "b.txt"))
+        self.assertEqual(entry.size, 5)
+        self.assertEqual(list(list_local(os.path.join(self.tmpdir.name, "no"))), [])
+
+    def test_list_s3(self):
+        self.client.get_paginator.return_value.paginate.return_value = [
+            {
+                "Contents": [
+                    {"Key": "hello/", "Size": 0, "LastModified": self.modified},
+                    {
+                        "Key": "hello/a.txt",
+                        "Size": 1,
+                        "LastModified": self.modified,
+                        "ETag": '"abc"',
+                    },
+                    {"Key": "hello/b.py", "Size": 2, "LastModified": self.modified},
+                ]
+            }
+        ]
+        result = list(list_s3(self.client, "kazhala-lol", "hello/", exclude=["*.py"]))
+        self.client.get_paginator.assert_called_with("list_objects_v2")
+        self.client.get_paginator.return_value.paginate.assert_called_with(
+            Bucket="kazhala-lol", Prefix="hello/"
+        )
+        self.assertEqual(
+            result,
+            [SyncEntry("a.txt", "hello/a.txt", 1, self.modified.timestamp(), "abc")],
+        )
+
+    def test_plan_sync(self):
+        source = [
+            _entry("a.txt"),
+            _entry("b.txt", size=2),
+            _entry("c.txt", mtime=200),
+            _entry("d.txt"),
+            _entry("f.txt"),
+        ]
+        destination = [
+            _entry("b.txt"),
+            _entry("c.txt"),
+            _entry("d.txt", mtime=200),
+            _entry("e.txt"),
+            _entry("g.txt"),
+        ]
+        self.assertEqual(
+            plan_sync(source, destination),
+            [
+                SyncAction("copy", source[0], None),
+                SyncAction("copy", source[1], destination[0]),
+                SyncAction("copy", source[2], destination[1]),
+                SyncAction("copy", source[4], None),
+            ],
+        )
+        plan = plan_sync(iter(source), iter(destination), delete=True)
+        self.assertEqual(
+            [action.operation for action in plan],
+            ["copy", "copy", "copy", "delete", "copy", "delete"],
+        )
+        self.assertEqual(plan[3].destination, destination[3])
 
+    @patch("fzfaws.s3.helper.sync_s3.verify_etag")
+    def test_plan_checksum(self, mocked_etag):
+        mocked_etag.side_effect = lambda path, etag: etag == "abc"
+        source = [_entry("a.txt", mtime=200), _entry("b.txt"), _entry("c.txt")]
+        destination = [
+            _entry("a.txt", etag="abc"),
+            _entry("b.txt", mtime=200, etag="def"),
+            _entry("c.txt", etag="abc"),
+        ]
+        plan = plan_sync(source, destination, checksum=True)
+        self.assertEqual(plan, [SyncAction("copy", source[1], destination[1])])
+        mocked_etag.assert_called_with("c.txt", "abc")
+
+        # ETag of a kms encrypted object is not a md5, compare the time instead
+        plan = plan_sync(source, destination, checksum=True, is_md5=lambda entry: False)
+        self.assertEqual(plan, [])
+
+        # unknown part size
+        mocked_etag.side_effect = lambda path, etag: None
+        plan = plan_sync(source, destination, checksum=True)
+        self.assertEqual(plan, [SyncAction("copy", source[0], destination[0])])
+
+    @patch("fzfaws.s3.helper.sync_s3.S3TransferScheduler")
+    @patch("fzfaws.s3.helper.sync_s3.get_confirmation")
+    def test_upload(self, mocked_confirm, mocked_scheduler):
+        mocked_confirm.return_value = True
+        self.client.get_paginator.return_value.paginate.return_value = [
+            {
+                "Contents": [
+                    # newer than the local file
+                    {
+                        "Key": "hello/a0",
+                        "Size": 2,
+                        "LastModified": datetime(2100, 1, 1, tzinfo=timezone.utc),
+                    },
+                    {"Key": "hello/b.txt", "Size": 2, "LastModified": self.modified},
+                    {"Key": "hello/old.txt", "Size": 2, "LastModified": self.modified},
+                ]
+            }
+        ]
+        self.client.delete_objects.return_value = {}
+        sync_s3(
+            exclude=["a/*", "c/*"],
+            from_path=self.tmpdir.name,
+            to_path="s3://kazhala-lol/hello",
+            s3=self.s3,
+            delete=True,
+        )
+        mocked_scheduler.return_value.upload.assert_called_once_with(
+            [
+                {
+                    "local_path": os.path.join(self.tmpdir.name, "a-c"),
+                    "bucket": "kazhala-lol",
+                    "key": "hello/a-c",
+                    "size": 3,
+                },
+                {
+                    "local_path": os.path.join(self.tmpdir.name, "b.txt"),
+                    "bucket": "kazhala-lol",
+                    "key": "hello/b.txt",
+                    "size": 5,
+                },
+            ]
+        )
+        self.client.delete_objects.assert_called_once_with(
+            Bucket="kazhala-lol",
+            Delete={"Objects": [{"Key": "hello/old.txt"}], "Quiet": True},
+        )
+        output = self.capturedOutput.getvalue()
+        self.assertRegex(
+            output, r"\(dryrun\) upload: .*/a-c to s3://kazhala-lol/hello/a-c"
+        )
+        self.assertRegex(output, r"\(dryrun\) delete: s3://kazhala-lol/hello/old.txt")
+        self.assertNotRegex(output, r"a0 to")
+        self.assertRegex(output, r"delete: s3://kazhala-lol/hello/old.txt")
+
+    @patch("fzfaws.s3.helper.sync_s3.S3TransferScheduler")
     @patch("fzfaws.s3.helper.sync_s3.get_confirmation")
-    @patch.object(subprocess, "Popen")
-    def test_extra(self, mocked_popen, mocked_confirmation):
-        mocked_confirmation.return_value = True
-        attrs = {"communicate.return_value": ("output", "error")}
-        mocked_popen.configure_mock(**attrs)
-        sync_s3(["lol"], ["foo", "boo"], "tmp", "s3://yes")
-        mocked_popen.assert_called_with(
+    def test_download(self, mocked_confirm, mocked_scheduler):
+        mocked_confirm.return_value = True
+        self.client.get_paginator.return_value.paginate.return_value = [
+            {
+                "Contents": [
+                    {"Key": "a-c", "Size": 3, "LastModified": self.modified},
+                    {
+                        "Key": "new.txt",
+                        "Size": 4,
+                        "LastModified": self.modified,
+                        "ETag": '"1"',
+                    },
+                ]
+            }
+        ]
+        sync_s3(
+            from_path="s3://kazhala-lol/",
+            to_path=self.tmpdir.name,
+            s3=self.s3,
+            delete=True,
+            exclude=["a*", "c/*"],
+            include=["a-c"],
+        )
+        mocked_scheduler.return_value.download.assert_called_once_with(
             [
-                "aws",
-                "s3",
-                "sync",
-                "tmp",
-                "s3://yes",
-                "--exclude",
-                "lol",
-                "--include",
-                "foo",
-                "boo",
+                {
+                    "bucket": "kazhala-lol",
+                    "key": "new.txt",
+                    "local_path": os.path.join(self.tmpdir.name, "new.txt"),
+                    "size": 4,
+                    "etag": '"1"',
+                }
             ]
         )
+        # local files not in the bucket are deleted, excluded files are kept
+        self.assertFalse(os.path.exists(os.path.join(self.tmpdir.name, "b.txt")))
+        self.assertTrue(os.path.exists(os.path.join(self.tmpdir.name, "a0")))
+        self.assertTrue(os.path.exists(os.path.join(self.tmpdir.name, "a-c")))
 
-        sync_s3(["lol"], [], "tmp", "s3://yes")
-        mocked_popen.assert_called_with(
-            ["aws", "s3", "sync", "tmp", "s3://yes", "--exclude", "lol",]
+    @patch("fzfaws.s3.helper.sync_s3.get_confirmation")
+    def test_copy(self, mocked_confirm):
+        mocked_confirm.return_value = True
+        self.client.get_paginator.return_value.paginate.side_effect = [
+            [{"Contents": [{"Key": "a.txt", "Size": 3, "LastModified": self.modified}]}],
+            [{"Contents": []}],
+        ]
+        sync_s3(from_path="s3://kazhala-lol", to_path="s3://kazhala-yes/hello/", s3=self.s3)
+        self.client.copy_object.assert_called_once_with(
+            Bucket="kazhala-yes",
+            Key="hello/a.txt",
+            CopySource={"Bucket": "kazhala-lol", "Key": "a.txt"},
+        )
+        self.assertRegex(
+            self.capturedOutput.getvalue(),
+            r"copy: s3://kazhala-lol/a.txt to s3://kazhala-yes/hello/a.txt",
         )
+
+    @patch("fzfaws.s3.helper.sync_s3.get_confirmation")
+    def test_in_sync(self, mocked_confirm):
+        self.client.get_paginator.return_value.paginate.return_value = [
+            {"Contents": [{"Key": "a.txt", "Size": 3, "LastModified": self.modified}]}
+        ]
+        sync_s3(from_path="s3://kazhala-lol/", to_path="s3://kazhala-lol/", s3=self.s3)
+        mocked_confirm.assert_not_called()
+        self.assertRegex(self.capturedOutput.getvalue(), r"already in sync")
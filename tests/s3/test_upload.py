@@ -1,8 +1,9 @@
 import io
 import sys
+import tempfile
 import os
 import unittest
-from unittest.mock import patch
+from unittest.mock import ANY, patch
 from fzfaws.s3.upload_s3 import upload_s3
 from fzfaws.s3 import S3
 from fzfaws.utils import Pyfzf
@@ -29,14 +30,27 @@ class TestS3Upload(unittest.TestCase):
             include=[],
             from_path="/tmp",
             to_path="s3://kazhala-file-transfer/hello/",
+            s3=ANY,
+            delete=False,
+            checksum=False,
+            verify=None,
         )
         mocked_local_file.assert_called_with(
             search_from_root=False, directory=True, hidden=False, multi_select=False,
         )
 
-        upload_s3(sync=True, search_root=True, recursive=True, hidden=True)
+        upload_s3(
+            sync=True, search_root=True, recursive=True, hidden=True, delete=True
+        )
         mocked_sync.assert_called_with(
-            exclude=[], include=[], from_path="/tmp", to_path="s3:///",
+            exclude=[],
+            include=[],
+            from_path="/tmp",
+            to_path="s3:///",
+            s3=ANY,
+            delete=True,
+            checksum=False,
+            verify=None,
         )
         mocked_local_file.assert_called_with(
             search_from_root=True, directory=True, hidden=True, multi_select=False,
@@ -46,14 +60,13 @@ class TestS3Upload(unittest.TestCase):
 
     @patch.object(S3Args, "set_extra_args")
     @patch("fzfaws.s3.upload_s3.get_confirmation")
-    @patch("fzfaws.s3.upload_s3.os.walk")
     @patch.object(Pyfzf, "get_local_file")
-    def test_recusive_upload(
-        self, mocked_local_file, mocked_walk, mocked_confirm, mocked_args
-    ):
-        curr_dirname = os.path.dirname(os.path.abspath(__file__))
-        mocked_local_file.return_value = curr_dirname
-        mocked_walk.return_value = [(curr_dirname, "/tmp", [__file__])]
+    def test_recusive_upload(self, mocked_local_file, mocked_confirm, mocked_args):
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        with open(os.path.join(tmpdir.name, "test_upload.py"), "w") as file:
+            file.write("hello")
+        mocked_local_file.return_value = tmpdir.name
         mocked_confirm.return_value = False
 
         self.capturedOutput.truncate(0)
@@ -115,3 +128,134 @@ class TestS3Upload(unittest.TestCase):
         )
         mocked_recursive.assert_not_called()
         mocked_local_file.assert_not_called()
+
+    @patch.object(S3, "get_client")
+    @patch("fzfaws.s3.upload_s3.S3TransferScheduler")
+    @patch("fzfaws.s3.upload_s3.get_confirmation")
+    @patch("fzfaws.s3.upload_s3.DRYRUN_LIMIT", 2)
+    def test_recusive_upload_summary(
+        self, mocked_confirm, mocked_scheduler, mocked_client
+    ):
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        for folder in ["a", "b"]:
+            os.makedirs(os.path.join(tmpdir.name, folder))
+            with open(os.path.join(tmpdir.name, folder, "file"), "w") as file:
+                file.write("hello")
+        with open(os.path.join(tmpdir.name, "file"), "w") as file:
+            file.write("hello")
+        mocked_confirm.return_value = True
+        upload_list = []
+        mocked_scheduler.return_value.upload.side_effect = (
+            lambda items, extra_args: upload_list.extend(items)
+        )
+
+        self.capturedOutput.truncate(0)
+        self.capturedOutput.seek(0)
+        upload_s3(
+            recursive=True, bucket="kazhala-file-lol/hello/", local_paths=tmpdir.name
+        )
+        self.assertEqual(
+            self.capturedOutput.getvalue(),
+            "(dryrun) upload: 3 files (15 Bytes) in %s to s3://kazhala-file-lol/hello/\n"
+            % tmpdir.name,
+        )
+        scheduler = mocked_scheduler.return_value
+        self.assertEqual(scheduler.progress.total_files, 3)
+        self.assertEqual(scheduler.progress.total_bytes, 15)
+        self.assertEqual(
+            sorted(item["key"] for item in upload_list),
+            ["hello/a/file", "hello/b/file", "hello/file"],
+        )
+
+        # files created after the dryrun are not uploaded
+        def _confirm(message):
+            with open(os.path.join(tmpdir.name, "a", "new"), "w") as file:
+                file.write("hello")
+            return True
+
+        mocked_confirm.side_effect = _confirm
+        upload_list.clear()
+        upload_s3(
+            recursive=True, bucket="kazhala-file-lol/hello/", local_paths=tmpdir.name
+        )
+        self.assertEqual(
+            sorted(item["key"] for item in upload_list),
+            ["hello/a/file", "hello/b/file", "hello/file"],
+        )
+
+    @patch.object(S3, "get_client")
+    @patch("fzfaws.s3.upload_s3.S3TransferScheduler")
+    @patch("fzfaws.s3.upload_s3.get_confirmation")
+    def test_recursive_upload_skip_unchanged(
+        self, mocked_confirm, mocked_scheduler, mocked_client
+    ):
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        for filename in ["a", "b", "c"]:
+            with open(os.path.join(tmpdir.name, filename), "w") as file:
+                file.write("hello")
+        mocked_confirm.return_value = True
+        mocked_client.return_value.get_paginator.return_value.paginate.return_value = [
+            {
+                "Contents": [
+                    # same content
+                    {
+                        "Key": "hello/a",
+                        "Size": 5,
+                        "ETag": '"5d41402abc4b2a76b9719d911017c592"',
+                    },
+                    # same size but different content
+                    {"Key": "hello/b", "Size": 5, "ETag": '"abc"'},
+                ]
+            }
+        ]
+
+        upload_list = []
+        mocked_scheduler.return_value.upload.side_effect = (
+            lambda items, extra_args: upload_list.extend(items)
+        )
+        cachedir = tempfile.TemporaryDirectory()
+        self.addCleanup(cachedir.cleanup)
+        with patch.dict(os.environ, {"XDG_CACHE_HOME": cachedir.name}):
+            upload_s3(
+                recursive=True,
+                bucket="kazhala-file-lol/hello/",
+                local_paths=tmpdir.name,
+                skip_unchanged=True,
+            )
+        output = self.capturedOutput.getvalue()
+        self.assertNotRegex(output, r"upload: a to")
+        self.assertRegex(output, r"upload: b to s3://kazhala-file-lol/hello/b")
+        self.assertRegex(output, r"upload: c to s3://kazhala-file-lol/hello/c")
+        self.assertRegex(output, r"skip: 1 unchanged files")
+        scheduler = mocked_scheduler.return_value
+        self.assertEqual(scheduler.progress.total_files, 2)
+        self.assertEqual(
+            sorted(item["key"] for item in upload_list), ["hello/b", "hello/c"]
+        )
+
+    @patch("fzfaws.s3.upload_s3.abort_upload")
+    @patch("fzfaws.s3.upload_s3.list_saved_uploads")
+    @patch.object(S3, "get_client")
+    @patch("fzfaws.s3.upload_s3.get_confirmation")
+    def test_cancel_upload(
+        self, mocked_confirm, mocked_client, mocked_saved, mocked_abort
+    ):
+        mocked_confirm.return_value = False
+        mocked_saved.return_value = [
+            ("/tmp/state.json", {"key": "hello/hello.txt", "upload_id": "11111111"})
+        ]
+        upload_s3(bucket="kazhala-file-lol/hello/", local_paths=["hello.txt"])
+        mocked_saved.assert_called_once_with("kazhala-file-lol", "hello/hello.txt")
+        mocked_abort.assert_called_once_with(
+            mocked_client.return_value,
+            "kazhala-file-lol",
+            "hello/hello.txt",
+            "11111111",
+            "/tmp/state.json",
+        )
+        self.assertRegex(
+            self.capturedOutput.getvalue(),
+            r"abort: incomplete upload to s3://kazhala-file-lol/hello/hello.txt",
+        )
@@ -0,0 +1,279 @@
+from datetime import datetime, timezone
+import json
+import os
+import unittest
+from unittest.mock import ANY, MagicMock, patch
+
+import boto3
+from botocore.paginate import Paginator
+
+from fzfaws.s3.helper.version_index import VersionIndex, group_keys, group_versions
+
+
+class TestVersionIndex(unittest.TestCase):
+    def setUp(self):
+        data_path = os.path.join(
+            os.path.dirname(os.path.abspath(__file__)), "../data/s3_object_ver.json"
+        )
+        with open(data_path, "r") as file:
+            self.response = json.load(file)
+        self.index = VersionIndex(bucket="kazhala-version-testing")
+        for result in self.response:
+            self.index.add_page(result)
+
+    def test_constructor(self):
+        index = VersionIndex()
+        self.assertEqual(index.bucket, "")
+        self.assertEqual(index.prefix, "")
+        self.assertEqual(len(index), 0)
+        self.assertEqual(index.keys, [])
+
+    @patch.object(Paginator, "paginate")
+    def test_from_bucket(self, mocked_paginator):
+        mocked_paginator.return_value = self.response
+        index = VersionIndex.from_bucket(
+            boto3.client("s3"), "kazhala-version-testing", prefix="wtf"
+        )
+        mocked_paginator.assert_called_once_with(
+            ANY, Bucket="kazhala-version-testing", Prefix="wtf"
+        )
+        self.assertEqual(len(index), 22)
+        self.assertEqual(index.prefix, "wtf")
+
+    @patch.object(Paginator, "paginate")
+    def test_from_keys(self, mocked_paginator):
+        mocked_paginator.return_value = self.response
+        index = VersionIndex.from_keys(
+            boto3.client("s3"), "kazhala-version-testing", ["wtf.pem", " wtf.txt"]
+        )
+        self.assertEqual(mocked_paginator.call_count, 2)
+        mocked_paginator.assert_any_call(
+            ANY, Bucket="kazhala-version-testing", Prefix="wtf.pem", Delimiter="/"
+        )
+        self.assertEqual(index.keys, [" wtf.txt", "wtf.pem"])
+        self.assertEqual(index.key_count, 2)
+        self.assertEqual(len(index), 8)
+        self.assertTrue(index.covers("kazhala-version-testing", "wtf.pem"))
+        self.assertFalse(index.covers("kazhala-version-testing", ".DS_Store"))
+
+    def test_from_keys_sparse(self):
+        client = MagicMock()
+        # the group prefix matches many unselected keys
+        client.get_paginator.return_value.paginate.side_effect = lambda **kwargs: (
+            iter([{"Versions": [{"Key": kwargs["Prefix"], "VersionId": "1"}]}])
+            if kwargs["Prefix"] != "folder/a"
+            else iter({"Versions": []} for _ in range(100))
+        )
+        index = VersionIndex.from_keys(
+            client, "kazhala-lol", ["folder/a1", "folder/a2"]
+        )
+        self.assertEqual(index.keys, ["folder/a1", "folder/a2"])
+        paginate = client.get_paginator.return_value.paginate
+        self.assertEqual(
+            [call[1]["Prefix"] for call in paginate.call_args_list],
+            ["folder/a", "folder/a1", "folder/a2"],
+        )
+
+    def test_group_keys(self):
+        self.assertEqual(group_keys([]), [])
+        self.assertEqual(
+            group_keys(
+                [
+                    "folder/file1",
+                    "folder/file2",
+                    "a.txt",
+                    "a.txt.bak",
+                    "b.txt",
+                    "folder/sub/file1",
+                    "folder/zzz",
+                    "folder/file1",
+                ]
+            ),
+            [
+                ("a.txt", {"a.txt", "a.txt.bak"}),
+                ("b.txt", {"b.txt"}),
+                ("folder/file", {"folder/file1", "folder/file2"}),
+                ("folder/sub/file1", {"folder/sub/file1"}),
+                ("folder/zzz", {"folder/zzz"}),
+            ],
+        )
+        # many keys sharing a naming pattern collapse into a single listing
+        groups = group_keys(["logs/2020-%05d.log" % i for i in range(10000)])
+        self.assertEqual(len(groups), 1)
+        self.assertEqual(groups[0][0], "logs/2020-0")
+
+    def test_add_page(self):
+        self.assertEqual(len(self.index), 22)
+        self.assertEqual(
+            self.index.keys,
+            [
+                " elb.pem",
+                " w tf.txt",
+                " wtf.txt",
+                "../",
+                ".DS_Store",
+                "CHANGELOG.md",
+                "README.md",
+                "wtf.pem",
+            ],
+        )
+
+    def test_cross_page(self):
+        modified = datetime(2020, 6, 3, tzinfo=timezone.utc)
+        index = VersionIndex()
+        index.add_page(
+            {
+                "Versions": [],
+                "DeleteMarkers": [
+                    {
+                        "Key": "a.txt",
+                        "VersionId": "4",
+                        "IsLatest": True,
+                        "LastModified": modified,
+                    },
+                ],
+            }
+        )
+        index.add_page(
+            {
+                "Versions": [
+                    {"Key": "a.txt", "VersionId": "1", "IsLatest": False, "Size": 5},
+                    {"Key": "b.txt", "VersionId": "2", "IsLatest": True, "Size": 3},
+                ],
+                "DeleteMarkers": [],
+            }
+        )
+        # a.txt versions are split across pages but the key only appears once
+        # and the delete marker on the first page still applies to it
+        self.assertEqual(index.keys, ["a.txt", "b.txt"])
+        self.assertEqual(
+            list(index.uniq_keys()), [("a.txt", True), ("b.txt", False)],
+        )
+        self.assertEqual(index.non_current_bytes(), 5)
+        latest = list(index.latest())
+        self.assertEqual(latest[0]["VersionId"], "4")
+        self.assertEqual(latest[0]["LastModified"], modified)
+        self.assertTrue(latest[0]["DeleteMarker"])
+        self.assertEqual(latest[1]["LastModified"], None)
+
+    def test_group_versions(self):
+        pages = [
+            {
+                "Versions": [{"Key": "a.txt", "VersionId": "1", "IsLatest": True}],
+                "DeleteMarkers": [],
+            },
+            {
+                "Versions": [{"Key": "b.txt", "VersionId": "3", "IsLatest": True}],
+                "DeleteMarkers": [
+                    {"Key": "a.txt", "VersionId": "2", "IsLatest": False}
+                ],
+            },
+        ]
+        result = list(group_versions(iter(pages)))
+        # a.txt versions are split across pages but only yield once
+        self.assertEqual([key for key, _ in result], ["a.txt", "b.txt"])
+        self.assertEqual(
+            [
+                (version["VersionId"], version["DeleteMarker"])
+                for version in result[0][1]
+            ],
+            [("1", False), ("2", True)],
+        )
+        self.assertEqual(list(group_versions([])), [])
+
+    def test_latest(self):
+        result = list(self.index.latest())
+        self.assertEqual(
+            [(item["Key"], item["DeleteMarker"]) for item in result],
+            [
+                (" elb.pem", True),
+                (" w tf.txt", True),
+                (" wtf.txt", True),
+                ("../", False),
+                (".DS_Store", True),
+                ("wtf.pem", False),
+            ],
+        )
+        result = list(self.index.latest(prefix="wtf"))
+        self.assertEqual(len(result), 1)
+        self.assertEqual(result[0]["VersionId"], "uFQYVZPcPUfqhR7jVidSd8x93DOvtrh.")
+
+    def test_non_current(self):
+        result = list(self.index.non_current(prefix="wtf.pem"))
+        self.assertEqual(len(result), 4)
+        for version in result:
+            self.assertFalse(version["IsLatest"])
+            self.assertEqual(version["Key"], "wtf.pem")
+        self.assertEqual(len(list(self.index.non_current())), 16)
+
+    def test_non_current_bytes(self):
+        self.assertEqual(self.index.non_current_bytes(prefix=".DS_Store"), 24592)
+        self.assertEqual(self.index.non_current_bytes(prefix="nothing"), 0)
+
+    def test_versions(self):
+        result = list(self.index.versions(" wtf.txt"))
+        self.assertEqual(
+            [(item["VersionId"], item["DeleteMarker"]) for item in result],
+            [
+                ("mPwdJWYvnyojsNhzHaZKejFuflfi77Xi", False),
+                ("x5fz_U7sN2gskZf_p0_JuIt8FzBPSMHV", False),
+                ("LDLzYD0SxjzfIFRvCvHd.cnEby_r_Iew", True),
+            ],
+        )
+        self.assertEqual(list(self.index.versions("wtf")), [])
+
+    def test_has_delete_marker(self):
+        self.assertTrue(self.index.has_delete_marker(".DS_Store"))
+        self.assertFalse(self.index.has_delete_marker("wtf.pem"))
+        self.assertFalse(self.index.has_delete_marker("hello"))
+
+    def test_uniq_keys(self):
+        self.assertEqual(
+            list(self.index.uniq_keys(onlydelete=True)),
+            [
+                (" elb.pem", True),
+                (" w tf.txt", True),
+                (" wtf.txt", True),
+                (".DS_Store", True),
+            ],
+        )
+        self.assertEqual(len(list(self.index.uniq_keys())), 8)
+        self.assertEqual(
+            list(self.index.uniq_keys(start=6, end=7)), [("README.md", False)]
+        )
+
+    def test_rows(self):
+        modified = datetime(2020, 6, 3, tzinfo=timezone.utc)
+        index = VersionIndex()
+        index.append("a.txt", "2", True, True)
+        index.append("a.txt", "1", False, False, 5, modified)
+        index.append("b.txt", "3", True, False, 1, modified, '"1"')
+        self.assertEqual(
+            list(index.rows()),
+            [
+                ("a.txt", "2", True, True, 0, None, ""),
+                ("a.txt", "1", False, False, 5, modified, ""),
+                ("b.txt", "3", True, False, 1, modified, '"1"'),
+            ],
+        )
+
+    def test_covers(self):
+        self.assertTrue(self.index.covers("kazhala-version-testing", "wtf.pem"))
+        self.assertFalse(self.index.covers("kazhala-lol", "wtf.pem"))
+
+    def test_list_folder(self):
+        index = VersionIndex()
+        for key in ["a/", "a/b/c.txt", "a/b/d.txt", "a/b0.txt", "a/e/"]:
+            index.append(key, "", True, False)
+        index.append("a/f.txt", "1", True, True)
+        index.append("b.txt", "", True, False)
+        result = index.list_folder("a/")
+        self.assertEqual(
+            result["CommonPrefixes"], [{"Prefix": "a/b/"}, {"Prefix": "a/e/"}]
+        )
+        self.assertEqual(
+            [item["Key"] for item in result["Contents"]], ["a/", "a/b0.txt"]
+        )
+        result = index.list_folder()
+        self.assertEqual(result["CommonPrefixes"], [{"Prefix": "a/"}])
+        self.assertEqual([item["Key"] for item in result["Contents"]], ["b.txt"])
@@ -0,0 +1,67 @@
+import os
+import tempfile
+import unittest
+
+from fzfaws.s3.helper.walk_local_folder import walk_local_folder
+
+
+class TestWalkLocalFolder(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.files = [
+            "hello.txt",
+            "a/hello.txt",
+            "a/b/c/hello.py",
+            "b/hello.txt",
+            ".git/config",
+        ]
+        for filename in self.files:
+            path = os.path.join(self.tmpdir.name, filename)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "w") as file:
+                file.write(filename)
+        os.makedirs(os.path.join(self.tmpdir.name, "empty"))
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_walk(self):
+        result = list(walk_local_folder(self.tmpdir.name, max_workers=2))
+        self.assertEqual(
+            sorted(item.relative for item in result), sorted(self.files),
+        )
+        for item in result:
+            self.assertEqual(item.path, os.path.join(self.tmpdir.name, item.relative))
+            self.assertEqual(item.size, len(item.relative))
+            self.assertEqual(item.mtime, os.stat(item.path).st_mtime)
+
+    def test_exclude(self):
+        result = walk_local_folder(
+            self.tmpdir.name, exclude=["*"], include=["*.txt"], max_workers=1
+        )
+        self.assertEqual(
+            sorted(item.relative for item in result),
+            ["a/hello.txt", "b/hello.txt", "hello.txt"],
+        )
+
+    def test_symlink(self):
+        os.symlink(
+            os.path.join(self.tmpdir.name, "a"), os.path.join(self.tmpdir.name, "c")
+        )
+        os.symlink(
+            os.path.join(self.tmpdir.name, "hello.txt"),
+            os.path.join(self.tmpdir.name, "b/link.txt"),
+        )
+        result = sorted(item.relative for item in walk_local_folder(self.tmpdir.name))
+        # same as os.walk, linked directories are not followed but linked files are included
+        self.assertNotIn("c/hello.txt", result)
+        self.assertIn("b/link.txt", result)
+
+    def test_stop_early(self):
+        for i in range(50):
+            with open(os.path.join(self.tmpdir.name, "a", "%s.txt" % i), "w") as file:
+                file.write("")
+        walker = walk_local_folder(self.tmpdir.name, max_queue=1)
+        next(walker)
+        # closing the generator shouldn't block on the walker threads
+        walker.close()
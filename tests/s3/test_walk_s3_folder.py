@@ -5,6 +5,7 @@ import sys
 import unittest
 from unittest.mock import patch
 from botocore.paginate import Paginator
+from fzfaws.s3.helper.version_index import VersionIndex
 from fzfaws.s3.helper.walk_s3_folder import walk_s3_folder
 import boto3
 
@@ -111,3 +112,27 @@ class TestS3WalkFolder(unittest.TestCase):
         mocked_exclude.return_value = True
         result = walk_s3_folder(client, "kazhala-file-transfer", "", "")
         self.assertEqual(result, [])
+
+    @patch.object(Paginator, "paginate")
+    def test_walk_inventory(self, mocked_paginator):
+        inventory = VersionIndex(bucket="kazhala-file-transfer")
+        for key in ["wtf/a.txt", "wtf/hello/", "wtf/hello/hello.txt", "wtfb.txt"]:
+            inventory.append(key, "", True, False, len(key))
+        inventory.append("wtf/hello/world.txt", "1", True, True)
+        sizes = {}
+        result = walk_s3_folder(
+            boto3.client("s3"),
+            "kazhala-file-transfer",
+            "wtf/",
+            "wtf/",
+            destination_path="tmp",
+            inventory=inventory,
+            sizes=sizes,
+        )
+        mocked_paginator.assert_not_called()
+        self.assertEqual(
+            result,
+            [("wtf/hello/hello.txt", "tmp/hello/hello.txt"), ("wtf/a.txt", "tmp/a.txt")],
+        )
+        # sizes of the snapshot could be outdated, never passed to the transfer
+        self.assertEqual(sizes, {})
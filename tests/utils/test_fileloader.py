@@ -116,6 +116,7 @@ class TestFileLoader(unittest.TestCase):
                 }
             ),
         )
+        self.assertEqual(os.environ["FZFAWS_S3_CONCURRENCY"], "10")
         self.assertEqual(os.environ["FZFAWS_S3_PROFILE"], "default")
         self.assertEqual(os.environ["FZFAWS_S3_UPLOAD"], "--hidden")
         self.assertEqual(os.environ["FZFAWS_S3_DOWNLOAD"], "--hidden")
@@ -155,6 +156,18 @@ class TestFileLoader(unittest.TestCase):
         self.assertEqual(os.getenv("FZFAWS_S3_DOWNLOAD", ""), "")
         self.assertEqual(os.getenv("FZFAWS_S3_PRESIGN", ""), "")
 
+        with patch.dict(os.environ, {"FZFAWS_S3_AUTO_TUNE": ""}):
+            self.fileloader._set_s3_env({"auto_tune": False})
+            self.assertEqual(os.environ["FZFAWS_S3_AUTO_TUNE"], "")
+            self.fileloader._set_s3_env({"auto_tune": True})
+            self.assertEqual(os.environ["FZFAWS_S3_AUTO_TUNE"], "true")
+
+        with patch.dict(os.environ, {"FZFAWS_S3_OBJECT_CACHE": ""}):
+            self.fileloader._set_s3_env({"object_cache": {"max_size": 1024}})
+            self.assertEqual(
+                os.environ["FZFAWS_S3_OBJECT_CACHE"], json.dumps({"max_size": 1024})
+            )
+
     def test_set_ec2_env(self):
         # normal test
         self.fileloader.load_config_file(config_path=self.test_yaml)